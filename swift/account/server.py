@@ -91,6 +91,10 @@ class AccountController(BaseStorageServer):
             config_true_value(conf.get('db_preallocation', 'f'))
         swift.common.db.QUERY_LOGGING = \
             config_true_value(conf.get('db_query_logging', 'f'))
+        swift.common.db.PENDING_FORMAT = \
+            swift.common.db.config_pending_format_value(
+                conf.get('db_pending_format',
+                         swift.common.db.PENDING_FORMAT_V1))
         self.fallocate_reserve, self.fallocate_is_percent = \
             config_fallocate_value(conf.get('fallocate_reserve', '1%'))
 
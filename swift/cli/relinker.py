@@ -349,8 +349,12 @@ class Relinker(object):
                         self.diskfile_mgr.partition_lock(
                             device, self.policy, partition):
                         # Order here is somewhat important for crash-tolerance
-                        for f in ('hashes.pkl', 'hashes.invalid', '.lock',
-                                  '.lock-replication'):
+                        index_files = [
+                            f for f in os.listdir(partition_path)
+                            if f.startswith(diskfile.HASH_INDEX_PREFIX)]
+                        for f in index_files + [
+                                'hashes.pkl', 'hashes.invalid', '.lock',
+                                '.lock-replication']:
                             try:
                                 os.unlink(os.path.join(partition_path, f))
                             except OSError as e:
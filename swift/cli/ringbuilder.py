@@ -14,13 +14,14 @@
 # limitations under the License.
 
 from __future__ import print_function
+from array import array
 import logging
 
 from collections import defaultdict
 from errno import EEXIST
 from itertools import islice
 from operator import itemgetter
-from os import mkdir
+from os import mkdir, unlink
 from os.path import basename, abspath, dirname, exists, join as pathjoin
 from sys import argv as sys_argv, exit, stderr, stdout
 from textwrap import wrap
@@ -34,6 +35,8 @@ from six.moves import input
 
 from swift.common import exceptions
 from swift.common.ring import RingBuilder, Ring, RingData
+from swift.common.ring.ring import RING_FORMAT_V1, RING_FORMAT_V2, \
+    get_v2_ring_path
 from swift.common.ring.builder import MAX_BALANCE
 from swift.common.ring.composite_builder import CompositeRingBuilder
 from swift.common.ring.utils import validate_args, \
@@ -474,6 +477,43 @@ def _parse_remove_values(argvish):
         exit(EXIT_ERROR)
 
 
+def _add_format_version_option(parser):
+    parser.add_option(
+        '--format-version', type='choice',
+        choices=[str(RING_FORMAT_V1), str(RING_FORMAT_V2)],
+        help='ring file format to write; v1 rings are gzipped, v2 rings are '
+        'uncompressed and are memory-mapped when loaded. A v2 ring is '
+        'written to a .ring file alongside the v1 .ring.gz file. Defaults to '
+        'v2 if a v2 ring file exists, or v1.')
+
+
+def _get_format_version(options):
+    """
+    Get the format to write the ring file in: the --format-version option if
+    it was given, otherwise v2 if a v2 ring file was written before.
+    """
+    if options.format_version:
+        return int(options.format_version)
+    if exists(get_v2_ring_path(ring_file)):
+        return RING_FORMAT_V2
+    return RING_FORMAT_V1
+
+
+def _save_ring(ring_data, path, format_version):
+    """
+    Write a ring to a .ring.gz file, and, for v2, to the v2 ring file
+    alongside it. Servers that can load v2 rings load the v2 ring file in
+    preference to the .ring.gz file, so when v1 is asked for a stale v2 ring
+    file is removed.
+    """
+    ring_data.save(path)
+    v2_path = get_v2_ring_path(path)
+    if format_version == RING_FORMAT_V2:
+        ring_data.save(v2_path, format_version=RING_FORMAT_V2)
+    elif exists(v2_path):
+        unlink(v2_path)
+
+
 def _make_display_device_table(builder):
     ip_width = 10
     port_width = 4
@@ -1053,7 +1093,9 @@ swift-ring-builder <builder_file> rebalance [options]
         parser.add_option('-s', '--seed', help="seed to use for rebalance")
         parser.add_option('-d', '--debug', action='store_true',
                           help="print debug information")
+        _add_format_version_option(parser)
         options, args = parser.parse_args(argv)
+        format_version = _get_format_version(options)
 
         def get_seed(index):
             if options.seed:
@@ -1167,10 +1209,12 @@ swift-ring-builder <builder_file> rebalance [options]
             print('-' * 79)
             status = EXIT_WARNING
         ts = time()
-        builder.get_ring().save(
-            pathjoin(backup_dir, '%d.' % ts + basename(ring_file)))
+        ring_data = builder.get_ring()
+        _save_ring(ring_data,
+                   pathjoin(backup_dir, '%d.' % ts + basename(ring_file)),
+                   format_version)
         builder.save(pathjoin(backup_dir, '%d.' % ts + basename(builder_file)))
-        builder.get_ring().save(ring_file)
+        _save_ring(ring_data, ring_file, format_version)
         builder.save(builder_file)
         exit(status)
 
@@ -1289,12 +1333,18 @@ swift-ring-builder <builder_file> validate
     @staticmethod
     def write_ring():
         """
-swift-ring-builder <builder_file> write_ring
+swift-ring-builder <builder_file> write_ring [options]
     Just rewrites the distributable ring file. This is done automatically after
     a successful rebalance, so really this is only useful after one or more
     'set_info' calls when no rebalance is needed but you want to send out the
-    new device information.
+    new device information, or to change the format of the ring file.
         """
+        usage = Commands.write_ring.__doc__.strip()
+        parser = optparse.OptionParser(usage)
+        _add_format_version_option(parser)
+        options, args = parser.parse_args(argv)
+        format_version = _get_format_version(options)
+
         if not builder.devs:
             print('Unable to write empty ring.')
             exit(EXIT_ERROR)
@@ -1305,9 +1355,10 @@ swift-ring-builder <builder_file> write_ring
                 print('Warning: Writing a ring with no partition '
                       'assignments but with devices; did you forget to run '
                       '"rebalance"?')
-        ring_data.save(
-            pathjoin(backup_dir, '%d.' % time() + basename(ring_file)))
-        ring_data.save(ring_file)
+        _save_ring(ring_data,
+                   pathjoin(backup_dir, '%d.' % time() + basename(ring_file)),
+                   format_version)
+        _save_ring(ring_data, ring_file, format_version)
         exit(EXIT_SUCCESS)
 
     @staticmethod
@@ -1345,7 +1396,10 @@ swift-ring-builder <ring_file> write_builder [min_part_hours]
             'devs': ring.devs,
             'devs_changed': False,
             'version': ring.version or 0,
-            '_replica2part2dev': ring._replica2part2dev_id,
+            # copy tables that may be memory-mapped from a v2 ring file
+            '_replica2part2dev': [
+                array('H', part2dev_id)
+                for part2dev_id in ring._replica2part2dev_id],
             '_last_part_moves_epoch': None,
             '_last_part_moves': None,
             '_last_part_gather_start': 0,
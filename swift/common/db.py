@@ -20,10 +20,13 @@ import base64
 import json
 import logging
 import os
+import re
+import struct
 from uuid import uuid4
 import sys
 import time
 import errno
+import zlib
 import six
 import six.moves.cPickle as pickle
 from tempfile import mkstemp
@@ -34,7 +37,7 @@ import sqlite3
 from swift.common.constraints import MAX_META_COUNT, MAX_META_OVERALL_SIZE, \
     check_utf8
 from swift.common.utils import Timestamp, renamer, \
-    mkdirs, lock_parent_directory, fallocate, md5
+    mkdirs, lock_parent_directory, fallocate, md5, GreenBatcher
 from swift.common.exceptions import LockTimeout
 from swift.common.swob import HTTPBadRequest
 
@@ -50,6 +53,26 @@ PICKLE_PROTOCOL = 2
 #: Max size of .pending file in bytes. When this is exceeded, the pending
 # records will be merged.
 PENDING_CAP = 131072
+#: Legacy .pending record format: a colon followed by a base64 encoded pickle.
+PENDING_FORMAT_V1 = 1
+#: Length-prefixed .pending record format: a version byte and magic, a 4 byte
+# big-endian payload length, a CRC32 of the payload and a raw pickle.
+PENDING_FORMAT_V2 = 2
+#: Format used when appending records to .pending files. Records in either
+# format are always readable, and may be mixed within a single .pending file.
+PENDING_FORMAT = PENDING_FORMAT_V1
+#: Size of the reads made while scanning a .pending file for records.
+PENDING_READ_SIZE = 65536
+#: Max number of .pending records merged into the DB in one transaction.
+PENDING_COMMIT_BATCH_SIZE = 1000
+
+_PENDING_V2_HEADER = struct.Struct('!4sII')
+_PENDING_V2_MAGIC = b'\x02PND'
+_PENDING_V2_MARKER = _PENDING_V2_MAGIC[:1]
+# Neither byte is in the base64 alphabet so either may end a v1 record.
+_PENDING_V1_END = re.compile(b'[:' + re.escape(_PENDING_V2_MARKER) + b']')
+# Where scanning resumes after a damaged v2 record.
+_PENDING_RESYNC = re.compile(b':|' + re.escape(_PENDING_V2_MAGIC))
 
 SQLITE_ARG_LIMIT = 999
 RECLAIM_PAGE_SIZE = 10000
@@ -178,6 +201,180 @@ class GreenDBCursor(sqlite3.Cursor):
     # (as far as I can tell)
 
 
+def config_pending_format_value(value):
+    """
+    Validate a ``db_pending_format`` config option.
+
+    :param value: the config value.
+    :returns: the pending record format as an int.
+    :raises ValueError: if the value is not a known pending record format.
+    """
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        version = None
+    if version not in (PENDING_FORMAT_V1, PENDING_FORMAT_V2):
+        raise ValueError('db_pending_format must be %d or %d, not %r' % (
+            PENDING_FORMAT_V1, PENDING_FORMAT_V2, value))
+    return version
+
+
+def encode_pending_record(data, version=None):
+    """
+    Serialize a record tuple for appending to a .pending file.
+
+    :param data: the tuple returned by a broker's ``make_tuple_for_pickle``.
+    :param version: the pending record format to use; defaults to
+        :data:`PENDING_FORMAT`.
+    :returns: the bytes to append to the .pending file.
+    """
+    if version is None:
+        version = PENDING_FORMAT
+    payload = pickle.dumps(data, protocol=PICKLE_PROTOCOL)
+    if version == PENDING_FORMAT_V1:
+        # Colons aren't used in base64 encoding; so they are our delimiter
+        return b':' + base64.b64encode(payload)
+    if version == PENDING_FORMAT_V2:
+        return _PENDING_V2_HEADER.pack(
+            _PENDING_V2_MAGIC, len(payload),
+            zlib.crc32(payload) & 0xffffffff) + payload
+    raise ValueError('Unknown pending record format %r' % version)
+
+
+def decode_pending_record(version, entry):
+    """
+    Deserialize a record yielded by :func:`iter_pending_records`.
+
+    :param version: the pending record format of ``entry``, or None if
+        ``entry`` is a damaged record.
+    :param entry: the serialized record, without any delimiter or header.
+    :returns: the record tuple.
+    :raises ValueError: if ``entry`` is a damaged record.
+    """
+    if version is None:
+        raise ValueError('Damaged pending record')
+    if version == PENDING_FORMAT_V1:
+        entry = base64.b64decode(entry)
+    if six.PY2:
+        return pickle.loads(entry)
+    return pickle.loads(entry, encoding='utf8')
+
+
+class _PendingFileBuffer(object):
+    """
+    A window onto a .pending file that is filled by bounded reads.
+    """
+
+    def __init__(self, fp, read_size):
+        self.fp = fp
+        self.read_size = read_size
+        self.buf = b''
+        self.pos = 0
+        self.eof = False
+
+    def available(self):
+        return len(self.buf) - self.pos
+
+    def fill(self, needed=1):
+        """
+        Read until at least ``needed`` unconsumed bytes are buffered or the
+        end of the file is reached.
+
+        :returns: True if at least ``needed`` bytes are buffered.
+        """
+        while not self.eof and self.available() < needed:
+            chunk = self.fp.read(max(self.read_size,
+                                     needed - self.available()))
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+            else:
+                self.eof = True
+        return self.available() >= needed
+
+    def consume(self, count):
+        data = self.buf[self.pos:self.pos + count]
+        self.pos += len(data)
+        return data
+
+    def find(self, pattern, start, width=1):
+        """
+        Find the offset, relative to the current position, of the first
+        match of ``pattern`` at or after relative offset ``start``, or the
+        number of bytes left in the file if there is no match.
+
+        :param width: the length of the longest match of ``pattern``, so that
+            matches spanning reads are found.
+        """
+        while True:
+            match = pattern.search(self.buf, self.pos + start)
+            if match:
+                return match.start() - self.pos
+            start = max(start, self.available() - width + 1)
+            if not self.fill(self.available() + 1):
+                return self.available()
+
+    def check_v2_record(self):
+        """
+        Check whether a complete, undamaged v2 record starts at the current
+        position.
+
+        :returns: the length of the record's payload, or None.
+        """
+        if not self.fill(_PENDING_V2_HEADER.size):
+            return None
+        magic, length, checksum = _PENDING_V2_HEADER.unpack_from(
+            self.buf, self.pos)
+        if magic != _PENDING_V2_MAGIC or \
+                not self.fill(_PENDING_V2_HEADER.size + length):
+            return None
+        start = self.pos + _PENDING_V2_HEADER.size
+        if zlib.crc32(self.buf[start:start + length]) & 0xffffffff \
+                != checksum:
+            return None
+        return length
+
+
+def iter_pending_records(fp, read_size=None):
+    """
+    Scan an open .pending file for serialized records, reading at most
+    ``read_size`` bytes at a time rather than the whole file.
+
+    Any bytes that are not part of a v2 record are treated as legacy v1 data
+    and yielded up to the next record boundary, in the same way that the
+    legacy format has always been split on colons, so that they can be
+    reported when they fail to decode. A v2 record that is truncated or fails
+    its checksum, for example because an append was torn, is yielded with a
+    version of None together with everything up to the next colon or v2
+    magic, where scanning resumes.
+
+    :param fp: a file object opened for reading in binary mode.
+    :param read_size: the size of each read; defaults to
+        :data:`PENDING_READ_SIZE`.
+    :returns: an iterator of (version, entry) tuples suitable for passing to
+        :func:`decode_pending_record`.
+    """
+    reader = _PendingFileBuffer(fp, read_size or PENDING_READ_SIZE)
+    while reader.fill():
+        lead = reader.buf[reader.pos:reader.pos + 1]
+        if lead == _PENDING_V2_MARKER:
+            length = reader.check_v2_record()
+            if length is None:
+                end = reader.find(_PENDING_RESYNC, 1,
+                                  len(_PENDING_V2_MAGIC))
+                yield None, reader.consume(end)
+                continue
+            reader.consume(_PENDING_V2_HEADER.size)
+            yield PENDING_FORMAT_V2, reader.consume(length)
+        else:
+            if lead == b':':
+                reader.consume(1)
+            end = reader.find(_PENDING_V1_END, 0)
+            entry = reader.consume(end)
+            if entry:
+                yield PENDING_FORMAT_V1, entry
+
+
 def dict_factory(crs, row):
     """
     This should only be used when you need a real dict,
@@ -242,6 +439,52 @@ def get_db_connection(path, timeout=30, logger=None, okay_to_create=False):
     return conn
 
 
+class GroupCommitter(GreenBatcher):
+    """
+    Coalesces records that concurrent greenthreads put to the same DB so that
+    each batch of records is written while holding the pending file lock once
+    and, if the pending file is full, is merged in a single transaction.
+
+    The first greenthread to put a record to a DB leads a new batch. If no
+    other batch is being put to the DB then the batch is put straight away;
+    otherwise, while the other batch is put, it waits up to ``window``
+    seconds, or until the batch has ``max_batch_size`` records, for other
+    greenthreads to add records to the batch, and then puts the whole batch.
+    Every greenthread that added a record returns once the batch has been
+    put, or raises the error that putting the batch raised.
+
+    :param window: the maximum time, in seconds, that a batch waits for
+        another batch to the same DB to be put.
+    :param max_batch_size: the maximum number of records in a batch.
+    :param logger: a logger used to emit batch metrics.
+    """
+
+    def __init__(self, window, max_batch_size, logger):
+        super(GroupCommitter, self).__init__(window, max_batch_size)
+        self.logger = logger
+
+    def _commit(self, key, items):
+        broker = items[0][0]
+        self.logger.increment('group_commit.batches')
+        self.logger.update_stats('group_commit.records', len(items))
+        broker.put_records([record for _broker, record in items])
+        return [None] * len(items)
+
+    def put_record(self, broker, record):
+        """
+        Put a record into the DB, as part of a batch of records.
+
+        :param broker: the broker for the DB.
+        :param record: a record to be added to the DB.
+        :raises: any error raised by the broker's ``put_records`` method.
+        """
+        start = time.time()
+        try:
+            self.submit(broker.pending_file, (broker, record))
+        finally:
+            self.logger.timing_since('group_commit.wait.timing', start)
+
+
 class TombstoneReclaimer(object):
     """Encapsulates reclamation of deleted rows in a database."""
     def __init__(self, broker, age_timestamp):
@@ -793,6 +1036,23 @@ class DatabaseBroker(object):
         :raises LockTimeout: if a timeout occurs while waiting to take a lock
             to write to the pending file.
         """
+        self.put_records([record])
+
+    def put_records(self, records):
+        """
+        Put a batch of records into the DB while holding the pending file lock
+        once. If the DB has an associated pending file with space then the
+        records are appended to that file in a single write and a commit to
+        the DB is deferred. If its pending file is full then the records will
+        be committed immediately, together with any pending records, in a
+        single transaction.
+
+        :param records: a list of records to be added to the DB.
+        :raises DatabaseConnectionError: if the DB file does not exist or if
+            ``skip_commits`` is True.
+        :raises LockTimeout: if a timeout occurs while waiting to take a lock
+            to write to the pending file.
+        """
         if not os.path.exists(self.db_file):
             raise DatabaseConnectionError(self.db_file, "DB doesn't exist")
         if self.skip_commits:
@@ -806,15 +1066,12 @@ class DatabaseBroker(object):
                 if err.errno != errno.ENOENT:
                     raise
             if pending_size > PENDING_CAP:
-                self._commit_puts([record])
+                self._commit_puts(list(records))
             else:
                 with open(self.pending_file, 'a+b') as fp:
-                    # Colons aren't used in base64 encoding; so they are our
-                    # delimiter
-                    fp.write(b':')
-                    fp.write(base64.b64encode(pickle.dumps(
-                        self.make_tuple_for_pickle(record),
-                        protocol=PICKLE_PROTOCOL)))
+                    fp.write(b''.join(
+                        encode_pending_record(self.make_tuple_for_pickle(r))
+                        for r in records))
                     fp.flush()
 
     def _skip_commit_puts(self):
@@ -844,19 +1101,19 @@ class DatabaseBroker(object):
                 self.merge_items(item_list)
             return
         with open(self.pending_file, 'r+b') as fp:
-            for entry in fp.read().split(b':'):
-                if entry:
-                    try:
-                        if six.PY2:
-                            data = pickle.loads(base64.b64decode(entry))
-                        else:
-                            data = pickle.loads(base64.b64decode(entry),
-                                                encoding='utf8')
-                        self._commit_puts_load(item_list, data)
-                    except Exception:
-                        self.logger.exception(
-                            'Invalid pending entry %(file)s: %(entry)s',
-                            {'file': self.pending_file, 'entry': entry})
+            for version, entry in iter_pending_records(fp):
+                try:
+                    data = decode_pending_record(version, entry)
+                    self._commit_puts_load(item_list, data)
+                except Exception:
+                    self.logger.exception(
+                        'Invalid pending entry %(file)s: %(entry)s',
+                        {'file': self.pending_file, 'entry': entry})
+                if len(item_list) >= PENDING_COMMIT_BATCH_SIZE:
+                    # the pending file is only truncated once every record
+                    # has been merged, and merging a record is idempotent
+                    self.merge_items(item_list)
+                    item_list = []
             if item_list:
                 self.merge_items(item_list)
             try:
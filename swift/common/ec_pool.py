@@ -0,0 +1,214 @@
+# Copyright (c) 2026 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import errno
+import os
+import signal
+import struct
+
+import eventlet
+import eventlet.greenio
+import eventlet.queue
+import six
+from six.moves import cPickle as pickle
+from pyeclib.ec_iface import ECDriverError
+
+from swift.common.storage_policy import POLICIES
+
+_socket = eventlet.patcher.original('socket')
+
+# each message is a pickle preceded by its length
+_LENGTH = struct.Struct('!Q')
+
+_Worker = collections.namedtuple('_Worker', 'pid sock')
+
+
+def _encode(driver, segments):
+    return [driver.encode(segment) for segment in segments]
+
+
+def _reconstruct(driver, segments, frag_index):
+    return [driver.reconstruct(fragments, [frag_index])[0]
+            for fragments in segments]
+
+
+_OPS = {
+    'encode': _encode,
+    'reconstruct': _reconstruct,
+}
+
+
+def _send_pickle(sock, data):
+    sock.sendall(_LENGTH.pack(len(data)))
+    sock.sendall(data)
+
+
+def _send_message(sock, obj):
+    _send_pickle(sock, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+def _recv_exactly(sock, length):
+    buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
+        nbytes = sock.recv_into(view[received:], length - received)
+        if not nbytes:
+            raise EOFError('EC pool worker connection closed')
+        received += nbytes
+    return buf
+
+
+def _recv_message(sock):
+    length, = _LENGTH.unpack(bytes(_recv_exactly(sock, _LENGTH.size)))
+    data = _recv_exactly(sock, length)
+    return pickle.loads(bytes(data) if six.PY2 else data)
+
+
+def _serve(sock):
+    """
+    Run requests from the pool's process until its end of the connection is
+    closed.
+    """
+    while True:
+        try:
+            op, policy_index, args = _recv_message(sock)
+        except EOFError:
+            return
+        try:
+            driver = POLICIES.get_by_index(policy_index).pyeclib_driver
+            result = (True, _OPS[op](driver, *args))
+        except Exception as err:
+            result = (False, err)
+        try:
+            data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # the error raised by the driver can't be sent as it is
+            data = pickle.dumps((False, ECDriverError(str(result[1]))),
+                                pickle.HIGHEST_PROTOCOL)
+        _send_pickle(sock, data)
+
+
+class ECProcessPool(object):
+    """
+    Runs erasure code encodes and reconstructs in a pool of worker processes,
+    so that they do not hold up the eventlet hub of the process that needs
+    them. pyeclib holds the GIL while it codes, so a thread pool would not.
+
+    The worker processes are forked the first time the pool is used in each
+    process, and exit once that process closes its end of their connections.
+    A greenthread waits for a worker process to be idle before it sends it
+    a request, so at most ``num_processes`` requests are in progress at once.
+    Requests refer to storage policies by index; the worker processes use
+    the policies that were loaded when they were forked.
+
+    :param num_processes: the number of worker processes.
+    """
+
+    def __init__(self, num_processes):
+        self.num_processes = int(num_processes)
+        if self.num_processes < 1:
+            raise ValueError('num_processes must be greater than 0')
+        self._pid = None
+        self._idle = None
+
+    def _fork_worker(self):
+        parent_sock, child_sock = _socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                # don't keep the listen sockets, or other workers'
+                # connections, of the process that forked the worker open
+                fd = child_sock.fileno()
+                max_fd = os.sysconf('SC_OPEN_MAX')
+                os.closerange(3, fd)
+                os.closerange(fd + 1, max_fd)
+                child_sock.setblocking(True)
+                _serve(child_sock)
+            finally:
+                os._exit(0)
+        child_sock.close()
+        return _Worker(pid, eventlet.greenio.GreenSocket(parent_sock))
+
+    def _start(self):
+        # any workers inherited from a parent process are its own
+        self._pid = os.getpid()
+        self._idle = eventlet.queue.LightQueue()
+        for _ in range(self.num_processes):
+            self._idle.put(self._fork_worker())
+
+    def _replace(self, worker):
+        try:
+            os.kill(worker.pid, signal.SIGKILL)
+        except OSError as err:
+            if err.errno != errno.ESRCH:
+                raise
+        worker.sock.close()
+        os.waitpid(worker.pid, 0)
+        self._idle.put(self._fork_worker())
+
+    def _call(self, op, policy, *args):
+        if self._pid != os.getpid():
+            self._start()
+        worker = self._idle.get()
+        try:
+            _send_message(worker.sock, (op, int(policy), args))
+            ok, result = _recv_message(worker.sock)
+        except BaseException:
+            # the worker may be part way through the request
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        """
+        Stop the idle worker processes of this process. Worker processes are
+        forked again if the pool is used after it is closed.
+        """
+        if self._pid != os.getpid():
+            return
+        self._pid = None
+        while not self._idle.empty():
+            worker = self._idle.get()
+            worker.sock.close()
+            os.waitpid(worker.pid, 0)
+
+    def encode(self, policy, segments):
+        """
+        Erasure code a list of segments.
+
+        :param policy: an EC storage policy.
+        :param segments: a list of segments.
+        :returns: a list with the list of fragments of each segment.
+        :raises: any error raised by the policy's pyeclib driver.
+        """
+        return self._call('encode', policy, segments)
+
+    def reconstruct(self, policy, segments, frag_index):
+        """
+        Rebuild one fragment of each of a list of segments.
+
+        :param policy: an EC storage policy.
+        :param segments: a list of segments, each a list of fragments.
+        :param frag_index: the index of the fragment to rebuild.
+        :returns: a list of the rebuilt fragments.
+        :raises: any error raised by the policy's pyeclib driver.
+        """
+        return self._call('reconstruct', policy, segments, frag_index)
@@ -13,9 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import collections
+import fcntl
+import mmap
+import struct
+import tempfile
 from time import time
 
-from swift.common.utils import node_to_string
+from swift.common.utils import node_to_string, md5
 
 
 class ErrorLimiter(object):
@@ -91,3 +95,215 @@ class ErrorLimiter(object):
         error_stats['errors'] = error_stats.get('errors', 0) + 1
         error_stats['last_error'] = time()
         return error_stats['errors'] > self.suppression_limit
+
+
+class SharedNodeTable(object):
+    """
+    A fixed size table of float values per node, kept in an anonymous shared
+    memory mapping so that all the processes forked after the table is
+    created read and update the same values.
+
+    Each key may be stored in one of ``max_probes`` slots chosen by hashing
+    the key; if they are all taken, the slot that was updated least recently
+    is reused. Writers take a lock on the slot, a byte of an unlinked
+    temporary file, so that only one process writes a slot at a time. Each
+    slot has a sequence number that is odd while the slot is being written,
+    which readers check before and after reading the slot, without a lock,
+    so that they never return values written for another key. A read and a
+    subsequent write are not done under one lock, so an update may
+    occasionally be lost when several processes update the same key at once.
+
+    :param size: the number of slots in the table.
+    :param num_values: the number of float values stored for each key.
+    :param max_probes: the number of slots in which a key may be stored.
+    """
+    def __init__(self, size, num_values, max_probes=8):
+        self.size = int(size)
+        if self.size < 1:
+            raise ValueError('size must be greater than 0')
+        self.num_values = int(num_values)
+        self.max_probes = min(int(max_probes), self.size)
+        # slots hold a sequence number, a key hash, the time of the last
+        # update and the values
+        self._seq = struct.Struct('<Q')
+        self._header = struct.Struct('<Qd')
+        self._values = struct.Struct('<%dd' % self.num_values)
+        self._header_offset = self._seq.size
+        self._values_offset = self._header_offset + self._header.size
+        self._slot_size = self._values_offset + self._values.size
+        self._mmap = mmap.mmap(-1, self.size * self._slot_size)
+        # POSIX record locks are held per process, and are released if the
+        # process dies
+        self._lock_file = tempfile.TemporaryFile()
+
+    def _key_hash(self, key):
+        if not isinstance(key, bytes):
+            key = key.encode('utf8')
+        key_hash = struct.unpack(
+            '<Q', md5(key, usedforsecurity=False).digest()[:8])[0]
+        # zero marks an empty slot
+        return key_hash or 1
+
+    def _find_slot(self, key_hash):
+        """
+        Find the slot holding a key.
+
+        :param key_hash: the hash of the key.
+        :return: a tuple of (offset, found); if the key is not in the table,
+            offset is that of the slot in which it should be stored.
+        """
+        start = key_hash % self.size
+        free_offset = oldest_offset = oldest_update = None
+        for i in range(self.max_probes):
+            offset = ((start + i) % self.size) * self._slot_size
+            slot_hash, updated = self._header.unpack_from(
+                self._mmap, offset + self._header_offset)
+            if slot_hash == key_hash:
+                return offset, True
+            if not slot_hash:
+                if free_offset is None:
+                    free_offset = offset
+            elif oldest_update is None or updated < oldest_update:
+                oldest_offset, oldest_update = offset, updated
+        if free_offset is None:
+            free_offset = oldest_offset
+        return free_offset, False
+
+    def _read_slot(self, offset, tries=100):
+        """
+        Read a slot that no other process wrote to while it was read.
+
+        :param offset: the offset of the slot.
+        :param tries: the number of times to try reading the slot.
+        :return: a tuple of (key hash, values); the key hash is 0 if the slot
+            was being written on every try.
+        """
+        for _ in range(tries):
+            seq = self._seq.unpack_from(self._mmap, offset)[0]
+            if seq % 2:
+                continue
+            slot_hash = self._header.unpack_from(
+                self._mmap, offset + self._header_offset)[0]
+            values = self._values.unpack_from(
+                self._mmap, offset + self._values_offset)
+            if self._seq.unpack_from(self._mmap, offset)[0] == seq:
+                return slot_hash, values
+        return 0, None
+
+    def _write_slot(self, offset, key_hash, updated, values):
+        slot = offset // self._slot_size
+        fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, slot)
+        try:
+            # a writer that died part way through leaves an odd sequence
+            # number, which the next write to the slot moves on from
+            seq = self._seq.unpack_from(self._mmap, offset)[0] | 1
+            self._seq.pack_into(self._mmap, offset, seq)
+            self._header.pack_into(
+                self._mmap, offset + self._header_offset, key_hash, updated)
+            self._values.pack_into(
+                self._mmap, offset + self._values_offset, *values)
+            self._seq.pack_into(self._mmap, offset, seq + 1)
+        finally:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def get(self, key, default=None):
+        """
+        Get the values stored for a key.
+
+        :param key: a string key.
+        :param default: the value returned if the key is not in the table.
+        :return: a tuple of floats, or ``default``.
+        """
+        key_hash = self._key_hash(key)
+        offset, found = self._find_slot(key_hash)
+        if not found:
+            return default
+        slot_hash, values = self._read_slot(offset)
+        if slot_hash != key_hash:
+            # the slot was reused for another key since it was found
+            return default
+        return values
+
+    def __setitem__(self, key, values):
+        key_hash = self._key_hash(key)
+        offset, found = self._find_slot(key_hash)
+        self._write_slot(offset, key_hash, time(), values)
+
+    def pop(self, key, default=None):
+        """
+        Remove a key from the table.
+
+        :param key: a string key.
+        :param default: the value returned if the key is not in the table.
+        :return: the tuple of floats that was stored for the key, or
+            ``default``.
+        """
+        key_hash = self._key_hash(key)
+        offset, found = self._find_slot(key_hash)
+        if not found:
+            return default
+        slot_hash, values = self._read_slot(offset)
+        if slot_hash != key_hash:
+            return default
+        self._write_slot(offset, 0, 0, (0,) * self.num_values)
+        return values
+
+    def clear(self):
+        """
+        Remove all keys from the table.
+        """
+        self._mmap.seek(0)
+        self._mmap.write(b'\x00' * len(self._mmap))
+        self._mmap.seek(0)
+
+
+class SharedErrorLimiter(ErrorLimiter):
+    """
+    An :class:`ErrorLimiter` that keeps its error stats in a
+    :class:`SharedNodeTable`, so that errors counted in any of the processes
+    sharing the table count towards error-limiting the node in all of them.
+
+    :param suppression_interval: The number of seconds for which a node is
+        error-limited once it has accumulated more than ``suppression_limit``
+        errors. Should be a float value.
+    :param suppression_limit: The number of errors that a node must accumulate
+        before it is considered to be error-limited. Should be an int value.
+    :param table: a :class:`SharedNodeTable` with two values per key, in which
+        the number of errors and the time of the last error are stored.
+    """
+    def __init__(self, suppression_interval, suppression_limit, table):
+        super(SharedErrorLimiter, self).__init__(
+            suppression_interval, suppression_limit)
+        if table.num_values != 2:
+            raise ValueError('table must have two values per key')
+        self.stats = table
+
+    def is_limited(self, node):
+        now = time()
+        node_key = self.node_key(node)
+        error_stats = self.stats.get(node_key)
+
+        if error_stats is None:
+            return False
+
+        errors, last_error = error_stats
+        if last_error < now - self.suppression_interval:
+            self.stats.pop(node_key)
+            return False
+        return errors > self.suppression_limit
+
+    def limit(self, node):
+        self.stats[self.node_key(node)] = (self.suppression_limit + 1, time())
+
+    def increment(self, node):
+        now = time()
+        node_key = self.node_key(node)
+        error_stats = self.stats.get(node_key)
+        # other processes may not have checked the node since its last error
+        if error_stats is None or \
+                error_stats[1] < now - self.suppression_interval:
+            errors = 1
+        else:
+            errors = int(error_stats[0]) + 1
+        self.stats[node_key] = (errors, now)
+        return errors > self.suppression_limit
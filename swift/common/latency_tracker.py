@@ -0,0 +1,146 @@
+# Copyright (c) 2026 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import random
+from time import time
+
+from swift.common.utils import node_to_string
+
+
+class LatencyTracker(object):
+    """
+    Tracks an exponentially weighted moving average of the response latency
+    of nodes, and the number of requests that are in flight to each of them.
+
+    :param expiry: The number of seconds after which a node's latency is
+        forgotten if it has not been updated. Should be a float value.
+    :param decay: The weight given to each new latency in the moving
+        average; must be greater than 0 and at most 1.
+    :param sample_size: The number of recent latencies, across all nodes,
+        from which latency percentiles are taken. Latencies are sampled
+        separately for each sample key, e.g. each server type and policy.
+    :param min_samples: The number of latencies that must have been
+        recorded for a sample key before any percentile is given.
+    """
+    def __init__(self, expiry, decay=0.3, sample_size=1000, min_samples=20):
+        self.expiry = float(expiry)
+        self.decay = float(decay)
+        if not 0 < self.decay <= 1:
+            raise ValueError('decay must be greater than 0 and at most 1')
+        self.min_samples = int(min_samples)
+        self.sample_size = int(sample_size)
+        # node key -> [latency average, requests in flight, last update]
+        self.stats = collections.defaultdict(lambda: [None, 0, 0])
+        # sample key -> [latencies, sorted latencies, new latencies]
+        self.samples = {}
+
+    def node_key(self, node):
+        """
+        Get the key under which a node's latency stats will be stored.
+
+        :param node: dictionary describing a node.
+        :return: string key.
+        """
+        return node_to_string(node)
+
+    def start_request(self, node):
+        """
+        Count a request as being in flight to a node.
+
+        :param node: dictionary describing a node.
+        """
+        self.stats[self.node_key(node)][1] += 1
+
+    def end_request(self, node, latency, sample_key=None):
+        """
+        Count a request to a node as finished and update the node's average
+        latency.
+
+        :param node: dictionary describing a node.
+        :param latency: the number of seconds the request took.
+        :param sample_key: if not None, the latency is also added to the
+            samples kept under this key, from which percentiles are taken.
+        """
+        node_stats = self.stats[self.node_key(node)]
+        node_stats[1] = max(node_stats[1] - 1, 0)
+        now = time()
+        if node_stats[0] is None or node_stats[2] < now - self.expiry:
+            node_stats[0] = latency
+        else:
+            node_stats[0] += self.decay * (latency - node_stats[0])
+        node_stats[2] = now
+        if sample_key is None:
+            return
+        samples = self.samples.get(sample_key)
+        if samples is None:
+            samples = self.samples[sample_key] = [
+                collections.deque(maxlen=self.sample_size), None, 0]
+        samples[0].append(latency)
+        samples[2] += 1
+
+    def score(self, node):
+        """
+        Get the expected cost of sending a request to a node: its average
+        latency scaled by the number of requests already in flight to it.
+        Nodes without a recent latency score 0, so that they are tried.
+
+        :param node: dictionary describing a node.
+        :return: a float; lower is better.
+        """
+        node_stats = self.stats.get(self.node_key(node))
+        if node_stats is None or node_stats[0] is None or \
+                node_stats[2] < time() - self.expiry:
+            return 0.0
+        return node_stats[0] * (node_stats[1] + 1)
+
+    def order(self, nodes):
+        """
+        Order nodes by repeatedly taking the better scoring of two randomly
+        chosen nodes ("power of two choices"). This favours fast, idle nodes
+        without sending every request to the single best one.
+
+        :param nodes: a list of nodes.
+        :return: a new list of the nodes.
+        """
+        remaining = list(nodes)
+        ordered = []
+        while len(remaining) > 1:
+            i, j = random.sample(range(len(remaining)), 2)
+            if self.score(remaining[j]) < self.score(remaining[i]):
+                i = j
+            ordered.append(remaining.pop(i))
+        ordered.extend(remaining)
+        return ordered
+
+    def percentile(self, pct, sample_key=None):
+        """
+        Get a percentile of the latencies recently sampled under a key. The
+        latencies are only re-sorted once a tenth of them have been replaced.
+
+        :param pct: the percentile, from 0 to 100.
+        :param sample_key: the key under which the latencies were sampled.
+        :return: a latency in seconds, or None if too few latencies have been
+            sampled.
+        """
+        samples = self.samples.get(sample_key)
+        if samples is None or len(samples[0]) < max(self.min_samples, 1):
+            return None
+        if samples[1] is None or samples[2] * 10 >= len(samples[0]):
+            samples[1] = sorted(samples[0])
+            samples[2] = 0
+        sorted_samples = samples[1]
+        index = int(round(pct / 100.0 * (len(sorted_samples) - 1)))
+        index = min(max(index, 0), len(sorted_samples) - 1)
+        return sorted_samples[index]
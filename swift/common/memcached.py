@@ -35,6 +35,12 @@ since nova and keystone and everyone else use pickles for memcache
 too, but it's hidden behind a "standard" library. But changing would
 be a security regression at this point.
 
+Values are serialized with JSON by default. When the optional msgpack
+package is installed the more compact msgpack format may be selected
+with the ``serialization_format`` option; values are tagged with a flag
+naming their format, so values written in either format are always
+readable by clients that have the serializer available.
+
 Also, pylibmc wouldn't work for us because it needs to use python
 sockets in order to play nice with eventlet.
 
@@ -52,16 +58,23 @@ import logging
 # signatures of member functions in this file.
 import time as tm
 from bisect import bisect
+from collections import defaultdict
 
 from eventlet.green import socket, ssl
 from eventlet.pools import Pool
-from eventlet import Timeout
+from eventlet import GreenPile, Timeout
 from six.moves import range
 from six.moves.configparser import ConfigParser, NoSectionError, NoOptionError
 from swift.common import utils
 from swift.common.utils import md5, human_readable, config_true_value, \
     memcached_timing_stats
 
+try:
+    import msgpack
+except ImportError:
+    # msgpack is an optional dependency; only JSON is available without it
+    msgpack = None
+
 DEFAULT_MEMCACHED_PORT = 11211
 
 CONN_TIMEOUT = 0.3
@@ -69,6 +82,9 @@ POOL_TIMEOUT = 1.0  # WAG
 IO_TIMEOUT = 2.0
 PICKLE_FLAG = 1
 JSON_FLAG = 2
+MSGPACK_FLAG = 4
+SERIALIZATION_FORMATS = {'json': JSON_FLAG, 'msgpack': MSGPACK_FLAG}
+DEFAULT_SERIALIZATION_FORMAT = 'json'
 NODE_WEIGHT = 50
 TRY_COUNT = 3
 
@@ -108,6 +124,45 @@ def sanitize_timeout(timeout):
     return int(timeout)
 
 
+def serialize_value(value, flags=JSON_FLAG):
+    """
+    Serialize a value to be stored in memcache.
+
+    :param value: the value to serialize; a bytes value is treated as a UTF-8
+        string.
+    :param flags: the flag of the format to serialize with, either
+        ``JSON_FLAG`` or ``MSGPACK_FLAG``.
+    :returns: the serialized value, as bytes.
+    """
+    if isinstance(value, bytes):
+        value = value.decode('utf8')
+    if flags == MSGPACK_FLAG:
+        return msgpack.packb(value, use_bin_type=True)
+    return json.dumps(value).encode('ascii')
+
+
+def deserialize_value(flags, value):
+    """
+    Deserialize a value read from memcache according to its flags.
+
+    Values serialized with pickle, or with a format that is not available to
+    this client, are treated as cache misses.
+
+    :param flags: the flags that were stored with the value.
+    :param value: the value read from memcache, as bytes.
+    :returns: the deserialized value, or None.
+    """
+    if flags & PICKLE_FLAG:
+        return None
+    if flags & MSGPACK_FLAG:
+        if msgpack is None:
+            return None
+        return msgpack.unpackb(value, raw=False, strict_map_key=False)
+    if flags & JSON_FLAG:
+        return json.loads(value)
+    return value
+
+
 def set_msg(key, flags, timeout, value):
     if not isinstance(key, bytes):
         raise TypeError('key must be bytes')
@@ -219,7 +274,16 @@ class MemcacheRing(object):
             error_limit_count=ERROR_LIMIT_COUNT,
             error_limit_time=ERROR_LIMIT_TIME,
             error_limit_duration=ERROR_LIMIT_DURATION,
-            item_size_warning_threshold=DEFAULT_ITEM_SIZE_WARNING_THRESHOLD):
+            item_size_warning_threshold=DEFAULT_ITEM_SIZE_WARNING_THRESHOLD,
+            serialization_format=DEFAULT_SERIALIZATION_FORMAT):
+        if serialization_format not in SERIALIZATION_FORMATS:
+            raise ValueError('Unknown serialization_format: %r (expected '
+                             'one of %s)' % (serialization_format, ', '.join(
+                                 sorted(SERIALIZATION_FORMATS))))
+        if serialization_format == 'msgpack' and msgpack is None:
+            raise ImportError(
+                'msgpack is required for serialization_format = msgpack')
+        self._serialize_flags = SERIALIZATION_FORMATS[serialization_format]
         self._ring = {}
         self._errors = dict(((serv, []) for serv in servers))
         self._error_limited = dict(((serv, 0) for serv in servers))
@@ -340,23 +404,37 @@ class MemcacheRing(object):
                 self._error_limited[server] = now + self._error_limit_duration
                 self.logger.error('Error limiting server %s', server)
 
-    def _get_conns(self, cmd):
+    def _iter_servers(self, hash_key):
         """
-        Retrieves a server conn from the pool, or connects a new one.
-        Chooses the server based on a consistent hash of "key".
+        Yields the servers to try for a key, in the order of the consistent
+        hash ring, up to the configured number of tries.
 
-        :param cmd: an instance of MemcacheCommand.
-        :return: generator to serve memcached connection
+        :param hash_key: the hashed memcached key.
         """
-        pos = bisect(self._sorted, cmd.hash_key)
+        pos = bisect(self._sorted, hash_key)
         served = []
-        any_yielded = False
         while len(served) < self._tries:
             pos = (pos + 1) % len(self._sorted)
             server = self._ring[self._sorted[pos]]
             if server in served:
                 continue
             served.append(server)
+            yield server
+
+    def _get_conns(self, cmd, servers=None):
+        """
+        Retrieves a server conn from the pool, or connects a new one.
+        Chooses the server based on a consistent hash of "key".
+
+        :param cmd: an instance of MemcacheCommand.
+        :param servers: an optional iterable of servers to try instead of the
+            servers chosen by the consistent hash of "key".
+        :return: generator to serve memcached connection
+        """
+        if servers is None:
+            servers = self._iter_servers(cmd.hash_key)
+        any_yielded = False
+        for server in servers:
             pool_start_time = tm.time()
             if self._error_limited[server] > pool_start_time:
                 continue
@@ -394,8 +472,8 @@ class MemcacheRing(object):
 
         :param key: key
         :param value: value
-        :param serialize: if True, value is serialized with JSON before sending
-                          to memcache
+        :param serialize: if True, value is serialized with the configured
+                          serialization format before sending to memcache
         :param time: the time to live
         :param min_compress_len: minimum compress length, this parameter was
                                  added to keep the signature compatible with
@@ -408,10 +486,8 @@ class MemcacheRing(object):
         timeout = sanitize_timeout(time)
         flags = 0
         if serialize:
-            if isinstance(value, bytes):
-                value = value.decode('utf8')
-            value = json.dumps(value).encode('ascii')
-            flags |= JSON_FLAG
+            flags |= self._serialize_flags
+            value = serialize_value(value, flags)
         elif not isinstance(value, bytes):
             value = str(value).encode('utf-8')
 
@@ -447,7 +523,7 @@ class MemcacheRing(object):
     def get(self, key, raise_on_error=False):
         """
         Gets the object specified by key.  It will also unserialize the object
-        before returning if it is serialized in memcache with JSON.
+        before returning if it is serialized in memcache with JSON or msgpack.
 
         :param key: key
         :param raise_on_error: if True, propagate Timeouts and other errors.
@@ -470,11 +546,8 @@ class MemcacheRing(object):
                         if (line[0].upper() == b'VALUE' and
                                 line[1] == cmd.hash_key):
                             size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                value = None
-                            if int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
+                            value = deserialize_value(
+                                int(line[2]), fp.read(size))
                             fp.readline()
                         line = fp.readline().strip().split()
                     self._return_conn(server, fp, sock)
@@ -486,8 +559,7 @@ class MemcacheRing(object):
             raise MemcacheConnectionError(
                 "No memcached connections succeeded.")
 
-    def _incr_or_decr(self, fp, sock, cmd, delta):
-        sock.sendall(b' '.join([cmd.command, cmd.hash_key, delta]) + b'\r\n')
+    def _read_incr_or_decr(self, fp):
         line = fp.readline().strip().split()
         if not line:
             raise MemcacheConnectionError('incomplete read')
@@ -495,6 +567,10 @@ class MemcacheRing(object):
             return None
         return int(line[0].strip())
 
+    def _incr_or_decr(self, fp, sock, cmd, delta):
+        sock.sendall(b' '.join([cmd.command, cmd.hash_key, delta]) + b'\r\n')
+        return self._read_incr_or_decr(fp)
+
     def _add(self, fp, sock, cmd, add_val, timeout):
         sock.sendall(b' '.join([
             b'add', cmd.hash_key, b'0', str(timeout).encode('ascii'),
@@ -503,6 +579,25 @@ class MemcacheRing(object):
         line = fp.readline().strip().split()
         return None if line[0].upper() == b'NOT_STORED' else int(add_val)
 
+    def _add_missing(self, fp, sock, cmd, delta_val, timeout, time):
+        """
+        Adds a key that an incr or decr did not find, as delta or 0 if
+        decrementing, or retries the incr or decr if the key was added
+        concurrently.
+
+        :returns: the new value of the key
+        """
+        add_val = b'0' if cmd.method == 'decr' else delta_val
+        new_val = self._add(fp, sock, cmd, add_val, timeout)
+        if new_val is None:
+            new_val = self._incr_or_decr(fp, sock, cmd, delta_val)
+            if new_val is None:
+                # This can happen if this thread takes more than the TTL to
+                # get from the first failed incr to the second incr, during
+                # which time the key was concurrently added and expired.
+                raise MemcacheIncrNotFoundError('expired ttl=%s' % time)
+        return new_val
+
     @memcached_timing_stats(sample_rate=TIMING_SAMPLE_RATE_LOW)
     def incr(self, key, delta=1, time=0):
         """
@@ -530,18 +625,8 @@ class MemcacheRing(object):
                 with Timeout(self._io_timeout):
                     new_val = self._incr_or_decr(fp, sock, cmd, delta_val)
                     if new_val is None:
-                        add_val = b'0' if cmd.method == 'decr' else delta_val
-                        new_val = self._add(fp, sock, cmd, add_val, timeout)
-                        if new_val is None:
-                            new_val = self._incr_or_decr(
-                                fp, sock, cmd, delta_val)
-                            if new_val is None:
-                                # This can happen if this thread takes more
-                                # than the TTL to get from the first failed
-                                # incr to the second incr, during which time
-                                # the key was concurrently added and expired.
-                                raise MemcacheIncrNotFoundError(
-                                    'expired ttl=%s' % time)
+                        new_val = self._add_missing(
+                            fp, sock, cmd, delta_val, timeout, time)
                     self._return_conn(server, fp, sock)
                     return new_val
             except (Exception, Timeout) as e:
@@ -549,6 +634,71 @@ class MemcacheRing(object):
                                          sock=sock, fp=fp)
         raise MemcacheConnectionError("No memcached connections succeeded.")
 
+    def _incr_many_on_server(self, server, cmds, deltas, timeout, time):
+        """
+        Increments or decrements several keys on a single server with
+        pipelined ``incr`` and ``decr`` commands.
+
+        :param server: the server to update.
+        :param cmds: a list of MemcacheCommand instances, one per key.
+        :param deltas: a dict mapping hashed keys to their encoded deltas.
+        :param timeout: the sanitized time to live of keys that are added.
+        :param time: the time to live of keys that are added.
+        :returns: a tuple of (server, cmds, responses), where responses is a
+            dict mapping hashed keys to their new values, or None if the
+            server could not be updated.
+        """
+        for (server, fp, sock) in self._get_conns(cmds[0], servers=[server]):
+            conn_start_time = tm.time()
+            try:
+                with Timeout(self._io_timeout):
+                    sock.sendall(b''.join(
+                        b' '.join([cmd.command, cmd.hash_key,
+                                   deltas[cmd.hash_key]]) + b'\r\n'
+                        for cmd in cmds))
+                    new_vals = [self._read_incr_or_decr(fp) for cmd in cmds]
+                    responses = {}
+                    for cmd, new_val in zip(cmds, new_vals):
+                        if new_val is None:
+                            new_val = self._add_missing(
+                                fp, sock, cmd, deltas[cmd.hash_key],
+                                timeout, time)
+                        responses[cmd.hash_key] = new_val
+                    self._return_conn(server, fp, sock)
+                    return server, cmds, responses
+            except (Exception, Timeout) as e:
+                self._exception_occurred(server, e, cmds[0], conn_start_time,
+                                         sock=sock, fp=fp)
+        return server, cmds, None
+
+    @memcached_timing_stats(sample_rate=TIMING_SAMPLE_RATE_LOW)
+    def incr_many(self, deltas, time=0):
+        """
+        Increments several keys by their deltas, wherever in the ring each
+        key is stored, as :meth:`incr` does for one key.
+
+        Each server is sent pipelined ``incr`` or ``decr`` commands for all of
+        its keys, and the servers are updated concurrently, as
+        :meth:`get_many` does for gets.
+
+        :param deltas: a dict mapping keys to the amounts to add to them.
+        :param time: the time to live of keys that are added.
+        :returns: a dict mapping keys to their new values; keys that could
+            not be incremented on any server are left out.
+        """
+        cmds = []
+        encoded_deltas = {}
+        for key, delta in deltas.items():
+            cmd = MemcacheCommand('incr' if delta >= 0 else 'decr', key)
+            cmds.append(cmd)
+            encoded_deltas[cmd.hash_key] = str(abs(int(delta))).encode(
+                'ascii')
+        timeout = sanitize_timeout(time)
+        responses, _failed = self._fan_out(
+            cmds, self._incr_many_on_server, encoded_deltas, timeout, time)
+        return dict((cmd.key, responses[cmd.hash_key]) for cmd in cmds
+                    if cmd.hash_key in responses)
+
     @memcached_timing_stats(sample_rate=TIMING_SAMPLE_RATE_LOW)
     def decr(self, key, delta=1, time=0):
         """
@@ -599,8 +749,8 @@ class MemcacheRing(object):
         :param mapping: dictionary of keys and values to be set in memcache
         :param server_key: key to use in determining which server in the ring
                             is used
-        :param serialize: if True, value is serialized with JSON before sending
-                          to memcache.
+        :param serialize: if True, value is serialized with the configured
+                          serialization format before sending to memcache.
         :param time: the time to live
         :min_compress_len: minimum compress length, this parameter was added
                            to keep the signature compatible with
@@ -614,10 +764,8 @@ class MemcacheRing(object):
             key = md5hash(key)
             flags = 0
             if serialize:
-                if isinstance(value, bytes):
-                    value = value.decode('utf8')
-                value = json.dumps(value).encode('ascii')
-                flags |= JSON_FLAG
+                flags |= self._serialize_flags
+                value = serialize_value(value, flags)
             msg.append(set_msg(key, flags, timeout, value))
         for (server, fp, sock) in self._get_conns(cmd):
             conn_start_time = tm.time()
@@ -633,6 +781,128 @@ class MemcacheRing(object):
                 self._exception_occurred(server, e, cmd, conn_start_time,
                                          sock=sock, fp=fp)
 
+    def _read_values(self, fp):
+        """
+        Reads the response to a ``get`` command.
+
+        :param fp: the connection's file pointer.
+        :returns: a dict mapping hashed keys to their values.
+        :raises MemcacheConnectionError: if the response is incomplete.
+        """
+        responses = {}
+        line = fp.readline().strip().split()
+        while True:
+            if not line:
+                raise MemcacheConnectionError('incomplete read')
+            if line[0].upper() == b'END':
+                break
+            if line[0].upper() == b'VALUE':
+                size = int(line[3])
+                responses[line[1]] = deserialize_value(
+                    int(line[2]), fp.read(size))
+                fp.readline()
+            line = fp.readline().strip().split()
+        return responses
+
+    def _get_many_from_server(self, server, cmds):
+        """
+        Gets the values of several keys from a single server with one
+        pipelined ``get`` command.
+
+        :param server: the server to query.
+        :param cmds: a list of MemcacheCommand instances, one per key.
+        :returns: a tuple of (server, cmds, responses), where responses is a
+            dict mapping hashed keys to their values, or None if the server
+            could not be queried.
+        """
+        hash_keys = [cmd.hash_key for cmd in cmds]
+        for (server, fp, sock) in self._get_conns(cmds[0], servers=[server]):
+            conn_start_time = tm.time()
+            try:
+                with Timeout(self._io_timeout):
+                    sock.sendall(b'get ' + b' '.join(hash_keys) + b'\r\n')
+                    responses = self._read_values(fp)
+                    self._return_conn(server, fp, sock)
+                    return server, cmds, responses
+            except (Exception, Timeout) as e:
+                self._exception_occurred(server, e, cmds[0], conn_start_time,
+                                         sock=sock, fp=fp)
+        return server, cmds, None
+
+    def _fan_out(self, cmds, server_func, *args):
+        """
+        Groups commands by the server that the consistent hash of each key
+        chooses and calls ``server_func`` for each server, concurrently, with
+        all of its commands. The commands of a server that fails are retried
+        on their next server in the ring.
+
+        :param cmds: a list of MemcacheCommand instances, one per key.
+        :param server_func: a function that takes a server, a list of
+            commands and ``args`` and returns a tuple of (server, cmds,
+            responses), where responses is a dict mapping hashed keys to their
+            responses, or None if the server failed.
+        :returns: a tuple of (a dict mapping hashed keys to their responses,
+            True if any command failed on every server it was tried on)
+        """
+        servers = dict((cmd.hash_key, self._iter_servers(cmd.hash_key))
+                       for cmd in cmds)
+        responses = {}
+        failed = False
+        remaining = cmds
+        while remaining:
+            cmds_by_server = defaultdict(list)
+            for cmd in remaining:
+                server = next(servers[cmd.hash_key], None)
+                if server is None:
+                    failed = True
+                else:
+                    cmds_by_server[server].append(cmd)
+            remaining = []
+            if len(cmds_by_server) == 1:
+                results = [server_func(*(cmds_by_server.popitem() + args))]
+            else:
+                results = GreenPile(len(cmds_by_server))
+                for server, server_cmds in cmds_by_server.items():
+                    results.spawn(server_func, server, server_cmds, *args)
+            for server, server_cmds, server_responses in results:
+                if server_responses is None:
+                    remaining.extend(server_cmds)
+                else:
+                    responses.update(server_responses)
+        return responses, failed
+
+    @memcached_timing_stats(sample_rate=TIMING_SAMPLE_RATE_MEDIUM)
+    def get_many(self, keys, raise_on_error=False):
+        """
+        Gets multiple values from memcache for the given keys, wherever in the
+        ring each key is stored.
+
+        Keys are grouped by the server that the consistent hash of each key
+        chooses, each server is sent a single pipelined ``get`` for all of its
+        keys, and the servers are queried concurrently, so the lookups cost
+        one round trip rather than one per key. The keys of a server that
+        fails are retried on their next server in the ring.
+
+        :param keys: keys for values to be retrieved from memcache
+        :param raise_on_error: if True, raise an error if the value of any key
+            could not be retrieved from any server. By default, errors are
+            treated as cache misses.
+        :returns: list of values, in the same order as keys; the value of a
+            key that is not found is None
+        :raises MemcacheConnectionError: if raise_on_error is True and the
+            value of any key could not be retrieved.
+        """
+        cmds = {}
+        for key in keys:
+            cmd = MemcacheCommand('get_many', key)
+            cmds.setdefault(cmd.hash_key, cmd)
+        responses, failed = self._fan_out(
+            list(cmds.values()), self._get_many_from_server)
+        if failed and raise_on_error:
+            raise MemcacheConnectionError(
+                "No memcached connections succeeded.")
+        return [responses.get(md5hash(key)) for key in keys]
+
     @memcached_timing_stats(sample_rate=TIMING_SAMPLE_RATE_HIGH)
     def get_multi(self, keys, server_key):
         """
@@ -650,23 +920,7 @@ class MemcacheRing(object):
             try:
                 with Timeout(self._io_timeout):
                     sock.sendall(b'get ' + b' '.join(hash_keys) + b'\r\n')
-                    line = fp.readline().strip().split()
-                    responses = {}
-                    while True:
-                        if not line:
-                            raise MemcacheConnectionError('incomplete read')
-                        if line[0].upper() == b'END':
-                            break
-                        if line[0].upper() == b'VALUE':
-                            size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                value = None
-                            elif int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
-                            responses[line[1]] = value
-                            fp.readline()
-                        line = fp.readline().strip().split()
+                    responses = self._read_values(fp)
                     values = []
                     for key in hash_keys:
                         if key in responses:
@@ -751,6 +1005,8 @@ def load_memcache(conf, logger):
         'error_suppression_limit', ERROR_LIMIT_COUNT))
     item_size_warning_threshold = int(memcache_options.get(
         'item_size_warning_threshold', DEFAULT_ITEM_SIZE_WARNING_THRESHOLD))
+    serialization_format = memcache_options.get(
+        'serialization_format', DEFAULT_SERIALIZATION_FORMAT).strip().lower()
 
     if not memcache_servers:
         memcache_servers = '127.0.0.1:11211'
@@ -770,4 +1026,5 @@ def load_memcache(conf, logger):
         error_limit_count=error_suppression_limit,
         error_limit_time=error_suppression_interval,
         error_limit_duration=error_suppression_interval,
-        item_size_warning_threshold=item_size_warning_threshold)
+        item_size_warning_threshold=item_size_warning_threshold,
+        serialization_format=serialization_format)
@@ -194,8 +194,10 @@ swift.source set and the content length will reflect the size of the
 payload sent to the proxy (the list of objects/containers to be deleted).
 """
 
+from io import BytesIO
 import json
 import six
+import sys
 import tarfile
 from xml.sax import saxutils
 from time import time
@@ -300,7 +302,8 @@ class Bulk(object):
                  max_failed_extractions=1000, max_deletes_per_request=10000,
                  max_failed_deletes=1000, yield_frequency=10,
                  delete_concurrency=2, retry_count=0, retry_interval=1.5,
-                 logger=None):
+                 logger=None, extract_concurrency=1,
+                 extract_buffer_size=16 * 1024 * 1024):
         self.app = app
         self.logger = logger or get_logger(conf, log_route='bulk')
         self.max_containers = max_containers_per_extraction
@@ -309,6 +312,8 @@ class Bulk(object):
         self.max_deletes_per_request = max_deletes_per_request
         self.yield_frequency = yield_frequency
         self.delete_concurrency = min(1000, max(1, delete_concurrency))
+        self.extract_concurrency = min(1000, max(1, extract_concurrency))
+        self.extract_buffer_size = extract_buffer_size
         self.retry_count = retry_count
         self.retry_interval = retry_interval
         self.max_path_length = constraints.MAX_OBJECT_NAME_LENGTH \
@@ -565,18 +570,55 @@ class Bulk(object):
             extract_base = extract_base.rstrip('/')
             tar = tarfile.open(mode='r|' + compress_type,
                                fileobj=req.body_file)
-            failed_response_type = HTTPBadRequest
+            # a list so that it can be updated by process_put
+            failed_response_type = [HTTPBadRequest]
             containers_created = 0
-            while True:
-                if last_yield + self.yield_frequency < time():
-                    last_yield = time()
-                    yield to_yield
-                    to_yield, separator = b' ', b'\r\n\r\n'
-                tar_info = tar.next()
-                if tar_info is None or \
-                        len(failed_files) >= self.max_failed_extractions:
-                    break
-                if tar_info.isfile():
+
+            def do_put(create_obj_req, obj_path, container_failure, size):
+                try:
+                    resp = create_obj_req.get_response(self.app)
+                except Exception:
+                    # raise it when the result is processed
+                    resp = sys.exc_info()
+                return resp, obj_path, container_failure, size
+
+            def process_put(resp, obj_path, container_failure, size):
+                if isinstance(resp, tuple):
+                    six.reraise(*resp)
+                if resp.is_success:
+                    resp_dict['Number Files Created'] += 1
+                else:
+                    if container_failure:
+                        failed_files.append(container_failure)
+                    if resp.status_int == HTTP_UNAUTHORIZED:
+                        failed_files.append([
+                            wsgi_quote(obj_path[:self.max_path_length]),
+                            HTTPUnauthorized().status])
+                        raise HTTPUnauthorized(request=req)
+                    if resp.status_int // 100 == 5:
+                        failed_response_type[0] = HTTPBadGateway
+                    failed_files.append([
+                        wsgi_quote(obj_path[:self.max_path_length]),
+                        resp.status])
+                return size
+
+            # Objects that fit in the extract buffer are read from the tar
+            # and PUT concurrently; larger objects are streamed from the tar
+            # while the buffered PUTs carry on.
+            puts_in_flight = 0
+            bytes_in_flight = 0
+            with StreamingPile(self.extract_concurrency) as pile:
+                while True:
+                    if last_yield + self.yield_frequency < time():
+                        last_yield = time()
+                        yield to_yield
+                        to_yield, separator = b' ', b'\r\n\r\n'
+                    tar_info = tar.next()
+                    if tar_info is None or \
+                            len(failed_files) >= self.max_failed_extractions:
+                        break
+                    if not tar_info.isfile():
+                        continue
                     obj_path = tar_info.name
                     if not six.PY2:
                         obj_path = obj_path.encode('utf-8', 'surrogateescape')
@@ -625,6 +667,9 @@ class Bulk(object):
                                 wsgi_quote(obj_path[:self.max_path_length]),
                                 HTTPBadRequest().status])
                             continue
+                        # so that later objects in the container, which
+                        # may be PUT concurrently, don't create it again
+                        containers_accessed.add(container)
 
                     tar_file = tar.extractfile(tar_info)
                     create_headers = {
@@ -643,7 +688,6 @@ class Bulk(object):
                         path=wsgi_quote(destination),
                         headers=create_headers,
                         agent='%(orig)s BulkExpand', swift_source='EA')
-                    create_obj_req.environ['wsgi.input'] = tar_file
 
                     for pax_key, pax_value in tar_info.pax_headers.items():
                         header_name = pax_key_to_swift_header(pax_key)
@@ -654,26 +698,38 @@ class Bulk(object):
                             create_obj_req.headers[header_name] = \
                                 pax_value.encode("utf-8")
 
-                    resp = create_obj_req.get_response(self.app)
-                    containers_accessed.add(container)
-                    if resp.is_success:
-                        resp_dict['Number Files Created'] += 1
+                    if self.extract_concurrency > 1 and \
+                            tar_info.size <= self.extract_buffer_size:
+                        # make room for the member before reading it, so that
+                        # no more than extract_buffer_size bytes are held
+                        while puts_in_flight and (
+                                puts_in_flight >= self.extract_concurrency or
+                                bytes_in_flight + tar_info.size >
+                                self.extract_buffer_size):
+                            bytes_in_flight -= process_put(*next(pile))
+                            puts_in_flight -= 1
+                        create_obj_req.environ['wsgi.input'] = BytesIO(
+                            tar_file.read())
+                        pile.spawn(do_put, create_obj_req, obj_path,
+                                   container_failure, tar_info.size)
+                        puts_in_flight += 1
+                        bytes_in_flight += tar_info.size
                     else:
-                        if container_failure:
-                            failed_files.append(container_failure)
-                        if resp.status_int == HTTP_UNAUTHORIZED:
-                            failed_files.append([
-                                wsgi_quote(obj_path[:self.max_path_length]),
-                                HTTPUnauthorized().status])
-                            raise HTTPUnauthorized(request=req)
-                        if resp.status_int // 100 == 5:
-                            failed_response_type = HTTPBadGateway
-                        failed_files.append([
-                            wsgi_quote(obj_path[:self.max_path_length]),
-                            resp.status])
+                        create_obj_req.environ['wsgi.input'] = tar_file
+                        process_put(*do_put(create_obj_req, obj_path,
+                                            container_failure, tar_info.size))
+
+                # wait for the buffered PUTs to finish
+                for result in pile:
+                    if last_yield + self.yield_frequency < time():
+                        last_yield = time()
+                        yield to_yield
+                        to_yield, separator = b' ', b'\r\n\r\n'
+                    process_put(*result)
 
             if failed_files:
-                resp_dict['Response Status'] = failed_response_type().status
+                resp_dict['Response Status'] = \
+                    failed_response_type[0]().status
             elif not resp_dict['Number Files Created']:
                 resp_dict['Response Status'] = HTTPBadRequest().status
                 resp_dict['Response Body'] = 'Invalid Tar File: No Valid Files'
@@ -763,6 +819,9 @@ def filter_factory(global_conf, **local_conf):
     yield_frequency = int(conf.get('yield_frequency', 10))
     delete_concurrency = min(1000, max(1, int(
         conf.get('delete_concurrency', 2))))
+    extract_concurrency = min(1000, max(1, int(
+        conf.get('extract_concurrency', 1))))
+    extract_buffer_size = int(conf.get('extract_buffer_size', 16777216))
     retry_count = int(conf.get('delete_container_retry_count', 0))
     retry_interval = 1.5
 
@@ -785,5 +844,7 @@ def filter_factory(global_conf, **local_conf):
             yield_frequency=yield_frequency,
             delete_concurrency=delete_concurrency,
             retry_count=retry_count,
-            retry_interval=retry_interval)
+            retry_interval=retry_interval,
+            extract_concurrency=extract_concurrency,
+            extract_buffer_size=extract_buffer_size)
     return bulk_filter
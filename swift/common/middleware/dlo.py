@@ -130,7 +130,7 @@ from swift.common.swob import Request, Response, HTTPException, \
     str_to_wsgi, wsgi_to_str, wsgi_quote, wsgi_unquote, normalize_etag
 from swift.common.utils import get_logger, \
     RateLimitedIterator, quote, close_if_possible, closing_if_possible, \
-    drain_and_close, md5
+    drain_and_close, md5, non_negative_int
 from swift.common.request_helpers import SegmentedIterable, \
     update_ignore_range_header
 from swift.common.wsgi import WSGIContext, make_subrequest, load_app_config
@@ -350,7 +350,9 @@ class GetContext(WSGIContext):
                 req, self.dlo.app, listing_iter, ua_suffix="DLO MultipartGET",
                 swift_source="DLO", name=req.path, logger=self.logger,
                 max_get_time=self.dlo.max_get_time,
-                response_body_length=actual_content_length)
+                response_body_length=actual_content_length,
+                prefetch_segments=self.dlo.prefetch_segments,
+                prefetch_bytes=self.dlo.prefetch_bytes)
 
             try:
                 app_iter.validate_first_segment()
@@ -404,6 +406,10 @@ class DynamicLargeObject(object):
         self._populate_config_from_old_location(conf)
 
         self.max_get_time = int(conf.get('max_get_time', '86400'))
+        self.prefetch_segments = max(0, int(conf.get(
+            'prefetch_segments', '0')))
+        self.prefetch_bytes = non_negative_int(conf.get(
+            'prefetch_bytes', 8 * 1024 * 1024))
         self.rate_limit_after_segment = int(conf.get(
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(conf.get(
@@ -17,12 +17,14 @@ from swift import gettext_ as _
 
 import eventlet
 
-from swift.common.utils import cache_from_env, get_logger
+from swift.common.utils import cache_from_env, get_logger, \
+    config_auto_int_value
 from swift.common.registry import register_swift_info
 from swift.proxy.controllers.base import get_account_info, get_container_info
 from swift.common.constraints import valid_api_version
 from swift.common.memcached import MemcacheConnectionError
 from swift.common.swob import Request, Response
+from swift.common.wsgi import CPU_COUNT
 
 
 def interpret_conf_limits(conf, name_prefix, info=None):
@@ -108,6 +110,16 @@ class RateLimitMiddleware(object):
             float(conf.get('log_sleep_time_seconds', 0))
         self.clock_accuracy = int(conf.get('clock_accuracy', 1000))
         self.rate_buffer_seconds = int(conf.get('rate_buffer_seconds', 5))
+        self.memcache_sync_interval = \
+            float(conf.get('memcache_sync_interval', 0))
+        # between syncs, each worker only uses its share of each rate
+        self.memcache_sync_workers = max(1, config_auto_int_value(
+            conf.get('memcache_sync_workers', conf.get('workers')),
+            CPU_COUNT))
+        # key -> [running time, time consumed since the last sync to
+        # memcache], both in 1/clock_accuracy seconds
+        self._local_running_times = {}
+        self._sync_thread = None
         self.ratelimit_whitelist = \
             [acc.strip() for acc in
                 conf.get('account_whitelist', '').split(',') if acc.strip()]
@@ -203,6 +215,8 @@ class RateLimitMiddleware(object):
         :param max_rate: maximum rate allowed in requests per second
         :raises MaxSleepTimeHitError: if max sleep time is exceeded.
         """
+        if self.memcache_sync_interval > 0:
+            return self._get_local_sleep_time(key, max_rate)
         try:
             now_m = int(round(time.time() * self.clock_accuracy))
             time_per_request_m = int(round(self.clock_accuracy / max_rate))
@@ -230,6 +244,91 @@ class RateLimitMiddleware(object):
         except MemcacheConnectionError:
             return 0
 
+    def _get_local_sleep_time(self, key, max_rate):
+        """
+        Like _get_sleep_time, but uses this worker's copy of the running time
+        for the key, which _sync_local_running_times reconciles with memcache
+        every memcache_sync_interval seconds. The local running time advances
+        at this worker's share of max_rate, while the time to add to memcache
+        is counted at max_rate.
+
+        :param key: a memcache key
+        :param max_rate: maximum rate allowed in requests per second
+        :raises MaxSleepTimeHitError: if max sleep time is exceeded.
+        """
+        now_m = int(round(time.time() * self.clock_accuracy))
+        time_per_request_m = int(round(self.clock_accuracy / max_rate))
+        local_time_per_request_m = \
+            time_per_request_m * self.memcache_sync_workers
+        running_time = self._local_running_times.setdefault(key, [now_m, 0])
+        running_time[0] += local_time_per_request_m
+        running_time[1] += time_per_request_m
+        need_to_sleep_m = 0
+        if (now_m - running_time[0] >
+                self.rate_buffer_seconds * self.clock_accuracy):
+            running_time[0] = now_m + local_time_per_request_m
+        else:
+            need_to_sleep_m = \
+                max(running_time[0] - now_m - local_time_per_request_m, 0)
+
+        max_sleep_m = self.max_sleep_time_seconds * self.clock_accuracy
+        if max_sleep_m - need_to_sleep_m <= self.clock_accuracy * 0.01:
+            # treat as no-op decrement time
+            running_time[0] -= local_time_per_request_m
+            running_time[1] -= time_per_request_m
+            raise MaxSleepTimeHitError(
+                "Max Sleep Time Exceeded: %.2f" %
+                (float(need_to_sleep_m) / self.clock_accuracy))
+
+        return float(need_to_sleep_m) / self.clock_accuracy
+
+    def _sync_local_running_times(self):
+        """
+        Adds the time consumed by this worker since the last sync to the
+        running times in memcache, with one pipelined incr per memcache
+        server, and takes up the time consumed by other workers in the
+        meantime. Keys that have caught up with the clock and have nothing to
+        sync are forgotten.
+        """
+        now_m = int(round(time.time() * self.clock_accuracy))
+        buffer_m = self.rate_buffer_seconds * self.clock_accuracy
+        consumed = {}
+        for key, running_time in list(self._local_running_times.items()):
+            if not running_time[1] and now_m - running_time[0] > buffer_m:
+                del self._local_running_times[key]
+            else:
+                consumed[key] = running_time[1]
+        if not consumed:
+            return
+        # keys that memcache can't be reached for keep their consumed time
+        # for the next sync
+        running_times_m = self.memcache_client.incr_many(consumed)
+        for key, running_time_m in running_times_m.items():
+            running_time = self._local_running_times.get(key)
+            if running_time is None:
+                continue
+            if now_m - running_time_m > buffer_m:
+                # like _get_sleep_time, restart a stale running time from now
+                running_time_m = now_m + consumed[key]
+                try:
+                    self.memcache_client.set(
+                        key, str(running_time_m), serialize=False)
+                except MemcacheConnectionError:
+                    pass
+            # requests may have consumed more time while we talked to memcache
+            running_time[1] -= consumed[key]
+            running_time[0] = max(running_time[0],
+                                  running_time_m + running_time[1])
+
+    def _run_sync_loop(self):
+        while True:
+            eventlet.sleep(self.memcache_sync_interval)
+            try:
+                self._sync_local_running_times()
+            except Exception:
+                self.logger.exception(
+                    'Error syncing ratelimit running times to memcache')
+
     def handle_ratelimit(self, req, account_name, container_name, obj_name):
         """
         Performs rate limiting and account white/black listing.  Sleeps
@@ -311,6 +410,8 @@ class RateLimitMiddleware(object):
             self.logger.warning(
                 _('Warning: Cannot ratelimit without a memcached client'))
             return self.app(env, start_response)
+        if self.memcache_sync_interval > 0 and self._sync_thread is None:
+            self._sync_thread = eventlet.spawn(self._run_sync_loop)
         try:
             version, account, container, obj = req.split_path(1, 4, True)
         except ValueError:
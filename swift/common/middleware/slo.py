@@ -364,7 +364,7 @@ from swift.common.utils import get_logger, config_true_value, \
     get_valid_utf8_str, override_bytes_from_content_type, split_path, \
     RateLimitedIterator, quote, closing_if_possible, \
     LRUCache, StreamingPile, strict_b64decode, Timestamp, friendly_close, \
-    get_expirer_container, md5
+    get_expirer_container, md5, non_negative_int
 from swift.common.registry import register_swift_info
 from swift.common.request_helpers import SegmentedIterable, \
     get_sys_meta_prefix, update_etag_is_at_header, resolve_etag_is_at_header, \
@@ -1267,7 +1267,9 @@ class SloGetContext(WSGIContext):
             name=req.path, logger=self.slo.logger,
             ua_suffix="SLO MultipartGET",
             swift_source="SLO",
-            max_get_time=self.slo.max_get_time)
+            max_get_time=self.slo.max_get_time,
+            prefetch_segments=self.slo.prefetch_segments,
+            prefetch_bytes=self.slo.prefetch_bytes)
 
         try:
             segmented_iter.validate_first_segment()
@@ -1315,6 +1317,10 @@ class StaticLargeObject(object):
         self.yield_frequency = yield_frequency
         self.allow_async_delete = allow_async_delete
         self.max_get_time = int(self.conf.get('max_get_time', 86400))
+        self.prefetch_segments = max(0, int(self.conf.get(
+            'prefetch_segments', '0')))
+        self.prefetch_bytes = non_negative_int(self.conf.get(
+            'prefetch_bytes', 8 * 1024 * 1024))
         self.rate_limit_under_size = int(self.conf.get(
             'rate_limit_under_size', DEFAULT_RATE_LIMIT_UNDER_SIZE))
         self.rate_limit_after_segment = int(self.conf.get(
@@ -20,10 +20,13 @@ Why not swift.common.utils, you ask? Because this way we can import things
 from swob in here without creating circular imports.
 """
 
+from collections import deque
 import itertools
 import sys
 import time
 
+import eventlet
+from eventlet.event import Event
 import six
 from swift.common.header_key_dict import HeaderKeyDict
 
@@ -486,6 +489,125 @@ def check_path_header(req, name, length, error_msg):
             body=error_msg)
 
 
+class _PrefetchBudget(object):
+    """
+    Tracks the bytes of segment bodies that have been read ahead of the
+    client, and makes prefetching greenthreads wait while there are too many.
+
+    :param max_bytes: the maximum number of bytes to read ahead
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._waiters = []
+
+    def wait(self, prefetcher):
+        """
+        Wait until there is room for another chunk.
+
+        :param prefetcher: the :class:`_SegmentPrefetcher` that wants to read
+        :returns: True if the prefetcher may read another chunk, False if it
+                  should stop reading
+        """
+        while self.used >= self.max_bytes and not prefetcher.taken:
+            event = Event()
+            self._waiters.append(event)
+            event.wait()
+        return not prefetcher.taken
+
+    def release(self, nbytes):
+        self.used -= nbytes
+        self.wake()
+
+    def wake(self):
+        waiters, self._waiters = self._waiters, []
+        for event in waiters:
+            event.send()
+
+
+class _SegmentPrefetcher(object):
+    """
+    Makes a segment subrequest in a greenthread, and reads the start of a
+    successful response's body while the budget allows, until the segment is
+    taken by the :class:`SegmentedIterable`.
+
+    :param app: WSGI application from which the segment will come
+    :param seg_req: the segment subrequest
+    :param budget: the :class:`_PrefetchBudget` shared by all prefetchers of
+                   a large object
+    :param logger: logger object
+    """
+
+    def __init__(self, app, seg_req, budget, logger):
+        self.app = app
+        self.seg_req = seg_req
+        self.budget = budget
+        self.logger = logger
+        self.resp = None
+        self.chunk_iter = None
+        self.chunks = deque()
+        self.taken = False
+        self._thread = eventlet.spawn(
+            self._fetch, getattr(logger, 'thread_locals', None))
+
+    def _fetch(self, logger_thread_locals):
+        if logger_thread_locals is not None:
+            self.logger.thread_locals = logger_thread_locals
+        self.resp = self.seg_req.get_response(self.app)
+        if not is_success(self.resp.status_int):
+            return self.resp
+        self.chunk_iter = itertools.chain.from_iterable(
+            maybe_multipart_byteranges_to_document_iters(
+                self.resp.app_iter, self.resp.headers['Content-Type']))
+        while self.budget.wait(self):
+            try:
+                chunk = next(self.chunk_iter)
+            except StopIteration:
+                break
+            self.chunks.append(chunk)
+            self.budget.used += len(chunk)
+        return self.resp
+
+    def take(self):
+        """
+        Stop prefetching and wait for the segment response.
+
+        :returns: the segment response
+        :raises: any error raised by making the segment subrequest
+        """
+        self.taken = True
+        self.budget.wake()
+        return self._thread.wait()
+
+    def iter_chunks(self):
+        """
+        Yield the body chunks of a taken segment response: those that were
+        prefetched, then the rest.
+        """
+        while self.chunks:
+            chunk = self.chunks.popleft()
+            self.budget.release(len(chunk))
+            yield chunk
+        for chunk in self.chunk_iter:
+            yield chunk
+
+    def _close(self, *args):
+        self.budget.release(sum(len(chunk) for chunk in self.chunks))
+        self.chunks.clear()
+        if self.resp is not None:
+            close_if_possible(self.resp.app_iter)
+
+    def close(self):
+        """
+        Stop prefetching, and close the segment response once the
+        subrequest has finished.
+        """
+        self.taken = True
+        self.budget.wake()
+        self._thread.link(self._close)
+
+
 class SegmentedIterable(object):
     """
     Iterable that returns the object contents for a large object.
@@ -514,11 +636,17 @@ class SegmentedIterable(object):
     :param name: name of manifest (used in logging only)
     :param response_body_length: optional response body length for
                                  the response being sent to the client.
+    :param prefetch_segments: the number of segment subrequests to make
+                              ahead of the segment being sent to the client;
+                              0 disables prefetching.
+    :param prefetch_bytes: the maximum number of bytes of prefetched segment
+                           bodies to buffer.
     """
 
     def __init__(self, req, app, listing_iter, max_get_time,
                  logger, ua_suffix, swift_source,
-                 name='<not specified>', response_body_length=None):
+                 name='<not specified>', response_body_length=None,
+                 prefetch_segments=0, prefetch_bytes=0):
         self.req = req
         self.app = app
         self.listing_iter = listing_iter
@@ -528,6 +656,8 @@ class SegmentedIterable(object):
         self.swift_source = swift_source
         self.name = name
         self.response_body_length = response_body_length
+        self.prefetch_segments = prefetch_segments
+        self.prefetch_bytes = prefetch_bytes
         self.peeked_chunk = None
         self.app_iter = self._internal_iter()
         self.validated_first_segment = False
@@ -615,18 +745,73 @@ class SegmentedIterable(object):
         if pending_req:
             yield pending_req, pending_etag, pending_size
 
+    def _prefetch_requests(self):
+        # Take the requests out of self._coalesce_requests and start making
+        # up to self.prefetch_segments of them ahead of the one whose bytes
+        # are being generated.
+        #
+        # Yields 4-tuples (data-or-request, segment-etag, segment-size,
+        # prefetcher). The prefetcher is None for data segments, or if
+        # prefetching is disabled.
+        if not self.prefetch_segments:
+            for data_or_req, seg_etag, seg_size in self._coalesce_requests():
+                yield data_or_req, seg_etag, seg_size, None
+            return
+
+        budget = _PrefetchBudget(self.prefetch_bytes)
+        requests = self._coalesce_requests()
+        pending = deque()
+        listing_exc_info = None
+        try:
+            while True:
+                while requests is not None and \
+                        len(pending) <= self.prefetch_segments:
+                    try:
+                        data_or_req, seg_etag, seg_size = next(requests)
+                    except StopIteration:
+                        requests = None
+                    except ListingIterError:
+                        # raise it once the pending segments have been sent
+                        listing_exc_info = sys.exc_info()
+                        requests = None
+                    else:
+                        prefetcher = None
+                        if not isinstance(data_or_req, bytes):
+                            prefetcher = _SegmentPrefetcher(
+                                self.app, data_or_req, budget, self.logger)
+                        pending.append(
+                            (data_or_req, seg_etag, seg_size, prefetcher))
+                if not pending:
+                    break
+                yield pending.popleft()
+        finally:
+            for _junk, _junk, _junk, prefetcher in pending:
+                if prefetcher:
+                    prefetcher.close()
+        if listing_exc_info:
+            six.reraise(*listing_exc_info)
+
     def _requests_to_bytes_iter(self):
-        # Take the requests out of self._coalesce_requests, actually make
+        # Take the requests out of self._prefetch_requests, actually make
         # the requests, and generate the bytes from the responses.
         #
         # Yields 2-tuples (segment-name, byte-chunk). The segment name is
         # used for logging.
-        for data_or_req, seg_etag, seg_size in self._coalesce_requests():
+        for data_or_req, seg_etag, seg_size, prefetcher in \
+                self._prefetch_requests():
             if isinstance(data_or_req, bytes):  # ugly, awful overloading
                 yield ('data segment', data_or_req)
                 continue
             seg_req = data_or_req
-            seg_resp = seg_req.get_response(self.app)
+            if prefetcher:
+                start = time.time()
+                try:
+                    seg_resp = prefetcher.take()
+                finally:
+                    self.logger.timing_since(
+                        'segment_prefetch.stall.timing', start)
+            else:
+                seg_resp = seg_req.get_response(self.app)
             if not is_success(seg_resp.status_int):
                 # Error body should be short
                 body = seg_resp.body
@@ -652,7 +837,10 @@ class SegmentedIterable(object):
                 # object many times which would hammer our obj servers. If
                 # this is a range request, don't check content-length
                 # because it won't match.
-                close_if_possible(seg_resp.app_iter)
+                if prefetcher:
+                    prefetcher.close()
+                else:
+                    close_if_possible(seg_resp.app_iter)
                 raise SegmentError(
                     'Object segment no longer valid: '
                     '%(path)s etag: %(r_etag)s != %(s_etag)s or '
@@ -670,11 +858,15 @@ class SegmentedIterable(object):
                 # Only calculate the MD5 if it we can use it to validate
                 seg_hash = md5(usedforsecurity=False)
 
-            document_iters = maybe_multipart_byteranges_to_document_iters(
-                seg_resp.app_iter,
-                seg_resp.headers['Content-Type'])
+            if prefetcher:
+                chunk_iter = prefetcher.iter_chunks()
+            else:
+                chunk_iter = itertools.chain.from_iterable(
+                    maybe_multipart_byteranges_to_document_iters(
+                        seg_resp.app_iter,
+                        seg_resp.headers['Content-Type']))
 
-            for chunk in itertools.chain.from_iterable(document_iters):
+            for chunk in chunk_iter:
                 if seg_hash:
                     seg_hash.update(chunk)
                     resp_len += len(chunk)
@@ -27,7 +27,7 @@ from copy import deepcopy
 from contextlib import contextmanager
 
 from array import array
-from collections import defaultdict
+from collections import Counter, defaultdict
 import six
 from six.moves import range
 from time import time
@@ -632,53 +632,70 @@ class RingBuilder(object):
             old_replica2part2dev if provided
         """
 
-        # Since we're going to loop over every replica of every part we'll
-        # also count up changed_parts if old_replica2part2dev is passed in
-        old_replica2part2dev = old_replica2part2dev or []
         # Compare the partition allocation before and after the rebalance
         # Only changed device ids are taken into account; devices might be
         # "touched" during the rebalance, but actually not really moved
         changed_parts = 0
+        old_replica2part2dev = old_replica2part2dev or []
+        # only parts held by every replica are counted, just as zip() stops
+        # at the shortest replica below
+        num_parts = min([len(part2dev)
+                         for part2dev in self._replica2part2dev] or [0])
+        for rep_id, part2dev in enumerate(self._replica2part2dev):
+            # a missing replica or part means the partition has changed
+            if rep_id >= len(old_replica2part2dev):
+                changed_parts += num_parts
+                continue
+            old_part2dev = old_replica2part2dev[rep_id]
+            changed_parts += max(num_parts - len(old_part2dev), 0)
+            changed_parts += sum(
+                1 for new_dev_id, old_dev_id in six.moves.zip(
+                    itertools.islice(part2dev, num_parts), old_part2dev)
+                if new_dev_id != old_dev_id)
 
         int_replicas = int(math.ceil(self.replicas))
         max_allowed_replicas = self._build_max_replicas_by_tier()
         parts_at_risk = 0
 
-        dispersion_graph = {}
+        # look up the tiers of each device only once, not once per replica
+        tiers_by_dev_id = {}
+        for dev_id in set(itertools.chain.from_iterable(
+                itertools.islice(part2dev, num_parts)
+                for part2dev in self._replica2part2dev)):
+            dev = self.devs[dev_id]
+            tiers_by_dev_id[dev_id] = dev.get('tiers') or tiers_for_dev(dev)
+
+        # parts_with_replicas_at_tier[(tier, replicas)] is the number of
+        # parts with exactly that many replicas within the tier
+        parts_with_replicas_at_tier = Counter()
         # go over all the devices holding each replica part by part
-        for part_id, dev_ids in enumerate(
-                six.moves.zip(*self._replica2part2dev)):
+        for dev_ids in six.moves.zip(*self._replica2part2dev):
             # count the number of replicas of this part for each tier of each
             # device, some devices may have overlapping tiers!
-            replicas_at_tier = defaultdict(int)
-            for rep_id, dev in enumerate(iter(
-                    self.devs[dev_id] for dev_id in dev_ids)):
-                for tier in (dev.get('tiers') or tiers_for_dev(dev)):
-                    replicas_at_tier[tier] += 1
-                # IndexErrors will be raised if the replicas are increased or
-                # decreased, and that actually means the partition has changed
-                try:
-                    old_device = old_replica2part2dev[rep_id][part_id]
-                except IndexError:
-                    changed_parts += 1
-                    continue
-
-                if old_device != dev['id']:
-                    changed_parts += 1
-            # update running totals for each tiers' number of parts with a
-            # given replica count
+            replicas_at_tier = Counter(itertools.chain.from_iterable(
+                map(tiers_by_dev_id.__getitem__, dev_ids)))
+            parts_with_replicas_at_tier.update(replicas_at_tier.items())
+            over_max = [
+                (len(tier), replicas - max_allowed_replicas[tier])
+                for tier, replicas in replicas_at_tier.items()
+                if replicas > max_allowed_replicas[tier]]
+            if not over_max:
+                continue
             part_risk_depth = defaultdict(int)
-            part_risk_depth[0] = 0
-            for tier, replicas in replicas_at_tier.items():
-                if tier not in dispersion_graph:
-                    dispersion_graph[tier] = [self.parts] + [0] * int_replicas
-                dispersion_graph[tier][0] -= 1
-                dispersion_graph[tier][replicas] += 1
-                if replicas > max_allowed_replicas[tier]:
-                    part_risk_depth[len(tier)] += (
-                        replicas - max_allowed_replicas[tier])
+            for depth, excess in over_max:
+                part_risk_depth[depth] += excess
             # count each part-replica once at tier where dispersion is worst
             parts_at_risk += max(part_risk_depth.values())
+
+        # update running totals for each tiers' number of parts with a given
+        # replica count
+        dispersion_graph = {}
+        for (tier, replicas), part_count in \
+                parts_with_replicas_at_tier.items():
+            if tier not in dispersion_graph:
+                dispersion_graph[tier] = [self.parts] + [0] * int_replicas
+            dispersion_graph[tier][0] -= part_count
+            dispersion_graph[tier][replicas] += part_count
         self._dispersion_graph = dispersion_graph
         self.dispersion = 100.0 * parts_at_risk / (self.parts * self.replicas)
         self.version += 1
@@ -1082,6 +1099,9 @@ class RingBuilder(object):
         Update the map of partition => [replicas] to be reassigned from
         insufficiently-far-apart replicas.
         """
+        max_replicas_in_tier = defaultdict(int, (
+            (t, plan['max']) for t, plan in replica_plan.items()))
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         # Now we gather partitions that are "at risk" because they aren't
         # currently sufficient spread out across the cluster.
         for part in range(self.parts):
@@ -1090,22 +1110,21 @@ class RingBuilder(object):
             # First, add up the count of replicas at each tier for each
             # partition.
             replicas_at_tier = defaultdict(int)
-            for dev in self._devs_for_part(part):
-                for tier in dev['tiers']:
-                    replicas_at_tier[tier] += 1
-
-            # Now, look for partitions not yet spread out enough.
-            undispersed_dev_replicas = []
+            dev_replicas = []
             for replica in self._replicas_for_part(part):
                 dev_id = self._replica2part2dev[replica][part]
                 if dev_id == NONE_DEV:
                     continue
                 dev = self.devs[dev_id]
-                if all(replicas_at_tier[tier] <=
-                       replica_plan[tier]['max']
-                       for tier in dev['tiers']):
-                    continue
-                undispersed_dev_replicas.append((dev, replica))
+                dev_replicas.append((dev, replica))
+                for tier in dev['tiers']:
+                    replicas_at_tier[tier] += 1
+
+            # Now, look for partitions not yet spread out enough.
+            undispersed_dev_replicas = [
+                (dev, replica) for dev, replica in dev_replicas
+                if any(replicas_at_tier[tier] > max_replicas_in_tier[tier]
+                       for tier in dev['tiers'])]
 
             if not undispersed_dev_replicas:
                 continue
@@ -1123,9 +1142,10 @@ class RingBuilder(object):
                 dev['parts_wanted'] += 1
                 dev['parts'] -= 1
                 assign_parts[part].append(replica)
-                self.logger.debug(
-                    "Gathered %d/%d from dev %s [dispersion]",
-                    part, replica, pretty_dev(dev))
+                if debug:
+                    self.logger.debug(
+                        "Gathered %d/%d from dev %s [dispersion]",
+                        part, replica, pretty_dev(dev))
                 self._replica2part2dev[replica][part] = NONE_DEV
                 for tier in dev['tiers']:
                     replicas_at_tier[tier] -= 1
@@ -1142,6 +1162,7 @@ class RingBuilder(object):
         :param start: offset into self.parts to begin search
         :param replica_plan: replicanth targets for tiers
         """
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         tier2children = self._build_tier2children()
         parts_wanted_in_tier = defaultdict(int)
         for dev in self._iter_devs():
@@ -1195,9 +1216,10 @@ class RingBuilder(object):
                 dev['parts_wanted'] += 1
                 dev['parts'] -= 1
                 assign_parts[part].append(replica)
-                self.logger.debug(
-                    "Gathered %d/%d from dev %s [weight disperse]",
-                    part, replica, pretty_dev(dev))
+                if debug:
+                    self.logger.debug(
+                        "Gathered %d/%d from dev %s [weight disperse]",
+                        part, replica, pretty_dev(dev))
                 self._replica2part2dev[replica][part] = NONE_DEV
                 for tier in dev['tiers']:
                     replicas_at_tier[tier] -= 1
@@ -1245,6 +1267,7 @@ class RingBuilder(object):
         :param assign_parts: the map of partition => [replica] to update
         :param start: offset into self.parts to begin search
         """
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         for offset in range(self.parts):
             part = (start + offset) % self.parts
             if (not self._can_part_move(part)):
@@ -1271,9 +1294,10 @@ class RingBuilder(object):
             dev['parts_wanted'] += 1
             dev['parts'] -= 1
             assign_parts[part].append(replica)
-            self.logger.debug(
-                "Gathered %d/%d from dev %s [weight forced]",
-                part, replica, pretty_dev(dev))
+            if debug:
+                self.logger.debug(
+                    "Gathered %d/%d from dev %s [weight forced]",
+                    part, replica, pretty_dev(dev))
             self._replica2part2dev[replica][part] = NONE_DEV
             self._set_part_moved(part)
 
@@ -1337,6 +1361,13 @@ class RingBuilder(object):
         tier2children_sets = build_tier_tree(available_devs)
         tier2children = defaultdict(list)
         tier2children_sort_key = {}
+        # flatten the plan's ceilings; they're checked for every child tier
+        # of every replica we place
+        max_replicas_in_tier = defaultdict(int, (
+            (t, plan['max']) for t, plan in replica_plan.items()))
+        # formatting devices for debug messages nobody will see is costly
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+
         tiers_list = [()]
         depth = 1
         while depth <= max_tier_depth:
@@ -1369,19 +1400,25 @@ class RingBuilder(object):
                 while depth <= max_tier_depth:
                     # Choose the roomiest tier among those that don't
                     # already have their max replicas assigned according
-                    # to the replica_plan.
-                    candidates = [t for t in tier2children[tier] if
-                                  replicas_at_tier[t] <
-                                  replica_plan[t]['max']]
-
-                    if not candidates:
+                    # to the replica_plan; ties go to the first child in
+                    # sort order, just like max() would pick.
+                    best_tier = None
+                    best_available = None
+                    for t in tier2children[tier]:
+                        if replicas_at_tier[t] >= max_replicas_in_tier[t]:
+                            continue
+                        available = parts_available_in_tier[t]
+                        if best_tier is None or available > best_available:
+                            best_tier = t
+                            best_available = available
+
+                    if best_tier is None:
                         raise Exception('no home for %s/%s %s' % (
                             part, replica, {t: (
                                 replicas_at_tier[t],
                                 replica_plan[t]['max'],
                             ) for t in tier2children[tier]}))
-                    tier = max(candidates, key=lambda t:
-                               parts_available_in_tier[t])
+                    tier = best_tier
 
                     depth += 1
 
@@ -1393,8 +1430,10 @@ class RingBuilder(object):
                     replicas_at_tier[tier] += 1
 
                 self._replica2part2dev[replica][part] = dev['id']
-                self.logger.debug(
-                    "Placed %d/%d onto dev %s", part, replica, pretty_dev(dev))
+                if debug:
+                    self.logger.debug(
+                        "Placed %d/%d onto dev %s",
+                        part, replica, pretty_dev(dev))
 
         # Just to save memory and keep from accidental reuse.
         for dev in self._iter_devs():
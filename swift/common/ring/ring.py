@@ -15,16 +15,18 @@
 
 import array
 import contextlib
+from collections import OrderedDict
 
 import six.moves.cPickle as pickle
 import json
 from collections import defaultdict
 from gzip import GzipFile
 from os.path import getmtime
+import mmap
 import struct
 from time import time
 import os
-from itertools import chain, count
+from itertools import chain
 from tempfile import NamedTemporaryFile
 import sys
 import zlib
@@ -38,6 +40,31 @@ from swift.common.ring.utils import tiers_for_dev
 
 
 DEFAULT_RELOAD_TIME = 15
+RING_FORMAT_V1 = 1
+RING_FORMAT_V2 = 2
+# the replica2part2dev_id tables of a v2 ring start at an offset aligned to
+# this many bytes so that they can be used straight from a memory mapping
+V2_TABLE_ALIGNMENT = 8
+# number of partitions whose handoff order is remembered by a Ring
+HANDOFF_CACHE_SIZE = 1024
+
+
+def get_v2_ring_path(ring_path):
+    """
+    Get the path of the uncompressed v2 ring file that may be written
+    alongside a gzipped ring file, e.g. ``object.ring`` for
+    ``object.ring.gz``.
+
+    v2 ring files have their own name so that servers which cannot load them
+    carry on loading the gzipped ring file.
+
+    :param ring_path: path of a ``.ring.gz`` file
+    :returns: the path of the v2 ring file, or None if ``ring_path`` is not
+              the path of a ``.ring.gz`` file
+    """
+    if ring_path.endswith('.ring.gz'):
+        return ring_path[:-len('.gz')]
+    return None
 
 
 def calc_replica_count(replica2part2dev_id):
@@ -65,6 +92,34 @@ def normalize_devices(devs):
             dev.setdefault('replication_port', dev['port'])
 
 
+class _MemoizedHandoffs(object):
+    """
+    The handoff device ids of a partition, computed lazily from an iterator
+    and remembered as they are computed, so that each later iteration only
+    computes any handoffs beyond those that were consumed before.
+
+    :param dev_id_iter: an iterator of handoff device ids.
+    """
+
+    def __init__(self, dev_id_iter):
+        self._dev_ids = []
+        self._dev_id_iter = dev_id_iter
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self._dev_ids):
+                if self._dev_id_iter is None:
+                    return
+                try:
+                    self._dev_ids.append(next(self._dev_id_iter))
+                except StopIteration:
+                    self._dev_id_iter = None
+                    return
+            yield self._dev_ids[index]
+            index += 1
+
+
 class RingReader(object):
     chunk_size = 2 ** 16
 
@@ -142,6 +197,37 @@ class RingData(object):
         self.next_part_power = next_part_power
         self.version = version
         self.md5 = self.size = self.raw_size = None
+        # a mapping of the v2 ring file the ring data was loaded from, which
+        # is only read if its md5 is asked for
+        self._md5_mapping = None
+        # the format of the file the ring data was loaded from, if any
+        self.format_version = None
+        # ids of the devices with partitions assigned, if recorded in the
+        # file the ring data was loaded from
+        self.assigned_dev_ids = None
+
+    @property
+    def md5(self):
+        """
+        The md5 of the file the ring data was loaded from, if any.
+
+        The md5 of a v2 ring file is only computed when it is first asked
+        for, so that loading the ring does not read every page of its tables.
+        """
+        if getattr(self, '_md5_mapping', None) is not None:
+            ring_md5 = md5(usedforsecurity=False)
+            for offset in range(0, len(self._md5_mapping),
+                                RingReader.chunk_size):
+                ring_md5.update(self._md5_mapping[
+                    offset:offset + RingReader.chunk_size])
+            self._md5_mapping.close()
+            self.md5 = ring_md5.hexdigest()
+        return self._md5
+
+    @md5.setter
+    def md5(self, value):
+        self._md5 = value
+        self._md5_mapping = None
 
     @property
     def replica_count(self):
@@ -183,6 +269,74 @@ class RingData(object):
 
         return ring_dict
 
+    @classmethod
+    def deserialize_v2(cls, fp, metadata_only=False):
+        """
+        Deserialize a v2 ring file into a dictionary with `devs`, `part_shift`,
+        and `replica2part2dev_id` keys.
+
+        A v2 ring file is not compressed, and its `replica2part2dev_id` tables
+        are memory-mapped read-only rather than read into memory. The tables
+        are then shared through the page cache by every process on the host
+        that loads the same ring file, and pages are only read from disk as
+        partitions are looked up. Where the file was written with a different
+        byte order, or on python 2, the tables are copied into arrays instead.
+
+        If the optional kwarg `metadata_only` is True, then the
+        `replica2part2dev_id` is not loaded and that key in the returned
+        dictionary just has the value `[]`.
+
+        :param file fp: An opened file which has already consumed the 6 bytes
+                        of magic and version.
+        :param bool metadata_only: If True, only load `devs` and `part_shift`
+        :returns: A dict containing `devs`, `part_shift`, and
+                  `replica2part2dev_id`
+        """
+        json_len, = struct.unpack('!I', fp.read(4))
+        ring_dict = json.loads(fp.read(json_len))
+        ring_dict['replica2part2dev_id'] = []
+
+        if metadata_only:
+            return ring_dict
+
+        byteswap = (ring_dict.get('byteorder', sys.byteorder) != sys.byteorder)
+
+        offset = 10 + json_len
+        mapping = memoryview(
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+        for part_count in ring_dict['replica_part_counts']:
+            table = mapping[offset:offset + 2 * part_count]
+            if len(table) != 2 * part_count:
+                raise RingLoadError('Truncated v2 ring file')
+            offset += 2 * part_count
+            if six.PY2 or byteswap:
+                part2dev = array.array('H', table.tobytes())
+                if byteswap:
+                    part2dev.byteswap()
+            else:
+                part2dev = table.cast('H')
+            ring_dict['replica2part2dev_id'].append(part2dev)
+
+        return ring_dict
+
+    @classmethod
+    def _load_v2(cls, filename, metadata_only=False):
+        with open(filename, 'rb') as fp:
+            fp.read(6)  # magic and version have already been checked
+            ring_dict = cls.deserialize_v2(fp, metadata_only=metadata_only)
+            ring_data = RingData(ring_dict['replica2part2dev_id'],
+                                 ring_dict['devs'], ring_dict['part_shift'],
+                                 ring_dict.get('next_part_power'),
+                                 ring_dict.get('version'))
+            ring_data.format_version = RING_FORMAT_V2
+            if 'assigned_dev_ids' in ring_dict:
+                ring_data.assigned_dev_ids = set(ring_dict['assigned_dev_ids'])
+            ring_data.size = ring_data.raw_size = os.fstat(fp.fileno()).st_size
+            if not metadata_only:
+                ring_data._md5_mapping = mmap.mmap(
+                    fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return ring_data
+
     @classmethod
     def load(cls, filename, metadata_only=False):
         """
@@ -192,12 +346,18 @@ class RingData(object):
         :param bool metadata_only: If True, only load `devs` and `part_shift`.
         :returns: A RingData instance containing the loaded data.
         """
+        with open(filename, 'rb') as fp:
+            header = fp.read(6)
+        if header == struct.pack('!4sH', b'R1NG', RING_FORMAT_V2):
+            # v2 rings are not compressed
+            return cls._load_v2(filename, metadata_only=metadata_only)
+
         with contextlib.closing(RingReader(filename)) as gz_file:
             # See if the file is in the new format
             magic = gz_file.read(4)
             if magic == b'R1NG':
                 format_version, = struct.unpack('!H', gz_file.read(2))
-                if format_version == 1:
+                if format_version == RING_FORMAT_V1:
                     ring_data = cls.deserialize_v1(
                         gz_file, metadata_only=metadata_only)
                 else:
@@ -205,6 +365,7 @@ class RingData(object):
                                     format_version)
             else:
                 # Assume old-style pickled ring
+                format_version = None
                 gz_file.seek(0)
                 ring_data = pickle.load(gz_file)
 
@@ -218,11 +379,10 @@ class RingData(object):
                                  ring_data.get('version'))
         for attr in ('md5', 'size', 'raw_size'):
             setattr(ring_data, attr, getattr(gz_file, attr))
+        ring_data.format_version = format_version
         return ring_data
 
-    def serialize_v1(self, file_obj):
-        # Write out new-style serialization magic and version:
-        file_obj.write(struct.pack('!4sH', b'R1NG', 1))
+    def _serialize_header(self, format_version):
         ring = self.to_dict()
 
         # Only include next_part_power if it is set in the
@@ -238,34 +398,94 @@ class RingData(object):
         if next_part_power is not None:
             _text['next_part_power'] = next_part_power
 
+        if format_version == RING_FORMAT_V2:
+            # the last replica may not cover every partition
+            _text['replica_part_counts'] = [
+                len(part2dev_id)
+                for part2dev_id in ring['replica2part2dev_id']]
+            # so that loading the ring needn't read every page of the tables
+            _text['assigned_dev_ids'] = sorted(self.get_assigned_dev_ids())
+
         json_text = json.dumps(_text, sort_keys=True,
                                ensure_ascii=True).encode('ascii')
-        json_len = len(json_text)
-        file_obj.write(struct.pack('!I', json_len))
-        file_obj.write(json_text)
-        for part2dev_id in ring['replica2part2dev_id']:
+        if format_version == RING_FORMAT_V2:
+            # pad so that the tables that follow the header are aligned
+            json_text += b' ' * (-(10 + len(json_text)) % V2_TABLE_ALIGNMENT)
+        return (struct.pack('!4sHI', b'R1NG', format_version, len(json_text)) +
+                json_text)
+
+    def get_assigned_dev_ids(self):
+        """
+        Get the ids of the devices that have at least one partition assigned.
+
+        :returns: a set of device ids
+        """
+        # pickled rings may predate the attribute
+        if getattr(self, 'assigned_dev_ids', None) is not None:
+            return self.assigned_dev_ids
+        dev_ids_with_parts = set()
+        for part2dev_id in self._replica2part2dev_id:
+            dev_ids_with_parts.update(part2dev_id)
+        return dev_ids_with_parts
+
+    def _serialize_tables(self, file_obj):
+        for part2dev_id in self._replica2part2dev_id:
             if six.PY2:
                 # Can't just use tofile() because a GzipFile apparently
                 # doesn't count as an 'open file'
                 file_obj.write(part2dev_id.tostring())
+            elif isinstance(part2dev_id, memoryview):
+                # loaded from a memory-mapped v2 ring
+                file_obj.write(part2dev_id.tobytes())
             else:
                 part2dev_id.tofile(file_obj)
 
-    def save(self, filename, mtime=1300507380.0):
+    def serialize_v2(self, file_obj):
+        """
+        Serialize this RingData instance in the uncompressed v2 format, which
+        is suitable for memory-mapping when the ring is loaded. See
+        :meth:`deserialize_v2`.
+
+        :param file_obj: an open file to write the ring to.
+        """
+        file_obj.write(self._serialize_header(RING_FORMAT_V2))
+        self._serialize_tables(file_obj)
+
+    def serialize_v1(self, file_obj):
+        # Write out new-style serialization magic, version and metadata:
+        file_obj.write(self._serialize_header(RING_FORMAT_V1))
+        self._serialize_tables(file_obj)
+
+    def save(self, filename, mtime=1300507380.0,
+             format_version=RING_FORMAT_V1):
         """
         Serialize this RingData instance to disk.
 
         :param filename: File into which this instance should be serialized.
         :param mtime: time used to override mtime for gzip, default or None
                       if the caller wants to include time
+        :param format_version: the ring format to write; v1 rings are gzipped,
+                               v2 rings are uncompressed so that they may be
+                               memory-mapped when loaded. v2 rings may not be
+                               written to a ``.gz`` file, see
+                               :func:`get_v2_ring_path`.
         """
-        # Override the timestamp so that the same ring data creates
-        # the same bytes on disk. This makes a checksum comparison a
-        # good way to see if two rings are identical.
+        if format_version not in (RING_FORMAT_V1, RING_FORMAT_V2):
+            raise ValueError('Unknown ring format version %r' %
+                             (format_version,))
+        if format_version == RING_FORMAT_V2 and filename.endswith('.gz'):
+            raise ValueError('v2 ring files are not gzipped; refusing to '
+                             'write one to %s' % filename)
         tempf = NamedTemporaryFile(dir=".", prefix=filename, delete=False)
-        gz_file = GzipFile(filename, mode='wb', fileobj=tempf, mtime=mtime)
-        self.serialize_v1(gz_file)
-        gz_file.close()
+        if format_version == RING_FORMAT_V2:
+            self.serialize_v2(tempf)
+        else:
+            # Override the timestamp so that the same ring data creates
+            # the same bytes on disk. This makes a checksum comparison a
+            # good way to see if two rings are identical.
+            gz_file = GzipFile(filename, mode='wb', fileobj=tempf, mtime=mtime)
+            self.serialize_v1(gz_file)
+            gz_file.close()
         tempf.flush()
         os.fsync(tempf.fileno())
         tempf.close()
@@ -284,7 +504,9 @@ class Ring(object):
     """
     Partitioned consistent hashing ring.
 
-    :param serialized_path: path to serialized RingData instance
+    :param serialized_path: path to serialized RingData instance; if it is a
+                            ``.ring.gz`` file and the v2 ring file of the same
+                            name exists, that is loaded instead
     :param reload_time: time interval in seconds to check for a ring change
     :param ring_name: ring name string (basically specified from policy)
     :param validation_hook: hook point to validate ring configuration ontime
@@ -301,15 +523,22 @@ class Ring(object):
                                                 ring_name + '.ring.gz')
         else:
             self.serialized_path = os.path.join(serialized_path)
+        self._v2_path = get_v2_ring_path(self.serialized_path)
         self.reload_time = (DEFAULT_RELOAD_TIME if reload_time is None
                             else reload_time)
         self._validation_hook = validation_hook
         self._reload(force=True)
 
+    def _get_ring_path(self):
+        if self._v2_path and os.path.exists(self._v2_path):
+            return self._v2_path
+        return self.serialized_path
+
     def _reload(self, force=False):
         self._rtime = time() + self.reload_time
         if force or self.has_changed():
-            ring_data = RingData.load(self.serialized_path)
+            ring_path = self._get_ring_path()
+            ring_data = RingData.load(ring_path)
 
             try:
                 self._validation_hook(ring_data)
@@ -321,19 +550,21 @@ class Ring(object):
                     # ring data if the new ring data is invalid.
                     return
 
-            self._mtime = getmtime(self.serialized_path)
+            self._loaded_path = ring_path
+            self._mtime = getmtime(ring_path)
             self._devs = ring_data.devs
             self._replica2part2dev_id = ring_data._replica2part2dev_id
             self._part_shift = ring_data._part_shift
             self._rebuild_tier_data()
-            self._update_bookkeeping()
+            self._update_bookkeeping(ring_data.get_assigned_dev_ids())
             self._next_part_power = ring_data.next_part_power
             self._version = ring_data.version
-            self._md5 = ring_data.md5
+            # the md5 of a v2 ring is only computed if it is asked for
+            self._ring_data = ring_data
             self._size = ring_data.size
             self._raw_size = ring_data.raw_size
 
-    def _update_bookkeeping(self):
+    def _update_bookkeeping(self, dev_ids_with_parts=None):
         # Do this now, when we know the data has changed, rather than
         # doing it on every call to get_more_nodes().
         #
@@ -342,10 +573,10 @@ class Ring(object):
         # way, a region, zone, or server with no partitions assigned
         # does not count toward our totals, thereby keeping the early
         # bailouts in get_more_nodes() working.
-        dev_ids_with_parts = set()
-        for part2dev_id in self._replica2part2dev_id:
-            for dev_id in part2dev_id:
-                dev_ids_with_parts.add(dev_id)
+        if dev_ids_with_parts is None:
+            dev_ids_with_parts = set()
+            for part2dev_id in self._replica2part2dev_id:
+                dev_ids_with_parts.update(part2dev_id)
         regions = set()
         zones = set()
         ips = set()
@@ -366,6 +597,8 @@ class Ring(object):
         self._num_regions = len(regions)
         self._num_zones = len(zones)
         self._num_ips = len(ips)
+        # handoffs found for the old tables no longer apply
+        self._handoff_cache = OrderedDict()
 
     @property
     def next_part_power(self):
@@ -383,7 +616,7 @@ class Ring(object):
 
     @property
     def md5(self):
-        return self._md5
+        return self._ring_data.md5
 
     @property
     def size(self):
@@ -448,7 +681,9 @@ class Ring(object):
 
         :returns: True if the ring on disk has changed, False otherwise
         """
-        return getmtime(self.serialized_path) != self._mtime
+        ring_path = self._get_ring_path()
+        return (ring_path != self._loaded_path or
+                getmtime(ring_path) != self._mtime)
 
     def _get_part_nodes(self, part):
         part_nodes = []
@@ -533,6 +768,10 @@ class Ring(object):
         will usually keep the same sequences of handoffs even with
         ring changes.
 
+        The handoff order of the most recently used partitions is remembered
+        until the ring is reloaded, so handoffs that have been found once need
+        not be searched for again.
+
         :param part: partition to get handoff nodes for
         :returns: generator of node dicts
 
@@ -540,22 +779,48 @@ class Ring(object):
         """
         if time() > self._rtime:
             self._reload()
-        primary_nodes = self._get_part_nodes(part)
+        devs = self._devs
+        handoffs = self._handoff_cache.pop(part, None)
+        if handoffs is None:
+            handoffs = _MemoizedHandoffs(self._iter_handoff_dev_ids(
+                part, self._get_part_nodes(part), devs,
+                self._replica2part2dev_id))
+            while len(self._handoff_cache) >= HANDOFF_CACHE_SIZE:
+                self._handoff_cache.popitem(last=False)
+        self._handoff_cache[part] = handoffs
+        for handoff_index, dev_id in enumerate(handoffs):
+            yield dict(devs[dev_id], handoff_index=handoff_index)
+
+    def _iter_handoff_dev_ids(self, part, primary_nodes, devs,
+                              replica2part2dev_id):
+        """
+        Generator of the ids of the handoff devices of a partition, in the
+        order they should be used. See :meth:`get_more_nodes`.
+
+        :param part: partition to get handoff device ids for
+        :param primary_nodes: the primary nodes of the partition
+        :param devs: the ring's list of devices
+        :param replica2part2dev_id: the ring's partition assignment tables
+        :returns: generator of device ids
+        """
         used = set(d['id'] for d in primary_nodes)
-        index = count()
         same_regions = set(d['region'] for d in primary_nodes)
         same_zones = set((d['region'], d['zone']) for d in primary_nodes)
         same_ips = set(
             (d['region'], d['zone'], d['ip']) for d in primary_nodes)
+        num_regions = self._num_regions
+        num_zones = self._num_zones
+        num_ips = self._num_ips
+        num_assigned_devs = self._num_assigned_devs
 
-        parts = len(self._replica2part2dev_id[0])
+        parts = len(replica2part2dev_id[0])
         part_hash = md5(str(part).encode('ascii'),
                         usedforsecurity=False).digest()
         start = struct.unpack_from('>I', part_hash)[0] >> self._part_shift
         inc = int(parts / 65536) or 1
         # Multiple loops for execution speed; the checks and bookkeeping get
         # simpler as you go along
-        hit_all_regions = len(same_regions) == self._num_regions
+        hit_all_regions = len(same_regions) == num_regions
         for handoff_part in chain(range(start, parts, inc),
                                   range(inc - ((parts - start) % inc),
                                         start, inc)):
@@ -563,24 +828,24 @@ class Ring(object):
                 # At this point, there are no regions left untouched, so we
                 # can stop looking.
                 break
-            for part2dev_id in self._replica2part2dev_id:
+            for part2dev_id in replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
+                    dev = devs[dev_id]
                     region = dev['region']
                     if dev_id not in used and region not in same_regions:
-                        yield dict(dev, handoff_index=next(index))
+                        yield dev_id
                         used.add(dev_id)
                         same_regions.add(region)
                         zone = dev['zone']
                         ip = (region, zone, dev['ip'])
                         same_zones.add((region, zone))
                         same_ips.add(ip)
-                        if len(same_regions) == self._num_regions:
+                        if len(same_regions) == num_regions:
                             hit_all_regions = True
                             break
 
-        hit_all_zones = len(same_zones) == self._num_zones
+        hit_all_zones = len(same_zones) == num_zones
         for handoff_part in chain(range(start, parts, inc),
                                   range(inc - ((parts - start) % inc),
                                         start, inc)):
@@ -588,22 +853,22 @@ class Ring(object):
                 # Much like we stopped looking for fresh regions before, we
                 # can now stop looking for fresh zones; there are no more.
                 break
-            for part2dev_id in self._replica2part2dev_id:
+            for part2dev_id in replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
+                    dev = devs[dev_id]
                     zone = (dev['region'], dev['zone'])
                     if dev_id not in used and zone not in same_zones:
-                        yield dict(dev, handoff_index=next(index))
+                        yield dev_id
                         used.add(dev_id)
                         same_zones.add(zone)
                         ip = zone + (dev['ip'],)
                         same_ips.add(ip)
-                        if len(same_zones) == self._num_zones:
+                        if len(same_zones) == num_zones:
                             hit_all_zones = True
                             break
 
-        hit_all_ips = len(same_ips) == self._num_ips
+        hit_all_ips = len(same_ips) == num_ips
         for handoff_part in chain(range(start, parts, inc),
                                   range(inc - ((parts - start) % inc),
                                         start, inc)):
@@ -611,20 +876,20 @@ class Ring(object):
                 # We've exhausted the pool of unused backends, so stop
                 # looking.
                 break
-            for part2dev_id in self._replica2part2dev_id:
+            for part2dev_id in replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
+                    dev = devs[dev_id]
                     ip = (dev['region'], dev['zone'], dev['ip'])
                     if dev_id not in used and ip not in same_ips:
-                        yield dict(dev, handoff_index=next(index))
+                        yield dev_id
                         used.add(dev_id)
                         same_ips.add(ip)
-                        if len(same_ips) == self._num_ips:
+                        if len(same_ips) == num_ips:
                             hit_all_ips = True
                             break
 
-        hit_all_devs = len(used) == self._num_assigned_devs
+        hit_all_devs = len(used) == num_assigned_devs
         for handoff_part in chain(range(start, parts, inc),
                                   range(inc - ((parts - start) % inc),
                                         start, inc)):
@@ -632,13 +897,12 @@ class Ring(object):
                 # We've used every device we have, so let's stop looking for
                 # unused devices now.
                 break
-            for part2dev_id in self._replica2part2dev_id:
+            for part2dev_id in replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
                     if dev_id not in used:
-                        dev = self._devs[dev_id]
-                        yield dict(dev, handoff_index=next(index))
+                        yield dev_id
                         used.add(dev_id)
-                        if len(used) == self._num_assigned_devs:
+                        if len(used) == num_assigned_devs:
                             hit_all_devs = True
                             break
@@ -15,18 +15,110 @@
 
 """ Statsd Client """
 
+import atexit
+import os
 import time
 import warnings
-from contextlib import closing
+import weakref
+from collections import deque
 from random import random
 
+import eventlet
 from eventlet.green import socket
 import six
 
+if six.PY3:
+    _thread = eventlet.patcher.original('_thread')
+else:
+    _thread = eventlet.patcher.original('thread')
+
+
+# the maximum number of idle sockets kept open by a StatsdClient
+MAX_IDLE_SOCKETS = 16
+# the maximum number of metrics buffered by a StatsdClient between flushes
+MAX_BUFFERED_METRICS = 10000
+# a UDP payload that fits in an Ethernet MTU
+DEFAULT_MAX_PACKET_SIZE = 1432
+
+# Buffering clients are flushed by one greenthread per process, and once
+# when the process exits. The clients are only weakly referenced, so that a
+# client that is no longer used, e.g. because get_logger() replaced it, is not
+# kept alive.
+_buffering_clients = weakref.WeakSet()
+_flusher_pid = None
+_atexit_registered = False
+# the flusher is only spawned from the thread that runs the eventlet hub,
+# never from a threadpool thread
+_hub_thread_ident = _thread.get_ident()
+
+
+def _start_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or \
+            _thread.get_ident() != _hub_thread_ident:
+        return
+    _flusher_pid = os.getpid()
+    eventlet.spawn_n(_run_flusher)
+
+
+def _run_flusher():
+    """
+    Flush each buffering client every ``flush_interval`` seconds, until there
+    are no buffering clients left.
+    """
+    global _flusher_pid
+    while True:
+        now = time.time()
+        next_flush = None
+        for client in list(_buffering_clients):
+            flush_at = client._last_flush + client._flush_interval
+            if flush_at <= now:
+                client._last_flush = now
+                try:
+                    client.flush()
+                except Exception:
+                    if client.logger:
+                        client.logger.exception(
+                            'Error flushing StatsD metrics')
+                flush_at = now + client._flush_interval
+            if next_flush is None or flush_at < next_flush:
+                next_flush = flush_at
+        # don't keep the last client alive while sleeping
+        client = None
+        if next_flush is None:
+            break
+        eventlet.sleep(next_flush - now)
+    _flusher_pid = None
+
+
+def _flush_at_exit():
+    for client in list(_buffering_clients):
+        client.flush()
+
 
 class StatsdClient(object):
+    """
+    Sends metrics to a StatsD server.
+
+    Sockets are reused: each send takes an idle socket, or opens one, and
+    returns it once the datagram has been sent, so a socket is never used by
+    two greenthreads at once.
+
+    If ``flush_interval`` is greater than zero, metrics are buffered and sent
+    every ``flush_interval`` seconds by a greenthread shared by all such
+    clients in the process, and when the process exits: the counters with the
+    same name and sample rate are summed, and the metrics are sent in
+    newline-separated datagrams of up to ``max_packet_size`` bytes.
+
+    :param flush_interval: the time, in seconds, to buffer metrics for; 0
+                           sends each metric as it is emitted.
+    :param max_packet_size: the maximum size, in bytes, of a datagram of
+                            buffered metrics.
+    """
+
     def __init__(self, host, port, base_prefix='', tail_prefix='',
-                 default_sample_rate=1, sample_rate_factor=1, logger=None):
+                 default_sample_rate=1, sample_rate_factor=1, logger=None,
+                 flush_interval=0, max_packet_size=DEFAULT_MAX_PACKET_SIZE):
         self._host = host
         self._port = port
         self._base_prefix = base_prefix
@@ -36,6 +128,20 @@ class StatsdClient(object):
         self.random = random
         self.logger = logger
         self._sock_family = self._target = None
+        self._idle_sockets = []
+        self._flush_interval = flush_interval
+        self._max_packet_size = max_packet_size
+        # deque appends and pops are atomic, so metrics may be buffered by
+        # any thread while another flushes them
+        self._buffer = deque()
+        self._buffer_pid = os.getpid()
+        if self._flush_interval > 0:
+            global _atexit_registered
+            self._last_flush = time.time()
+            _buffering_clients.add(self)
+            if not _atexit_registered:
+                atexit.register(_flush_at_exit)
+                _atexit_registered = True
 
         if self._host:
             self._set_sock_family_and_target(host, port)
@@ -123,24 +229,93 @@ class StatsdClient(object):
         if sample_rate is None:
             sample_rate = self._default_sample_rate
         sample_rate = sample_rate * self._sample_rate_factor
-        parts = ['%s%s:%s' % (self._prefix, m_name, m_value), m_type]
+        rate_part = None
         if sample_rate < 1:
             if self.random() < sample_rate:
-                parts.append('@%s' % (sample_rate,))
+                rate_part = '@%s' % (sample_rate,)
             else:
                 return
+        if self._flush_interval > 0:
+            self._check_buffer_pid()
+            self._buffer.append((m_name, m_value, m_type, rate_part))
+            # the flusher is started in each (forked) process that buffers
+            # metrics
+            _start_flusher()
+            now = time.time()
+            if now - self._last_flush >= self._flush_interval or \
+                    len(self._buffer) >= MAX_BUFFERED_METRICS:
+                self._last_flush = now
+                self.flush()
+            return
+        return self._send_datagram(
+            self._format_metric(m_name, m_value, m_type, rate_part))
+
+    def _format_metric(self, m_name, m_value, m_type, rate_part):
+        parts = ['%s%s:%s' % (self._prefix, m_name, m_value), m_type]
+        if rate_part:
+            parts.append(rate_part)
         if six.PY3:
             parts = [part.encode('utf-8') for part in parts]
-        # Ideally, we'd cache a sending socket in self, but that
-        # results in a socket getting shared by multiple green threads.
-        with closing(self._open_socket()) as sock:
+        return b'|'.join(parts)
+
+    def _send_datagram(self, payload):
+        try:
+            sock = self._idle_sockets.pop()
+        except IndexError:
+            sock = self._open_socket()
+        try:
+            return sock.sendto(payload, self._target)
+        except IOError as err:
+            if self.logger:
+                self.logger.warning(
+                    'Error sending UDP message to %(target)r: %(err)s',
+                    {'target': self._target, 'err': err})
+        finally:
+            if len(self._idle_sockets) < MAX_IDLE_SOCKETS:
+                self._idle_sockets.append(sock)
+            else:
+                sock.close()
+
+    def _check_buffer_pid(self):
+        # a forked child inherits the metrics that its parent buffered, which
+        # the parent will send
+        pid = os.getpid()
+        if self._buffer_pid != pid:
+            self._buffer_pid = pid
+            self._buffer.clear()
+
+    def flush(self):
+        """
+        Send the buffered metrics.
+        """
+        self._check_buffer_pid()
+        counters = {}
+        metrics = []
+        for _junk in range(len(self._buffer)):
             try:
-                return sock.sendto(b'|'.join(parts), self._target)
-            except IOError as err:
-                if self.logger:
-                    self.logger.warning(
-                        'Error sending UDP message to %(target)r: %(err)s',
-                        {'target': self._target, 'err': err})
+                m_name, m_value, m_type, rate_part = self._buffer.popleft()
+            except IndexError:
+                break
+            if m_type == 'c':
+                key = (m_name, rate_part)
+                if key not in counters:
+                    counters[key] = 0
+                    metrics.append((m_name, key, m_type, rate_part))
+                counters[key] += m_value
+            else:
+                metrics.append((m_name, m_value, m_type, rate_part))
+        payload = b''
+        for m_name, m_value, m_type, rate_part in metrics:
+            if m_type == 'c':
+                m_value = counters[m_value]
+            line = self._format_metric(m_name, m_value, m_type, rate_part)
+            if payload and \
+                    len(payload) + 1 + len(line) > self._max_packet_size:
+                self._send_datagram(payload)
+                payload = b''
+            payload = payload + b'\n' + line if payload else line
+        if payload:
+            self._send_datagram(payload)
 
     def _open_socket(self):
         return socket.socket(self._sock_family, socket.SOCK_DGRAM)
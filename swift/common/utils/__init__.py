@@ -132,6 +132,7 @@ from swift.common.utils.libc import (  # noqa
     F_SETPIPE_SZ,
     load_libc_function,
     drop_buffer_cache,
+    advise_sequential_read,
     get_md5_socket,
     modify_priority,
     _LibcWrapper,
@@ -1936,6 +1937,121 @@ class StreamingPile(GreenAsyncPile):
         self.pool.__exit__(type, value, traceback)
 
 
+class _GreenBatch(object):
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.full = Event()
+        self.done = Event()
+
+
+class GreenBatcher(object):
+    """
+    Coalesces items that concurrent greenthreads submit with the same key
+    into batches that are committed together.
+
+    The first greenthread to submit an item with a key leads a new batch. If
+    no other batch with that key is being committed then the leader commits
+    the batch straight away, together with any items submitted by
+    greenthreads that were already runnable. Otherwise it waits until the
+    other batch has been committed, for up to ``window`` seconds, or until
+    its batch has ``max_batch_size`` items, while other greenthreads add items
+    to its batch, and then commits the whole batch. Every greenthread that
+    added an item returns once the batch has been committed, or raises the
+    error that committing its item raised. A batch is committed even if its
+    leader is killed while it waits.
+
+    Subclasses implement :meth:`_commit`.
+
+    :param window: the maximum time, in seconds, that a batch waits for
+        another batch with the same key to be committed.
+    :param max_batch_size: the maximum number of items in a batch.
+    """
+
+    def __init__(self, window, max_batch_size):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._batches = {}
+        self._committing = {}
+
+    def _close(self, batch):
+        if self._batches.get(batch.key) is batch:
+            del self._batches[batch.key]
+        if not batch.full.ready():
+            batch.full.send()
+
+    def _commit(self, key, items):
+        """
+        Commit a batch of items.
+
+        :param key: the key the items were submitted with.
+        :param items: a list of items.
+        :returns: a list with the error to raise for each item, or None.
+        :raises: any error, which is then raised for every item.
+        """
+        raise NotImplementedError
+
+    def _commit_batch(self, batch):
+        key = batch.key
+        self._committing[key] = self._committing.get(key, 0) + 1
+        errors = None
+        try:
+            errors = self._commit(key, batch.items)
+        except (Exception, Timeout) as err:
+            errors = [err] * len(batch.items)
+        finally:
+            if errors is None:
+                # the leader was killed while committing; whether or not the
+                # items were committed, don't leave the followers waiting
+                errors = [swift.common.exceptions.BatchCommitInterrupted(
+                    'Commit of batch %r interrupted' % (key,))
+                ] * len(batch.items)
+            batch.done.send(errors)
+            self._committing[key] -= 1
+            if not self._committing[key]:
+                del self._committing[key]
+                waiting = self._batches.get(key)
+                if waiting:
+                    # its leader has nothing left to wait for
+                    self._close(waiting)
+        return errors
+
+    def submit(self, key, item):
+        """
+        Add an item to the batch for a key, and wait for the batch to be
+        committed.
+
+        :param key: the key of the batch.
+        :param item: the item to add to the batch.
+        :raises: any error that committing the item raised.
+        """
+        batch = self._batches.get(key)
+        leader = batch is None
+        if leader:
+            batch = _GreenBatch(key)
+            self._batches[key] = batch
+        index = len(batch.items)
+        batch.items.append(item)
+        if len(batch.items) >= self.max_batch_size:
+            self._close(batch)
+        if leader:
+            try:
+                if key in self._committing:
+                    batch.full.wait(self.window)
+                else:
+                    # let greenthreads that are already runnable join
+                    sleep(0)
+            finally:
+                # commit even if the leader is killed while it waits, so that
+                # no follower is left waiting forever
+                self._close(batch)
+                errors = self._commit_batch(batch)
+        else:
+            errors = batch.done.wait()
+        if errors[index] is not None:
+            raise errors[index]
+
+
 def validate_sync_to(value, allowed_sync_hosts, realms_conf):
     """
     Validates an X-Container-Sync-To header value, returning the
@@ -198,6 +198,27 @@ def drop_buffer_cache(fd, offset, length):
                                        'length': length, 'ret': ret})
 
 
+def advise_sequential_read(fd, offset=0, length=0):
+    """
+    Tell the kernel that the given range of the given file will be read
+    sequentially, so that it reads ahead more aggressively.
+
+    :param fd: file descriptor
+    :param offset: start offset
+    :param length: length; 0 means to the end of the file
+    """
+    global _posix_fadvise
+    if _posix_fadvise is None:
+        _posix_fadvise = load_libc_function('posix_fadvise64')
+    # 2 means "POSIX_FADV_SEQUENTIAL"
+    ret = _posix_fadvise(fd, ctypes.c_uint64(offset),
+                         ctypes.c_uint64(length), 2)
+    if ret != 0:
+        logging.warning("posix_fadvise64(%(fd)s, %(offset)s, %(length)s, 2) "
+                        "-> %(ret)s", {'fd': fd, 'offset': offset,
+                                       'length': length, 'ret': ret})
+
+
 class sockaddr_alg(ctypes.Structure):
     _fields_ = [("salg_family", ctypes.c_ushort),
                 ("salg_type", ctypes.c_ubyte * 14),
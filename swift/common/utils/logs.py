@@ -741,11 +741,19 @@ def get_logger(conf, name=None, log_to_console=False, log_route=None,
         'log_statsd_default_sample_rate', 1))
     sample_rate_factor = float(conf.get(
         'log_statsd_sample_rate_factor', 1))
+    flush_interval = float(conf.get('log_statsd_flush_interval', 0))
+    max_packet_size = int(conf.get(
+        'log_statsd_max_packet_size', statsd_client.DEFAULT_MAX_PACKET_SIZE))
     if statsd_tail_prefix is None:
         statsd_tail_prefix = name
+    old_statsd_client = getattr(logger, 'statsd_client', None)
+    if old_statsd_client:
+        # don't lose any metrics buffered by the client being replaced
+        old_statsd_client.flush()
     logger.statsd_client = statsd_client.StatsdClient(
         statsd_host, statsd_port, base_prefix, statsd_tail_prefix,
-        default_sample_rate, sample_rate_factor, logger=logger)
+        default_sample_rate, sample_rate_factor, logger=logger,
+        flush_interval=flush_interval, max_packet_size=max_packet_size)
 
     adapted_logger = LogAdapter(logger, name)
     other_handlers = conf.get('log_custom_handlers', None)
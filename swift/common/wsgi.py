@@ -1197,7 +1197,7 @@ def make_env(env, method=None, path=None, agent='Swift', query_string=None,
                  'swift.trans_id', 'swift.authorize_override',
                  'swift.authorize', 'HTTP_X_USER_ID', 'HTTP_X_PROJECT_ID',
                  'HTTP_REFERER', 'swift.infocache',
-                 'swift.shard_listing_history'):
+                 'swift.worker_infocache', 'swift.shard_listing_history'):
         if name in env:
             newenv[name] = env[name]
     if method:
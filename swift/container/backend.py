@@ -32,7 +32,7 @@ from swift.common.utils import Timestamp, encode_timestamps, \
     decode_timestamps, extract_swift_bytes, storage_directory, hash_path, \
     ShardRange, renamer, MD5_OF_EMPTY_STRING, mkdirs, get_db_files, \
     parse_db_filename, make_db_file_path, split_path, RESERVED_BYTE, \
-    ShardRangeList, Namespace
+    RESERVED, ShardRangeList, Namespace
 from swift.common.db import DatabaseBroker, utf8encode, BROKER_TIMEOUT, \
     zero_like, DatabaseAlreadyExists, SQLITE_ARG_LIMIT
 
@@ -68,6 +68,9 @@ SHARD_UPDATE_STAT_STATES = [ShardRange.CLEAVED, ShardRange.ACTIVE,
                             ShardRange.SHARDING, ShardRange.SHARDED,
                             ShardRange.SHRINKING, ShardRange.SHRUNK]
 
+# recursive common table expressions are needed for skip-scan listings
+SKIP_SCAN_SUPPORTED = sqlite3.sqlite_version_info >= (3, 8, 3)
+
 # attribute names in order used when transforming shard ranges from dicts to
 # tuples and vice-versa
 SHARD_RANGE_KEYS = ('name', 'timestamp', 'lower', 'upper', 'object_count',
@@ -751,8 +754,8 @@ class ContainerBroker(DatabaseBroker):
         :param timestamp: timestamp when the object was marked as deleted
         :param storage_policy_index: the storage policy index for the object
         """
-        self.put_object(name, timestamp, 0, 'application/deleted', 'noetag',
-                        deleted=1, storage_policy_index=storage_policy_index)
+        self.put_record(self.make_deleted_object_record(
+            name, timestamp, storage_policy_index))
 
     def make_tuple_for_pickle(self, record):
         return (record['name'], record['created_at'], record['size'],
@@ -779,14 +782,40 @@ class ContainerBroker(DatabaseBroker):
                                 updated
         :param meta_timestamp: timestamp of when metadata was last updated
         """
-        record = {'name': name, 'created_at': timestamp, 'size': size,
-                  'content_type': content_type, 'etag': etag,
-                  'deleted': deleted,
-                  'storage_policy_index': storage_policy_index,
-                  'ctype_timestamp': ctype_timestamp,
-                  'meta_timestamp': meta_timestamp}
+        record = self.make_object_record(
+            name, timestamp, size, content_type, etag, deleted,
+            storage_policy_index, ctype_timestamp, meta_timestamp)
         self.put_record(record)
 
+    @staticmethod
+    def make_object_record(name, timestamp, size, content_type, etag,
+                           deleted=0, storage_policy_index=0,
+                           ctype_timestamp=None, meta_timestamp=None):
+        """
+        Make an object record suitable for :meth:`put_record`.
+
+        See :meth:`put_object` for the parameters.
+        """
+        return {'name': name, 'created_at': timestamp, 'size': size,
+                'content_type': content_type, 'etag': etag,
+                'deleted': deleted,
+                'storage_policy_index': storage_policy_index,
+                'ctype_timestamp': ctype_timestamp,
+                'meta_timestamp': meta_timestamp}
+
+    @classmethod
+    def make_deleted_object_record(cls, name, timestamp,
+                                   storage_policy_index=0):
+        """
+        Make a record, suitable for :meth:`put_record`, that marks an object
+        deleted.
+
+        See :meth:`delete_object` for the parameters.
+        """
+        return cls.make_object_record(
+            name, timestamp, 0, 'application/deleted', 'noetag', deleted=1,
+            storage_policy_index=storage_policy_index)
+
     def remove_objects(self, lower, upper, max_row=None):
         """
         Removes object records in the given namespace range from the object
@@ -1155,41 +1184,61 @@ class ContainerBroker(DatabaseBroker):
         if prefix:
             end_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
         orig_marker = marker
+        # With a delimiter, each subdir would need another query to get past
+        # its rows; instead, a recursive query walks the index from one
+        # object or subdir to the next, so one query lists many subdirs.
+        # This relies on the (deleted, name) index and on names being unique,
+        # so is only done when listing either deleted or undeleted objects in
+        # one policy.
+        # SQLite's string functions stop at a NUL, so names with a reserved
+        # byte must not be skip-scanned; they all start with it.
+        skip_scan = (SKIP_SCAN_SUPPORTED and prefix is not None and
+                     bool(delimiter) and include_deleted in (True, False) and
+                     not all_policies and RESERVED not in delimiter and
+                     RESERVED not in prefix and
+                     (not allow_reserved or bool(prefix)))
         with self.get() as conn:
             results = []
             deleted_key = self._get_deleted_key(conn)
             query_keys = ['name', 'created_at', 'size', 'content_type',
                           'etag', deleted_key]
             while len(results) < limit:
+                # bounds on name are kept apart from the other conditions
+                # so that a skip-scan can replace them with its own bound
+                upper_conditions = []
+                upper_args = []
+                lower_conditions = []
+                lower_args = []
                 query_args = []
                 query_conditions = []
                 if end_marker and (not prefix or end_marker < end_prefix):
-                    query_conditions.append('name < ?')
-                    query_args.append(end_marker)
+                    upper_conditions.append('name < ?')
+                    upper_args.append(end_marker)
                 elif prefix:
-                    query_conditions.append('name < ?')
-                    query_args.append(end_prefix)
+                    upper_conditions.append('name < ?')
+                    upper_args.append(end_prefix)
 
                 if delim_force_gte:
-                    query_conditions.append('name >= ?')
-                    query_args.append(marker)
-                    # Always set back to False
-                    delim_force_gte = False
+                    lower_conditions.append('name >= ?')
+                    lower_args.append(marker)
                 elif marker and (not prefix or marker >= prefix):
-                    query_conditions.append('name > ?')
-                    query_args.append(marker)
+                    lower_conditions.append('name > ?')
+                    lower_args.append(marker)
                 elif prefix:
-                    query_conditions.append('name >= ?')
-                    query_args.append(prefix)
+                    lower_conditions.append('name >= ?')
+                    lower_args.append(prefix)
                 if not allow_reserved:
-                    query_conditions.append('name >= ?')
-                    query_args.append(chr(ord(RESERVED_BYTE) + 1))
+                    lower_conditions.append('name >= ?')
+                    lower_args.append(chr(ord(RESERVED_BYTE) + 1))
                 query_conditions.append(deleted_key + deleted_arg)
                 if since_row:
                     query_conditions.append('ROWID > ?')
                     query_args.append(since_row)
 
                 def build_query(keys, conditions, args):
+                    conditions = \
+                        upper_conditions + lower_conditions + conditions
+                    args = upper_args + lower_args + args
                     query = 'SELECT ' + ', '.join(keys) + ' FROM object '
                     if conditions:
                         query += 'WHERE ' + ' AND '.join(conditions)
@@ -1198,14 +1247,67 @@ class ContainerBroker(DatabaseBroker):
                     ''' % ('DESC' if reverse else '')
                     return query + tail_query, args + [limit - len(results)]
 
+                def build_skip_scan_query(keys, conditions, args):
+                    # Each step finds the next name after the previous one;
+                    # if the previous name is in a subdir, the next name is
+                    # the first one after the subdir.
+                    subdir_name = '''CASE
+                        WHEN instr(substr(skip_scan.last_name, length(?) + 1),
+                                   ?) > 0
+                        THEN substr(skip_scan.last_name, 1, length(?) + instr(
+                            substr(skip_scan.last_name, length(?) + 1), ?) - 1)
+                            || ?
+                        ELSE skip_scan.last_name END'''
+                    next_args = [prefix, delimiter, prefix, prefix, delimiter]
+                    if reverse:
+                        step_conditions = lower_conditions + conditions
+                        step_args = lower_args + args
+                        next_name = 'name < ' + subdir_name
+                        next_args.append(delimiter)
+                    else:
+                        step_conditions = upper_conditions + conditions
+                        step_args = upper_args + args
+                        next_name = ('name >= %s AND '
+                                     'name != skip_scan.last_name'
+                                     % subdir_name)
+                        next_args.append(
+                            delimiter[:-1] + chr(ord(delimiter[-1:]) + 1))
+                    conditions = \
+                        upper_conditions + lower_conditions + conditions
+                    args = upper_args + lower_args + args
+                    order = 'ORDER BY name %s' % ('DESC' if reverse else '')
+                    query = '''
+                        WITH RECURSIVE skip_scan(row_id, last_name) AS (
+                            SELECT ROWID, name FROM object WHERE ROWID = (
+                                SELECT ROWID FROM object WHERE %s %s LIMIT 1)
+                            UNION ALL
+                            SELECT object.ROWID, object.name
+                            FROM skip_scan JOIN object ON object.ROWID = (
+                                SELECT ROWID FROM object WHERE %s %s LIMIT 1)
+                            LIMIT ?
+                        )
+                        SELECT %s FROM skip_scan
+                        JOIN object ON object.ROWID = skip_scan.row_id
+                        %s
+                    ''' % (' AND '.join(conditions), order,
+                           ' AND '.join(step_conditions + [next_name]), order,
+                           ', '.join(keys), order)
+                    return query, (args + step_args + next_args +
+                                   [limit - len(results)])
+
+                if skip_scan:
+                    build = build_skip_scan_query
+                else:
+                    build = build_query
+
                 # storage policy filter
                 if all_policies:
-                    query, args = build_query(
+                    query, args = build(
                         query_keys + ['storage_policy_index'],
                         query_conditions,
                         query_args)
                 else:
-                    query, args = build_query(
+                    query, args = build(
                         query_keys + ['storage_policy_index'],
                         query_conditions + ['storage_policy_index = ?'],
                         query_args + [storage_policy_index])
@@ -1214,7 +1316,7 @@ class ContainerBroker(DatabaseBroker):
                 except sqlite3.OperationalError as err:
                     if 'no such column: storage_policy_index' not in str(err):
                         raise
-                    query, args = build_query(
+                    query, args = build(
                         query_keys + ['0 as storage_policy_index'],
                         query_conditions, query_args)
                     curs = conn.execute(query, tuple(args))
@@ -1236,6 +1338,7 @@ class ContainerBroker(DatabaseBroker):
                         end_marker = name
                     else:
                         marker = name
+                        delim_force_gte = False
 
                     if len(results) >= limit:
                         curs.close()
@@ -1253,6 +1356,9 @@ class ContainerBroker(DatabaseBroker):
                                     delimiter[:-1],
                                     chr(ord(delimiter[-1:]) + 1),
                                 ])
+                                delim_force_gte = True
+                            if skip_scan:
+                                continue
                             curs.close()
                             break
                     elif end >= 0:
@@ -1269,10 +1375,13 @@ class ContainerBroker(DatabaseBroker):
                         dir_name = name[:end + len(delimiter)]
                         if dir_name != orig_marker:
                             results.append([dir_name, '0', 0, None, ''])
+                        if skip_scan:
+                            continue
                         curs.close()
                         break
                     results.append(transform_func(row))
-                if not rowcount:
+                if not rowcount or (skip_scan and
+                                    rowcount < args[-1]):
                     break
             return results
 
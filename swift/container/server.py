@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
+import codecs
 import json
 import os
 import time
@@ -28,7 +30,7 @@ from swift.container.sync_store import ContainerSyncStore
 from swift.container.backend import ContainerBroker, DATADIR, \
     RECORD_TYPE_SHARD, UNSHARDED, SHARDING, SHARDED, SHARD_UPDATE_STATES
 from swift.container.replicator import ContainerReplicatorRpc
-from swift.common.db import DatabaseAlreadyExists
+from swift.common.db import DatabaseAlreadyExists, GroupCommitter
 from swift.common.container_sync_realms import ContainerSyncRealms
 from swift.common.request_helpers import split_and_validate_path, \
     is_sys_or_user_meta, validate_internal_container, validate_internal_obj, \
@@ -38,7 +40,7 @@ from swift.common.utils import get_logger, hash_path, public, \
     config_true_value, timing_stats, replication, \
     override_bytes_from_content_type, get_log_line, \
     config_fallocate_value, fs_has_free_space, list_from_csv, \
-    ShardRange
+    ShardRange, config_positive_int_value, non_negative_float
 from swift.common.constraints import valid_timestamp, check_utf8, \
     check_drive, AUTO_CREATE_ACCOUNT_PREFIX
 from swift.common.bufferedhttp import http_connect
@@ -55,6 +57,90 @@ from swift.common.swob import HTTPAccepted, HTTPBadRequest, HTTPConflict, \
     wsgi_to_str, str_to_wsgi
 
 
+def iter_json_list(fp, chunk_size=65536, max_item_size=1048576):
+    """
+    Decode a JSON list from a file-like object, reading only as much of it as
+    is needed to decode each item.
+
+    :param fp: a file-like object with a ``read`` method returning bytes.
+    :param chunk_size: the number of bytes to read at a time.
+    :param max_item_size: the maximum length of an encoded item.
+    :return: an iterator of the decoded items of the list.
+    :raises ValueError: if the content is not a valid JSON list.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = u''
+    pos = 0
+    eof = False
+    # one of: start, first (item or end), next (comma or end), item
+    state = 'start'
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError('Unexpected end of JSON list')
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+            continue
+        char = buf[pos]
+        if state == 'start':
+            if char != u'[':
+                raise ValueError('Expected a JSON list')
+            pos += 1
+            state = 'first'
+        elif char == u']' and state in ('first', 'next'):
+            return
+        elif state == 'next':
+            if char != u',':
+                raise ValueError('Expected , or ] in JSON list')
+            pos += 1
+            state = 'item'
+        else:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError('Invalid JSON list item')
+                end = None
+            # an item is only known to be complete if a delimiter follows it;
+            # e.g. a number might continue in the next chunk
+            if not eof and (end is None or end >= len(buf) or
+                            buf[end] not in u',] \t\r\n'):
+                if len(buf) - pos > max_item_size:
+                    raise ValueError('Invalid JSON list item')
+                chunk = fp.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+                pos = 0
+                continue
+            yield item
+            pos = end
+            state = 'next'
+
+
+def find_shard_range(name, shard_ranges):
+    """
+    Find the shard range to which an object update should be redirected.
+
+    :param name: an object name.
+    :param shard_ranges: a list of shard ranges, sorted as returned by
+        :meth:`~swift.container.backend.ContainerBroker.get_shard_ranges`.
+    :return: the first of the ``shard_ranges`` that includes ``name``, or
+        None.
+    """
+    # shard ranges are sorted by upper bound, so none before this index can
+    # include the name
+    for index in range(bisect.bisect_left(shard_ranges, name),
+                       len(shard_ranges)):
+        if name in shard_ranges[index]:
+            return shard_ranges[index]
+    return None
+
+
 def gen_resp_headers(info, is_deleted=False):
     """
     Convert container info dict to headers.
@@ -155,6 +241,22 @@ class ContainerController(BaseStorageServer):
             config_true_value(conf.get('db_preallocation', 'f'))
         swift.common.db.QUERY_LOGGING = \
             config_true_value(conf.get('db_query_logging', 'f'))
+        swift.common.db.PENDING_FORMAT = \
+            swift.common.db.config_pending_format_value(
+                conf.get('db_pending_format',
+                         swift.common.db.PENDING_FORMAT_V1))
+        group_commit_window = non_negative_float(
+            conf.get('group_commit_window', 0))
+        if group_commit_window > 0:
+            self.group_committer = GroupCommitter(
+                group_commit_window,
+                config_positive_int_value(
+                    conf.get('group_commit_max_batch_size', 500)),
+                self.logger)
+        else:
+            self.group_committer = None
+        self.update_merge_batch_size = config_positive_int_value(
+            conf.get('update_merge_batch_size', 1000))
         self.sync_store = ContainerSyncStore(self.root,
                                              self.logger,
                                              self.mount_check)
@@ -376,8 +478,9 @@ class ContainerController(BaseStorageServer):
             if redirect:
                 return redirect
 
-            broker.delete_object(obj, req.headers.get('x-timestamp'),
-                                 obj_policy_index)
+            self._put_object_record(
+                broker, broker.make_deleted_object_record(
+                    obj, req.headers.get('x-timestamp'), obj_policy_index))
             return HTTPNoContent(request=req)
         else:
             # delete container
@@ -526,16 +629,24 @@ class ContainerController(BaseStorageServer):
         if response:
             return response
 
-        broker.put_object(obj, req_timestamp.internal,
-                          int(req.headers['x-size']),
-                          wsgi_to_str(req.headers['x-content-type']),
-                          wsgi_to_str(req.headers['x-etag']), 0,
-                          obj_policy_index,
-                          wsgi_to_str(req.headers.get(
-                              'x-content-type-timestamp')),
-                          wsgi_to_str(req.headers.get('x-meta-timestamp')))
+        self._put_object_record(broker, broker.make_object_record(
+            obj, req_timestamp.internal, int(req.headers['x-size']),
+            wsgi_to_str(req.headers['x-content-type']),
+            wsgi_to_str(req.headers['x-etag']), 0, obj_policy_index,
+            wsgi_to_str(req.headers.get('x-content-type-timestamp')),
+            wsgi_to_str(req.headers.get('x-meta-timestamp'))))
         return HTTPCreated(request=req)
 
+    def _put_object_record(self, broker, record):
+        """
+        Put an object record into the container DB, batching it with records
+        from concurrent requests if group commit is enabled.
+        """
+        if self.group_committer:
+            self.group_committer.put_record(broker, record)
+        else:
+            broker.put_record(record)
+
     def _create_ok_resp(self, req, broker, created):
         if created:
             return HTTPCreated(request=req,
@@ -955,6 +1066,19 @@ class ContainerController(BaseStorageServer):
     def UPDATE(self, req):
         """
         Handle HTTP UPDATE request (merge_items RPCs coming from the proxy.)
+
+        The request body is a JSON list of object records. Records are
+        decoded as they are read and merged in batches of
+        ``update_merge_batch_size``.
+
+        If the request has an ``X-Backend-Accept-Redirect`` header with a
+        truthy value then records for objects in the namespace of a shard
+        range are not merged. Instead the response body is a JSON object with
+        the number of records that were ``merged``, and a list of
+        ``redirects``, each giving the ``path`` and ``timestamp`` of a shard
+        range and the indexes of the request's ``rows`` that belong in it.
+
+        Records merged before an invalid record is decoded remain merged.
         """
         drive, part, account, container = get_container_name_and_placement(req)
         req_timestamp = valid_timestamp(req)
@@ -969,12 +1093,49 @@ class ContainerController(BaseStorageServer):
         broker = self._get_container_broker(drive, part, account, container)
         self._maybe_autocreate(broker, req_timestamp, account,
                                requested_policy_index, req)
+        accept_redirect = config_true_value(
+            req.headers.get('x-backend-accept-redirect', False))
+        if accept_redirect:
+            shard_ranges = broker.get_shard_ranges(states=SHARD_UPDATE_STATES)
+        else:
+            shard_ranges = []
+        merged = 0
+        redirects = {}
+        batch = []
         try:
-            objs = json.load(req.environ['wsgi.input'])
+            for index, obj in enumerate(
+                    iter_json_list(req.environ['wsgi.input'])):
+                if not isinstance(obj, dict) or \
+                        not isinstance(obj.get('name'), six.string_types):
+                    raise ValueError('Invalid object record at index %d'
+                                     % index)
+                if six.PY2 and isinstance(obj['name'], six.text_type):
+                    obj['name'] = obj['name'].encode('utf-8')
+                shard_range = shard_ranges and find_shard_range(
+                    obj['name'], shard_ranges)
+                if shard_range:
+                    redirects.setdefault(shard_range.name, {
+                        'path': shard_range.name,
+                        'timestamp': shard_range.timestamp.internal,
+                        'rows': [],
+                    })['rows'].append(index)
+                    continue
+                batch.append(obj)
+                if len(batch) >= self.update_merge_batch_size:
+                    broker.merge_items(batch)
+                    merged += len(batch)
+                    batch = []
         except ValueError as err:
             return HTTPBadRequest(body=str(err), content_type='text/plain')
-        broker.merge_items(objs)
-        return HTTPAccepted(request=req)
+        if batch:
+            broker.merge_items(batch)
+            merged += len(batch)
+        if not accept_redirect:
+            return HTTPAccepted(request=req)
+        body = json.dumps({'merged': merged,
+                           'redirects': list(redirects.values())})
+        return HTTPAccepted(request=req, body=body.encode('ascii'),
+                            content_type='application/json')
 
     @public
     @timing_stats()
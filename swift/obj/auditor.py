@@ -18,10 +18,13 @@ import os
 import sys
 import time
 import signal
+from collections import defaultdict
 from os.path import basename, dirname, join
 from random import shuffle
 from contextlib import closing
-from eventlet import Timeout
+from eventlet import Timeout, spawn, tpool
+from eventlet.queue import LightQueue
+from eventlet.semaphore import Semaphore
 
 from swift.obj import diskfile, replicator
 from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist, \
@@ -31,7 +34,9 @@ from swift.common.storage_policy import POLICIES
 from swift.common.utils import (
     config_auto_int_value, dump_recon_cache, get_logger, list_from_csv,
     listdir, load_pkg_resource, parse_prefixed_conf, EventletRateLimiter,
-    readconf, round_robin_iter, unlink_paths_older_than, PrefixLoggerAdapter)
+    readconf, round_robin_iter, unlink_paths_older_than, PrefixLoggerAdapter,
+    non_negative_int, config_positive_int_value, advise_sequential_read,
+    ContextPool)
 from swift.common.recon import RECON_OBJECT_FILE, DEFAULT_RECON_CACHE_PATH
 
 
@@ -89,6 +94,17 @@ class AuditorWorker(object):
             self.max_files_per_second)
         self.bytes_rate_limiter = EventletRateLimiter(
             self.max_bytes_per_second)
+        # when device_concurrency is set, each device's objects are audited
+        # that many at a time, in inode order, and their data is read and
+        # checksummed in eventlet's thread pool
+        self.device_concurrency = non_negative_int(
+            conf.get('device_concurrency', 0))
+        self.checksum_batch_size = config_positive_int_value(
+            conf.get('checksum_batch_size', 1048576))
+        # by default there is a thread for each audit greenthread
+        self.tpool_size = config_auto_int_value(
+            conf.get('eventlet_tpool_num_threads'), None)
+        self.device_stats = defaultdict(lambda: {'files': 0, 'bytes': 0})
         self.bytes_processed = 0
         self.total_bytes_processed = 0
         self.total_files_processed = 0
@@ -134,19 +150,12 @@ class AuditorWorker(object):
         total_errors = 0
         time_auditing = 0
 
-        # get AuditLocations for each policy
-        loc_generators = []
-        for policy in POLICIES:
-            loc_generators.append(
-                self.diskfile_router[policy]
-                    .object_audit_location_generator(
-                        policy, device_dirs=device_dirs,
-                        auditor_type=self.auditor_type))
-
-        all_locs = round_robin_iter(loc_generators)
-        for location in all_locs:
-            loop_time = time.time()
-            self.failsafe_object_audit(location)
+        if self.device_concurrency:
+            audit_times = self._audit_devices(device_dirs)
+        else:
+            audit_times = self._audit_locations(
+                self._location_generator(device_dirs))
+        for loop_time in audit_times:
             self.logger.timing_since('timing', loop_time)
             self.files_rate_limiter.wait()
             self.total_files_processed += 1
@@ -167,13 +176,15 @@ class AuditorWorker(object):
                         'brate': self.bytes_processed / (now - reported),
                         'total': (now - begin), 'audit': time_auditing,
                         'audit_rate': time_auditing / (now - begin)})
+                stats = {'errors': self.errors, 'passes': self.passes,
+                         'quarantined': self.quarantines,
+                         'bytes_processed': self.bytes_processed,
+                         'start_time': reported, 'audit_time': time_auditing}
+                if self.device_concurrency:
+                    stats['device_stats'] = self._device_rates(now - reported)
                 cache_entry = self.create_recon_nested_dict(
                     'object_auditor_stats_%s' % (self.auditor_type),
-                    device_dirs,
-                    {'errors': self.errors, 'passes': self.passes,
-                     'quarantined': self.quarantines,
-                     'bytes_processed': self.bytes_processed,
-                     'start_time': reported, 'audit_time': time_auditing})
+                    device_dirs, stats)
                 dump_recon_cache(cache_entry, self.rcache, self.logger)
                 reported = now
                 total_quarantines += self.quarantines
@@ -211,6 +222,129 @@ class AuditorWorker(object):
                 policy,
                 self.auditor_type)
 
+    def _location_generator(self, device_dirs, inode_order=False):
+        # get AuditLocations for each policy
+        loc_generators = []
+        for policy in POLICIES:
+            loc_generators.append(
+                self.diskfile_router[policy]
+                    .object_audit_location_generator(
+                        policy, device_dirs=device_dirs,
+                        auditor_type=self.auditor_type,
+                        inode_order=inode_order))
+        return round_robin_iter(loc_generators)
+
+    def _audit_locations(self, locations):
+        """
+        Audit each of the given locations in turn.
+
+        :param locations: an iterator of audit locations
+        :returns: an iterator of the time at which each audit started
+        """
+        for location in locations:
+            loop_time = time.time()
+            self.failsafe_object_audit(location)
+            yield loop_time
+
+    def _audit_devices(self, device_dirs):
+        """
+        Audit the objects on each device ``device_concurrency`` at a time,
+        with the devices audited concurrently.
+
+        :param device_dirs: the devices to audit, or None for all devices
+        :returns: an iterator of the time at which each audit started, which
+                  yields as audits complete
+        """
+        devices = device_dirs or listdir(self.devices)
+        concurrency = len(devices) * self.device_concurrency
+        # the thread pool's size can only change while it isn't running, so
+        # stop any threads left from a previous pass
+        tpool.killall()
+        tpool.set_num_threads(self.tpool_size or concurrency)
+        done = LightQueue(concurrency)
+        pool = ContextPool(concurrency)
+
+        def audit_device(device, locations, lock):
+            while True:
+                # the location generators are shared by a device's
+                # greenthreads; listing and sorting the hash dirs is done in
+                # eventlet's thread pool so it doesn't block the other audits
+                with lock:
+                    try:
+                        location = tpool.execute(next, locations, None)
+                    except (Exception, Timeout):
+                        self.logger.exception(
+                            'ERROR listing objects to audit on %s', device)
+                        location = None
+                if location is None:
+                    break
+                loop_time = time.time()
+                self.failsafe_object_audit(location)
+                done.put(loop_time)
+
+        def audit_all():
+            for device in devices:
+                locations = self._location_generator(
+                    [device], inode_order=True)
+                lock = Semaphore()
+                for _ in range(self.device_concurrency):
+                    pool.spawn(audit_device, device, locations, lock)
+            pool.waitall()
+            done.put(None)
+
+        audit_thread = spawn(audit_all)
+        try:
+            while True:
+                loop_time = done.get()
+                if loop_time is None:
+                    break
+                yield loop_time
+        finally:
+            # the caller may stop early, e.g. if it is killed
+            audit_thread.kill()
+            pool.close()
+
+    def _device_rates(self, elapsed):
+        """
+        Returns the files and bytes audited per second on each device since
+        the stats were last reported, and resets the counts.
+        """
+        elapsed = elapsed or 0.000001
+        rates = {}
+        for device, stats in self.device_stats.items():
+            rates[device] = {
+                'files_per_second': stats['files'] / elapsed,
+                'bytes_per_second': stats['bytes'] / elapsed}
+        self.device_stats.clear()
+        return rates
+
+    def _read_chunks(self, chunks):
+        # this is run in eventlet's thread pool, so the reads and the checks
+        # of what is read don't block the other audits
+        nbytes = 0
+        for chunk in chunks:
+            nbytes += len(chunk)
+            if nbytes >= self.checksum_batch_size:
+                break
+        return nbytes
+
+    def _read_in_thread_pool(self, reader):
+        """
+        Read all of an object's data in eventlet's thread pool,
+        ``checksum_batch_size`` bytes at a time.
+
+        :param reader: a DiskFileReader
+        :returns: an iterator of the number of bytes read in each batch
+        """
+        advise_sequential_read(reader._fp.fileno())
+        chunks = iter(reader)
+        while True:
+            nbytes = tpool.execute(self._read_chunks, chunks)
+            if nbytes:
+                yield nbytes
+            if nbytes < self.checksum_batch_size:
+                break
+
     def record_stats(self, obj_size):
         """
         Based on config's object_size_stats will keep track of how many objects
@@ -239,6 +373,27 @@ class AuditorWorker(object):
             self.errors += 1
             self.logger.exception('ERROR Trying to audit %s', location)
 
+    def _open_diskfile(self, df, quarantine_hook):
+        """
+        Opens the diskfile and validates its metadata.
+
+        :param df: the diskfile to audit
+        :param quarantine_hook: the reader's quarantine hook
+        :returns: a tuple of the diskfile's metadata and a reader of its data,
+                  or None if its data is not to be audited
+        """
+        reader = None
+        with df.open(modernize=True):
+            metadata = df.get_metadata()
+            if not df.validate_metadata():
+                df._quarantine(
+                    df._data_file,
+                    "Metadata failed validation")
+            obj_size = int(metadata['Content-Length'])
+            if obj_size and not self.zero_byte_only_at_fps:
+                reader = df.reader(_quarantine_hook=quarantine_hook)
+        return metadata, reader
+
     def object_audit(self, location):
         """
         Audits the given object location.
@@ -254,26 +409,30 @@ class AuditorWorker(object):
         # location does not exist; if this raises an unexpected error it
         # will get logged in failsafe
         df = diskfile_mgr.get_diskfile_from_audit_location(location)
-        reader = None
         try:
-            with df.open(modernize=True):
-                metadata = df.get_metadata()
-                if not df.validate_metadata():
-                    df._quarantine(
-                        df._data_file,
-                        "Metadata failed validation")
-                obj_size = int(metadata['Content-Length'])
-                if self.stats_sizes:
-                    self.record_stats(obj_size)
-                if obj_size and not self.zero_byte_only_at_fps:
-                    reader = df.reader(_quarantine_hook=raise_dfq)
+            if self.device_concurrency:
+                # opening the diskfile lists and reads from the disk, so do
+                # it in eventlet's thread pool like the reads of its data
+                metadata, reader = tpool.execute(
+                    self._open_diskfile, df, raise_dfq)
+            else:
+                metadata, reader = self._open_diskfile(df, raise_dfq)
+            # record_stats isn't thread safe, so it isn't called by
+            # _open_diskfile, which may run in the thread pool
+            if self.stats_sizes:
+                self.record_stats(int(metadata['Content-Length']))
             if reader:
+                if self.device_concurrency:
+                    chunk_lens = self._read_in_thread_pool(reader)
+                else:
+                    chunk_lens = (len(chunk) for chunk in reader)
                 with closing(reader):
-                    for chunk in reader:
-                        chunk_len = len(chunk)
+                    for chunk_len in chunk_lens:
                         self.bytes_rate_limiter.wait(incr_by=chunk_len)
                         self.bytes_processed += chunk_len
                         self.total_bytes_processed += chunk_len
+                        self.device_stats[location.device]['bytes'] += \
+                            chunk_len
             for watcher in self.watchers:
                 try:
                     watcher.see_object(
@@ -301,6 +460,7 @@ class AuditorWorker(object):
             pass
 
         self.passes += 1
+        self.device_stats[location.device]['files'] += 1
         # _ondisk_info attr is initialized to None and filled in by open
         ondisk_info_dict = df._ondisk_info or {}
         if 'unexpected' in ondisk_info_dict:
@@ -84,6 +84,12 @@ DEFAULT_RECLAIM_AGE = timedelta(weeks=1).total_seconds()
 DEFAULT_COMMIT_WINDOW = 60.0
 HASH_FILE = 'hashes.pkl'
 HASH_INVALIDATIONS_FILE = 'hashes.invalid'
+# each suffix's hash index is a file, not a dir, in the partition dir so
+# that partition walkers skip it like they skip hashes.pkl
+HASH_INDEX_PREFIX = 'hashes.index.'
+# hash dirs modified this recently are not indexed; a later change within
+# the same mtime tick would go unnoticed
+HASH_INDEX_MIN_AGE = 1.0
 METADATA_KEY = b'user.swift.metadata'
 METADATA_CHECKSUM_KEY = b'user.swift.metadata_checksum'
 DROP_CACHE_WINDOW = 1024 * 1024
@@ -471,6 +477,147 @@ def invalidate_hash(suffix_dir):
         inv_fh.write(suffix + b"\n")
 
 
+def _get_hash_index_file(suffix_dir):
+    partition_dir, suffix = os.path.split(suffix_dir)
+    return join(partition_dir, HASH_INDEX_PREFIX + suffix)
+
+
+def read_hash_index(suffix_dir):
+    """
+    Read the hash index of a suffix dir.
+
+    The hash index remembers, for each hash dir in the suffix, the updates
+    that the hash dir made to the suffix hash the last time it was hashed,
+    so unchanged hash dirs need not be listed and cleaned up again.
+
+    :param suffix_dir: absolute path to the suffix dir
+    :returns: a dict mapping hash dir names to tuples of (stat_key,
+              reclaim_timestamp, updates); empty if the index does not exist
+              or cannot be read
+    """
+    try:
+        with open(_get_hash_index_file(suffix_dir), 'rb') as index_fp:
+            index = pickle.load(index_fp)
+    except Exception:
+        # the index is only ever a hint, anything unreadable is as good as
+        # no index at all
+        return {}
+    if not isinstance(index, dict):
+        return {}
+    return index
+
+
+def write_hash_index(suffix_dir, index):
+    """
+    Write (or, if empty, remove) the hash index of a suffix dir.
+
+    The index is not fsync'd; a hash index lost in a crash only costs a
+    full rehash of the suffix.
+
+    :param suffix_dir: absolute path to the suffix dir
+    :param index: a dict as returned by :func:`read_hash_index`
+    """
+    index_file = _get_hash_index_file(suffix_dir)
+    if not index:
+        remove_file(index_file)
+        return
+    fd, tmppath = mkstemp(dir=dirname(index_file), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as index_fp:
+            pickle.dump(index, index_fp, PICKLE_PROTOCOL)
+        os.rename(tmppath, index_file)
+    except BaseException:
+        remove_file(tmppath)
+        raise
+
+
+def hash_tree_bucket(suffix, object_hash):
+    """
+    Returns the name of the suffix tree bucket that an object hash falls in.
+
+    Each suffix is split into 16 buckets by the first hex digit of the object
+    hashes in it; a bucket is named by its suffix followed by that digit.
+
+    :param suffix: a suffix
+    :param object_hash: the name of a hash dir in the suffix
+    """
+    return suffix + object_hash[:1]
+
+
+def hash_dir_digest(updates):
+    """
+    Returns an md5 hex digest of the updates that a hash dir made to its
+    suffix hash, which changes whenever the suffix hash would.
+
+    :param updates: a sequence of (key, update) tuples as recorded in the
+                    hash index
+    """
+    hasher = md5(usedforsecurity=False)
+    for key, update in updates:
+        if isinstance(update, bytes):
+            update = update.decode('utf-8')
+        hasher.update(('%s:%s\n' % (key, update)).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def hash_tree_bucket_digests(tree):
+    """
+    Returns a dict mapping each bucket of a suffix tree to an md5 hex digest
+    of the object hashes in the bucket and their digests.
+
+    :param tree: a dict as returned for a suffix by
+                 :meth:`BaseDiskFileManager.get_suffix_trees`
+    """
+    digests = {}
+    for bucket, leaves in tree.items():
+        hasher = md5(usedforsecurity=False)
+        for object_hash, digest in sorted(leaves.items()):
+            hasher.update(('%s %s\n' % (object_hash, digest)).encode('ascii'))
+        digests[bucket] = hasher.hexdigest()
+    return digests
+
+
+def _get_hash_dir_stat_key(hsh_path):
+    """
+    Returns a key that changes whenever a file is added to, removed from or
+    renamed within the hash dir, or None if the hash dir cannot be stat'd or
+    was modified too recently to tell for sure.
+    """
+    try:
+        st = os.stat(hsh_path)
+    except OSError:
+        return None
+    if time.time() - st.st_mtime < HASH_INDEX_MIN_AGE:
+        return None
+    return (st.st_ino, st.st_mtime)
+
+
+class _RecordingHasher(object):
+    def __init__(self, hasher, key, updates):
+        self.hasher = hasher
+        self.key = key
+        self.updates = updates
+
+    def update(self, s):
+        self.updates.append((self.key, s))
+        self.hasher.update(s)
+
+
+class _HashUpdateRecorder(object):
+    """
+    Stands in for a suffix's dict of hashers while a single hash dir is
+    hashed, passing updates through and keeping a list of (key, update) so
+    that they can be replayed from the hash index later.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self.updates = []
+
+    def __getitem__(self, key):
+        return _RecordingHasher(self.hashes[key], key, self.updates)
+
+
 def relink_paths(target_path, new_target_path, ignore_missing=True):
     """
     Hard-links a file located in ``target_path`` using the second path
@@ -549,9 +696,26 @@ class AuditLocation(object):
         return str(self.path)
 
 
+def _list_with_inodes(path):
+    """
+    List the entries of a directory along with their inode numbers, which on
+    most filesystems roughly follow where the inodes are on disk. The inode
+    numbers are those returned with the directory listing, so the entries
+    are not stat'ed.
+
+    :param path: the directory to list
+    :returns: a list of (inode number, path) tuples
+    """
+    if six.PY2:
+        # py2 has no os.scandir, so fall back to stat'ing each entry
+        return [(os.lstat(os.path.join(path, name)).st_ino,
+                 os.path.join(path, name)) for name in listdir(path)]
+    return [(entry.inode(), entry.path) for entry in os.scandir(path)]
+
+
 def object_audit_location_generator(devices, datadir, mount_check=True,
                                     logger=None, device_dirs=None,
-                                    auditor_type="ALL"):
+                                    auditor_type="ALL", inode_order=False):
     """
     Given a devices path (e.g. "/srv/node"), yield an AuditLocation for all
     objects stored under that directory for the given datadir (policy),
@@ -568,6 +732,9 @@ def object_audit_location_generator(devices, datadir, mount_check=True,
     :param logger: a logger object
     :param device_dirs: a list of directories under devices to traverse
     :param auditor_type: either ALL or ZBF
+    :param inode_order: if True, the objects in each partition are yielded in
+                        the order of their hash directories' inode numbers
+                        rather than suffix by suffix, to reduce seeking
     """
     if not device_dirs:
         device_dirs = listdir(devices)
@@ -603,9 +770,13 @@ def object_audit_location_generator(devices, datadir, mount_check=True,
                 if e.errno not in (errno.ENOTDIR, errno.ENODATA):
                     raise
                 continue
+            hsh_paths = []
             for asuffix in suffixes:
                 suff_path = os.path.join(part_path, asuffix)
                 try:
+                    if inode_order:
+                        hsh_paths.extend(_list_with_inodes(suff_path))
+                        continue
                     hashes = listdir(suff_path)
                 except OSError as e:
                     if e.errno not in (errno.ENOTDIR, errno.ENODATA):
@@ -613,8 +784,12 @@ def object_audit_location_generator(devices, datadir, mount_check=True,
                     continue
                 for hsh in hashes:
                     hsh_path = os.path.join(suff_path, hsh)
-                    yield AuditLocation(hsh_path, device, partition,
-                                        policy)
+                    yield AuditLocation(hsh_path, device, partition, policy)
+            # the hash dirs of all the partition's suffixes are audited in
+            # inode order
+            hsh_paths.sort()
+            for _inode, hsh_path in hsh_paths:
+                yield AuditLocation(hsh_path, device, partition, policy)
 
         update_auditor_status(datadir_path, logger, [], auditor_type)
 
@@ -1163,11 +1338,14 @@ class BaseDiskFileManager(object):
         """
         raise NotImplementedError
 
-    def _hash_suffix_dir(self, path, policy):
+    def _hash_suffix_dir(self, path, policy, hash_dir_updates=None):
         """
 
         :param path: full path to directory
         :param policy: storage policy used
+        :param hash_dir_updates: an optional dict that is updated to map
+                                 each hash dir to the (key, update) tuples it
+                                 contributed to the suffix hashes
         """
         if six.PY2:
             hashes = defaultdict(lambda: md5(usedforsecurity=False))
@@ -1189,10 +1367,27 @@ class BaseDiskFileManager(object):
             path_contents = sorted(os.listdir(path))
         except OSError as err:
             if err.errno in (errno.ENOTDIR, errno.ENOENT):
+                remove_file(_get_hash_index_file(path))
                 raise PathNotDir()
             raise
+        index = read_hash_index(path)
+        new_index = {}
         for hsh in path_contents:
             hsh_path = join(path, hsh)
+            stat_key = _get_hash_dir_stat_key(hsh_path)
+            indexed = index.get(hsh)
+            if stat_key and indexed and indexed[0] == stat_key and (
+                    indexed[1] is None or
+                    time.time() - indexed[1] <= self.reclaim_age):
+                # nothing changed in the hash dir and nothing in it has
+                # become reclaimable since it was last hashed
+                for key, update in indexed[2]:
+                    hashes[key].update(update)
+                new_index[hsh] = indexed
+                if hash_dir_updates is not None:
+                    hash_dir_updates[hsh] = indexed[2]
+                continue
+            recorder = _HashUpdateRecorder(hashes)
             try:
                 ondisk_info = self.cleanup_ondisk_files(
                     hsh_path, policy=policy)
@@ -1248,10 +1443,11 @@ class BaseDiskFileManager(object):
             for key in (k for k in ('meta_info', 'ts_info')
                         if k in ondisk_info):
                 info = ondisk_info[key]
-                hashes[None].update(info['timestamp'].internal + info['ext'])
+                recorder[None].update(
+                    info['timestamp'].internal + info['ext'])
 
             # delegate to subclass for data file related updates...
-            self._update_suffix_hashes(hashes, ondisk_info)
+            self._update_suffix_hashes(recorder, ondisk_info)
 
             if 'ctype_info' in ondisk_info:
                 # We have a distinct content-type timestamp so update the
@@ -1260,8 +1456,33 @@ class BaseDiskFileManager(object):
                 # the hash in future. There is no .ctype file so use _ctype to
                 # avoid any confusion.
                 info = ondisk_info['ctype_info']
-                hashes[None].update(info['ctype_timestamp'].internal
-                                    + '_ctype')
+                recorder[None].update(info['ctype_timestamp'].internal
+                                      + '_ctype')
+
+            if hash_dir_updates is not None:
+                hash_dir_updates[hsh] = tuple(recorder.updates)
+
+            # the hash dir may only be indexed if cleanup left it untouched;
+            # the index entry must be rechecked once any remaining file could
+            # be reclaimed
+            if stat_key and stat_key == _get_hash_dir_stat_key(hsh_path):
+                reclaim_timestamps = [
+                    info['timestamp']
+                    for info in ondisk_info.get('possible_reclaim', [])]
+                if 'ts_info' in ondisk_info:
+                    reclaim_timestamps.append(
+                        ondisk_info['ts_info']['timestamp'])
+                reclaim_timestamp = (float(min(reclaim_timestamps))
+                                     if reclaim_timestamps else None)
+                new_index[hsh] = (stat_key, reclaim_timestamp,
+                                  tuple(recorder.updates))
+
+        if new_index != index:
+            try:
+                write_hash_index(path, new_index)
+            except (OSError, IOError) as err:
+                self.logger.warning('Unable to write hash index for %s: %s',
+                                    path, err)
 
         try:
             os.rmdir(path)
@@ -1503,19 +1724,21 @@ class BaseDiskFileManager(object):
         clear_auditor_status(self.devices, datadir, auditor_type)
 
     def object_audit_location_generator(self, policy, device_dirs=None,
-                                        auditor_type="ALL"):
+                                        auditor_type="ALL", inode_order=False):
         """
         Yield an AuditLocation for all objects stored under device_dirs.
 
         :param policy: the StoragePolicy instance
         :param device_dirs: directory of target device
         :param auditor_type: either ALL or ZBF
+        :param inode_order: if True, yield each partition's objects in inode
+                            order
         """
         datadir = get_data_dir(policy)
         return object_audit_location_generator(self.devices, datadir,
                                                self.mount_check,
                                                self.logger, device_dirs,
-                                               auditor_type)
+                                               auditor_type, inode_order)
 
     def get_diskfile_from_audit_location(self, audit_location):
         """
@@ -1652,6 +1875,48 @@ class BaseDiskFileManager(object):
                 recalculate=suffixes)
         return hashes
 
+    def _get_suffix_trees(self, partition_path, suffixes, policy):
+        trees = {}
+        for suffix in suffixes:
+            hash_dir_updates = {}
+            try:
+                self._hash_suffix_dir(join(partition_path, suffix), policy,
+                                      hash_dir_updates=hash_dir_updates)
+            except PathNotDir:
+                pass
+            tree = trees[suffix] = {}
+            for hsh, updates in hash_dir_updates.items():
+                tree.setdefault(hash_tree_bucket(suffix, hsh), {})[hsh] = \
+                    hash_dir_digest(updates)
+        return trees
+
+    def get_suffix_trees(self, device, partition, suffixes, policy):
+        """
+        Returns the hash trees of the given suffixes, which narrow a
+        difference between suffix hashes down to the hash dirs that differ.
+
+        Each suffix is split into buckets (see :func:`hash_tree_bucket`) and
+        each hash dir in a bucket has a digest of the updates it makes to the
+        suffix hash (see :func:`hash_dir_digest`), so the hash index
+        usually spares listing unchanged hash dirs.
+
+        :param device: name of target device
+        :param partition: partition name
+        :param suffixes: a list of suffix directories
+        :param policy: the StoragePolicy instance
+        :returns: a dict mapping each suffix to a dict that maps bucket names
+                  to dicts of object hash to digest
+        """
+        dev_path = self.get_dev_path(device)
+        if not dev_path:
+            raise DiskFileDeviceUnavailable()
+        partition_path = get_part_path(dev_path, policy, partition)
+        suffixes = [suf for suf in suffixes or [] if valid_suffix(suf)]
+        if not os.path.exists(partition_path):
+            return dict((suffix, {}) for suffix in suffixes)
+        return tpool.execute(
+            self._get_suffix_trees, partition_path, suffixes, policy)
+
     def _listdir(self, path):
         """
         :param path: full path to directory
@@ -38,6 +38,9 @@ from swift.container.reconciler import direct_delete_container_entry
 
 MAX_OBJECTS_TO_CACHE = 100000
 ASYNC_DELETE_TYPE = 'application/async-deleted'
+TASK_ASSIGNMENT_OBJECT = 'object'
+TASK_ASSIGNMENT_CONTAINER = 'container'
+TASK_ASSIGNMENTS = (TASK_ASSIGNMENT_OBJECT, TASK_ASSIGNMENT_CONTAINER)
 
 
 def build_task_obj(timestamp, target_account, target_container,
@@ -146,6 +149,8 @@ class ObjectExpirer(Daemon):
         self.report_interval = float(conf.get('report_interval') or 300)
         self.report_first_time = self.report_last_time = time()
         self.report_objects = 0
+        self.report_backlog = 0
+        self.report_oldest_task = None
         self.recon_cache_path = conf.get('recon_cache_path',
                                          DEFAULT_RECON_CACHE_PATH)
         self.rcache = join(self.recon_cache_path, RECON_OBJECT_FILE)
@@ -176,6 +181,11 @@ class ObjectExpirer(Daemon):
 
         self.processes = int(self.conf.get('processes', 0))
         self.process = int(self.conf.get('process', 0))
+        self.task_assignment = self.conf.get(
+            'task_assignment', TASK_ASSIGNMENT_OBJECT).strip().lower()
+        if self.task_assignment not in TASK_ASSIGNMENTS:
+            raise ValueError('task_assignment must be one of %s' %
+                             ', '.join(TASK_ASSIGNMENTS))
 
     def report(self, final=False):
         """
@@ -190,8 +200,17 @@ class ObjectExpirer(Daemon):
             self.logger.info(
                 'Pass completed in %(time)ds; %(objects)d objects expired', {
                     'time': elapsed, 'objects': self.report_objects})
+            if self.report_oldest_task is None:
+                lag = 0
+            else:
+                lag = max(0, self.report_first_time -
+                          float(self.report_oldest_task))
             dump_recon_cache({'object_expiration_pass': elapsed,
-                              'expired_last_pass': self.report_objects},
+                              'expired_last_pass': self.report_objects,
+                              'object_expiration_backlog': {
+                                  str(self.process): {
+                                      'tasks': self.report_backlog,
+                                      'lag': lag}}},
                              self.rcache, self.logger)
         elif time() - self.report_last_time >= self.report_interval:
             elapsed = time() - self.report_first_time
@@ -266,6 +285,10 @@ class ObjectExpirer(Daemon):
         "my_index" is equal to the assigned index executes the task. Because
         each expirer have different "my_index", task objects are executed by
         only one expirer.
+
+        If task_assignment is ``container`` the assigned index is calculated
+        for each task container rather than for each task object, so that
+        each expirer only lists the task containers it is assigned.
         """
         if self.processes > 0:
             yield self.expiring_objects_account, self.process, self.processes
@@ -331,10 +354,15 @@ class ObjectExpirer(Daemon):
                     continue
 
                 # Only one expirer daemon assigned for one task
-                if self.hash_mod('%s/%s' % (task_container, task_object),
-                                 divisor) != my_index:
+                if divisor > 1 and self.hash_mod(
+                        '%s/%s' % (task_container, task_object),
+                        divisor) != my_index:
                     continue
 
+                self.report_backlog += 1
+                if self.report_oldest_task is None or \
+                        delete_timestamp < self.report_oldest_task:
+                    self.report_oldest_task = delete_timestamp
                 yield {'task_account': task_account,
                        'task_container': task_container,
                        'task_object': task_object,
@@ -379,6 +407,8 @@ class ObjectExpirer(Daemon):
         pool = GreenPool(self.concurrency)
         self.report_first_time = self.report_last_time = time()
         self.report_objects = 0
+        self.report_backlog = 0
+        self.report_oldest_task = None
         try:
             self.logger.debug('Run begin')
             for task_account, my_index, divisor in \
@@ -401,6 +431,15 @@ class ObjectExpirer(Daemon):
                 task_account_container_list = \
                     [(task_account, task_container) for task_container in
                      self.iter_task_containers_to_expire(task_account)]
+                if self.task_assignment == TASK_ASSIGNMENT_CONTAINER:
+                    # only list the task containers assigned to this expirer,
+                    # and all of the tasks in them
+                    task_account_container_list = [
+                        (task_account, task_container)
+                        for task_account, task_container in
+                        task_account_container_list
+                        if self.hash_mod(task_container, divisor) == my_index]
+                    my_index, divisor = 0, 1
 
                 # delete_task_iter is a generator to yield a dict of
                 # task_account, task_container, task_object, delete_timestamp,
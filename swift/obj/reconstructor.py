@@ -33,10 +33,11 @@ from swift.common.utils import (
     GreenAsyncPile, Timestamp, remove_file, node_to_string,
     load_recon_cache, parse_override_options, distribute_evenly,
     PrefixLoggerAdapter, remove_directory, config_request_node_count_value,
-    non_negative_int)
+    non_negative_int, config_positive_int_value)
 from swift.common.header_key_dict import HeaderKeyDict
 from swift.common.bufferedhttp import http_connect
 from swift.common.daemon import Daemon
+from swift.common.ec_pool import ECProcessPool
 from swift.common.recon import RECON_OBJECT_FILE, DEFAULT_RECON_CACHE_PATH
 from swift.common.ring.utils import is_local_device
 from swift.obj.ssync_sender import Sender as ssync_sender
@@ -205,6 +206,7 @@ class ObjectReconstructor(Daemon):
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
         self.node_timeout = float(conf.get('node_timeout', 10))
         self.network_chunk_size = int(conf.get('network_chunk_size', 65536))
+        self.ssync_version = int(conf.get('ssync_version', 1))
         self.disk_chunk_size = int(conf.get('disk_chunk_size', 65536))
         self.headers = {
             'Content-Length': '0',
@@ -248,6 +250,12 @@ class ObjectReconstructor(Daemon):
                 '1' if config_true_value(conf['write_legacy_ec_crc']) else '0'
         # else, assume operators know what they're doing and leave env alone
 
+        self.decode_batch_segments = config_positive_int_value(
+            conf.get('decode_batch_segments', 4))
+        decode_processes = non_negative_int(conf.get('decode_processes', 0))
+        self.decode_pool = ECProcessPool(decode_processes) \
+            if decode_processes else None
+
         self._df_router = DiskFileRouter(conf, self.logger)
         self.all_local_devices = self.get_local_devices()
         self.rings_mtime = None
@@ -705,10 +713,40 @@ class ObjectReconstructor(Daemon):
         return policy.pyeclib_driver.reconstruct(fragment_payload,
                                                  [frag_index])[0]
 
+    def _reconstruct_segments(self, policy, segments, frag_index):
+        """
+        Rebuild a fragment of each of a list of segments and emit decode
+        metrics for the policy.
+
+        :param policy: the storage policy of the object.
+        :param segments: a list of segments, each a list of fragments.
+        :param frag_index: the index of the fragment to rebuild.
+        :return: a list of the rebuilt fragments.
+        """
+        start = time.time()
+        if self.decode_pool:
+            rebuilt_fragments = self.decode_pool.reconstruct(
+                policy, segments, frag_index)
+        else:
+            rebuilt_fragments = [
+                self._reconstruct(policy, fragment_payload, frag_index)
+                for fragment_payload in segments]
+        self.logger.timing_since('decode.timing', start)
+        metric_prefix = 'decode.policy.%d.' % int(policy)
+        self.logger.update_stats(metric_prefix + 'segments',
+                                 len(rebuilt_fragments))
+        self.logger.update_stats(metric_prefix + 'bytes',
+                                 sum(len(frag) for frag in rebuilt_fragments))
+        return rebuilt_fragments
+
     def make_rebuilt_fragment_iter(self, responses, path, policy, frag_index):
         """
         Turn a set of connections from backend object servers into a generator
         that yields up the rebuilt fragment archive for frag_index.
+
+        Segments are read from the connections and rebuilt in batches of
+        ``decode_batch_segments``; the next batch is read while the rebuilt
+        fragments of the current batch are consumed.
         """
 
         def _get_one_fragment(resp):
@@ -722,11 +760,14 @@ class ObjectReconstructor(Daemon):
                 buff.append(chunk)
             return b''.join(buff)
 
-        def fragment_payload_iter():
+        def _get_segments():
+            # returns a list of up to decode_batch_segments segments, and
+            # whether the end of the responses has been reached
+            segments = []
             # We need a fragment from each connections, so best to
             # use a GreenPile to keep them ordered and in sync
             pile = GreenPile(len(responses))
-            while True:
+            while len(segments) < self.decode_batch_segments:
                 for resp in responses:
                     pile.spawn(_get_one_fragment, resp)
                 try:
@@ -740,12 +781,29 @@ class ObjectReconstructor(Daemon):
                          'policy': policy,
                          'frag_index': frag_index,
                          })
-                    break
+                    return segments, True
                 if not all(fragment_payload):
-                    break
-                rebuilt_fragment = self._reconstruct(
-                    policy, fragment_payload, frag_index)
-                yield rebuilt_fragment
+                    return segments, True
+                segments.append(fragment_payload)
+            return segments, False
+
+        def fragment_payload_iter():
+            reader = spawn(_get_segments)
+            try:
+                while True:
+                    segments, done = reader.wait()
+                    if not done:
+                        # read ahead while this batch is consumed
+                        reader = spawn(_get_segments)
+                    if segments:
+                        for rebuilt_fragment in \
+                                self._reconstruct_segments(
+                                    policy, segments, frag_index):
+                            yield rebuilt_fragment
+                    if done:
+                        break
+            finally:
+                reader.kill()
 
         return fragment_payload_iter()
 
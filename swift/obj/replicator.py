@@ -41,7 +41,8 @@ from swift.common.daemon import Daemon
 from swift.common.http import HTTP_OK, HTTP_INSUFFICIENT_STORAGE
 from swift.common.recon import RECON_OBJECT_FILE, DEFAULT_RECON_CACHE_PATH
 from swift.obj import ssync_sender
-from swift.obj.diskfile import get_data_dir, get_tmp_dir, DiskFileRouter
+from swift.obj.diskfile import get_data_dir, get_tmp_dir, DiskFileRouter, \
+    hash_tree_bucket_digests
 from swift.common.storage_policy import POLICIES, REPL_POLICY
 from swift.common.exceptions import PartitionLockTimeout
 
@@ -179,6 +180,11 @@ class ObjectReplicator(Daemon):
         self.node_timeout = float(conf.get('node_timeout', 10))
         self.sync_method = getattr(self, conf.get('sync_method') or 'rsync')
         self.network_chunk_size = int(conf.get('network_chunk_size', 65536))
+        self.ssync_version = int(conf.get('ssync_version', 1))
+        self.suffix_tree_sync = config_true_value(
+            conf.get('suffix_tree_sync', False))
+        self.suffix_tree_batch_size = int(
+            conf.get('suffix_tree_batch_size', 256))
         self.default_headers = {
             'Content-Length': '0',
             'user-agent': 'object-replicator %s' % os.getpid()}
@@ -476,9 +482,78 @@ class ObjectReplicator(Daemon):
                 conn.getresponse().read()
         return success, {}
 
-    def ssync(self, node, job, suffixes, remote_check_objs=None):
+    def ssync(self, node, job, suffixes, remote_check_objs=None,
+              object_hashes=None):
         return ssync_sender.Sender(
-            self, node, job, suffixes, remote_check_objs)()
+            self, node, job, suffixes, remote_check_objs,
+            object_hashes=object_hashes)()
+
+    def _replicate_tree(self, node, job, parts, tree, headers):
+        """
+        Fetch part of a remote node's suffix hash trees.
+
+        :param node: the remote node
+        :param job: information about the partition being synced
+        :param parts: the suffixes or buckets to fetch
+        :param tree: ``buckets`` or ``hashes``
+        :param headers: headers for the REPLICATE request
+        :returns: a dict as returned by the object server for the given tree,
+                  or None if the remote node does not support suffix trees
+        """
+        headers = dict(headers)
+        headers['X-Backend-Replicate-Tree'] = tree
+        with Timeout(self.http_timeout):
+            resp = http_connect(
+                node['replication_ip'], node['replication_port'],
+                node['device'], job['partition'], 'REPLICATE',
+                '/' + '-'.join(parts), headers=headers).getresponse()
+            body = resp.read()
+        if resp.status != HTTP_OK or \
+                resp.getheader('X-Backend-Replicate-Tree') != tree:
+            return None
+        return pickle.loads(body)
+
+    def _diff_suffix_trees(self, node, job, suffixes, headers):
+        """
+        Narrow down the suffixes whose hashes differ between this node and a
+        remote node to the local hash dirs that differ, by comparing suffix
+        hash trees bucket by bucket.
+
+        :param node: the remote node
+        :param job: information about the partition being synced
+        :param suffixes: the suffixes whose hashes differ
+        :param headers: headers for the REPLICATE requests
+        :returns: a set of object hashes, or None if the remote node does not
+                  support suffix trees
+        """
+        df_mgr = self._df_router[job['policy']]
+        local_trees = df_mgr.get_suffix_trees(
+            job['device'], job['partition'], suffixes, job['policy'])
+        remote_buckets = self._replicate_tree(
+            node, job, suffixes, 'buckets', headers)
+        if remote_buckets is None:
+            return None
+        buckets = []
+        for suffix, tree in local_trees.items():
+            local_digests = hash_tree_bucket_digests(tree)
+            remote_digests = remote_buckets.get(suffix) or {}
+            buckets.extend(bucket for bucket, digest in local_digests.items()
+                           if remote_digests.get(bucket) != digest)
+        object_hashes = set()
+        for i in range(0, len(buckets), self.suffix_tree_batch_size):
+            batch = buckets[i:i + self.suffix_tree_batch_size]
+            remote_hashes = self._replicate_tree(
+                node, job, batch, 'hashes', headers)
+            if remote_hashes is None:
+                return None
+            for bucket in batch:
+                remote_digests = remote_hashes.get(bucket) or {}
+                object_hashes.update(
+                    object_hash for object_hash, digest in
+                    local_trees[bucket[:-1]][bucket].items()
+                    if remote_digests.get(object_hash) != digest)
+        self.logger.update_stats('suffix.tree.buckets', len(buckets))
+        return object_hashes
 
     def check_ring(self, object_ring):
         """
@@ -713,8 +788,20 @@ class ObjectReplicator(Daemon):
                     if not suffixes:
                         stats.hashmatch += 1
                         continue
+                    sync_kwargs = {}
+                    if self.suffix_tree_sync and \
+                            self.conf.get('sync_method', 'rsync') == 'ssync':
+                        object_hashes = self._diff_suffix_trees(
+                            node, job, suffixes, headers)
+                        if object_hashes is not None:
+                            if not object_hashes:
+                                # only the remote has anything to sync
+                                stats.hashmatch += 1
+                                continue
+                            sync_kwargs['object_hashes'] = object_hashes
                     stats.rsync += 1
-                    success, _junk = self.sync(node, job, suffixes)
+                    success, _junk = self.sync(
+                        node, job, suffixes, **sync_kwargs)
                     if not success:
                         failure_devs_info.add((node['replication_ip'],
                                                node['device']))
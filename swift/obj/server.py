@@ -58,7 +58,8 @@ from swift.common.swob import HTTPAccepted, HTTPBadRequest, HTTPCreated, \
     HTTPClientDisconnect, HTTPMethodNotAllowed, Request, Response, \
     HTTPInsufficientStorage, HTTPForbidden, HTTPException, HTTPConflict, \
     HTTPServerError, bytes_to_wsgi, wsgi_to_bytes, wsgi_to_str, normalize_etag
-from swift.obj.diskfile import RESERVED_DATAFILE_META, DiskFileRouter
+from swift.obj.diskfile import RESERVED_DATAFILE_META, DiskFileRouter, \
+    hash_tree_bucket_digests
 from swift.obj.expirer import build_task_obj
 
 
@@ -1296,6 +1297,10 @@ class ObjectController(BaseStorageServer):
         device, partition, suffix_parts, policy = \
             get_name_and_placement(request, 2, 3, True)
         suffixes = suffix_parts.split('-') if suffix_parts else []
+        tree = request.headers.get('X-Backend-Replicate-Tree')
+        if tree is not None:
+            return self._replicate_tree(
+                request, device, partition, suffixes, policy, tree)
         try:
             hashes = self._diskfile_router[policy].get_hashes(
                 device, partition, suffixes, policy,
@@ -1307,6 +1312,39 @@ class ObjectController(BaseStorageServer):
             resp = Response(body=pickle.dumps(hashes, protocol=2))
         return resp
 
+    def _replicate_tree(self, request, device, partition, parts, policy,
+                        tree):
+        """
+        Handle a REPLICATE request for suffix hash trees.
+
+        With ``X-Backend-Replicate-Tree: buckets`` the path names suffixes
+        and the response maps each suffix to a dict of its bucket digests.
+        With ``X-Backend-Replicate-Tree: hashes`` the path names buckets and
+        the response maps each bucket to a dict of its object hash digests.
+        """
+        if tree == 'buckets':
+            suffixes = parts
+        elif tree == 'hashes':
+            suffixes = sorted(set(bucket[:-1] for bucket in parts))
+        else:
+            return HTTPBadRequest(body='Invalid X-Backend-Replicate-Tree %r'
+                                  % tree, request=request)
+        try:
+            trees = self._diskfile_router[policy].get_suffix_trees(
+                device, partition, suffixes, policy)
+        except DiskFileDeviceUnavailable:
+            return HTTPInsufficientStorage(drive=device, request=request)
+        if tree == 'buckets':
+            result = dict((suffix, hash_tree_bucket_digests(suffix_tree))
+                          for suffix, suffix_tree in trees.items())
+        else:
+            result = dict((bucket, trees.get(bucket[:-1], {}).get(bucket, {}))
+                          for bucket in parts)
+        # the tree is echoed so that the caller can tell this server
+        # understood the request
+        return Response(body=pickle.dumps(result, protocol=2),
+                        headers={'X-Backend-Replicate-Tree': tree})
+
     @public
     @replication
     @timing_stats(sample_rate=0.1)
@@ -1317,8 +1355,11 @@ class ObjectController(BaseStorageServer):
         # indicate to the sender that this object server has been upgraded to
         # understand the X-Backend-No-Commit header.
         headers = {'X-Backend-Accept-No-Commit': True}
-        return Response(app_iter=ssync_receiver.Receiver(self, request)(),
-                        headers=headers)
+        receiver = ssync_receiver.Receiver(self, request)
+        # the receiver agrees to the highest protocol version that both it
+        # and the sender understand
+        headers['X-Backend-Ssync-Version'] = receiver.ssync_version
+        return Response(app_iter=receiver(), headers=headers)
 
     def __call__(self, env, start_response):
         """WSGI Application entry point for the Swift Object Server."""
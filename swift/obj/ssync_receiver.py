@@ -14,6 +14,10 @@
 # limitations under the License.
 
 
+import binascii
+import os
+import struct
+
 import eventlet.greenio
 import eventlet.wsgi
 from eventlet import sleep
@@ -24,7 +28,19 @@ from swift.common import http
 from swift.common import swob
 from swift.common import utils
 from swift.common import request_helpers
+from swift.common.storage_policy import EC_POLICY
 from swift.common.utils import Timestamp
+from swift.obj.diskfile import get_part_path
+
+
+# the highest version of the ssync protocol understood by this receiver;
+# version 2 exchanges MISSING_CHECK entries in binary frames
+SSYNC_VERSION = 2
+# a version 2 MISSING_CHECK frame is a count of entries followed by that many
+# fixed width entries of (object hash, ts_data raw, ts_data offset, ts_meta
+# raw, ts_meta offset, ts_ctype raw, ts_ctype offset, durable)
+MISSING_CHECK_FRAME_HEADER = struct.Struct('!I')
+MISSING_CHECK_ENTRY = struct.Struct('!16sQQQQQQ?')
 
 
 class SsyncClientDisconnected(Exception):
@@ -70,6 +86,26 @@ def decode_missing(line):
     return result
 
 
+def unpack_missing(entry):
+    """
+    Parse a fixed width binary entry of the form generated by
+    :py:func:`~swift.obj.ssync_sender.pack_missing` and return a dict
+    with the same keys as :py:func:`decode_missing`.
+
+    The encoder for this entry is
+    :py:func:`~swift.obj.ssync_sender.pack_missing`
+    """
+    (hash_bytes, data_raw, data_offset, meta_raw, meta_offset, ctype_raw,
+     ctype_offset, durable) = MISSING_CHECK_ENTRY.unpack(entry)
+    return {
+        'object_hash': binascii.hexlify(hash_bytes).decode('ascii'),
+        'ts_data': Timestamp(0, delta=data_raw, offset=data_offset),
+        'ts_meta': Timestamp(0, delta=meta_raw, offset=meta_offset),
+        'ts_ctype': Timestamp(0, delta=ctype_raw, offset=ctype_offset),
+        'durable': durable,
+    }
+
+
 def encode_wanted(remote, local):
     """
     Compare a remote and local results and generate a wanted line.
@@ -256,6 +292,13 @@ class Receiver(object):
                 raise swob.HTTPBadRequest(
                     'Invalid X-Backend-Ssync-Frag-Index %r' %
                     self.request.headers['X-Backend-Ssync-Frag-Index'])
+        try:
+            self.ssync_version = min(int(self.request.headers.get(
+                'X-Backend-Ssync-Version', 1)), SSYNC_VERSION)
+        except ValueError:
+            raise swob.HTTPBadRequest(
+                'Invalid X-Backend-Ssync-Version %r' %
+                self.request.headers['X-Backend-Ssync-Version'])
         utils.validate_device_partition(self.device, self.partition)
         self.diskfile_mgr = self.app._diskfile_router[self.policy]
         if not self.diskfile_mgr.get_dev_path(self.device):
@@ -273,6 +316,19 @@ class Receiver(object):
                 raise exceptions.ChunkReadError('%s: %s' % (context, err))
             return line
 
+    def _read(self, size, context):
+        # read exactly size bytes from the wsgi input; annotate any timeout
+        # or read errors with a description of the calling context
+        with exceptions.MessageTimeout(
+                self.app.client_timeout, context):
+            try:
+                data = self.fp.read(size)
+            except (eventlet.wsgi.ChunkReadError, IOError) as err:
+                raise exceptions.ChunkReadError('%s: %s' % (context, err))
+        if len(data) != size:
+            raise SsyncClientDisconnected
+        return data
+
     def _check_local(self, remote, make_durable=True):
         """
         Parse local diskfile and return results of current
@@ -342,6 +398,87 @@ class Receiver(object):
         local = self._check_local(remote)
         return encode_wanted(remote, local)
 
+    def _list_suffix(self, suffix):
+        """
+        Return a dict mapping each object hash in a local suffix to the
+        timestamps of its representative files, in the form yielded by
+        the diskfile manager's ``yield_hashes``, or None if there is no
+        such local suffix.
+        """
+        suffix_path = os.path.join(get_part_path(
+            self.diskfile_mgr.get_dev_path(self.device), self.policy,
+            self.partition), suffix)
+        if not os.path.isdir(suffix_path):
+            return None
+        # an empty frag_prefs list yields the newest frag set whether or not
+        # it is durable, so that offers which might need a local frag to be
+        # made durable can be spotted
+        frag_prefs = [] if self.policy.policy_type == EC_POLICY else None
+        return dict(self.diskfile_mgr.yield_hashes(
+            self.device, self.partition, self.policy, [suffix],
+            frag_index=self.frag_index, frag_prefs=frag_prefs))
+
+    def _check_listed(self, remote, listing):
+        """
+        Compare an offered object with its entry in a local suffix listing,
+        falling back to :py:meth:`_check_local` for the cases in which the
+        listing alone cannot tell what is wanted.
+
+        :param remote: a dict in the form returned by
+                       :py:func:`unpack_missing`
+        :param listing: a dict, or None, in the form returned by
+                        :py:meth:`_list_suffix`
+        """
+        if listing is None:
+            return {}
+        listed = listing.get(remote['object_hash'])
+        if listed is None:
+            if self.policy.policy_type == EC_POLICY:
+                # there may be frags that are not listed for our frag_index
+                # which the remote offer would make durable
+                return self._check_local(remote)
+            return {}
+        if not listed.get('durable', True):
+            # the newest local frag is not durable
+            return self._check_local(remote)
+        local = {'ts_data': listed['ts_data']}
+        if 'ts_meta' in listed:
+            local['ts_meta'] = listed['ts_meta']
+            local['ts_ctype'] = listed.get('ts_ctype', listed['ts_data'])
+        elif remote['ts_meta'] > listed['ts_data']:
+            # a tombstone and a data file without a meta file are listed
+            # alike, but only the latter would want the offered meta
+            return self._check_local(remote)
+        return local
+
+    def _check_missing_frames(self):
+        """
+        Read version 2 MISSING_CHECK frames from the sender and compare
+        the offered objects with local suffix listings, yielding a wanted
+        line for each object that is not in sync.
+        """
+        suffix = listing = None
+        while True:
+            count, = MISSING_CHECK_FRAME_HEADER.unpack(self._read(
+                MISSING_CHECK_FRAME_HEADER.size, 'missing_check frame'))
+            if not count:
+                break
+            frame = self._read(count * MISSING_CHECK_ENTRY.size,
+                               'missing_check frame')
+            for offset in range(0, len(frame), MISSING_CHECK_ENTRY.size):
+                remote = unpack_missing(
+                    frame[offset:offset + MISSING_CHECK_ENTRY.size])
+                # the sender offers objects one suffix at a time so only
+                # the current suffix listing need be kept
+                if remote['object_hash'][-3:] != suffix:
+                    suffix = remote['object_hash'][-3:]
+                    listing = self._list_suffix(suffix)
+                want = encode_wanted(
+                    remote, self._check_listed(remote, listing))
+                if want:
+                    yield want
+            sleep()  # Gives a chance for other greenthreads to run
+
     def missing_check(self):
         """
         Handles the receiver-side of the MISSING_CHECK step of a
@@ -381,6 +518,14 @@ class Receiver(object):
         The collection and then response is so the sender doesn't
         have to read while it writes to ensure network buffers don't
         fill up and block everything.
+
+        When both the sender and receiver agree to version 2 of the protocol
+        (see the ``X-Backend-Ssync-Version`` header) the sender sends frames
+        of fixed width binary entries instead of `hash timestamp` lines,
+        followed by an empty frame. Each frame is a count of the entries
+        it contains followed by the entries, which are compared with a
+        listing of each local suffix rather than by opening a diskfile for
+        each offered object. The response is unchanged.
         """
         line = self._readline('missing_check start')
         if not line:
@@ -392,6 +537,8 @@ class Receiver(object):
                 % utils.cap_length(line, 1024))
         object_hashes = []
         nlines = 0
+        if self.ssync_version >= 2:
+            object_hashes.extend(self._check_missing_frames())
         while True:
             line = self._readline('missing_check line')
             if not line or line.strip() == b':MISSING_CHECK: END':
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+
 from eventlet import sleep
 import six
 from six.moves import urllib
@@ -22,6 +24,8 @@ from swift.common import exceptions
 from swift.common import http
 from swift.common import utils
 from swift.common.swob import wsgi_to_bytes
+from swift.obj.ssync_receiver import SSYNC_VERSION, \
+    MISSING_CHECK_FRAME_HEADER, MISSING_CHECK_ENTRY
 
 
 def encode_missing(object_hash, ts_data, ts_meta=None, ts_ctype=None,
@@ -58,6 +62,26 @@ def encode_missing(object_hash, ts_data, ts_meta=None, ts_ctype=None,
     return msg.encode('ascii')
 
 
+def pack_missing(object_hash, ts_data, ts_meta=None, ts_ctype=None,
+                 **kwargs):
+    """
+    Returns a fixed width binary entry representing the object hash, its
+    data file, metafile and content-type timestamps and its durability, for
+    use in version 2 MISSING_CHECK frames.
+
+    The decoder for this entry is
+    :py:func:`~swift.obj.ssync_receiver.unpack_missing`
+    """
+    ts_meta = ts_meta or ts_data
+    ts_ctype = ts_ctype or ts_data
+    return MISSING_CHECK_ENTRY.pack(
+        binascii.unhexlify(object_hash),
+        ts_data.raw, ts_data.offset,
+        ts_meta.raw, ts_meta.offset,
+        ts_ctype.raw, ts_ctype.offset,
+        kwargs.get('durable', True) is not False)
+
+
 def decode_wanted(parts):
     """
     Parse missing_check line parts to determine which parts of local
@@ -149,7 +173,8 @@ class Sender(object):
     """
 
     def __init__(self, daemon, node, job, suffixes, remote_check_objs=None,
-                 include_non_durable=False, max_objects=0):
+                 include_non_durable=False, max_objects=0,
+                 object_hashes=None):
         self.daemon = daemon
         self.df_mgr = self.daemon._df_router[job['policy']]
         self.node = node
@@ -158,9 +183,13 @@ class Sender(object):
         # When remote_check_objs is given in job, ssync_sender trys only to
         # make sure those objects exist or not in remote.
         self.remote_check_objs = remote_check_objs
+        # When object_hashes is given, only those objects in the suffixes are
+        # offered to the remote.
+        self.object_hashes = object_hashes
         self.include_non_durable = include_non_durable
         self.max_objects = max_objects
         self.limited_by_max_objects = False
+        self.ssync_version = min(self.daemon.ssync_version, SSYNC_VERSION)
 
     def __call__(self):
         """
@@ -262,6 +291,9 @@ class Sender(object):
                 connection.putheader('X-Backend-Ssync-Frag-Index', frag_index)
                 # Node-Index header is for backwards compat 2.4.0-2.20.0
                 connection.putheader('X-Backend-Ssync-Node-Index', frag_index)
+            if self.ssync_version > 1:
+                connection.putheader('X-Backend-Ssync-Version',
+                                     self.ssync_version)
             connection.endheaders()
         with exceptions.MessageTimeout(
                 self.daemon.node_timeout, 'connect receive'):
@@ -279,6 +311,11 @@ class Sender(object):
                     'ssync receiver %s does not accept non-durable fragments' %
                     node_addr)
                 self.include_non_durable = False
+            if self.ssync_version > 1:
+                # fall back to legacy behaviour if receiver does not agree to
+                # a newer protocol version
+                self.ssync_version = min(self.ssync_version, int(
+                    response.getheader('x-backend-ssync-version', 1)))
         return connection, response
 
     def missing_check(self, connection, response):
@@ -310,24 +347,17 @@ class Sender(object):
                 lambda objhash_timestamps:
                 objhash_timestamps[0] in
                 self.remote_check_objs, hash_gen)
-        nlines = 0
-        nbytes = 0
-        object_hash = None
-        for object_hash, timestamps in hash_gen:
-            available_map[object_hash] = timestamps
-            with exceptions.MessageTimeout(
-                    self.daemon.node_timeout,
-                    'missing_check send line: %d lines (%d bytes) sent'
-                    % (nlines, nbytes)):
-                msg = b'%s\r\n' % encode_missing(object_hash, **timestamps)
-                msg = b'%x\r\n%s\r\n' % (len(msg), msg)
-                connection.send(msg)
-            if nlines % 5 == 0:
-                sleep()  # Gives a chance for other greenthreads to run
-            nlines += 1
-            nbytes += len(msg)
-            if 0 < self.max_objects <= nlines:
-                break
+        if self.object_hashes is not None:
+            hash_gen = six.moves.filter(
+                lambda objhash_timestamps:
+                objhash_timestamps[0] in
+                self.object_hashes, hash_gen)
+        if self.ssync_version >= 2:
+            nlines, object_hash = self._send_missing_frames(
+                connection, hash_gen, available_map)
+        else:
+            nlines, object_hash = self._send_missing_lines(
+                connection, hash_gen, available_map)
         for _ in hash_gen:
             # only log truncation if there were more hashes to come...
             self.limited_by_max_objects = True
@@ -374,6 +404,73 @@ class Sender(object):
                 send_map[parts[0]] = decode_wanted(parts[1:])
         return available_map, send_map
 
+    def _send_missing_lines(self, connection, hash_gen, available_map):
+        """
+        Sends one MISSING_CHECK line per object yielded by hash_gen.
+
+        :returns: a tuple of (number of objects sent, last object hash sent)
+        """
+        nlines = 0
+        nbytes = 0
+        object_hash = None
+        for object_hash, timestamps in hash_gen:
+            available_map[object_hash] = timestamps
+            with exceptions.MessageTimeout(
+                    self.daemon.node_timeout,
+                    'missing_check send line: %d lines (%d bytes) sent'
+                    % (nlines, nbytes)):
+                msg = b'%s\r\n' % encode_missing(object_hash, **timestamps)
+                msg = b'%x\r\n%s\r\n' % (len(msg), msg)
+                connection.send(msg)
+            if nlines % 5 == 0:
+                sleep()  # Gives a chance for other greenthreads to run
+            nlines += 1
+            nbytes += len(msg)
+            if 0 < self.max_objects <= nlines:
+                break
+        return nlines, object_hash
+
+    def _send_missing_frames(self, connection, hash_gen, available_map):
+        """
+        Sends version 2 MISSING_CHECK frames, each holding the fixed width
+        entries of as many objects yielded by hash_gen as fit in
+        network_chunk_size, followed by an empty frame.
+
+        :returns: a tuple of (number of objects sent, last object hash sent)
+        """
+        frame_entries = max(
+            1, self.daemon.network_chunk_size // MISSING_CHECK_ENTRY.size)
+        nlines = 0
+        nbytes = 0
+        object_hash = None
+        entries = []
+
+        def send_frame():
+            msg = MISSING_CHECK_FRAME_HEADER.pack(len(entries)) + b''.join(
+                entries)
+            with exceptions.MessageTimeout(
+                    self.daemon.node_timeout,
+                    'missing_check send frame: %d lines (%d bytes) sent'
+                    % (nlines - len(entries), nbytes)):
+                connection.send(b'%x\r\n%s\r\n' % (len(msg), msg))
+            del entries[:]
+            sleep()  # Gives a chance for other greenthreads to run
+            return len(msg)
+
+        for object_hash, timestamps in hash_gen:
+            available_map[object_hash] = timestamps
+            entries.append(pack_missing(object_hash, **timestamps))
+            nlines += 1
+            if len(entries) >= frame_entries:
+                nbytes += send_frame()
+            if 0 < self.max_objects <= nlines:
+                break
+        if entries:
+            nbytes += send_frame()
+        # an empty frame marks the end of the frames
+        send_frame()
+        return nlines, object_hash
+
     def updates(self, connection, response, send_map):
         """
         Handles the sender-side of the UPDATES step of an SSYNC
@@ -16,13 +16,14 @@ from six.moves import queue
 
 import six.moves.cPickle as pickle
 import errno
+import json
 import os
 import signal
 import sys
 import time
 import uuid
 from random import random, shuffle
-from collections import deque
+from collections import deque, OrderedDict
 
 from eventlet import spawn, Timeout
 
@@ -34,9 +35,10 @@ from swift.common.utils import get_logger, renamer, write_pickle, \
     dump_recon_cache, config_true_value, RateLimitedIterator, split_path, \
     eventlet_monkey_patch, get_redirect_data, ContextPool, hash_path, \
     non_negative_float, config_positive_int_value, non_negative_int, \
-    EventletRateLimiter, node_to_string
+    EventletRateLimiter, node_to_string, Timestamp
 from swift.common.daemon import Daemon
 from swift.common.header_key_dict import HeaderKeyDict
+from swift.common.swob import wsgi_to_str
 from swift.common.storage_policy import split_policy_string, PolicyError
 from swift.common.recon import RECON_OBJECT_FILE, DEFAULT_RECON_CACHE_PATH
 from swift.obj.diskfile import get_tmp_dir, ASYNCDIR_BASE
@@ -297,6 +299,43 @@ def split_update_path(update):
     return acct, cont
 
 
+def make_update_record(update, policy):
+    """
+    Make the container object record that the container server would make
+    from an update's request.
+
+    :param update: the un-pickled update data
+    :param policy: storage policy of object update
+    :return: a dict suitable for the container server's ``UPDATE`` method,
+        or None if the update cannot be sent in a batch.
+    :raises ValueError: if a header in the update has an invalid value.
+    """
+    headers = HeaderKeyDict(update['headers'])
+    required = ['x-timestamp']
+    if update['op'] == 'PUT':
+        required.extend(['x-size', 'x-content-type', 'x-etag'])
+    elif update['op'] != 'DELETE':
+        return None
+    if any(headers.get(header) is None for header in required):
+        return None
+    timestamp = Timestamp(headers['x-timestamp']).internal
+    policy_index = int(headers.get('X-Backend-Storage-Policy-Index')
+                       or int(policy))
+    if update['op'] == 'DELETE':
+        return {'name': update['obj'], 'created_at': timestamp, 'size': 0,
+                'content_type': 'application/deleted', 'etag': 'noetag',
+                'deleted': 1, 'storage_policy_index': policy_index,
+                'ctype_timestamp': None, 'meta_timestamp': None}
+    return {'name': update['obj'], 'created_at': timestamp,
+            'size': int(headers['x-size']),
+            'content_type': wsgi_to_str(headers['x-content-type']),
+            'etag': wsgi_to_str(headers['x-etag']), 'deleted': 0,
+            'storage_policy_index': policy_index,
+            'ctype_timestamp': wsgi_to_str(
+                headers.get('x-content-type-timestamp')),
+            'meta_timestamp': wsgi_to_str(headers.get('x-meta-timestamp'))}
+
+
 class ObjectUpdater(Daemon):
     """Update object information in container listings."""
 
@@ -336,6 +375,10 @@ class ObjectUpdater(Daemon):
         self.stats = SweepStats()
         self.max_deferred_updates = non_negative_int(
             conf.get('max_deferred_updates', 10000))
+        self.update_batch_size = config_positive_int_value(
+            conf.get('update_batch_size', 1))
+        self.max_batched_updates = config_positive_int_value(
+            conf.get('max_batched_updates', 10000))
         self.begin = time.time()
 
     def _listdir(self, path):
@@ -560,9 +603,14 @@ class ObjectUpdater(Daemon):
             self.max_objects_per_container_per_second,
             max_deferred_elements=self.max_deferred_updates,
             drain_until=self.begin + self.interval)
+        if self.update_batch_size > 1:
+            ap_iter = self._batch_updates(ap_iter)
         with ContextPool(self.concurrency) as pool:
             for update_ctx in ap_iter:
-                pool.spawn(self.process_object_update, **update_ctx)
+                if self.update_batch_size > 1:
+                    pool.spawn(self.process_update_batch, update_ctx)
+                else:
+                    pool.spawn(self.process_object_update, **update_ctx)
                 now = time.time()
                 if now - last_status_update >= self.report_interval:
                     this_sweep = self.stats.since(start_stats)
@@ -648,30 +696,9 @@ class ObjectUpdater(Daemon):
                 self.logger.increment('successes')
                 self.logger.debug('Update sent for %(obj)s %(path)s',
                                   {'obj': obj, 'path': update_path})
-                self.stats.unlinks += 1
-                self.logger.increment('unlinks')
-                os.unlink(update_path)
-                try:
-                    # If this was the last async_pending in the directory,
-                    # then this will succeed. Otherwise, it'll fail, and
-                    # that's okay.
-                    os.rmdir(os.path.dirname(update_path))
-                except OSError:
-                    pass
+                self._unlink_update(update_path)
             elif redirects:
-                # erase any previous successes
-                update.pop('successes', None)
-                redirect = max(redirects, key=lambda x: x[-1])[0]
-                redirect_history = update.setdefault('redirect_history', [])
-                if redirect in redirect_history:
-                    # force next update to be sent to root, reset history
-                    update['container_path'] = None
-                    update['redirect_history'] = []
-                else:
-                    update['container_path'] = redirect
-                    redirect_history.append(redirect)
-                self.stats.redirects += 1
-                self.logger.increment("redirects")
+                redirect = self._redirect_update(update, redirects)
                 self.logger.debug(
                     'Update redirected for %(obj)s %(path)s to %(shard)s',
                     {'obj': obj, 'path': update_path,
@@ -696,7 +723,174 @@ class ObjectUpdater(Daemon):
             write_pickle(update, update_path, os.path.join(
                 device, get_tmp_dir(policy)))
 
-    def object_update(self, node, part, op, obj, headers_out):
+    def _redirect_update(self, update, redirects):
+        """
+        Point an update at the newest of the shards it was redirected to.
+
+        :param update: the un-pickled update data
+        :param redirects: a collection of tuples of (a path, a timestamp
+            string)
+        :return: the path of the newest redirect
+        """
+        # erase any previous successes
+        update.pop('successes', None)
+        redirect = max(redirects, key=lambda x: x[-1])[0]
+        redirect_history = update.setdefault('redirect_history', [])
+        if redirect in redirect_history:
+            # force next update to be sent to root, reset history
+            update['container_path'] = None
+            update['redirect_history'] = []
+        else:
+            update['container_path'] = redirect
+            redirect_history.append(redirect)
+        self.stats.redirects += 1
+        self.logger.increment("redirects")
+        return redirect
+
+    def _unlink_update(self, update_path):
+        self.stats.unlinks += 1
+        self.logger.increment('unlinks')
+        os.unlink(update_path)
+        try:
+            # If this was the last async_pending in the directory,
+            # then this will succeed. Otherwise, it'll fail, and
+            # that's okay.
+            os.rmdir(os.path.dirname(update_path))
+        except OSError:
+            pass
+
+    def _batch_updates(self, update_iter):
+        """
+        Group updates that are to be sent to the same container into batches
+        of up to ``update_batch_size`` updates. Batches are yielded when they
+        are full; once more than ``max_batched_updates`` updates are waiting
+        in batches, the oldest batch is yielded before it is full.
+
+        :param update_iter: an iterator of update contexts
+        :return: an iterator of lists of update contexts; updates that cannot
+            be batched are yielded in lists of their own.
+        """
+        batches = OrderedDict()
+        num_batched = 0
+        for update_ctx in update_iter:
+            try:
+                record = make_update_record(update_ctx['update'],
+                                            update_ctx['policy'])
+            except ValueError:
+                record = None
+            if record is None:
+                yield [update_ctx]
+                continue
+            update_ctx['record'] = record
+            key = split_update_path(update_ctx['update']) + (
+                record['storage_policy_index'],)
+            batch = batches.setdefault(key, [])
+            batch.append(update_ctx)
+            num_batched += 1
+            if len(batch) >= self.update_batch_size:
+                num_batched -= len(batch)
+                yield batches.pop(key)
+            elif num_batched > self.max_batched_updates:
+                batch = batches.popitem(last=False)[1]
+                num_batched -= len(batch)
+                yield batch
+        for batch in batches.values():
+            yield batch
+
+    def process_update_batch(self, batch, retry_redirects=True):
+        """
+        Send a batch of updates for the same container to each container
+        node in a single ``UPDATE`` request, which the container server merges
+        in one transaction.
+
+        Updates that the container server redirects to shards are retried
+        once in batches to the shards.
+
+        :param batch: a list of update contexts, as yielded by
+            :meth:`_batch_updates`
+        :param retry_redirects: if False, redirected updates are only
+            rewritten to be sent to their shards by a later sweep.
+        """
+        if len(batch) == 1:
+            return self.process_object_update(**batch[0])
+        acct, cont = split_update_path(batch[0]['update'])
+        part, nodes = self.get_container_ring().get_nodes(acct, cont)
+        path = '/%s/%s' % (acct, cont)
+        records = [update_ctx['record'] for update_ctx in batch]
+        headers_out = {
+            'X-Timestamp': min(r['created_at'] for r in records),
+            'X-Backend-Storage-Policy-Index':
+                str(records[0]['storage_policy_index']),
+            'X-Backend-Accept-Redirect': 'true',
+            'Content-Type': 'application/json',
+            'user-agent': 'object-updater %s' % os.getpid()}
+        successes = [update_ctx['update'].get('successes', [])
+                     for update_ctx in batch]
+        events = []
+        for node in nodes:
+            # don't resend updates that a node has already accepted
+            indexes = [i for i, node_ids in enumerate(successes)
+                       if node['id'] not in node_ids]
+            if not indexes:
+                continue
+            body = json.dumps([records[i] for i in indexes]).encode('ascii')
+            node_headers = dict(headers_out)
+            node_headers['Content-Length'] = str(len(body))
+            events.append((indexes, spawn(
+                self.object_update, node, part, 'UPDATE', path,
+                node_headers, body=body)))
+
+        new_successes = set()
+        failed = set()
+        redirects = {}
+        for indexes, event in events:
+            event_success, node_id, node_redirects = event.wait()
+            if event_success is not True:
+                failed.update(indexes)
+                continue
+            redirected = set()
+            for redirect_path, timestamp, rows in node_redirects:
+                for row in rows:
+                    redirects.setdefault(indexes[row], set()).add(
+                        (redirect_path, timestamp))
+                    redirected.add(indexes[row])
+            for i in indexes:
+                if i not in redirected:
+                    successes[i].append(node_id)
+                    new_successes.add(i)
+        self.logger.debug('Update batch of %(count)d sent for %(path)s, '
+                          '%(failed)d failed, %(redirected)d redirected',
+                          {'count': len(batch), 'path': path,
+                           'failed': len(failed),
+                           'redirected': len(redirects)})
+
+        retries = OrderedDict()
+        for i, update_ctx in enumerate(batch):
+            update = update_ctx['update']
+            update_path = update_ctx['update_path']
+            if i in redirects:
+                self._redirect_update(update, redirects[i])
+                retries.setdefault(
+                    split_update_path(update), []).append(update_ctx)
+            elif i not in failed:
+                self.stats.successes += 1
+                self.logger.increment('successes')
+                self._unlink_update(update_path)
+                continue
+            else:
+                self.stats.failures += 1
+                self.logger.increment('failures')
+                if i not in new_successes:
+                    continue
+                update['successes'] = successes[i]
+            write_pickle(update, update_path, os.path.join(
+                update_ctx['device'], get_tmp_dir(update_ctx['policy'])))
+
+        if retry_redirects:
+            for retry_batch in retries.values():
+                self.process_update_batch(retry_batch, retry_redirects=False)
+
+    def object_update(self, node, part, op, obj, headers_out, body=None):
         """
         Perform the object update to the container
 
@@ -705,10 +899,13 @@ class ObjectUpdater(Daemon):
         :param op: operation performed (ex: 'PUT' or 'DELETE')
         :param obj: object name being updated
         :param headers_out: headers to send with the update
+        :param body: optional request body to send with the update
         :return: a tuple of (``success``, ``node_id``, ``redirect``)
             where ``success`` is True if the update succeeded, ``node_id`` is
             the_id of the node updated and ``redirect`` is either None or a
-            tuple of (a path, a timestamp string).
+            tuple of (a path, a timestamp string). For an ``UPDATE``,
+            ``redirect`` is instead a list of tuples of (a path, a timestamp
+            string, a list of indexes of the batch's records).
         """
         redirect = None
         start = time.time()
@@ -720,9 +917,12 @@ class ObjectUpdater(Daemon):
                     node['replication_ip'], node['replication_port'],
                     node['device'], part, op, obj, headers_out)
             with Timeout(self.node_timeout):
+                if body:
+                    conn.send(body)
                 resp = conn.getresponse()
-                resp.read()
+                resp_body = resp.read()
             status = resp.status
+            success = is_success(status)
 
             if status == HTTP_MOVED_PERMANENTLY:
                 try:
@@ -731,8 +931,15 @@ class ObjectUpdater(Daemon):
                     self.logger.error(
                         'Container update failed for %r; problem with '
                         'redirect location: %s' % (obj, err))
-
-            success = is_success(status)
+            elif op == 'UPDATE' and success:
+                try:
+                    redirect = [
+                        (r['path'], r['timestamp'], r['rows'])
+                        for r in json.loads(resp_body)['redirects']]
+                except (ValueError, TypeError, KeyError):
+                    # the container server did not route the records to
+                    # shards, so they were all merged
+                    redirect = []
             if not success:
                 self.logger.debug(
                     'Error code %(status)d is returned from remote '
@@ -33,6 +33,7 @@ import inspect
 import itertools
 import operator
 import random
+from collections import OrderedDict
 from copy import deepcopy
 from sys import exc_info
 
@@ -71,6 +72,12 @@ DEFAULT_RECHECK_ACCOUNT_EXISTENCE = 60  # seconds
 DEFAULT_RECHECK_CONTAINER_EXISTENCE = 60  # seconds
 DEFAULT_RECHECK_UPDATING_SHARD_RANGES = 3600  # seconds
 DEFAULT_RECHECK_LISTING_SHARD_RANGES = 600  # seconds
+DEFAULT_WORKER_INFO_CACHE_TTL = 5  # seconds
+#: Fraction by which the lifetime of each WorkerInfoCache entry is randomly
+#: varied.
+WORKER_INFO_CACHE_JITTER = 0.1
+#: Max number of containers that a proxy-server worker remembers as sharded.
+SHARDED_CONTAINERS_MAXSIZE = 10000
 
 
 def update_headers(response, headers):
@@ -413,8 +420,8 @@ def _record_ac_info_cache_metrics(
 
     :param  app: the application object
     :param  cache_state: the state of this cache operation, includes
-                infocache_hit, memcache hit, miss, error, skip, force_skip
-                and disabled.
+                infocache_hit, worker_cache_hit, worker_cache_miss, memcache
+                hit, miss, error, skip, force_skip and disabled.
     :param  container: the container name
     :param  resp: the response from either backend or cache hit.
     """
@@ -429,7 +436,8 @@ def _record_ac_info_cache_metrics(
         record_cache_op_metrics(logger, server_type, 'info', cache_state, resp)
 
 
-def get_container_info(env, app, swift_source=None, cache_only=False):
+def get_container_info(env, app, swift_source=None, cache_only=False,
+                       prefetch_keys=()):
     """
     Get the info structure for a container, based on env and app.
     This is useful to middlewares.
@@ -440,6 +448,12 @@ def get_container_info(env, app, swift_source=None, cache_only=False):
                          middleware. Will be logged in proxy logs.
     :param cache_only: If true, indicates that caller doesn't want to HEAD the
                        backend container when cache miss.
+    :param prefetch_keys: memcache keys of the container's cached namespaces
+                          that the caller will look up next if the container
+                          is sharded; if the info is read from memcache and
+                          the worker last saw the container sharding or
+                          sharded, these are read in the same round trip. See
+                          :func:`get_namespaces_from_cache`.
     :returns: the object info
 
     .. note::
@@ -465,9 +479,17 @@ def get_container_info(env, app, swift_source=None, cache_only=False):
         proxy_app = app._pipeline_final_app
     except AttributeError:
         logged_app = proxy_app = app
+    sharded_containers = getattr(proxy_app, 'sharded_containers', None)
+    if not isinstance(sharded_containers, ShardedContainers):
+        sharded_containers = None
+    cache_key = get_cache_key(account, container)
+    if sharded_containers is None or cache_key not in sharded_containers:
+        # most containers are not sharded, so don't make memcache look for
+        # namespaces that are not there
+        prefetch_keys = ()
     # Check in environment cache and in memcache (in that order)
     info, cache_state = _get_info_from_caches(
-        proxy_app, env, account, container)
+        proxy_app, env, account, container, prefetch_keys)
 
     resp = None
     if not info and not cache_only:
@@ -523,6 +545,8 @@ def get_container_info(env, app, swift_source=None, cache_only=False):
 
     if info.get('sharding_state') is None:
         info['sharding_state'] = 'unsharded'
+    if sharded_containers is not None and is_success(info['status']):
+        sharded_containers.update(cache_key, info)
 
     versions_cont = info.get('sysmeta', {}).get('versions-container', '')
     if versions_cont:
@@ -599,7 +623,9 @@ def get_account_info(env, app, swift_source=None):
             info = set_info_cache(env, account, None, resp)
 
     if info:
-        info = info.copy()  # avoid mutating what's in swift.infocache
+        # avoid mutating what's in swift.infocache, which may also be in the
+        # worker's info cache
+        info = deepcopy(info)
     else:
         info = headers_to_account_info({}, 503)
 
@@ -664,6 +690,134 @@ def get_cache_key(account, container=None, obj=None, shard=None):
     return cache_key
 
 
+class WorkerInfoCache(object):
+    """
+    A bounded cache of account and container info that is shared by all of
+    the requests handled by a proxy-server worker. It is checked after a
+    request's ``swift.infocache`` and before memcache, so that hot accounts
+    and containers do not cost a memcache round trip on every request.
+
+    Entries are evicted in least recently used order once there are
+    ``maxsize`` of them, and expire after ``ttl`` seconds, randomly varied by
+    up to :data:`WORKER_INFO_CACHE_JITTER` so that entries cached at the same
+    time do not all expire at once, but never outlive the time for which the
+    info is cached in memcache. As with memcache, info for accounts or
+    containers that were not found is cached for a tenth of the ``ttl``.
+
+    Entries are only invalidated in the worker that clears them; other
+    workers may return stale info until their entries expire.
+
+    Cached info is not copied. Like the info in a request's
+    ``swift.infocache``, it must not be mutated; :func:`get_account_info` and
+    :func:`get_container_info` return copies of it.
+
+    :param maxsize: the maximum number of entries.
+    :param ttl: the lifetime of each entry, in seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, cache_key):
+        """
+        :returns: the cached info, or None if there is no unexpired entry for
+            ``cache_key``.
+        """
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at <= time.time():
+            return None
+        # re-insert as the most recently used
+        self._entries[cache_key] = entry
+        return info
+
+    def set(self, cache_key, info, max_ttl=None):
+        """
+        Cache info.
+
+        :param cache_key: the info's cache key.
+        :param info: the info, which must not be mutated once it is cached.
+        :param max_ttl: the time for which the info is cached in memcache, if
+            that is less than the ``ttl``.
+        """
+        ttl = self.ttl
+        if info.get('status') in (HTTP_NOT_FOUND, HTTP_GONE):
+            ttl *= 0.1
+        ttl *= 1 + random.uniform(-WORKER_INFO_CACHE_JITTER,
+                                  WORKER_INFO_CACHE_JITTER)
+        if max_ttl is not None:
+            ttl = min(ttl, max_ttl)
+        self._entries.pop(cache_key, None)
+        while len(self._entries) >= self.maxsize:
+            self._entries.popitem(last=False)
+        self._entries[cache_key] = (time.time() + ttl, info)
+
+    def delete(self, cache_key):
+        self._entries.pop(cache_key, None)
+
+
+class ShardedContainers(object):
+    """
+    A bounded record of the containers that a proxy-server worker has most
+    recently seen to be sharding or sharded, which are the only containers
+    whose cached namespaces are worth reading along with their info.
+
+    :param maxsize: the maximum number of containers to remember.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, cache_key):
+        return cache_key in self._keys
+
+    def update(self, cache_key, info):
+        """
+        Remember or forget a container according to its info.
+
+        :param cache_key: the container's info cache key.
+        :param info: the container's info.
+        """
+        self._keys.pop(cache_key, None)
+        if info.get('sharding_state') in ('sharding', 'sharded'):
+            while len(self._keys) >= self.maxsize:
+                self._keys.popitem(last=False)
+            self._keys[cache_key] = True
+
+
+def _get_worker_info_cache(env, app=None):
+    """
+    Get the proxy-server worker's :class:`WorkerInfoCache`, if it has one.
+
+    :param env: the WSGI request environment
+    :param app: the application object, which is used to find the proxy-server
+                app if the request has not yet reached it
+    :returns: a :class:`WorkerInfoCache`, or None
+    """
+    cache = env.get('swift.worker_infocache')
+    if cache is None and app is not None:
+        try:
+            cache = app._pipeline_final_app.worker_info_cache
+        except AttributeError:
+            pass
+        if not isinstance(cache, WorkerInfoCache):
+            # e.g. an app that is not the proxy-server
+            return None
+        env['swift.worker_infocache'] = cache
+    return cache
+
+
 def set_info_cache(env, account, container, resp):
     """
     Cache info in both memcache and env.
@@ -705,6 +859,9 @@ def set_info_cache(env, account, container, resp):
         info = headers_to_account_info(resp.headers, resp.status_int)
     if memcache:
         memcache.set(cache_key, info, time=cache_time)
+    worker_infocache = _get_worker_info_cache(env)
+    if worker_infocache is not None:
+        worker_infocache.set(cache_key, info, cache_time)
     infocache[cache_key] = info
     return info
 
@@ -739,7 +896,7 @@ def set_object_info_cache(app, env, account, container, obj, resp):
 
 def clear_info_cache(env, account, container=None, shard=None):
     """
-    Clear the cached info in both memcache and env
+    Clear the cached info in memcache, env and the worker's info cache
 
     :param  env: the WSGI request environment
     :param  account: the account name
@@ -752,6 +909,9 @@ def clear_info_cache(env, account, container=None, shard=None):
     infocache = env.setdefault('swift.infocache', {})
     memcache = cache_from_env(env, True)
     infocache.pop(cache_key, None)
+    worker_infocache = _get_worker_info_cache(env)
+    if worker_infocache is not None:
+        worker_infocache.delete(cache_key)
     if memcache:
         memcache.delete(cache_key)
 
@@ -783,14 +943,19 @@ def record_cache_op_metrics(
     :param  op_type: the name of the operation type, includes 'shard_listing',
               'shard_updating', and etc.
     :param  cache_state: the state of this cache operation. When it's
-              'infocache_hit' or memcache 'hit', expect it succeeded and 'resp'
-              will be None; for all other cases like memcache 'miss' or 'skip'
+              'infocache_hit', 'worker_cache_hit' or memcache 'hit', expect it
+              succeeded and 'resp' will be None; 'worker_cache_miss' is
+              recorded in addition to the state of the memcache look-up that
+              follows it; for all other cases like memcache 'miss' or 'skip'
               which will make to backend, expect a valid 'resp'.
     :param  resp: the response from backend for all cases except cache hits.
     """
     server_type = server_type.lower()
     if cache_state == 'infocache_hit':
         logger.increment('%s.%s.infocache.hit' % (server_type, op_type))
+    elif cache_state in ('worker_cache_hit', 'worker_cache_miss'):
+        logger.increment('%s.%s.worker_cache.%s' % (
+            server_type, op_type, cache_state[len('worker_cache_'):]))
     elif cache_state == 'hit':
         # memcache hits.
         logger.increment('%s.%s.cache.hit' % (server_type, op_type))
@@ -807,7 +972,37 @@ def record_cache_op_metrics(
                 server_type, op_type, cache_state))
 
 
-def _get_info_from_memcache(app, env, account, container=None):
+def _get_info_cache_params(app, container=None):
+    """
+    Get the proxy-server's settings for caching account or container info.
+
+    :param  app: the application object
+    :param  container: the container name
+    :returns: a tuple of (the chance that cached info is skipped, the time
+      for which found info is cached in memcache)
+    """
+    try:
+        proxy_app = app._pipeline_final_app
+    except AttributeError:
+        # Only the middleware entry-points get a reference to the
+        # proxy-server app; if a middleware composes itself as multiple
+        # filters, we'll just have to choose a reasonable default
+        if container:
+            return 0.0, DEFAULT_RECHECK_CONTAINER_EXISTENCE
+        return 0.0, DEFAULT_RECHECK_ACCOUNT_EXISTENCE
+    # apps other than the proxy-server, e.g. in middleware tests, may only
+    # set the skip chances
+    if container:
+        return (proxy_app.container_existence_skip_cache,
+                getattr(proxy_app, 'recheck_container_existence',
+                        DEFAULT_RECHECK_CONTAINER_EXISTENCE))
+    return (proxy_app.account_existence_skip_cache,
+            getattr(proxy_app, 'recheck_account_existence',
+                    DEFAULT_RECHECK_ACCOUNT_EXISTENCE))
+
+
+def _get_info_from_memcache(app, env, account, container=None,
+                            prefetch_keys=(), skip_chance=None):
     """
     Get cached account or container information from memcache
 
@@ -815,6 +1010,10 @@ def _get_info_from_memcache(app, env, account, container=None):
     :param  env: the environment used by the current request
     :param  account: the account name
     :param  container: the container name
+    :param  prefetch_keys: other keys to read from memcache in the same round
+      trip; their values are kept in ``swift.memcache_prefetch`` in env.
+    :param  skip_chance: the chance that memcache is skipped; defaults to the
+      proxy-server's ``*_existence_skip_cache``.
 
     :returns: a tuple of two values, the first is a dictionary of cached info
       on cache hit, None on miss or if memcache is not in use; the second is
@@ -824,23 +1023,25 @@ def _get_info_from_memcache(app, env, account, container=None):
     if not memcache:
         return None, 'disabled'
 
-    try:
-        proxy_app = app._pipeline_final_app
-    except AttributeError:
-        # Only the middleware entry-points get a reference to the
-        # proxy-server app; if a middleware composes itself as multiple
-        # filters, we'll just have to choose a reasonable default
-        skip_chance = 0.0
-    else:
-        if container:
-            skip_chance = proxy_app.container_existence_skip_cache
-        else:
-            skip_chance = proxy_app.account_existence_skip_cache
+    if skip_chance is None:
+        skip_chance = _get_info_cache_params(app, container)[0]
 
     cache_key = get_cache_key(account, container)
     if skip_chance and random.random() < skip_chance:
         info = None
         cache_state = 'skip'
+    elif prefetch_keys:
+        try:
+            values = memcache.get_many([cache_key] + list(prefetch_keys),
+                                       raise_on_error=True)
+        except MemcacheConnectionError:
+            # let each look-up handle its own errors
+            info = memcache.get(cache_key)
+        else:
+            info = values[0]
+            env.setdefault('swift.memcache_prefetch', {}).update(
+                zip(prefetch_keys, values[1:]))
+        cache_state = 'hit' if info else 'miss'
     else:
         info = memcache.get(cache_key)
         cache_state = 'hit' if info else 'miss'
@@ -870,28 +1071,53 @@ def _get_info_from_memcache(app, env, account, container=None):
     return info, cache_state
 
 
-def _get_info_from_caches(app, env, account, container=None):
+def _get_info_from_caches(app, env, account, container=None,
+                          prefetch_keys=()):
     """
-    Get the cached info from env or memcache (if used) in that order.
-    Used for both account and container info.
+    Get the cached info from env, the worker's info cache or memcache (if
+    used) in that order. Used for both account and container info.
 
     :param  app: the application object
     :param  env: the environment used by the current request
+    :param  prefetch_keys: other keys to read from memcache in the same round
+      trip, if the info is read from memcache.
     :returns: a tuple of (the cached info or None if not cached, cache state)
     """
 
     info = _get_info_from_infocache(env, account, container)
     if info:
-        cache_state = 'infocache_hit'
-    else:
-        info, cache_state = _get_info_from_memcache(
-            app, env, account, container)
+        return info, 'infocache_hit'
+    worker_infocache = _get_worker_info_cache(env, app)
+    if worker_infocache is None:
+        return _get_info_from_memcache(
+            app, env, account, container, prefetch_keys)
+
+    skip_chance, cache_time = _get_info_cache_params(app, container)
+    if skip_chance and random.random() < skip_chance:
+        # skip both caches, as if the worker's info cache were not there
+        if not cache_from_env(env, True):
+            return None, 'disabled'
+        return None, 'skip'
+    cache_key = get_cache_key(account, container)
+    info = worker_infocache.get(cache_key)
+    if info:
+        env.setdefault('swift.infocache', {})[cache_key] = info
+        return info, 'worker_cache_hit'
+    _record_ac_info_cache_metrics(app, 'worker_cache_miss', container)
+    info, cache_state = _get_info_from_memcache(
+        app, env, account, container, prefetch_keys, skip_chance=0.0)
+    if info:
+        if info.get('status') in (HTTP_NOT_FOUND, HTTP_GONE):
+            cache_time *= 0.1
+        worker_infocache.set(cache_key, info, cache_time)
     return info, cache_state
 
 
 def get_namespaces_from_cache(req, cache_key, skip_chance):
     """
-    Get cached namespaces from infocache or memcache.
+    Get cached namespaces from infocache or memcache. Namespaces that were
+    read from memcache along with the container info (see
+    :func:`get_container_info`) do not need another memcache look-up.
 
     :param req: a :class:`swift.common.swob.Request` object.
     :param cache_key: the cache key for both infocache and memcache.
@@ -913,12 +1139,17 @@ def get_namespaces_from_cache(req, cache_key, skip_chance):
         return None, 'disabled'
     if skip_chance and random.random() < skip_chance:
         return None, 'skip'
-    try:
-        bounds = memcache.get(cache_key, raise_on_error=True)
+    prefetched = req.environ.get('swift.memcache_prefetch', {})
+    if cache_key in prefetched:
+        bounds = prefetched.pop(cache_key)
         cache_state = 'hit' if bounds else 'miss'
-    except MemcacheConnectionError:
-        bounds = None
-        cache_state = 'error'
+    else:
+        try:
+            bounds = memcache.get(cache_key, raise_on_error=True)
+            cache_state = 'hit' if bounds else 'miss'
+        except MemcacheConnectionError:
+            bounds = None
+            cache_state = 'error'
 
     if bounds:
         if six.PY2:
@@ -1543,6 +1774,7 @@ class GetOrHeadHandler(GetterBase):
         req_headers = dict(self.backend_headers)
         ip, port = get_ip_port(node, req_headers)
         start_node_timing = time.time()
+        self.app.start_node_request(node)
         try:
             with ConnectionTimeout(self.app.conn_timeout):
                 conn = http_connect(
@@ -1557,11 +1789,19 @@ class GetOrHeadHandler(GetterBase):
                 # See NOTE: swift_conn at top of file about this.
                 possible_source.swift_conn = conn
         except (Exception, Timeout):
+            self.app.end_node_request(node, time.time() - start_node_timing)
             self.app.exception_occurred(
                 node, self.server_type,
                 'Trying to %(method)s %(path)s' %
                 {'method': self.req.method, 'path': self.req.path})
             return False
+        latency = time.time() - start_node_timing
+        if is_good_source(possible_source.status, self.server_type):
+            self.app.end_node_request(
+                node, latency, self.server_type, self.policy)
+        else:
+            # only the latencies of successful responses are sampled
+            self.app.end_node_request(node, latency)
 
         src_headers = dict(
             (k.lower(), v) for k, v in
@@ -1649,8 +1889,8 @@ class GetOrHeadHandler(GetterBase):
         for node in nodes:
             pile.spawn(self._make_node_request, node,
                        self.logger.thread_locals)
-            _timeout = self.app.get_policy_options(
-                self.policy).concurrency_timeout \
+            _timeout = self.app.get_concurrency_timeout(
+                self.server_type, self.policy) \
                 if pile.inflight < self.concurrency else None
             if pile.waitfirst(_timeout):
                 break
@@ -308,10 +308,17 @@ class ContainerController(Controller):
         # This is an object listing but the backend may be sharded.
         # Only lookup container info from cache and skip the backend HEAD,
         # since we are going to GET the backend container anyway.
-        info = get_container_info(
-            req.environ, self.app, swift_source=None, cache_only=True)
         memcache = cache_from_env(req.environ, True)
         cache_enabled = self.app.recheck_listing_shard_ranges > 0 and memcache
+        prefetch_keys = []
+        if cache_enabled and \
+                not config_true_value(req.headers.get('x-newest', False)):
+            # if the container is sharded its namespaces may be cached too
+            prefetch_keys.append(get_cache_key(
+                self.account_name, self.container_name, shard='listing'))
+        info = get_container_info(
+            req.environ, self.app, swift_source=None, cache_only=True,
+            prefetch_keys=prefetch_keys)
         resp = namespaces = None
         if cache_enabled:
             # if the container is sharded we may look for namespaces in cache
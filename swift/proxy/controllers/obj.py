@@ -2013,14 +2013,13 @@ class MIMEPutter(Putter):
                    mime_boundary, multiphase=need_multiphase)
 
 
-def chunk_transformer(policy):
+def chunk_segmenter(segment_size):
     """
-    A generator to transform a source chunk to erasure coded chunks for each
-    `send` call. The number of erasure coded chunks is as
-    policy.ec_n_unique_fragments.
+    A generator to split source chunks into segments for each `send` call.
+    Each call returns a list of the segments that were completed by the
+    chunk. An empty chunk indicates end-of-input, and returns a list of any
+    leftover bytes.
     """
-    segment_size = policy.ec_segment_size
-
     buf = collections.deque()
     total_buf_len = 0
 
@@ -2028,51 +2027,96 @@ def chunk_transformer(policy):
     while chunk:
         buf.append(chunk)
         total_buf_len += len(chunk)
-        if total_buf_len >= segment_size:
-            chunks_to_encode = []
-            # extract as many chunks as we can from the input buffer
-            while total_buf_len >= segment_size:
-                to_take = segment_size
-                pieces = []
-                while to_take > 0:
-                    piece = buf.popleft()
-                    if len(piece) > to_take:
-                        buf.appendleft(piece[to_take:])
-                        piece = piece[:to_take]
-                    pieces.append(piece)
-                    to_take -= len(piece)
-                    total_buf_len -= len(piece)
-                chunks_to_encode.append(b''.join(pieces))
-
-            frags_by_byte_order = []
-            for chunk_to_encode in chunks_to_encode:
-                frags_by_byte_order.append(
-                    policy.pyeclib_driver.encode(chunk_to_encode))
-            # Sequential calls to encode() have given us a list that
-            # looks like this:
-            #
-            # [[frag_A1, frag_B1, frag_C1, ...],
-            #  [frag_A2, frag_B2, frag_C2, ...], ...]
-            #
-            # What we need is a list like this:
-            #
-            # [(frag_A1 + frag_A2 + ...),  # destined for node A
-            #  (frag_B1 + frag_B2 + ...),  # destined for node B
-            #  (frag_C1 + frag_C2 + ...),  # destined for node C
-            #  ...]
-            obj_data = [b''.join(frags)
-                        for frags in zip(*frags_by_byte_order)]
-            chunk = yield obj_data
+        segments = []
+        # extract as many segments as we can from the input buffer
+        while total_buf_len >= segment_size:
+            to_take = segment_size
+            pieces = []
+            while to_take > 0:
+                piece = buf.popleft()
+                if len(piece) > to_take:
+                    buf.appendleft(piece[to_take:])
+                    piece = piece[:to_take]
+                pieces.append(piece)
+                to_take -= len(piece)
+                total_buf_len -= len(piece)
+            segments.append(b''.join(pieces))
+        chunk = yield segments
+
+    # Now we've gotten an empty chunk, which indicates end-of-input.
+    last_bytes = b''.join(buf)
+    yield [last_bytes] if last_bytes else []
+
+
+def encode_segments(policy, segments, encode_pool=None):
+    """
+    Erasure code a list of segments.
+
+    :param policy: an EC storage policy.
+    :param segments: a list of segments.
+    :param encode_pool: an optional
+        :class:`~swift.common.ec_pool.ECProcessPool` to encode the segments
+        in; by default they are encoded inline.
+    :return: a list of the policy.ec_n_unique_fragments erasure coded chunks,
+        each the concatenation of the fragments of every segment that are
+        destined for one node.
+    """
+    if encode_pool:
+        frags_by_byte_order = encode_pool.encode(policy, segments)
+    else:
+        frags_by_byte_order = [policy.pyeclib_driver.encode(segment)
+                               for segment in segments]
+    # Sequential calls to encode() have given us a list that
+    # looks like this:
+    #
+    # [[frag_A1, frag_B1, frag_C1, ...],
+    #  [frag_A2, frag_B2, frag_C2, ...], ...]
+    #
+    # What we need is a list like this:
+    #
+    # [(frag_A1 + frag_A2 + ...),  # destined for node A
+    #  (frag_B1 + frag_B2 + ...),  # destined for node B
+    #  (frag_C1 + frag_C2 + ...),  # destined for node C
+    #  ...]
+    return [b''.join(frags) for frags in zip(*frags_by_byte_order)]
+
+
+def chunk_transformer(policy, logger=None, encode_pool=None):
+    """
+    A generator to transform a source chunk to erasure coded chunks for each
+    `send` call. The number of erasure coded chunks is as
+    policy.ec_n_unique_fragments.
+
+    If a logger is given, the time spent encoding and the number of bytes
+    encoded are emitted as per-policy metrics. If an encode_pool is given,
+    the segments are encoded in its worker processes.
+    """
+    segmenter = chunk_segmenter(policy.ec_segment_size)
+    segmenter.send(None)
+
+    def encode(segments):
+        start = time.time()
+        backend_chunks = encode_segments(policy, segments, encode_pool)
+        if logger:
+            metric_prefix = 'object.policy.%d.encode.' % int(policy)
+            logger.timing_since(metric_prefix + 'timing', start)
+            logger.update_stats(metric_prefix + 'bytes',
+                                sum(len(segment) for segment in segments))
+        return backend_chunks
+
+    chunk = yield
+    while chunk:
+        segments = segmenter.send(chunk)
+        if segments:
+            chunk = yield encode(segments)
         else:
             # didn't have enough data to encode
             chunk = yield None
 
-    # Now we've gotten an empty chunk, which indicates end-of-input.
     # Take any leftover bytes and encode them.
-    last_bytes = b''.join(buf)
-    if last_bytes:
-        last_frags = policy.pyeclib_driver.encode(last_bytes)
-        yield last_frags
+    last_segments = segmenter.send(b'')
+    if last_segments:
+        yield encode(last_segments)
     else:
         yield [b''] * policy.ec_n_unique_fragments
 
@@ -2629,6 +2673,7 @@ class ECFragGetter(GetterBase):
         ip, port = get_ip_port(node, req_headers)
         req_headers.update(self.header_provider())
         start_node_timing = time.time()
+        self.app.start_node_request(node)
         try:
             with ConnectionTimeout(self.app.conn_timeout):
                 conn = http_connect(
@@ -2643,11 +2688,18 @@ class ECFragGetter(GetterBase):
                 # See NOTE: swift_conn at top of file about this.
                 possible_source.swift_conn = conn
         except (Exception, Timeout):
+            self.app.end_node_request(node, time.time() - start_node_timing)
             self.app.exception_occurred(
                 node, 'Object',
                 'Trying to %(method)s %(path)s' %
                 {'method': self.req.method, 'path': self.req.path})
             return None
+        latency = time.time() - start_node_timing
+        if is_good_source(possible_source.status, server_type='Object'):
+            self.app.end_node_request(node, latency, 'Object', self.policy)
+        else:
+            # only the latencies of successful responses are sampled
+            self.app.end_node_request(node, latency)
 
         src_headers = dict(
             (k.lower(), v) for k, v in
@@ -2809,8 +2861,8 @@ class ECObjectController(BaseObjectController):
 
     def feed_remaining_primaries(self, safe_iter, pile, req, partition, policy,
                                  buckets, feeder_q, logger_thread_locals):
-        timeout = self.app.get_policy_options(policy).concurrency_timeout
         while True:
+            timeout = self.app.get_concurrency_timeout('Object', policy)
             try:
                 feeder_q.get(timeout=timeout)
             except Empty:
@@ -3121,7 +3173,8 @@ class ECObjectController(BaseObjectController):
         This method was added in the PUT method extraction change
         """
         bytes_transferred = 0
-        chunk_transform = chunk_transformer(policy)
+        chunk_transform = chunk_transformer(
+            policy, self.logger, self.app.ec_encode_pool)
         chunk_transform.send(None)
         frag_hashers = collections.defaultdict(
             lambda: md5(usedforsecurity=False))
@@ -31,19 +31,26 @@ from swift.common import constraints
 from swift.common.http import is_server_error, HTTP_INSUFFICIENT_STORAGE
 from swift.common.storage_policy import POLICIES
 from swift.common.ring import Ring
-from swift.common.error_limiter import ErrorLimiter
+from swift.common.ec_pool import ECProcessPool
+from swift.common.error_limiter import ErrorLimiter, SharedErrorLimiter, \
+    SharedNodeTable
+from swift.common.latency_tracker import LatencyTracker
 from swift.common.utils import Watchdog, get_logger, \
     get_remote_client, split_path, config_true_value, generate_trans_id, \
     affinity_key_function, affinity_locality_predicate, list_from_csv, \
     parse_prefixed_conf, config_auto_int_value, node_to_string, \
-    config_request_node_count_value, config_percent_value, cap_length
+    config_request_node_count_value, config_percent_value, cap_length, \
+    non_negative_float, non_negative_int
 from swift.common.registry import register_swift_info
 from swift.common.constraints import check_utf8, valid_api_version
 from swift.proxy.controllers import AccountController, ContainerController, \
     ObjectControllerRouter, InfoController
-from swift.proxy.controllers.base import get_container_info, \
+from swift.proxy.controllers.base import get_container_info, get_cache_key, \
     DEFAULT_RECHECK_CONTAINER_EXISTENCE, DEFAULT_RECHECK_ACCOUNT_EXISTENCE, \
-    DEFAULT_RECHECK_UPDATING_SHARD_RANGES, DEFAULT_RECHECK_LISTING_SHARD_RANGES
+    DEFAULT_RECHECK_UPDATING_SHARD_RANGES, \
+    DEFAULT_RECHECK_LISTING_SHARD_RANGES, DEFAULT_WORKER_INFO_CACHE_TTL, \
+    SHARDED_CONTAINERS_MAXSIZE, ShardedContainers, \
+    WorkerInfoCache
 from swift.common.swob import HTTPBadRequest, HTTPForbidden, \
     HTTPMethodNotAllowed, HTTPNotFound, HTTPPreconditionFailed, \
     HTTPServerError, HTTPException, Request, HTTPServiceUnavailable, \
@@ -92,7 +99,7 @@ def _label_for_policy(policy):
     return '(default)'
 
 
-VALID_SORTING_METHODS = ('shuffle', 'timing', 'affinity')
+VALID_SORTING_METHODS = ('shuffle', 'timing', 'affinity', 'latency')
 
 
 class ProxyOverrideOptions(object):
@@ -155,6 +162,13 @@ class ProxyOverrideOptions(object):
         self.concurrent_gets = config_true_value(get('concurrent_gets', False))
         self.concurrency_timeout = float(get(
             'concurrency_timeout', app.conn_timeout))
+        self.concurrency_timeout_percentile = float(get(
+            'concurrency_timeout_percentile', 0))
+        if not 0 <= self.concurrency_timeout_percentile <= 100:
+            raise ValueError(
+                'Invalid concurrency_timeout_percentile value; must be '
+                'between 0 and 100, not %r' %
+                self.concurrency_timeout_percentile)
         self.concurrent_ec_extra_requests = int(get(
             'concurrent_ec_extra_requests', 0))
 
@@ -170,6 +184,7 @@ class ProxyOverrideOptions(object):
                     'rebalance_missing_suppression_count',
                     'concurrent_gets',
                     'concurrency_timeout',
+                    'concurrency_timeout_percentile',
                     'concurrent_ec_extra_requests',
                 )))
 
@@ -185,6 +200,7 @@ class ProxyOverrideOptions(object):
             'rebalance_missing_suppression_count',
             'concurrent_gets',
             'concurrency_timeout',
+            'concurrency_timeout_percentile',
             'concurrent_ec_extra_requests',
         ))
 
@@ -216,14 +232,32 @@ class Application(object):
         self.client_timeout = float(conf.get('client_timeout', 60))
         self.object_chunk_size = int(conf.get('object_chunk_size', 65536))
         self.client_chunk_size = int(conf.get('client_chunk_size', 65536))
+        ec_encode_processes = non_negative_int(
+            conf.get('ec_encode_processes', 0))
+        self.ec_encode_pool = ECProcessPool(ec_encode_processes) \
+            if ec_encode_processes else None
         self.trans_id_suffix = conf.get('trans_id_suffix', '')
         self.post_quorum_timeout = float(conf.get('post_quorum_timeout', 0.5))
         error_suppression_interval = \
             float(conf.get('error_suppression_interval', 60))
         error_suppression_limit = \
             int(conf.get('error_suppression_limit', 10))
-        self.error_limiter = ErrorLimiter(error_suppression_interval,
-                                          error_suppression_limit)
+        self.shared_node_stats = config_true_value(
+            conf.get('shared_node_stats', 'false'))
+        if self.shared_node_stats:
+            # the tables are normally made by global_conf_callback before
+            # workers are forked; without them, stats are only shared by the
+            # greenthreads of this process
+            error_table, timing_table = \
+                conf.get('shared_node_stats_tables') or \
+                make_shared_node_stats_tables(conf)
+            self.error_limiter = SharedErrorLimiter(
+                error_suppression_interval, error_suppression_limit,
+                error_table)
+        else:
+            timing_table = {}
+            self.error_limiter = ErrorLimiter(error_suppression_interval,
+                                              error_suppression_limit)
         self.recheck_container_existence = \
             int(conf.get('recheck_container_existence',
                          DEFAULT_RECHECK_CONTAINER_EXISTENCE))
@@ -246,6 +280,15 @@ class Application(object):
                 'container_listing_shard_ranges_skip_cache_pct', 0))
         self.account_existence_skip_cache = config_percent_value(
             conf.get('account_existence_skip_cache_pct', 0))
+        worker_info_cache_size = int(conf.get('worker_info_cache_size', 0))
+        if worker_info_cache_size > 0:
+            self.worker_info_cache = WorkerInfoCache(
+                worker_info_cache_size,
+                non_negative_float(conf.get('worker_info_cache_ttl',
+                                            DEFAULT_WORKER_INFO_CACHE_TTL)))
+        else:
+            self.worker_info_cache = None
+        self.sharded_containers = ShardedContainers(SHARDED_CONTAINERS_MAXSIZE)
         self.allow_account_management = \
             config_true_value(conf.get('allow_account_management', 'no'))
         self.container_ring = container_ring or Ring(swift_dir,
@@ -288,7 +331,7 @@ class Application(object):
             conf.get('strict_cors_mode', 't'))
         self.allow_open_expired = config_true_value(
             conf.get('allow_open_expired', 'f'))
-        self.node_timings = {}
+        self.node_timings = timing_table
         self.timing_expiry = int(conf.get('timing_expiry', 300))
         value = conf.get('request_node_count', '2 * replicas')
         self.request_node_count = config_request_node_count_value(value)
@@ -342,6 +385,10 @@ class Application(object):
         self._override_options = self._load_per_policy_config(conf)
         self.sorts_by_timing = any(pc.sorting_method == 'timing'
                                    for pc in self._override_options.values())
+        self.latency_tracker = LatencyTracker(self.timing_expiry)
+        self.tracks_latency = any(
+            pc.sorting_method == 'latency' or pc.concurrency_timeout_percentile
+            for pc in self._override_options.values())
 
         register_swift_info(
             version=swift_version,
@@ -455,7 +502,15 @@ class Application(object):
         if account and not valid_api_version(version):
             raise APIVersionError('Invalid path')
         if obj and container and account:
-            info = get_container_info(req.environ, self)
+            prefetch_keys = []
+            if self.recheck_updating_shard_ranges and \
+                    req.method in ('PUT', 'POST', 'DELETE'):
+                # if the container is sharded the object update may need its
+                # cached updating namespaces, so read them along with its info
+                prefetch_keys.append(get_cache_key(
+                    account, container, shard='updating'))
+            info = get_container_info(req.environ, self,
+                                      prefetch_keys=prefetch_keys)
             if is_server_error(info.get('status')):
                 raise HTTPServiceUnavailable(request=req)
             policy_index = req.headers.get('X-Backend-Storage-Policy-Index',
@@ -488,6 +543,8 @@ class Application(object):
         :param start_response: WSGI callable
         """
         try:
+            if self.worker_info_cache is not None:
+                env['swift.worker_infocache'] = self.worker_info_cache
             req = self.update_request(Request(env))
             return self.handle_request(req)(env, start_response)
         except UnicodeError:
@@ -613,7 +670,10 @@ class Application(object):
         Sorts nodes in-place (and returns the sorted list) according to
         the configured strategy. The default "sorting" is to randomly
         shuffle the nodes. If the "timing" strategy is chosen, the nodes
-        are sorted according to the stored timing data.
+        are sorted according to the stored timing data. If the "latency"
+        strategy is chosen, the nodes are ordered by picking the better of
+        two random nodes according to their average latency and the number
+        of requests in flight to them.
 
         :param nodes: a list of nodes
         :param policy: an instance of :class:`BaseStoragePolicy`
@@ -632,6 +692,8 @@ class Application(object):
             nodes.sort(key=key_func)
         elif policy_options.sorting_method == 'affinity':
             nodes.sort(key=policy_options.read_affinity_sort_key)
+        elif policy_options.sorting_method == 'latency':
+            nodes[:] = self.latency_tracker.order(nodes)
         return nodes
 
     def set_node_timing(self, node, timing):
@@ -641,6 +703,52 @@ class Application(object):
         timing = round(timing, 3)  # sort timings to the millisecond
         self.node_timings[node['ip']] = (timing, now + self.timing_expiry)
 
+    def start_node_request(self, node):
+        """
+        Record that a backend request has been started to a node.
+
+        :param node: dictionary of the node the request is sent to
+        """
+        if self.tracks_latency:
+            self.latency_tracker.start_request(node)
+
+    def end_node_request(self, node, latency, server_type=None, policy=None):
+        """
+        Record that a backend request to a node has finished.
+
+        :param node: dictionary of the node the request was sent to
+        :param latency: the time, in seconds, until the response headers were
+                        received or the request failed
+        :param server_type: the type of server, e.g. 'Object', that gave a
+                            successful response; None if the request failed.
+                            Only successful responses are sampled for
+                            concurrency_timeout_percentile.
+        :param policy: an instance of :class:`BaseStoragePolicy`
+        """
+        if self.tracks_latency:
+            sample_key = None if server_type is None else (server_type, policy)
+            self.latency_tracker.end_request(node, latency, sample_key)
+
+    def get_concurrency_timeout(self, server_type, policy=None):
+        """
+        Get how long to wait for a backend response before sending another
+        concurrent request. If concurrency_timeout_percentile is set, this is
+        that percentile of the recent latencies of successful responses from
+        the same server type and policy, capped at concurrency_timeout.
+
+        :param server_type: the type of server, e.g. 'Object'
+        :param policy: an instance of :class:`BaseStoragePolicy`
+        """
+        policy_options = self.get_policy_options(policy)
+        timeout = policy_options.concurrency_timeout
+        if policy_options.concurrency_timeout_percentile:
+            latency = self.latency_tracker.percentile(
+                policy_options.concurrency_timeout_percentile,
+                (server_type, policy))
+            if latency is not None:
+                timeout = min(timeout, latency)
+        return timeout
+
     def error_limited(self, node):
         """
         Check if the node is currently error limited.
@@ -807,6 +915,38 @@ def parse_per_policy_config(conf):
     return parse_prefixed_conf(conf['__file__'], policy_section_prefix)
 
 
+def make_shared_node_stats_tables(conf):
+    """
+    Make the shared memory tables in which error limiting stats and node
+    timings are kept when ``shared_node_stats`` is enabled.
+
+    :param conf: the proxy server conf dict
+    :return: a list of the error stats table and the node timings table
+    """
+    size = int(conf.get('shared_node_stats_size', 8192))
+    return [SharedNodeTable(size, 2), SharedNodeTable(size, 2)]
+
+
+def global_conf_callback(preloaded_app_conf, global_conf):
+    """
+    Callback for swift.common.wsgi.run_wsgi during the global_conf
+    creation so that we can add the shared memory tables in which all
+    workers keep error limiting stats and node timings.
+
+    :param preloaded_app_conf: The preloaded conf for the WSGI app.
+                               This conf instance will go away, so
+                               just read from it, don't write.
+    :param global_conf: The global conf that will eventually be
+                        passed to the app_factory function later.
+                        This conf is created before the worker
+                        subprocesses are forked, so can be useful to
+                        set up semaphores, shared memory, etc.
+    """
+    if config_true_value(preloaded_app_conf.get('shared_node_stats')):
+        global_conf['shared_node_stats_tables'] = \
+            make_shared_node_stats_tables(preloaded_app_conf)
+
+
 def app_factory(global_conf, **local_conf):
     """paste.deploy app factory for creating WSGI proxy apps."""
     conf = global_conf.copy()
@@ -31,10 +31,12 @@ class WARN_DEPRECATED(Exception):
 
 class FakeStatsdClient(statsd_client.StatsdClient):
     def __init__(self, host, port, base_prefix='', tail_prefix='',
-                 default_sample_rate=1, sample_rate_factor=1, logger=None):
+                 default_sample_rate=1, sample_rate_factor=1, logger=None,
+                 flush_interval=0,
+                 max_packet_size=statsd_client.DEFAULT_MAX_PACKET_SIZE):
         super(FakeStatsdClient, self).__init__(
             host, port, base_prefix, tail_prefix, default_sample_rate,
-            sample_rate_factor, logger)
+            sample_rate_factor, logger, flush_interval, max_packet_size)
         self.clear()
 
         # Capture then call parent pubic stat functions
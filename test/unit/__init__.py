@@ -428,6 +428,13 @@ class FakeMemcache(object):
                 raise MemcacheConnectionError()
         return self.store.get(key)
 
+    @track
+    def get_many(self, keys, raise_on_error=False):
+        if self.error_on_get and self.error_on_get.pop(0):
+            if raise_on_error:
+                raise MemcacheConnectionError()
+        return [self.store.get(key) for key in keys]
+
     @property
     def keys(self):
         return self.store.keys
@@ -449,6 +456,9 @@ class FakeMemcache(object):
     def incr(self, key, delta=1, time=0):
         if self.error_on_incr:
             raise MemcacheConnectionError('Memcache restarting')
+        return self._incr(key, delta)
+
+    def _incr(self, key, delta):
         if self.init_incr_return_neg:
             # simulate initial hit, force reset of memcache
             self.init_incr_return_neg = False
@@ -458,6 +468,13 @@ class FakeMemcache(object):
             self.store[key] = 0
         return self.store[key]
 
+    @track
+    def incr_many(self, deltas, time=0):
+        if self.error_on_incr:
+            return {}
+        return dict((key, self._incr(key, delta))
+                    for key, delta in deltas.items())
+
     # tracked via incr()
     def decr(self, key, delta=1, time=0):
         return self.incr(key, delta=-delta, time=time)
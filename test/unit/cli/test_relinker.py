@@ -38,7 +38,7 @@ from swift.common.storage_policy import (
     get_policy_string)
 
 from swift.obj.diskfile import write_metadata, DiskFileRouter, \
-    DiskFileManager, relink_paths, BaseDiskFileManager
+    DiskFileManager, relink_paths, BaseDiskFileManager, HASH_INDEX_PREFIX
 
 from test.debug_logger import debug_logger
 from test.unit import skip_if_no_xattrs, DEFAULT_TEST_EC_TYPE, \
@@ -3218,6 +3218,23 @@ class TestRelinker(unittest.TestCase):
         self.assertTrue(os.path.exists(self.part_dir))
         self.assertTrue(os.path.exists(extra_dir))
 
+    def test_cleanup_old_part_hash_index(self):
+        self._common_test_cleanup()
+        # a leftover hash index doesn't stop the old partition being removed
+        index_file = os.path.join(
+            self.part_dir, HASH_INDEX_PREFIX + 'abc')
+        with open(index_file, 'w'):
+            pass
+        with self._mock_relinker():
+            self.assertEqual(0, relinker.main([
+                'cleanup',
+                '--swift-dir', self.testdir,
+                '--devices', self.devices,
+                '--skip-mount',
+            ]))
+        self.assertFalse(os.path.exists(self.part_dir))
+        self.assertEqual([], self.logger.get_lines_for_level('error'))
+
     def test_cleanup_old_part_replication_lock_taken(self):
         # verify that relinker must take the replication lock before deleting
         # it, and handles the LockTimeout when unable to take it
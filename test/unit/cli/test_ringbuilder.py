@@ -30,7 +30,7 @@ import time
 from swift.cli import ringbuilder
 from swift.cli.ringbuilder import EXIT_SUCCESS, EXIT_WARNING, EXIT_ERROR
 from swift.common import exceptions
-from swift.common.ring import RingBuilder
+from swift.common.ring import RingBuilder, RingData
 from swift.common.ring.composite_builder import CompositeRingBuilder
 
 from test.unit import Timeout, write_stub_builder
@@ -2546,6 +2546,50 @@ class TestCommands(unittest.TestCase, RunSwiftRingBuilderMixin):
         argv = ["", self.tmpfile, "write_ring"]
         self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
 
+    def test_write_ring_format_version(self):
+        self.create_sample_ring()
+        ring_file = self.tmpfile + '.ring.gz'
+        v2_ring_file = self.tmpfile + '.ring'
+        argv = ["", self.tmpfile, "rebalance"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        self.assertEqual(1, RingData.load(ring_file).format_version)
+        self.assertFalse(os.path.exists(v2_ring_file))
+
+        # a v2 ring is written alongside the v1 ring, for servers that can't
+        # load it
+        argv = ["", self.tmpfile, "write_ring", "--format-version", "2"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        expected = RingBuilder.load(self.tmpfile).get_ring().to_dict()
+        ring_data = RingData.load(v2_ring_file)
+        self.assertEqual(2, ring_data.format_version)
+        self.assertEqual(expected, ring_data.to_dict())
+        ring_data = RingData.load(ring_file)
+        self.assertEqual(1, ring_data.format_version)
+        self.assertEqual(expected, ring_data.to_dict())
+        backups = os.listdir(os.path.join(self.tmpdir, 'backups'))
+        self.assertTrue([b for b in backups if b.endswith('.ring')])
+
+        # the format of the existing ring file is kept...
+        argv = ["", self.tmpfile, "pretend_min_part_hours_passed"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        argv = ["", self.tmpfile, "rebalance", "--force"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        expected = RingBuilder.load(self.tmpfile).get_ring().to_dict()
+        self.assertEqual(expected, RingData.load(v2_ring_file).to_dict())
+        self.assertEqual(expected, RingData.load(ring_file).to_dict())
+        argv = ["", self.tmpfile, "write_ring"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        self.assertEqual(2, RingData.load(v2_ring_file).format_version)
+
+        # ...unless another is asked for
+        argv = ["", self.tmpfile, "write_ring", "--format-version", "1"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        self.assertEqual(1, RingData.load(ring_file).format_version)
+        self.assertFalse(os.path.exists(v2_ring_file))
+
+        argv = ["", self.tmpfile, "write_ring", "--format-version", "3"]
+        self.assertSystemExit(EXIT_ERROR, ringbuilder.main, argv)
+
     def test_write_empty_ring(self):
         ring = RingBuilder(6, 3, 1)
         ring.save(self.tmpfile)
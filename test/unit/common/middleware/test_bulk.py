@@ -277,10 +277,11 @@ class TestUntarMetadata(unittest.TestCase):
 
 
 class TestUntar(unittest.TestCase):
+    conf = {}
 
     def setUp(self):
         self.app = FakeApp()
-        self.bulk = bulk.filter_factory({})(self.app)
+        self.bulk = bulk.filter_factory(self.conf)(self.app)
         self.bulk.logger = debug_logger()
         self.testdir = mkdtemp(suffix='tmp_test_bulk')
 
@@ -288,6 +289,9 @@ class TestUntar(unittest.TestCase):
         self.app.calls = 0
         rmtree(self.testdir, ignore_errors=1)
 
+    def assert_aborted_extract_count(self, actual, expected):
+        self.assertEqual(actual, expected)
+
     def handle_extract_and_iter(self, req, compress_format,
                                 out_content_type='application/json'):
         iter = self.bulk.handle_extract_iter(
@@ -498,7 +502,7 @@ class TestUntar(unittest.TestCase):
                                                       'tar_fails.tar'), 'rb')
         req.headers['transfer-encoding'] = 'chunked'
         resp_body = self.handle_extract_and_iter(req, '')
-        self.assertEqual(self.app.calls, 2)
+        self.assert_aborted_extract_count(self.app.calls, 2)
         resp_data = utils.json.loads(resp_body)
         self.assertEqual(resp_data['Response Status'], '401 Unauthorized')
         self.assertEqual(
@@ -545,9 +549,10 @@ class TestUntar(unittest.TestCase):
                 os.path.join(self.testdir, 'tar_fails.tar'), 'rb')
             req.headers['transfer-encoding'] = 'chunked'
             resp_body = self.handle_extract_and_iter(req, '')
-            self.assertEqual(self.app.calls, 5)
+            self.assert_aborted_extract_count(self.app.calls, 5)
             resp_data = utils.json.loads(resp_body)
-            self.assertEqual(resp_data['Number Files Created'], 3)
+            self.assert_aborted_extract_count(
+                resp_data['Number Files Created'], 3)
             self.assertEqual(
                 resp_data['Errors'],
                 [['cont/base_fails1/' + ('f' * 101), '400 Bad Request']])
@@ -588,7 +593,7 @@ class TestUntar(unittest.TestCase):
                                 headers={'Accept': 'application/json'})
             req.headers['transfer-encoding'] = 'chunked'
             resp_body = self.handle_extract_and_iter(req, '')
-            self.assertEqual(self.app.calls, 5)
+            self.assert_aborted_extract_count(self.app.calls, 5)
             resp_data = utils.json.loads(resp_body)
             self.assertEqual(resp_data['Response Status'], '400 Bad Request')
             self.assertEqual(
@@ -670,6 +675,102 @@ class TestUntar(unittest.TestCase):
         self.assertTrue(xml_body.endswith(b'\n</root_tag>\n'))
 
 
+class TestConcurrentUntar(TestUntar):
+    conf = {'extract_concurrency': 3}
+
+    def assert_aborted_extract_count(self, actual, expected):
+        # when an extraction is aborted, up to extract_concurrency - 1 more
+        # objects may have been PUT, or fewer may have been started
+        self.assertLessEqual(abs(actual - expected),
+                             self.bulk.extract_concurrency - 1)
+
+    def test_concurrency_set(self):
+        self.assertEqual(self.bulk.extract_concurrency, 3)
+
+    def test_extract_tar_buffered_and_streamed(self):
+        # objects larger than the extract buffer are streamed from the tar
+        self.bulk.extract_buffer_size = 10
+        dir_tree = [{'base': [{'c1': ['f1', 'f2']}, {'c2': ['f3']}]}]
+        build_dir_tree(self.testdir, dir_tree)
+        with open(os.path.join(self.testdir, 'base', 'c1', 'big'),
+                  'w') as fd:
+            fd.write('x' * 20)
+        tar = tarfile.open(name=os.path.join(self.testdir, 'tar_works.tar'),
+                           mode='w')
+        tar.add(os.path.join(self.testdir, 'base'), arcname='base')
+        tar.close()
+        put_bodies = {}
+        orig_call = self.app.__call__
+
+        def fake_call(env, start_response):
+            if env['REQUEST_METHOD'] == 'PUT':
+                put_bodies[env['PATH_INFO']] = env['wsgi.input'].read()
+                sleep(0)
+            return orig_call(env, start_response)
+
+        self.bulk.app = fake_call
+        with open(os.path.join(self.testdir, 'tar_works.tar'), 'rb') as fd:
+            req = Request.blank('/tar_works/acc/')
+            req.environ['wsgi.input'] = fd
+            req.headers['transfer-encoding'] = 'chunked'
+            resp_body = self.handle_extract_and_iter(req, '')
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Files Created'], 4)
+        self.assertEqual(resp_data['Response Status'], '201 Created')
+        self.assertEqual({
+            '/tar_works/acc/base/c1/f1': b'testing',
+            '/tar_works/acc/base/c1/f2': b'testing',
+            '/tar_works/acc/base/c1/big': b'x' * 20,
+            '/tar_works/acc/base/c2/f3': b'testing',
+        }, put_bodies)
+        # the container was only HEADed once
+        self.assertEqual(5, self.app.calls)
+
+    def test_extract_tar_buffer_size_not_exceeded(self):
+        # room is made for a member before it is read from the tar
+        self.bulk.extract_buffer_size = 14
+        os.mkdir(os.path.join(self.testdir, 'c1'))
+        tar = tarfile.open(name=os.path.join(self.testdir, 'tar_works.tar'),
+                           mode='w')
+        for name in ('f1', 'f2', 'f3', 'f4', 'f5'):
+            path = os.path.join(self.testdir, 'c1', name)
+            with open(path, 'w') as fd:
+                fd.write('x' * 7)
+            tar.add(path, arcname='c1/' + name)
+        tar.close()
+        buffered = {'bytes': 0, 'max': 0}
+
+        def fake_bytes_io(data):
+            buffered['bytes'] += len(data)
+            buffered['max'] = max(buffered['max'], buffered['bytes'])
+            return BytesIO(data)
+
+        orig_call = self.app.__call__
+
+        def fake_call(env, start_response):
+            if env['REQUEST_METHOD'] == 'PUT':
+                body = env['wsgi.input'].read()
+                # keep the PUT in flight while the next members are read
+                for _ in range(3):
+                    sleep(0)
+                buffered['bytes'] -= len(body)
+            return orig_call(env, start_response)
+
+        self.bulk.app = fake_call
+        with open(os.path.join(self.testdir, 'tar_works.tar'), 'rb') as fd, \
+                mock.patch.object(bulk, 'BytesIO', fake_bytes_io):
+            req = Request.blank('/tar_works/acc/')
+            req.environ['wsgi.input'] = fd
+            req.headers['transfer-encoding'] = 'chunked'
+            resp_body = self.handle_extract_and_iter(req, '')
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Files Created'], 5)
+        self.assertEqual(resp_data['Response Status'], '201 Created')
+        # two 7 byte members fit in the buffer, three would not
+        self.assertEqual(14, buffered['max'])
+        self.assertEqual(0, buffered['bytes'])
+
+
 class TestDelete(unittest.TestCase):
     conf = {'delete_concurrency': 1}  # default to old single-threaded behavior
 
@@ -988,6 +1089,8 @@ class TestConfig(unittest.TestCase):
     def test_defaults(self):
         expected_defaults = {
             'delete_concurrency': 2,
+            'extract_concurrency': 1,
+            'extract_buffer_size': 16 * 1024 * 1024,
             'max_containers': 10000,
             'max_deletes_per_request': 10000,
             'max_failed_deletes': 1000,
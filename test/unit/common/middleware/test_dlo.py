@@ -957,6 +957,16 @@ class TestDloConfiguration(unittest.TestCase):
 
         conffile.close()
 
+    def test_prefetch_config(self):
+        mware = dlo.filter_factory({
+            'prefetch_segments': '2',
+            'prefetch_bytes': '1024',
+        })("no app here")
+        self.assertEqual(2, mware.prefetch_segments)
+        self.assertEqual(1024, mware.prefetch_bytes)
+        with self.assertRaises(ValueError):
+            dlo.filter_factory({'prefetch_bytes': '-1'})("no app here")
+
     def test_finding_defaults_from_file(self):
         # If DLO has no config vars, go pull them from the proxy server's
         # config section
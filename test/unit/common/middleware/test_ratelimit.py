@@ -543,6 +543,108 @@ class TestRateLimit(unittest.TestCase):
             time_took = time.time() - begin
             self.assertEqual(round(time_took, 1), 0)  # no memcache, no limit
 
+    def test_local_ratelimit(self):
+        current_rate = 5
+        num_calls = 50
+        conf_dict = {'account_ratelimit': current_rate,
+                     'memcache_sync_interval': '1',
+                     'memcache_sync_workers': '1'}
+        self.test_ratelimit = ratelimit.filter_factory(conf_dict)(FakeApp())
+        fake_memcache = FakeMemcache()
+        req = Request.blank('/v1/a/c')
+        req.method = 'PUT'
+        req.environ['swift.cache'] = fake_memcache
+        make_app_call = lambda: self.test_ratelimit(req.environ.copy(),
+                                                    start_response)
+        begin = time.time()
+        with mock.patch('swift.common.middleware.ratelimit.get_account_info',
+                        lambda *args, **kwargs: {}), \
+                mock.patch('swift.common.middleware.ratelimit.eventlet.spawn'
+                           ) as mock_spawn:
+            self._run(make_app_call, num_calls, current_rate)
+            self.assertEqual(round(time.time() - begin, 1), 9.8)
+        self.assertEqual([mock.call(self.test_ratelimit._run_sync_loop)],
+                         mock_spawn.mock_calls)
+        # memcache is left out of the request path
+        self.assertNotIn('ratelimit/a', fake_memcache.store)
+
+        self.test_ratelimit._sync_local_running_times()
+        self.assertEqual(10000, fake_memcache.store['ratelimit/a'])
+        self.assertEqual([[10000, 0]], list(
+            self.test_ratelimit._local_running_times.values()))
+
+    def test_local_ratelimit_sync_takes_up_other_proxies(self):
+        conf_dict = {'account_ratelimit': 10,
+                     'memcache_sync_interval': '1',
+                     'memcache_sync_workers': '1'}
+        the_app = ratelimit.filter_factory(conf_dict)(FakeApp())
+        the_app.memcache_client = fake_memcache = FakeMemcache()
+        self.assertEqual(0, the_app._get_sleep_time('ratelimit/a', 10))
+        self.assertEqual([[100, 100]],
+                         list(the_app._local_running_times.values()))
+        # another proxy has used the next second
+        fake_memcache.store['ratelimit/a'] = 1100
+        the_app._sync_local_running_times()
+        self.assertEqual(1200, fake_memcache.store['ratelimit/a'])
+        self.assertEqual([[1200, 0]],
+                         list(the_app._local_running_times.values()))
+        self.assertEqual(1.2, the_app._get_sleep_time('ratelimit/a', 10))
+
+        # consumed time is kept if memcache is unavailable
+        fake_memcache.error_on_incr = True
+        the_app._sync_local_running_times()
+        self.assertEqual([[1300, 100]],
+                         list(the_app._local_running_times.values()))
+        fake_memcache.error_on_incr = False
+        the_app._sync_local_running_times()
+        self.assertEqual(1300, fake_memcache.store['ratelimit/a'])
+
+        # idle keys are forgotten once they have caught up
+        global time_ticker
+        time_ticker = 10
+        the_app._sync_local_running_times()
+        self.assertEqual({}, the_app._local_running_times)
+
+    def test_local_ratelimit_max_sleep(self):
+        conf_dict = {'account_ratelimit': 1,
+                     'max_sleep_time_seconds': 2,
+                     'memcache_sync_interval': '1',
+                     'memcache_sync_workers': '1'}
+        the_app = ratelimit.filter_factory(conf_dict)(FakeApp())
+        the_app.memcache_client = FakeMemcache()
+        self.assertEqual(0, the_app._get_sleep_time('ratelimit/a', 1))
+        self.assertEqual(1, the_app._get_sleep_time('ratelimit/a', 1))
+        with self.assertRaises(ratelimit.MaxSleepTimeHitError):
+            the_app._get_sleep_time('ratelimit/a', 1)
+        self.assertEqual([[2000, 2000]],
+                         list(the_app._local_running_times.values()))
+
+    def test_local_ratelimit_shared_by_workers(self):
+        conf_dict = {'account_ratelimit': 10,
+                     'memcache_sync_interval': '1',
+                     'workers': '4'}
+        the_app = ratelimit.filter_factory(conf_dict)(FakeApp())
+        self.assertEqual(4, the_app.memcache_sync_workers)
+        conf_dict['memcache_sync_workers'] = '8'
+        the_app = ratelimit.filter_factory(conf_dict)(FakeApp())
+        self.assertEqual(8, the_app.memcache_sync_workers)
+        the_app.memcache_client = fake_memcache = FakeMemcache()
+        # each worker gets an eighth of the rate ...
+        self.assertEqual(0, the_app._get_sleep_time('ratelimit/a', 10))
+        self.assertEqual(0.8, the_app._get_sleep_time('ratelimit/a', 10))
+        self.assertEqual([[1600, 200]],
+                         list(the_app._local_running_times.values()))
+        # ... but adds what it used at the full rate, in one round trip
+        the_app._get_sleep_time('ratelimit/b', 10)
+        fake_memcache.clear_calls()
+        the_app._sync_local_running_times()
+        self.assertEqual([mock.call.incr_many(
+            {'ratelimit/a': 200, 'ratelimit/b': 100})], fake_memcache.calls)
+        self.assertEqual(200, fake_memcache.store['ratelimit/a'])
+        self.assertEqual(100, fake_memcache.store['ratelimit/b'])
+        self.assertEqual({'ratelimit/a': [1600, 0], 'ratelimit/b': [800, 0]},
+                         the_app._local_running_times)
+
 
 class TestSwiftInfo(unittest.TestCase):
     def setUp(self):
@@ -856,7 +856,8 @@ class TestReconSuccess(TestCase):
         self.fakecache.fakeout = from_cache_response
         rv = self.app.get_expirer_info('object')
         self.assertEqual(self.fakecache.fakeout_calls,
-                         [((['object_expiration_pass', 'expired_last_pass'],
+                         [((['object_expiration_pass', 'expired_last_pass',
+                             'object_expiration_backlog'],
                             self._full_recon_path('object')), {})])
         self.assertEqual(rv, from_cache_response)
 
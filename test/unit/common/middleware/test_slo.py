@@ -6448,6 +6448,17 @@ class TestSwiftInfo(unittest.TestCase):
         self.assertEqual(3, mware.bulk_deleter.delete_concurrency)
         self.assertIs(False, mware.allow_async_delete)
 
+    def test_prefetch_config(self):
+        mware = slo.filter_factory({
+            'prefetch_segments': '2',
+            'prefetch_bytes': '1024',
+        })('have to pass in an app')
+        self.assertEqual(2, mware.prefetch_segments)
+        self.assertEqual(1024, mware.prefetch_bytes)
+        with self.assertRaises(ValueError):
+            slo.filter_factory({'prefetch_bytes': '-1'})(
+                'have to pass in an app')
+
 
 class TestNonSloPassthrough(SloGETorHEADTestCase):
 
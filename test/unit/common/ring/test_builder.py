@@ -1498,6 +1498,38 @@ class TestRingBuilder(unittest.TestCase):
         self.assertEqual([len(p2d) for p2d in rb._replica2part2dev],
                          [256, 256, 128])
 
+    def test_build_dispersion_graph_counts_changed_parts(self):
+        rb = ring.RingBuilder(2, 2.5, 0)
+        rb.add_dev({'id': 0, 'region': 0, 'zone': 0, 'weight': 1,
+                    'ip': '127.0.0.1', 'port': 10000, 'device': 'sda1'})
+        rb.add_dev({'id': 1, 'region': 0, 'zone': 1, 'weight': 1,
+                    'ip': '127.0.0.1', 'port': 10001, 'device': 'sda1'})
+        rb.add_dev({'id': 2, 'region': 0, 'zone': 2, 'weight': 1,
+                    'ip': '127.0.0.1', 'port': 10001, 'device': 'sda1'})
+        rb._replica2part2dev = [
+            array('H', [0, 1, 2, 0]),
+            array('H', [1, 2, 0, 1]),
+            array('H', [2, 0]),
+        ]
+        old_replica2part2dev = [
+            array('H', [0, 1, 0, 0]),
+            array('H', [2, 2, 0, 1]),
+        ]
+        # part 0 of replica 1 moved and replica 2 is new; only the parts
+        # held by every replica are compared
+        self.assertEqual(
+            3, rb._build_dispersion_graph(old_replica2part2dev))
+        self.assertEqual(0, rb._build_dispersion_graph(
+            [array('H', p2d) for p2d in rb._replica2part2dev]))
+        self.assertEqual(6, rb._build_dispersion_graph())
+        self.assertEqual({
+            (0,): [2, 0, 0, 2],
+            (0, 0): [2, 2, 0, 0],
+            (0, 1): [2, 2, 0, 0],
+            (0, 2): [2, 2, 0, 0],
+        }, {tier: graph for tier, graph in rb._dispersion_graph.items()
+            if len(tier) <= 2})
+
     def test_create_add_dev_add_replica_rebalance(self):
         rb = ring.RingBuilder(8, 3, 1)
         rb.add_dev({'id': 0, 'region': 0, 'zone': 0, 'weight': 3,
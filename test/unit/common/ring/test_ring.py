@@ -15,6 +15,7 @@
 
 import array
 import collections
+import itertools
 import six.moves.cPickle as pickle
 import os
 import unittest
@@ -28,6 +29,7 @@ import sys
 import copy
 import mock
 
+import six
 from six.moves import range
 from swift.common import ring, utils
 from swift.common.ring import utils as ring_utils
@@ -162,6 +164,163 @@ class TestRingData(unittest.TestCase):
         rd2 = ring.RingData.load(ring_fname)
         self.assert_ring_data_equal(rd1, rd2)
 
+    def test_roundtrip_serialization_v2(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        # the last replica doesn't cover every partition
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [1, 0, 1])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 30,
+            next_part_power=3, version=7)
+        rd.save(ring_fname, format_version=2)
+        with open(ring_fname, 'rb') as fp:
+            raw = fp.read()
+        # not compressed, and the tables are aligned at the end of the file
+        self.assertEqual(b'R1NG\x00\x02', raw[:6])
+        self.assertEqual(0, (len(raw) - 14) % ring.ring.V2_TABLE_ALIGNMENT)
+
+        meta_only = ring.RingData.load(ring_fname, metadata_only=True)
+        self.assertEqual([
+            {'id': 0, 'zone': 0, 'region': 1},
+            {'id': 1, 'zone': 1, 'region': 1},
+        ], meta_only.devs)
+        self.assertEqual([], meta_only._replica2part2dev_id)
+        self.assertEqual(2, meta_only.format_version)
+        # the header records which devices have partitions
+        self.assertEqual({0, 1}, meta_only.assigned_dev_ids)
+
+        rd2 = ring.RingData.load(ring_fname)
+        self.assert_ring_data_equal(rd, rd2)
+        self.assertEqual(1.75, rd2.replica_count)
+        self.assertEqual(2, rd2.format_version)
+        self.assertEqual(len(raw), rd2.size)
+        self.assertEqual(len(raw), rd2.raw_size)
+        self.assertEqual(md5(raw, usedforsecurity=False).hexdigest(),
+                         rd2.md5)
+        if not six.PY2:
+            # tables are read straight from the memory-mapped file
+            for part2dev_id in rd2._replica2part2dev_id:
+                self.assertIsInstance(part2dev_id, memoryview)
+                self.assertTrue(part2dev_id.readonly)
+
+        # a ring loaded from a v2 file can be written in either format
+        rd2.save(ring_fname)
+        rd3 = ring.RingData.load(ring_fname)
+        self.assert_ring_data_equal(rd, rd3)
+        self.assertEqual(1, rd3.format_version)
+        rd3.save(ring_fname, format_version=2)
+        with open(ring_fname, 'rb') as fp:
+            self.assertEqual(raw, fp.read())
+
+    def test_load_v2_does_not_read_tables(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        rd = ring.RingData(
+            [array.array('H', [0, 1] * 1024), array.array('H', [1, 0] * 1024)],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 22)
+        rd.save(ring_fname, format_version=2)
+        with open(ring_fname, 'rb') as fp:
+            raw = fp.read()
+        json_len = len(raw) - 10 - 2 * 2 * 2048
+        reads = []
+
+        class RecordingFile(object):
+            def __init__(self, fp):
+                self.fp = fp
+
+            def __getattr__(self, name):
+                return getattr(self.fp, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                self.fp.close()
+
+            def read(self, *args):
+                data = self.fp.read(*args)
+                reads.append(len(data))
+                return data
+
+        def recording_open(*args, **kwargs):
+            return RecordingFile(open(*args, **kwargs))
+
+        with mock.patch('swift.common.ring.ring.open', recording_open,
+                        create=True), \
+                mock.patch('swift.common.ring.ring.md5',
+                           side_effect=md5) as mock_md5:
+            rd2 = ring.RingData.load(ring_fname)
+        # only the header is read...
+        self.assertEqual([6, 6, 4, json_len], reads)
+        mock_md5.assert_not_called()
+        self.assert_ring_data_equal(rd, rd2)
+        # ... and the file's md5 is computed only if it's asked for
+        self.assertEqual(md5(raw, usedforsecurity=False).hexdigest(),
+                         rd2.md5)
+        self.assertEqual(md5(raw, usedforsecurity=False).hexdigest(),
+                         rd2.md5)
+
+    def test_byteswapped_serialization_v2(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        data = [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])]
+        swapped_data = copy.deepcopy(data)
+        for x in swapped_data:
+            x.byteswap()
+
+        with mock.patch.object(sys, 'byteorder',
+                               'big' if sys.byteorder == 'little'
+                               else 'little'):
+            rds = ring.RingData(swapped_data,
+                                [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}],
+                                30)
+            rds.save(ring_fname, format_version=2)
+
+        rd1 = ring.RingData(data, [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}],
+                            30)
+        rd2 = ring.RingData.load(ring_fname)
+        self.assert_ring_data_equal(rd1, rd2)
+        # byte-swapped tables must be copied
+        for part2dev_id in rd2._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, array.array)
+
+    def test_truncated_v2(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 30)
+        rd.save(ring_fname, format_version=2)
+        with open(ring_fname, 'r+b') as fp:
+            fp.truncate(os.path.getsize(ring_fname) - 2)
+        with self.assertRaises(ring.ring.RingLoadError) as cm:
+            ring.RingData.load(ring_fname)
+        self.assertEqual('Truncated v2 ring file', str(cm.exception))
+
+    def test_save_unknown_format_version(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring.gz')
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 30)
+        with self.assertRaises(ValueError) as cm:
+            rd.save(ring_fname, format_version=3)
+        self.assertEqual('Unknown ring format version 3', str(cm.exception))
+        self.assertFalse(os.path.exists(ring_fname))
+
+    def test_save_v2_gzip_name(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring.gz')
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 30)
+        with self.assertRaises(ValueError) as cm:
+            rd.save(ring_fname, format_version=2)
+        self.assertEqual('v2 ring files are not gzipped; refusing to write '
+                         'one to %s' % ring_fname, str(cm.exception))
+        self.assertFalse(os.path.exists(ring_fname))
+
+    def test_get_v2_ring_path(self):
+        self.assertEqual('/etc/swift/object.ring',
+                         ring.ring.get_v2_ring_path(
+                             '/etc/swift/object.ring.gz'))
+        self.assertIsNone(ring.ring.get_v2_ring_path('/etc/swift/object.ring'))
+        self.assertIsNone(ring.ring.get_v2_ring_path('/etc/swift/ring.pkl'))
+
     def test_deterministic_serialization(self):
         """
         Two identical rings should produce identical .gz files on disk.
@@ -349,6 +508,51 @@ class TestRing(TestRingBase):
         self.assertEqual(len(self.ring.devs), 9)
         self.assertNotEqual(self.ring._mtime, orig_mtime)
 
+    def test_reload_v2(self):
+        self.ring = ring.Ring(self.testdir, reload_time=0.001,
+                              ring_name='whatever')
+        expected_nodes = [self.ring.get_part_nodes(part)
+                          for part in range(self.ring.partition_count)]
+        expected_handoffs = [list(self.ring.get_more_nodes(part))
+                             for part in range(self.ring.partition_count)]
+        # the v2 ring file is loaded in preference to the .ring.gz file...
+        v2_path = os.path.join(self.testdir, 'whatever.ring')
+        ring.RingData(
+            self.intended_replica2part2dev_id,
+            self.intended_devs, self.intended_part_shift).save(
+                v2_path, format_version=2)
+        sleep(0.01)
+        with mock.patch.object(ring.Ring, '_update_bookkeeping',
+                               autospec=True,
+                               side_effect=ring.Ring._update_bookkeeping) \
+                as mock_bookkeeping:
+            self.assertEqual(expected_nodes[0], self.ring.get_part_nodes(0))
+        # ...without reading all of its tables to find the assigned devices
+        self.assertEqual([mock.call(self.ring, {0, 1, 3, 4})],
+                         mock_bookkeeping.call_args_list)
+        self.assertEqual(self.intended_replica2part2dev_id,
+                         self.ring._replica2part2dev_id)
+        self.assertEqual(
+            expected_nodes, [self.ring.get_part_nodes(part)
+                             for part in range(self.ring.partition_count)])
+        self.assertEqual(
+            expected_handoffs, [list(self.ring.get_more_nodes(part))
+                                for part in range(self.ring.partition_count)])
+        with open(v2_path, 'rb') as fp:
+            self.assertEqual(md5(fp.read(), usedforsecurity=False).hexdigest(),
+                             self.ring.md5)
+        if not six.PY2:
+            for part2dev_id in self.ring._replica2part2dev_id:
+                self.assertIsInstance(part2dev_id, memoryview)
+        self.assertEqual(4, self.ring.assigned_device_count)
+
+        # the .ring.gz file is loaded again once the v2 ring file is removed
+        os.unlink(v2_path)
+        sleep(0.01)
+        self.assertEqual(expected_nodes[0], self.ring.get_part_nodes(0))
+        for part2dev_id in self.ring._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, array.array)
+
     def test_reload_without_replication(self):
         replication_less_devs = [{'id': 0, 'region': 0, 'zone': 0,
                                   'weight': 1.0, 'ip': '10.1.1.1',
@@ -1004,6 +1208,78 @@ class TestRing(TestRingBase):
         self.assertEqual(sum(histogram.get(x, 0) for x in range(50, 100)), 0,
                          histogram)
 
+    def test_get_more_nodes_memoized(self):
+        rb = ring.RingBuilder(8, 3, 1)
+        for zone in range(4):
+            for i in range(3):
+                rb.add_dev({'region': 1, 'zone': zone, 'weight': 1.0,
+                            'ip': '127.0.0.%d' % zone, 'port': 6200 + i,
+                            'device': 'sd%d' % i})
+        rb.rebalance()
+        rb.get_ring().save(self.testgz)
+        r = ring.Ring(self.testdir, ring_name='whatever')
+
+        with mock.patch.object(r, '_iter_handoff_dev_ids',
+                               wraps=r._iter_handoff_dev_ids) as mock_iter:
+            # a partially consumed handoff order...
+            handoffs = list(itertools.islice(r.get_more_nodes(1), 2))
+            self.assertEqual(2, len(handoffs))
+            # ...is continued by the next caller
+            all_handoffs = list(r.get_more_nodes(1))
+            self.assertEqual(9, len(all_handoffs))
+            self.assertEqual(handoffs, all_handoffs[:2])
+            self.assertEqual(all_handoffs, list(r.get_more_nodes(1)))
+        self.assertEqual([mock.call(1, mock.ANY, r._devs,
+                                    r._replica2part2dev_id)],
+                         mock_iter.call_args_list)
+        self.assertEqual(list(range(9)),
+                         [h['handoff_index'] for h in all_handoffs])
+        # node dicts are not shared between callers
+        all_handoffs[0]['index'] = 'foo'
+        self.assertNotIn('index', next(r.get_more_nodes(1)))
+
+        # the cache is bounded, evicting the least recently used
+        with mock.patch.object(ring.ring, 'HANDOFF_CACHE_SIZE', 3):
+            for part in (2, 3, 1, 4):
+                next(r.get_more_nodes(part))
+        self.assertEqual([3, 1, 4], list(r._handoff_cache))
+
+        # and is forgotten when the ring changes
+        os.utime(self.testgz, (time() + 60, time() + 60))
+        r._rtime = 0
+        next(r.get_more_nodes(1))
+        self.assertEqual([1], list(r._handoff_cache))
+
+    def test_get_more_nodes_subclass_with_own_reload(self):
+        # subclasses that load their tables without Ring._reload still get a
+        # handoff cache from _update_bookkeeping
+        class OtherRing(ring.Ring):
+            def __init__(self, ring_data):
+                self.ring_data = ring_data
+                self._reload()
+
+            def has_changed(self):
+                return False
+
+            def _reload(self, *args, **kwargs):
+                self._rtime = time() + 3600
+                self._devs = self.ring_data.devs
+                self._replica2part2dev_id = \
+                    self.ring_data._replica2part2dev_id
+                self._part_shift = self.ring_data._part_shift
+                self._rebuild_tier_data()
+                self._update_bookkeeping()
+
+        r = OtherRing(ring.RingData(
+            self.intended_replica2part2dev_id, self.intended_devs,
+            self.intended_part_shift))
+        self.assertEqual(
+            [dev['id'] for dev in ring.Ring(self.testdir,
+                                            ring_name='whatever')
+             .get_more_nodes(0)],
+            [dev['id'] for dev in r.get_more_nodes(0)])
+        self.assertEqual([0], list(r._handoff_cache))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -24,6 +24,7 @@ from uuid import uuid4
 
 import mock
 import six.moves.cPickle as pickle
+from six import BytesIO
 
 import base64
 import json
@@ -31,8 +32,11 @@ import sqlite3
 import itertools
 import time
 import random
+import struct
+import zlib
 from mock import patch, MagicMock
 
+import eventlet
 from eventlet.timeout import Timeout
 from six.moves import range
 
@@ -43,11 +47,15 @@ from swift.common.constraints import \
     MAX_META_VALUE_LENGTH, MAX_META_COUNT, MAX_META_OVERALL_SIZE
 from swift.common.db import chexor, dict_factory, get_db_connection, \
     DatabaseBroker, DatabaseConnectionError, DatabaseAlreadyExists, \
-    GreenDBConnection, PICKLE_PROTOCOL, zero_like, TombstoneReclaimer
+    GreenDBConnection, PICKLE_PROTOCOL, zero_like, TombstoneReclaimer, \
+    encode_pending_record, decode_pending_record, iter_pending_records, \
+    config_pending_format_value, PENDING_FORMAT_V1, PENDING_FORMAT_V2, \
+    GroupCommitter
 from swift.common.utils import normalize_timestamp, mkdirs, Timestamp
 from swift.common.exceptions import LockTimeout
 from swift.common.swob import HTTPException
 
+from test.debug_logger import debug_logger
 from test.unit import make_timestamp_iter, generate_db_path
 
 
@@ -75,6 +83,214 @@ class TestHelperFunctions(unittest.TestCase):
             self.fail('Some unexpected return values:\n' + '\n'.join(errors))
 
 
+class TestPendingRecords(unittest.TestCase):
+
+    def _roundtrip(self, data, read_size=None):
+        fp = BytesIO(data)
+        return [decode_pending_record(version, entry)
+                for version, entry in iter_pending_records(fp, read_size)]
+
+    def test_encode_v1(self):
+        record = (u'o\u00e9', '1559241846.46601', 0)
+        encoded = encode_pending_record(record, PENDING_FORMAT_V1)
+        self.assertEqual(b':' + base64.b64encode(
+            pickle.dumps(record, protocol=PICKLE_PROTOCOL)), encoded)
+        self.assertEqual([record], self._roundtrip(encoded))
+
+    def test_encode_v2(self):
+        record = (u'o\u00e9', '1559241846.46601', 0)
+        encoded = encode_pending_record(record, PENDING_FORMAT_V2)
+        payload = pickle.dumps(record, protocol=PICKLE_PROTOCOL)
+        self.assertEqual(struct.pack(
+            '!4sII', b'\x02PND', len(payload),
+            zlib.crc32(payload) & 0xffffffff) + payload, encoded)
+        self.assertEqual([record], self._roundtrip(encoded))
+
+    def test_encode_default_format(self):
+        record = ('name', 1)
+        for version in (PENDING_FORMAT_V1, PENDING_FORMAT_V2):
+            with mock.patch('swift.common.db.PENDING_FORMAT', version):
+                self.assertEqual(encode_pending_record(record, version),
+                                 encode_pending_record(record))
+
+    def test_encode_unknown_format(self):
+        with self.assertRaises(ValueError):
+            encode_pending_record(('name', 1), 3)
+
+    def test_iter_mixed_formats(self):
+        records = [(u'obj%d' % i, '%d.00000' % i, i % 2) for i in range(50)]
+        data = b''.join(
+            encode_pending_record(r, PENDING_FORMAT_V1 if i % 3 else
+                                  PENDING_FORMAT_V2)
+            for i, r in enumerate(records))
+        # whatever the read size, records that span reads are reassembled
+        for read_size in (1, 2, 7, 64, 1024, len(data) * 2):
+            self.assertEqual(records, self._roundtrip(data, read_size))
+
+    def test_iter_bounded_reads(self):
+        records = [(u'obj%d' % i, '%d.00000' % i, 0) for i in range(1000)]
+        for version in (PENDING_FORMAT_V1, PENDING_FORMAT_V2):
+            data = b''.join(encode_pending_record(r, version)
+                            for r in records)
+            fp = BytesIO(data)
+            with mock.patch.object(fp, 'read', wraps=fp.read) as mock_read:
+                self.assertEqual(records, [
+                    decode_pending_record(v, e)
+                    for v, e in iter_pending_records(fp, 256)])
+            self.assertEqual(
+                [256], list(set(c[0][0] for c in mock_read.call_args_list)))
+
+    def test_iter_legacy_garbage(self):
+        good = encode_pending_record(('good', 1), PENDING_FORMAT_V1)
+        self.assertEqual(
+            [(PENDING_FORMAT_V1, b'junk'), (PENDING_FORMAT_V1, good[1:]),
+             (PENDING_FORMAT_V1, b'x')],
+            list(iter_pending_records(BytesIO(b'junk' + good + b'::x:'))))
+
+    def test_iter_truncated_v2(self):
+        good = encode_pending_record(('good', 1), PENDING_FORMAT_V2)
+        self.assertEqual(
+            [(PENDING_FORMAT_V2, good[12:]), (None, good[:-1])],
+            list(iter_pending_records(BytesIO(good + good[:-1]))))
+        self.assertEqual(
+            [(PENDING_FORMAT_V2, good[12:]), (None, good[:3])],
+            list(iter_pending_records(BytesIO(good + good[:3]))))
+        with self.assertRaises(ValueError):
+            decode_pending_record(None, good[:3])
+
+    def test_iter_resyncs_after_torn_v2(self):
+        records = [(u'obj%d' % i, '%d.00000' % i, 0) for i in range(20)]
+        encoded = [encode_pending_record(r, PENDING_FORMAT_V2)
+                   for r in records]
+        legacy = encode_pending_record(('legacy', 1), PENDING_FORMAT_V1)
+        # a torn append followed by more appends
+        torn = encoded[5][:len(encoded[5]) // 2]
+        data = b''.join(encoded[:5]) + torn + b''.join(encoded[6:]) + \
+            torn + legacy
+        for read_size in (1, 3, 64, len(data)):
+            self.assertEqual(
+                [(PENDING_FORMAT_V2, e[12:]) for e in encoded[:5]] +
+                [(None, torn)] +
+                [(PENDING_FORMAT_V2, e[12:]) for e in encoded[6:]] +
+                [(None, torn), (PENDING_FORMAT_V1, legacy[1:])],
+                list(iter_pending_records(BytesIO(data), read_size)))
+
+        # a corrupted payload or length fails the checksum
+        bad_payload = encoded[0][:-2] + b'X' + encoded[0][-1:]
+        bad_length = encoded[0][:4] + struct.pack('!I', 3) + encoded[0][8:]
+        for bad in (bad_payload, bad_length):
+            self.assertEqual(
+                [(None, bad), (PENDING_FORMAT_V2, encoded[1][12:])],
+                list(iter_pending_records(BytesIO(bad + encoded[1]))))
+
+    def test_config_pending_format_value(self):
+        self.assertEqual(1, config_pending_format_value('1'))
+        self.assertEqual(2, config_pending_format_value('2'))
+        self.assertEqual(2, config_pending_format_value(2))
+        for bad in ('0', '3', 'two', None, ''):
+            with self.assertRaises(ValueError):
+                config_pending_format_value(bad)
+
+
+class TestGroupCommitter(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = debug_logger()
+
+    def _make_broker(self, pending_file='/path/1.db.pending'):
+        broker = mock.MagicMock()
+        broker.pending_file = pending_file
+        return broker
+
+    def _run(self, committer, puts):
+        pool = eventlet.GreenPool()
+        threads = [pool.spawn(committer.put_record, broker, record)
+                   for broker, record in puts]
+        results = []
+        for gt in threads:
+            try:
+                results.append(gt.wait())
+            except Exception as err:
+                results.append(err)
+        return results
+
+    def test_concurrent_records_batched(self):
+        committer = GroupCommitter(0.01, 100, self.logger)
+        broker = self._make_broker()
+        other_broker = self._make_broker('/path/2.db.pending')
+        puts = [(broker, 'r%d' % i) for i in range(5)]
+        puts.append((other_broker, 'other'))
+        self.assertEqual([None] * 6, self._run(committer, puts))
+        broker.put_records.assert_called_once_with(
+            ['r0', 'r1', 'r2', 'r3', 'r4'])
+        other_broker.put_records.assert_called_once_with(['other'])
+        stats = self.logger.statsd_client
+        self.assertEqual({'group_commit.batches': 2,
+                          'group_commit.records': 6},
+                         stats.get_stats_counts())
+        self.assertEqual(6, len(stats.calls['timing_since']))
+        self.assertFalse(committer._batches)
+
+    def test_max_batch_size(self):
+        committer = GroupCommitter(10, 2, self.logger)
+        broker = self._make_broker()
+        puts = [(broker, 'r%d' % i) for i in range(4)]
+        with Timeout(5):
+            self.assertEqual([None] * 4, self._run(committer, puts))
+        self.assertEqual([mock.call(['r0', 'r1']), mock.call(['r2', 'r3'])],
+                         broker.put_records.call_args_list)
+        self.assertFalse(committer._batches)
+
+    def test_sequential_records_not_delayed_past_window(self):
+        committer = GroupCommitter(0.001, 100, self.logger)
+        broker = self._make_broker()
+        committer.put_record(broker, 'r0')
+        committer.put_record(broker, 'r1')
+        self.assertEqual([mock.call(['r0']), mock.call(['r1'])],
+                         broker.put_records.call_args_list)
+
+    def test_error_raised_by_all_records_in_batch(self):
+        committer = GroupCommitter(0.01, 100, self.logger)
+        broker = self._make_broker()
+        broker.put_records.side_effect = sqlite3.OperationalError('locked')
+        results = self._run(committer, [(broker, 'r0'), (broker, 'r1')])
+        self.assertEqual(2, len(results))
+        for result in results:
+            self.assertIsInstance(result, sqlite3.OperationalError)
+        broker.put_records.assert_called_once_with(['r0', 'r1'])
+        self.assertFalse(committer._batches)
+        # subsequent batches are unaffected
+        broker.put_records.side_effect = None
+        self.assertEqual([None], self._run(committer, [(broker, 'r2')]))
+
+    def test_leader_killed_while_waiting(self):
+        committer = GroupCommitter(10, 100, self.logger)
+        broker = self._make_broker()
+        unblock = eventlet.event.Event()
+
+        def put_records(records):
+            if records == ['block']:
+                unblock.wait()
+        broker.put_records.side_effect = put_records
+        # a leader only waits while another batch is being put
+        blocker = eventlet.spawn(committer.put_record, broker, 'block')
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        leader = eventlet.spawn(committer.put_record, broker, 'r0')
+        eventlet.sleep(0)
+        follower = eventlet.spawn(committer.put_record, broker, 'r1')
+        eventlet.sleep(0)
+        leader.kill()
+        with Timeout(5):
+            self.assertIsNone(follower.wait())
+        self.assertEqual([mock.call(['block']), mock.call(['r0', 'r1'])],
+                         broker.put_records.call_args_list)
+        self.assertFalse(committer._batches)
+        unblock.send()
+        with Timeout(5):
+            self.assertIsNone(blocker.wait())
+
+
 class TestDatabaseConnectionError(unittest.TestCase):
 
     def test_str(self):
@@ -1591,6 +1807,34 @@ class TestDatabaseBroker(TestDbBase):
             (expected_name, '1559241846.46601', '0', '0', '0', 0, '0')])
         self.assertEqual(0, os.path.getsize(broker.pending_file))
 
+        # load a file mixing legacy and length-prefixed records
+        with open(broker.pending_file, 'wb') as fd:
+            fd.write(encode_pending_record(1, PENDING_FORMAT_V2))
+            fd.write(encode_pending_record(2, PENDING_FORMAT_V1))
+            fd.write(encode_pending_record(b'x:y', PENDING_FORMAT_V2))
+            fd.write(b':bad')
+            fd.write(encode_pending_record(99, PENDING_FORMAT_V2)[:-1])
+        with patch.object(broker, 'merge_items') as mock_merge_items, \
+                patch.object(broker, 'logger') as mock_logger:
+            broker._commit_puts_load = lambda l, e: l.append(e)
+            broker._commit_puts()
+        mock_merge_items.assert_called_once_with([1, 2, b'x:y'])
+        self.assertEqual(2, mock_logger.exception.call_count)
+        self.assertEqual(0, os.path.getsize(broker.pending_file))
+
+        # large pending files are merged in batches
+        with open(broker.pending_file, 'wb') as fd:
+            for v in range(7):
+                fd.write(encode_pending_record(v, PENDING_FORMAT_V2))
+        with patch.object(broker, 'merge_items') as mock_merge_items, \
+                patch('swift.common.db.PENDING_COMMIT_BATCH_SIZE', 3):
+            broker._commit_puts_load = lambda l, e: l.append(e)
+            broker._commit_puts([b'given'])
+        self.assertEqual(
+            [mock.call([b'given', 0, 1]), mock.call([2, 3, 4]),
+             mock.call([5, 6])], mock_merge_items.call_args_list)
+        self.assertEqual(0, os.path.getsize(broker.pending_file))
+
         # skip_commits True - no merge
         db_file = os.path.join(self.testdir, '2.db')
         broker = DatabaseBroker(db_file, skip_commits=True)
@@ -1635,6 +1879,25 @@ class TestDatabaseBroker(TestDbBase):
                          [pickle.loads(base64.b64decode(i))
                              for i in items[1:]])
 
+        # length-prefixed record appended
+        with patch.object(broker, '_commit_puts') as mock_commit_puts, \
+                patch('swift.common.db.PENDING_FORMAT', PENDING_FORMAT_V2):
+            broker.put_record('brain')
+        mock_commit_puts.assert_not_called()
+        with open(broker.pending_file, 'rb') as fd:
+            self.assertEqual(['PINKY', 'PERKY', 'BRAIN'], [
+                decode_pending_record(version, entry)
+                for version, entry in iter_pending_records(fd)])
+
+        # batch of records appended
+        with patch.object(broker, '_commit_puts') as mock_commit_puts:
+            broker.put_records(['pinky', 'brain'])
+        mock_commit_puts.assert_not_called()
+        with open(broker.pending_file, 'rb') as fd:
+            self.assertEqual(['PINKY', 'PERKY', 'BRAIN', 'PINKY', 'BRAIN'], [
+                decode_pending_record(version, entry)
+                for version, entry in iter_pending_records(fd)])
+
         # pending file above cap
         cap = swift.common.db.PENDING_CAP
         while os.path.getsize(broker.pending_file) < cap:
@@ -1643,6 +1906,9 @@ class TestDatabaseBroker(TestDbBase):
         with patch.object(broker, '_commit_puts') as mock_commit_puts:
             broker.put_record('direct')
         mock_commit_puts.assert_called_once_with(['direct'])
+        with patch.object(broker, '_commit_puts') as mock_commit_puts:
+            broker.put_records(['direct', 'batch'])
+        mock_commit_puts.assert_called_once_with(['direct', 'batch'])
 
         # records shouldn't be put to brokers with skip_commits True because
         # they cannot be accepted if the pending file is full
@@ -0,0 +1,136 @@
+# Copyright (c) 2026 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import unittest
+
+import eventlet
+import mock
+from pyeclib.ec_iface import ECDriverError
+
+from swift.common import ec_pool
+from swift.common.storage_policy import ECStoragePolicy, POLICIES
+
+from test.unit import patch_policies, DEFAULT_TEST_EC_TYPE
+
+
+@patch_policies([ECStoragePolicy(0, name='ec', is_default=True,
+                                 ec_type=DEFAULT_TEST_EC_TYPE, ec_ndata=4,
+                                 ec_nparity=2, ec_segment_size=4096)])
+class TestECProcessPool(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = POLICIES[0]
+        self.driver = self.policy.pyeclib_driver
+        self.pool = ec_pool.ECProcessPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_bad_num_processes(self):
+        for bad in (0, -1, 'auto'):
+            with self.assertRaises(ValueError):
+                ec_pool.ECProcessPool(bad)
+
+    def test_encode(self):
+        segments = [b'a' * 4096, b'b' * 4096, b'c' * 100]
+        self.assertEqual([self.driver.encode(segment) for segment in segments],
+                         self.pool.encode(self.policy, segments))
+        self.assertEqual(2, len(self.pool._idle.queue))
+
+    def test_reconstruct(self):
+        segments = [self.driver.encode(segment)
+                    for segment in (b'a' * 4096, b'b' * 100)]
+        # rebuild fragment 1 from the other fragments
+        self.assertEqual(
+            [fragments[1] for fragments in segments],
+            self.pool.reconstruct(
+                self.policy,
+                [fragments[:1] + fragments[2:] for fragments in segments],
+                1))
+
+    def test_driver_error(self):
+        fragments = self.driver.encode(b'a' * 4096)
+        with self.assertRaises(ECDriverError):
+            self.pool.reconstruct(self.policy, [[b'junk'] * 4], 1)
+        pids = [worker.pid for worker in self.pool._idle.queue]
+        self.assertEqual(2, len(pids))
+        # the workers are still in use
+        self.assertEqual([fragments],
+                         self.pool.encode(self.policy, [b'a' * 4096]))
+        self.assertEqual(
+            sorted(pids),
+            sorted(worker.pid for worker in self.pool._idle.queue))
+
+    def test_concurrent_requests(self):
+        segments = [b'%d' % i * 4096 for i in range(6)]
+        pile = eventlet.GreenPile()
+        for segment in segments:
+            pile.spawn(self.pool.encode, self.policy, [segment])
+        self.assertEqual([[self.driver.encode(segment)]
+                          for segment in segments], list(pile))
+        self.assertEqual(2, len(self.pool._idle.queue))
+
+    def test_interrupted_request_replaces_worker(self):
+        self.pool.encode(self.policy, [b'a'])
+        pids = set(worker.pid for worker in self.pool._idle.queue)
+        pid = os.getpid()
+        recv_message = ec_pool._recv_message
+
+        def interrupted_recv_message(sock):
+            # the replacement worker is forked with this mock in place
+            if os.getpid() == pid:
+                raise eventlet.Timeout()
+            return recv_message(sock)
+
+        with mock.patch.object(ec_pool, '_recv_message',
+                               interrupted_recv_message):
+            with self.assertRaises(eventlet.Timeout):
+                self.pool.encode(self.policy, [b'a'])
+        new_pids = set(worker.pid for worker in self.pool._idle.queue)
+        self.assertEqual(2, len(new_pids))
+        self.assertEqual(1, len(pids & new_pids))
+        self.assertEqual([self.driver.encode(b'a')] * 2, [
+            self.pool.encode(self.policy, [b'a'])[0] for _ in range(2)])
+
+    def test_forks_workers_in_new_process(self):
+        self.pool.encode(self.policy, [b'a'])
+        parent_workers = list(self.pool._idle.queue)
+        self.assertEqual(2, len(parent_workers))
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertEqual([self.driver.encode(b'a')],
+                             self.pool.encode(self.policy, [b'a']))
+            child_workers = list(self.pool._idle.queue)
+            self.pool.close()
+        self.assertFalse(set(parent_workers) & set(child_workers))
+        for worker in parent_workers:
+            worker.sock.close()
+            os.waitpid(worker.pid, 0)
+
+    def test_close(self):
+        self.pool.close()
+        self.pool.encode(self.policy, [b'a'])
+        workers = list(self.pool._idle.queue)
+        self.pool.close()
+        self.assertEqual(0, len(self.pool._idle.queue))
+        for worker in workers:
+            # the worker processes have exited and been reaped
+            with self.assertRaises(OSError):
+                os.kill(worker.pid, 0)
+        self.assertEqual([self.driver.encode(b'a')],
+                         self.pool.encode(self.policy, [b'a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,11 +12,14 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import fcntl
+import os
 import unittest
 import mock
 from time import time
 
-from swift.common.error_limiter import ErrorLimiter
+from swift.common.error_limiter import ErrorLimiter, SharedErrorLimiter, \
+    SharedNodeTable
 from test.unit import FakeRing
 
 
@@ -97,3 +100,182 @@ class TestErrorLimiter(unittest.TestCase):
         node = self.ring.devs[0]
         expected = '%s:%s/%s' % (node['ip'], node['port'], node['device'])
         self.assertEqual(expected, limiter.node_key(node))
+
+
+class TestSharedNodeTable(unittest.TestCase):
+    def test_init_bad_config(self):
+        with self.assertRaises(ValueError):
+            SharedNodeTable(0, 2)
+        with self.assertRaises(ValueError):
+            SharedNodeTable('bad', 2)
+
+    def test_get_set_pop(self):
+        table = SharedNodeTable(16, 2)
+        self.assertIsNone(table.get('a'))
+        self.assertEqual('x', table.get('a', 'x'))
+        table['a'] = (1, 2.5)
+        table[u'\u00e9'] = (3, 4)
+        self.assertEqual((1.0, 2.5), table.get('a'))
+        self.assertEqual((3.0, 4.0), table.get(u'\u00e9'))
+        table['a'] = (5, 6)
+        self.assertEqual((5.0, 6.0), table.get('a'))
+        self.assertEqual((5.0, 6.0), table.pop('a'))
+        self.assertIsNone(table.get('a'))
+        self.assertIsNone(table.pop('a'))
+        self.assertEqual((3.0, 4.0), table.get(u'\u00e9'))
+        table.clear()
+        self.assertIsNone(table.get(u'\u00e9'))
+
+    def test_least_recently_updated_is_evicted(self):
+        table = SharedNodeTable(3, 1, max_probes=3)
+        now = time()
+        for i, key in enumerate('abc'):
+            with mock.patch('swift.common.error_limiter.time',
+                            return_value=now + i):
+                table[key] = (i,)
+        with mock.patch('swift.common.error_limiter.time',
+                        return_value=now + 3):
+            table['a'] = (3,)
+            table['d'] = (4,)
+        self.assertEqual((3.0,), table.get('a'))
+        self.assertIsNone(table.get('b'))
+        self.assertEqual((2.0,), table.get('c'))
+        self.assertEqual((4.0,), table.get('d'))
+
+    def test_get_checks_slot_sequence(self):
+        table = SharedNodeTable(1, 2, max_probes=1)
+        table['a'] = (1, 2)
+        seq_struct = table._seq
+        reads = []
+
+        class ReuseSlotDuringRead(object):
+            # another process writes 'b' into the slot after the first read
+            # of its sequence number
+            def unpack_from(self, buf, offset):
+                result = seq_struct.unpack_from(buf, offset)
+                reads.append(result[0])
+                if len(reads) == 1:
+                    table._seq = seq_struct
+                    table['b'] = (3, 4)
+                    table._seq = self
+                return result
+
+        table._seq = ReuseSlotDuringRead()
+        self.assertIsNone(table.get('a'))
+        # the first read was retried because the sequence number changed,
+        # and the retry found the slot holding 'b'
+        self.assertEqual([2, 4, 4, 4], reads)
+
+        # a slot stuck mid-write by a dead writer reads as empty ...
+        table = SharedNodeTable(1, 2, max_probes=1)
+        table['a'] = (1, 2)
+        table._seq.pack_into(table._mmap, 0, 3)
+        self.assertIsNone(table.get('a'))
+        # ... until it is written again
+        table['a'] = (5, 6)
+        self.assertEqual((5.0, 6.0), table.get('a'))
+        self.assertEqual((4,), table._seq.unpack_from(table._mmap, 0))
+
+    def test_write_slot_locked(self):
+        table = SharedNodeTable(4, 2, max_probes=1)
+        offset, _found = table._find_slot(table._key_hash('a'))
+        slot = offset // table._slot_size
+        with mock.patch('swift.common.error_limiter.fcntl.lockf') \
+                as mock_lockf:
+            table['a'] = (1, 2)
+            self.assertEqual((1, 2), table.pop('a'))
+        self.assertEqual([
+            mock.call(table._lock_file, fcntl.LOCK_EX, 1, slot),
+            mock.call(table._lock_file, fcntl.LOCK_UN, 1, slot),
+        ] * 2, mock_lockf.call_args_list)
+
+    def test_concurrent_writers(self):
+        # each process stores its own key in the only slot, with values that
+        # identify the key
+        table = SharedNodeTable(1, 2, max_probes=1)
+        keys = ['k%d' % i for i in range(4)]
+        pids = []
+        for i, key in enumerate(keys):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for _ in range(2000):
+                        table[key] = (i, i)
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        try:
+            for _ in range(2000):
+                for i, key in enumerate(keys):
+                    values = table.get(key)
+                    if values is not None:
+                        self.assertEqual((i, i), values)
+        finally:
+            for pid in pids:
+                os.waitpid(pid, 0)
+        self.assertEqual(0, table._seq.unpack_from(table._mmap, 0)[0] % 2)
+
+    def test_shared_with_forked_process(self):
+        table = SharedNodeTable(16, 2)
+        table['a'] = (1, 2)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                table['b'] = table.get('a')[::-1]
+                table.pop('a')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertIsNone(table.get('a'))
+        self.assertEqual((2.0, 1.0), table.get('b'))
+
+
+class TestSharedErrorLimiter(unittest.TestCase):
+    def setUp(self):
+        self.ring = FakeRing()
+
+    def test_init_bad_table(self):
+        with self.assertRaises(ValueError):
+            SharedErrorLimiter(60, 10, SharedNodeTable(16, 3))
+
+    def test_is_limited(self):
+        node = self.ring.devs[-1]
+        limiter = SharedErrorLimiter(60, 10, SharedNodeTable(16, 2))
+
+        now = time()
+        with mock.patch('swift.common.error_limiter.time', return_value=now):
+            self.assertFalse(limiter.is_limited(node))
+            limiter.limit(node)
+            self.assertTrue(limiter.is_limited(node))
+            node_key = limiter.node_key(node)
+            self.assertEqual(limiter.stats.get(node_key),
+                             (limiter.suppression_limit + 1, now))
+
+    def test_increment(self):
+        node = self.ring.devs[-1]
+        table = SharedNodeTable(16, 2)
+        limiter = SharedErrorLimiter(60, 10, table)
+        other_limiter = SharedErrorLimiter(60, 10, table)
+        node_key = limiter.node_key(node)
+        for i in range(limiter.suppression_limit):
+            self.assertFalse((limiter, other_limiter)[i % 2].increment(node))
+            self.assertEqual(i + 1, limiter.stats.get(node_key)[0])
+            self.assertFalse(limiter.is_limited(node))
+            self.assertFalse(other_limiter.is_limited(node))
+
+        self.assertTrue(other_limiter.increment(node))
+        self.assertTrue(limiter.is_limited(node))
+        self.assertTrue(other_limiter.is_limited(node))
+
+        # errors after the interval start a new count
+        last_time = limiter.stats.get(node_key)[1]
+        now = last_time + limiter.suppression_interval + 1
+        with mock.patch('swift.common.error_limiter.time',
+                        return_value=now):
+            self.assertFalse(limiter.increment(node))
+            self.assertEqual((1, now), limiter.stats.get(node_key))
+        now += limiter.suppression_interval + 1
+        with mock.patch('swift.common.error_limiter.time',
+                        return_value=now):
+            self.assertFalse(other_limiter.is_limited(node))
+            self.assertIsNone(limiter.stats.get(node_key))
@@ -0,0 +1,125 @@
+# Copyright (c) 2026 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import mock
+from time import time
+
+from swift.common.latency_tracker import LatencyTracker
+from test.unit import FakeRing
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def setUp(self):
+        self.ring = FakeRing()
+
+    def test_init_bad_config(self):
+        with self.assertRaises(ValueError):
+            LatencyTracker(expiry='bad')
+        with self.assertRaises(ValueError):
+            LatencyTracker(expiry=300, decay=0)
+        with self.assertRaises(ValueError):
+            LatencyTracker(expiry=300, decay=1.1)
+
+    def test_moving_average(self):
+        node = self.ring.devs[-1]
+        tracker = LatencyTracker(expiry=300, decay=0.5)
+        self.assertEqual(0, tracker.score(node))
+        tracker.start_request(node)
+        self.assertEqual([None, 1, 0], tracker.stats[tracker.node_key(node)])
+        tracker.end_request(node, 1.0)
+        self.assertEqual(1.0, tracker.score(node))
+        tracker.end_request(node, 3.0)
+        self.assertEqual(2.0, tracker.score(node))
+        # in flight count never goes negative
+        self.assertEqual(0, tracker.stats[tracker.node_key(node)][1])
+
+        # in flight requests scale the score
+        tracker.start_request(node)
+        tracker.start_request(node)
+        self.assertEqual(6.0, tracker.score(node))
+
+    def test_expiry(self):
+        node = self.ring.devs[-1]
+        tracker = LatencyTracker(expiry=300, decay=0.5)
+        now = time()
+        with mock.patch('swift.common.latency_tracker.time',
+                        return_value=now):
+            tracker.end_request(node, 4.0)
+        with mock.patch('swift.common.latency_tracker.time',
+                        return_value=now + 301):
+            self.assertEqual(0, tracker.score(node))
+            # an expired average starts over
+            tracker.end_request(node, 1.0)
+            self.assertEqual(1.0, tracker.score(node))
+
+    def test_order(self):
+        nodes = self.ring.devs[:3]
+        tracker = LatencyTracker(expiry=300)
+        for node, latency in zip(nodes, (3, 1, 2)):
+            tracker.end_request(node, latency)
+
+        # always compare the first two of the remaining nodes
+        with mock.patch('swift.common.latency_tracker.random.sample',
+                        lambda population, k: list(population)[:k]):
+            self.assertEqual([nodes[1], nodes[2], nodes[0]],
+                             tracker.order(nodes))
+        # always compare the last two of the remaining nodes
+        with mock.patch('swift.common.latency_tracker.random.sample',
+                        lambda population, k: list(population)[-k:]):
+            self.assertEqual([nodes[1], nodes[2], nodes[0]],
+                             tracker.order(nodes))
+        # the worst node is only taken first if it is the only choice
+        self.assertEqual(nodes[0], tracker.order(nodes)[-1])
+        self.assertEqual([], tracker.order([]))
+
+    def test_percentile(self):
+        node = self.ring.devs[-1]
+        tracker = LatencyTracker(expiry=300, sample_size=100, min_samples=10)
+        for i in range(9):
+            tracker.end_request(node, i, 'key')
+        self.assertIsNone(tracker.percentile(50, 'key'))
+        tracker.end_request(node, 9, 'key')
+        self.assertEqual(0, tracker.percentile(0, 'key'))
+        self.assertEqual(5, tracker.percentile(60, 'key'))
+        self.assertEqual(9, tracker.percentile(100, 'key'))
+
+        # samples are re-sorted once a tenth of them are new
+        for i in range(100):
+            tracker.end_request(node, 100 + i, 'key')
+        self.assertEqual(199, tracker.percentile(100, 'key'))
+        tracker.end_request(node, 1000, 'key')
+        self.assertEqual(199, tracker.percentile(100, 'key'))
+        for i in range(9):
+            tracker.end_request(node, 1000, 'key')
+        self.assertEqual(1000, tracker.percentile(100, 'key'))
+
+    def test_percentile_per_sample_key(self):
+        node = self.ring.devs[-1]
+        tracker = LatencyTracker(expiry=300, sample_size=100, min_samples=10)
+        for i in range(10):
+            tracker.end_request(node, 1, ('Object', 0))
+            tracker.end_request(node, 2, ('Object', 1))
+            # latencies without a sample key only update the node's average
+            tracker.end_request(node, 3)
+        self.assertEqual(1, tracker.percentile(100, ('Object', 0)))
+        self.assertEqual(2, tracker.percentile(100, ('Object', 1)))
+        self.assertIsNone(tracker.percentile(100, ('Container', None)))
+        self.assertIsNone(tracker.percentile(100))
+        self.assertEqual([('Object', 0), ('Object', 1)],
+                         sorted(tracker.samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
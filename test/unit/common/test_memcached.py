@@ -18,7 +18,9 @@
 import itertools
 from collections import defaultdict
 import errno
+import functools
 import io
+import json
 import logging
 import six
 import socket
@@ -1027,6 +1029,123 @@ class TestMemcached(unittest.TestCase):
         self.assertEqual(memcache_client.get('some_key0'), [7, 8, 9])
         self.assertIn(key, mock2.cache)
 
+    def _make_get_many_client(self, tries=2):
+        memcache_client = memcached.MemcacheRing(
+            ['1.2.3.4:11211', '1.2.3.5:11211'], tries=tries,
+            logger=self.logger)
+        mocks = {}
+        for server in memcache_client.memcache_servers:
+            mock = mocks[server] = MockMemcached()
+            memcache_client._client_cache[server] = MockedMemcachePool(
+                [(mock, mock)] * 2)
+        return memcache_client, mocks
+
+    def test_get_many(self):
+        memcache_client, mocks = self._make_get_many_client()
+        # MemcacheRing will put 'some_key0' on server 1.2.3.5:11211 and
+        # 'some_key1' on '1.2.3.4:11211'
+        memcache_client.set('some_key0', [1, 2, 3])
+        memcache_client.set('some_key1', {'a': 'b'})
+        memcache_client.set('some_key2', b'raw', serialize=False)
+        self.assertTrue(mocks['1.2.3.5:11211'].cache)  # sanity
+        self.assertTrue(mocks['1.2.3.4:11211'].cache)  # sanity
+
+        sent = []
+        for mock_memcached in mocks.values():
+            mock_memcached.sendall = functools.partial(
+                lambda orig, msg: sent.append(msg) or orig(msg),
+                mock_memcached.sendall)
+        self.assertEqual(
+            [{'a': 'b'}, None, [1, 2, 3], b'raw', [1, 2, 3]],
+            memcache_client.get_many(['some_key1', 'not_exists', 'some_key0',
+                                      'some_key2', 'some_key0']))
+        # one pipelined get per server
+        self.assertEqual(2, len(sent))
+        for msg in sent:
+            self.assertTrue(msg.startswith(b'get '))
+        self.assertEqual(4, sum(len(msg.split()) - 1 for msg in sent))
+        self.assertEqual([], memcache_client.get_many([]))
+        self.assertEqual(
+            'memcached.get_many.timing',
+            self.logger.statsd_client.calls['timing_since'][-1][0][0])
+
+    def test_get_many_server_down(self):
+        memcache_client, mocks = self._make_get_many_client()
+        memcache_client.set('some_key0', [1, 2, 3])
+        memcache_client.set('some_key1', [4, 5, 6])
+        mocks['1.2.3.5:11211'].down = True
+        # keys of the failed server are retried on the next server, where
+        # they are misses; other keys are unaffected
+        self.assertEqual([None, [4, 5, 6]],
+                         memcache_client.get_many(['some_key0', 'some_key1']))
+        self.assertEqual([None, [4, 5, 6]], memcache_client.get_many(
+            ['some_key0', 'some_key1'], raise_on_error=True))
+        self.assertIn('Error talking to memcached: 1.2.3.5:11211',
+                      self.logger.get_lines_for_level('error')[0])
+
+        # with nowhere else to go errors are misses unless asked to raise
+        memcache_client, mocks = self._make_get_many_client(tries=1)
+        memcache_client.set('some_key0', [1, 2, 3])
+        memcache_client.set('some_key1', [4, 5, 6])
+        mocks['1.2.3.5:11211'].down = True
+        self.assertEqual([None, [4, 5, 6]],
+                         memcache_client.get_many(['some_key0', 'some_key1']))
+        with self.assertRaises(MemcacheConnectionError):
+            memcache_client.get_many(['some_key0', 'some_key1'],
+                                     raise_on_error=True)
+
+    def test_incr_many(self):
+        memcache_client, mocks = self._make_get_many_client()
+        # 'some_key0' is on 1.2.3.5:11211 and 'some_key1' on '1.2.3.4:11211'
+        memcache_client.set('some_key0', 10)
+        memcache_client.set('some_key1', 20)
+        memcache_client.set('some_key2', 30)
+
+        sent = []
+        for mock_memcached in mocks.values():
+            mock_memcached.sendall = functools.partial(
+                lambda orig, msg: sent.append(msg) or orig(msg),
+                mock_memcached.sendall)
+        self.assertEqual(
+            {'some_key0': 11, 'some_key1': 15, 'some_key2': 33,
+             'not_exists': 4, 'not_exists_decr': 0},
+            memcache_client.incr_many({
+                'some_key0': 1, 'some_key1': -5, 'some_key2': 3,
+                'not_exists': 4, 'not_exists_decr': -4}))
+        # one pipelined round trip per server, plus an add per missing key
+        self.assertEqual(4, len(sent))
+        self.assertEqual(5, sum(msg.count(b'\r\n') for msg in sent
+                                if not msg.startswith(b'add ')))
+        self.assertEqual(2, len([msg for msg in sent
+                                 if msg.startswith(b'add ')]))
+        self.assertEqual(11, memcache_client.get('some_key0'))
+        self.assertEqual(15, memcache_client.get('some_key1'))
+        self.assertEqual(b'4', memcache_client.get('not_exists'))
+        self.assertEqual({}, memcache_client.incr_many({}))
+        self.assertEqual(
+            'memcached.incr_many.timing',
+            self.logger.statsd_client.calls['timing_since'][-1][0][0])
+
+    def test_incr_many_server_down(self):
+        memcache_client, mocks = self._make_get_many_client()
+        memcache_client.set('some_key0', 10)
+        memcache_client.set('some_key1', 20)
+        mocks['1.2.3.5:11211'].down = True
+        # keys of the failed server are retried on the next server
+        self.assertEqual({'some_key0': 1, 'some_key1': 21},
+                         memcache_client.incr_many(
+                             {'some_key0': 1, 'some_key1': 1}))
+        self.assertIn('Error talking to memcached: 1.2.3.5:11211',
+                      self.logger.get_lines_for_level('error')[0])
+
+        # with nowhere else to go the key is left out
+        memcache_client, mocks = self._make_get_many_client(tries=1)
+        memcache_client.set('some_key0', 10)
+        memcache_client.set('some_key1', 20)
+        mocks['1.2.3.5:11211'].down = True
+        self.assertEqual({'some_key1': 21}, memcache_client.incr_many(
+            {'some_key0': 1, 'some_key1': 1}))
+
     def test_serialization(self):
         memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'],
                                                  logger=self.logger)
@@ -1042,6 +1161,68 @@ class TestMemcached(unittest.TestCase):
         mock.cache[key] = (b'1',) + mock.cache[key][1:]
         self.assertIsNone(memcache_client.get('some_key'))
 
+    @unittest.skipIf(memcached.msgpack is None, 'msgpack is not installed')
+    def test_set_get_msgpack(self):
+        memcache_client = memcached.MemcacheRing(
+            ['1.2.3.4:11211'], logger=self.logger,
+            serialization_format='msgpack')
+        mock = MockMemcached()
+        memcache_client._client_cache['1.2.3.4:11211'] = MockedMemcachePool(
+            [(mock, mock)] * 2)
+        cache_key = md5(b'some_key',
+                        usedforsecurity=False).hexdigest().encode('ascii')
+
+        memcache_client.set('some_key', [1, 2, 3])
+        self.assertEqual(memcache_client.get('some_key'), [1, 2, 3])
+        # See MSGPACK_FLAG
+        self.assertEqual(mock.cache,
+                         {cache_key: (b'4', 0, b'\x93\x01\x02\x03')})
+
+        value = {'status': 200, 'meta': {'color': u'bl\xfc'},
+                 'bounds': [['', 'a/c'], ['m', 'a/c2']]}
+        memcache_client.set('some_key', value)
+        self.assertEqual(memcache_client.get('some_key'), value)
+        self.assertEqual(memcache_client.get_many(['some_key']), [value])
+        self.assertLess(len(mock.cache[cache_key][2]),
+                        len(json.dumps(value)))
+        # bytes values are treated as UTF-8 strings, as with JSON
+        memcache_client.set('some_key', u'bl\xfc'.encode('utf8'))
+        self.assertEqual(memcache_client.get('some_key'), u'bl\xfc')
+
+        # legacy JSON values are still read
+        json_client = memcached.MemcacheRing(['1.2.3.4:11211'],
+                                             logger=self.logger)
+        json_client._client_cache['1.2.3.4:11211'] = MockedMemcachePool(
+            [(mock, mock)] * 2)
+        json_client.set('some_key', [4, 5, 6])
+        self.assertEqual(mock.cache, {cache_key: (b'2', 0, b'[4, 5, 6]')})
+        self.assertEqual(memcache_client.get('some_key'), [4, 5, 6])
+        # ...and msgpack values are read whichever format is configured
+        memcache_client.set('some_key', [1, 2, 3])
+        self.assertEqual(json_client.get('some_key'), [1, 2, 3])
+        self.assertEqual(json_client.get_many(['some_key']), [[1, 2, 3]])
+
+        # without msgpack, msgpack values are cache misses
+        with patch.object(memcached, 'msgpack', None):
+            self.assertIsNone(json_client.get('some_key'))
+            self.assertEqual(json_client.get_many(['some_key']), [None])
+
+    def test_serialization_format(self):
+        memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'])
+        self.assertEqual(memcached.JSON_FLAG, memcache_client._serialize_flags)
+        with self.assertRaises(ValueError) as cm:
+            memcached.MemcacheRing(['1.2.3.4:11211'],
+                                   serialization_format='pickle')
+        self.assertEqual("Unknown serialization_format: 'pickle' (expected "
+                         "one of json, msgpack)", str(cm.exception))
+        with patch.object(memcached, 'msgpack', None):
+            with self.assertRaises(ImportError) as cm:
+                memcached.MemcacheRing(['1.2.3.4:11211'],
+                                       serialization_format='msgpack')
+        self.assertEqual(
+            'msgpack is required for serialization_format = msgpack',
+            str(cm.exception))
+
     def test_connection_pooling(self):
         with patch('swift.common.memcached.socket') as mock_module:
             def mock_getaddrinfo(host, port, family=socket.AF_INET,
@@ -1790,6 +1971,21 @@ class TestLoadMemcache(unittest.TestCase):
         self.assertIn('invalid literal for int() with base 10:',
                       str(err.exception))
 
+    @unittest.skipIf(memcached.msgpack is None, 'msgpack is not installed')
+    def test_conf_inline_serialization_format(self):
+        with mock.patch.object(memcached, 'ConfigParser', get_config_parser()):
+            memcache = memcached.load_memcache({}, self.logger)
+            self.assertEqual(memcached.JSON_FLAG, memcache._serialize_flags)
+            memcache = memcached.load_memcache({
+                'serialization_format': 'msgpack',
+            }, self.logger)
+            self.assertEqual(memcached.MSGPACK_FLAG,
+                             memcache._serialize_flags)
+            with self.assertRaises(ValueError):
+                memcached.load_memcache({
+                    'serialization_format': 'yaml',
+                }, self.logger)
+
     def test_conf_from_extra_conf(self):
         with mock.patch.object(memcached, 'ConfigParser', get_config_parser()):
             memcache = memcached.load_memcache({}, self.logger)
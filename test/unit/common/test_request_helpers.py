@@ -16,10 +16,15 @@
 """Tests for swift.common.request_helpers"""
 import argparse
 import unittest
+
+import eventlet
+
+from swift.common.exceptions import ListingIterError
 from swift.common.swob import Request, HTTPException, HeaderKeyDict, HTTPOk
 from swift.common.storage_policy import POLICIES, EC_POLICY, REPL_POLICY
 from swift.common import request_helpers as rh
 from swift.common.constraints import AUTO_CREATE_ACCOUNT_PREFIX
+from swift.common.utils import md5
 
 from test.debug_logger import debug_logger
 from test.unit import patch_policies
@@ -773,6 +778,109 @@ class TestSegmentedIterable(unittest.TestCase):
         body = b''.join(si.app_iter)
         self.assertEqual(b'segment1segment2', body)
 
+    def _make_prefetch_listing(self, count):
+        listing = []
+        for i in range(count):
+            path = '/a/c/seg%d' % i
+            body = b'segment%d' % i
+            etag = md5(body, usedforsecurity=False).hexdigest()
+            self.app.register('GET', path, HTTPOk, {'Etag': etag}, body)
+            listing.append({'path': path, 'first_byte': None,
+                            'last_byte': None, 'hash': etag,
+                            'bytes': len(body)})
+        return listing
+
+    def test_prefetch_segments_app_iter(self):
+        listing_iter = self._make_prefetch_listing(5)
+        req = Request.blank('/v1/a/c/mpu')
+        si = rh.SegmentedIterable(req, self.app, listing_iter, 60, self.logger,
+                                  'test-agent', 'test-source',
+                                  prefetch_segments=2, prefetch_bytes=1024)
+        app_iter = iter(si.app_iter)
+        self.assertEqual(b'segment0', next(app_iter))
+        eventlet.sleep(0)
+        # the first segment, and the two segments after it, were requested
+        self.assertEqual(['/a/c/seg0?multipart-manifest=get',
+                          '/a/c/seg1?multipart-manifest=get',
+                          '/a/c/seg2?multipart-manifest=get'],
+                         [path for _method, path in self.app.calls])
+        self.assertEqual(b'segment1segment2segment3segment4',
+                         b''.join(app_iter))
+        self.assertEqual(5, len(self.app.calls))
+        self.assertEqual(5, len([
+            call for call in self.logger.statsd_client.calls['timing_since']
+            if call[0][0] == 'segment_prefetch.stall.timing']))
+
+    def test_prefetch_segments_logger_thread_locals(self):
+        listing_iter = self._make_prefetch_listing(3)
+        self.logger.txn_id = 'tx-prefetch'
+        self.logger.client_ip = '1.2.3.4'
+        seen_thread_locals = []
+
+        def app(env, start_response):
+            seen_thread_locals.append(self.logger.thread_locals)
+            return self.app(env, start_response)
+
+        req = Request.blank('/v1/a/c/mpu')
+        si = rh.SegmentedIterable(req, app, listing_iter, 60, self.logger,
+                                  'test-agent', 'test-source',
+                                  prefetch_segments=2, prefetch_bytes=1024)
+        self.assertEqual(b'segment0segment1segment2', b''.join(si.app_iter))
+        # the segments were requested in prefetching greenthreads, which log
+        # with the transaction's thread locals
+        self.assertEqual([('tx-prefetch', '1.2.3.4')] * 3, seen_thread_locals)
+
+    def test_prefetch_segments_bytes_limit(self):
+        listing_iter = self._make_prefetch_listing(4)
+        req = Request.blank('/v1/a/c/mpu')
+        # no bodies are read ahead, but the segments are still requested
+        si = rh.SegmentedIterable(req, self.app, listing_iter, 60, self.logger,
+                                  'test-agent', 'test-source',
+                                  prefetch_segments=3, prefetch_bytes=0)
+        app_iter = iter(si.app_iter)
+        self.assertEqual(b'segment0', next(app_iter))
+        eventlet.sleep(0)
+        self.assertEqual(4, len(self.app.calls))
+        self.assertEqual(b'segment1segment2segment3', b''.join(app_iter))
+
+    def test_prefetch_segments_bad_etag(self):
+        listing_iter = self._make_prefetch_listing(4)
+        listing_iter[1]['hash'] = 'bad etag'
+        req = Request.blank('/v1/a/c/mpu')
+        si = rh.SegmentedIterable(req, self.app, listing_iter, 60, self.logger,
+                                  'test-agent', 'test-source',
+                                  prefetch_segments=2, prefetch_bytes=0)
+        si.validate_first_segment()
+        self.assertEqual(b'segment0', b''.join(si))
+        error_lines = self.logger.get_lines_for_level('error')
+        self.assertEqual(1, len(error_lines))
+        self.assertIn('Object segment no longer valid: /a/c/seg1',
+                      error_lines[0])
+        # the prefetched segments are closed, without being read, once their
+        # greenthreads have stopped
+        eventlet.sleep(0)
+        self.expected_unread_requests = {
+            ('GET', '/a/c/seg1?multipart-manifest=get'): 1,
+            ('GET', '/a/c/seg2?multipart-manifest=get'): 1,
+            ('GET', '/a/c/seg3?multipart-manifest=get'): 1}
+
+    def test_prefetch_segments_listing_error(self):
+        listing = self._make_prefetch_listing(3)
+
+        def listing_iter():
+            for seg_dict in listing:
+                yield seg_dict
+            raise ListingIterError('boom')
+
+        req = Request.blank('/v1/a/c/mpu')
+        si = rh.SegmentedIterable(req, self.app, listing_iter(), 60,
+                                  self.logger, 'test-agent', 'test-source',
+                                  prefetch_segments=5, prefetch_bytes=1024)
+        si.validate_first_segment()
+        # the segments listed before the error are all sent
+        self.assertEqual(b'segment0segment1segment2', b''.join(si))
+        self.assertEqual(['boom'], self.logger.get_lines_for_level('error'))
+
     def test_simple_segments_app_iter_ranges(self):
         self.app.register('GET', '/a/c/seg1', HTTPOk, {}, 'segment1')
         self.app.register('GET', '/a/c/seg2', HTTPOk, {}, 'segment2')
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import errno
+import gc
+import os
 import random
 import re
 import socket
@@ -21,6 +23,7 @@ import threading
 import time
 import unittest
 import warnings
+import weakref
 
 import mock
 import six
@@ -88,9 +91,227 @@ class TestStatsdClient(BaseTestStasdClient):
         self.assertEqual(mock_open.mock_calls, [
             mock.call(),
             mock.call().sendto(b'tunafish:1|c', ('myhost', 1234)),
-            mock.call().close(),
         ])
 
+    def test_socket_is_reused(self):
+        client = StatsdClient('myhost', 1234)
+        with mock.patch.object(client, '_open_socket') as mock_open:
+            client.increment('tunafish')
+            client.increment('tunafish')
+        self.assertEqual(mock_open.mock_calls, [
+            mock.call(),
+            mock.call().sendto(b'tunafish:1|c', ('myhost', 1234)),
+            mock.call().sendto(b'tunafish:1|c', ('myhost', 1234)),
+        ])
+
+    def test_idle_sockets_are_limited(self):
+        client = StatsdClient('myhost', 1234)
+        busy_sock = mock.MagicMock()
+
+        def fill_pool(*args):
+            # other greenthreads return their sockets during this send
+            client._idle_sockets.extend(
+                mock.MagicMock()
+                for _ in range(statsd_client.MAX_IDLE_SOCKETS))
+
+        busy_sock.sendto.side_effect = fill_pool
+        with mock.patch.object(client, '_open_socket',
+                               return_value=busy_sock):
+            client.increment('tunafish')
+        self.assertEqual(statsd_client.MAX_IDLE_SOCKETS,
+                         len(client._idle_sockets))
+        self.assertNotIn(busy_sock, client._idle_sockets)
+        self.assertEqual([mock.call()], busy_sock.close.mock_calls)
+
+    def test_flush_interval(self):
+        client = StatsdClient('myhost', 1234, flush_interval=10)
+        mock_socket = MockUdpSocket()
+        client._open_socket = lambda *_: mock_socket
+        with mock.patch('swift.common.statsd_client.time.time',
+                        return_value=client._last_flush + 1):
+            client.increment('tunafish')
+            client.increment('tunafish')
+            client.update_stats('tunafish', 3)
+            client.timing('tuna.time', 12.5)
+            client.timing('tuna.time', 7.5)
+            client.decrement('salmon')
+        self.assertEqual([], mock_socket.sent)
+
+        with mock.patch('swift.common.statsd_client.time.time',
+                        return_value=client._last_flush + 10):
+            client.increment('salmon')
+        self.assertEqual(mock_socket.sent, [
+            (b'tunafish:5|c\ntuna.time:12.5|ms\ntuna.time:7.5|ms\n'
+             b'salmon:0|c', ('myhost', 1234)),
+        ])
+
+    def test_flush_respects_max_packet_size(self):
+        client = StatsdClient('myhost', 1234, flush_interval=10,
+                              max_packet_size=30)
+        mock_socket = MockUdpSocket()
+        client._open_socket = lambda *_: mock_socket
+        client.increment('aaaaaaaaaa')
+        client.increment('bbbbbbbbbb')
+        client.increment('cccccccccc')
+        client.flush()
+        self.assertEqual(mock_socket.sent, [
+            (b'aaaaaaaaaa:1|c\nbbbbbbbbbb:1|c', ('myhost', 1234)),
+            (b'cccccccccc:1|c', ('myhost', 1234)),
+        ])
+        client.flush()
+        self.assertEqual(2, len(mock_socket.sent))
+
+    def test_flush_keeps_sample_rates_apart(self):
+        client = StatsdClient('myhost', 1234, flush_interval=10)
+        mock_socket = MockUdpSocket()
+        client._open_socket = lambda *_: mock_socket
+        client.random = lambda: 0.1
+        client.increment('tunafish')
+        client.increment('tunafish', sample_rate=0.5)
+        client.increment('tunafish', sample_rate=0.5)
+        client.flush()
+        self.assertEqual(mock_socket.sent, [
+            (b'tunafish:1|c\ntunafish:2|c|@0.5', ('myhost', 1234)),
+        ])
+
+    def test_forked_child_drops_parent_buffer(self):
+        client = StatsdClient('myhost', 1234, flush_interval=10)
+        mock_socket = MockUdpSocket()
+        client._open_socket = lambda *_: mock_socket
+        client.increment('tunafish')
+        # a child forked now has a copy of the parent's buffer, which it
+        # mustn't send again, whether it flushes...
+        with mock.patch('swift.common.statsd_client.os.getpid',
+                        return_value=-1):
+            client.flush()
+        self.assertEqual([], mock_socket.sent)
+        # ... or buffers its own metrics first
+        client.increment('tunafish')
+        with mock.patch('swift.common.statsd_client.os.getpid',
+                        return_value=-2):
+            client.increment('salmon')
+            client.flush()
+        self.assertEqual(mock_socket.sent, [
+            (b'salmon:1|c', ('myhost', 1234)),
+        ])
+
+    def _patch_flusher_state(self):
+        return mock.patch.multiple(
+            statsd_client, _buffering_clients=weakref.WeakSet(),
+            _flusher_pid=None, _atexit_registered=False)
+
+    def test_flusher(self):
+        with self._patch_flusher_state(), \
+                mock.patch('swift.common.statsd_client.eventlet') as \
+                mock_eventlet:
+            client = StatsdClient('myhost', 1234, flush_interval=10)
+            other_client = StatsdClient('myhost', 1234, flush_interval=5)
+            mock_socket = MockUdpSocket()
+            client._open_socket = lambda *_: mock_socket
+            other_client._open_socket = lambda *_: mock_socket
+            client.increment('tunafish')
+            client.increment('tunafish')
+            other_client.increment('salmon')
+            # one flusher per process, whatever the number of clients
+            self.assertEqual([mock.call(statsd_client._run_flusher)],
+                             mock_eventlet.spawn_n.mock_calls)
+            with mock.patch('swift.common.statsd_client.os.getpid',
+                            return_value=-1):
+                client.increment('tunafish')
+            self.assertEqual([mock.call(statsd_client._run_flusher)] * 2,
+                             mock_eventlet.spawn_n.mock_calls)
+            self.assertEqual([], mock_socket.sent)
+
+            class StopFlusher(BaseException):
+                pass
+
+            now = client._last_flush
+            other_client._last_flush = now
+            mock_eventlet.sleep.side_effect = [None, StopFlusher]
+            with mock.patch('swift.common.statsd_client.time.time',
+                            side_effect=[now + 1, now + 5]), \
+                    self.assertRaises(StopFlusher):
+                statsd_client._run_flusher()
+        # the flusher sleeps until the next client is due to be flushed
+        self.assertEqual([mock.call(4), mock.call(5)],
+                         mock_eventlet.sleep.mock_calls)
+        self.assertEqual(mock_socket.sent, [
+            (b'salmon:1|c', ('myhost', 1234)),
+        ])
+
+    def test_flusher_stops_without_clients(self):
+        with self._patch_flusher_state(), \
+                mock.patch('swift.common.statsd_client.eventlet') as \
+                mock_eventlet:
+            client = StatsdClient('myhost', 1234, flush_interval=10)
+            client._open_socket = lambda *_: MockUdpSocket()
+            client.increment('tunafish')
+            self.assertEqual(os.getpid(), statsd_client._flusher_pid)
+            self.assertEqual([client], list(statsd_client._buffering_clients))
+            # clients are not kept alive by the flusher...
+            del client
+            gc.collect()
+            self.assertEqual([], list(statsd_client._buffering_clients))
+            # ...which stops once there are none
+            statsd_client._run_flusher()
+            self.assertFalse(mock_eventlet.sleep.mock_calls)
+            self.assertIsNone(statsd_client._flusher_pid)
+
+    def test_flusher_not_spawned_from_other_threads(self):
+        with self._patch_flusher_state(), \
+                mock.patch('swift.common.statsd_client.eventlet') as \
+                mock_eventlet:
+            client = StatsdClient('myhost', 1234, flush_interval=10)
+            client._open_socket = lambda *_: MockUdpSocket()
+            thread = threading.Thread(target=client.increment,
+                                      args=('tunafish',))
+            thread.start()
+            thread.join()
+            self.assertEqual(1, len(client._buffer))
+            self.assertFalse(mock_eventlet.spawn_n.mock_calls)
+            client.increment('tunafish')
+            self.assertEqual([mock.call(statsd_client._run_flusher)],
+                             mock_eventlet.spawn_n.mock_calls)
+
+    def test_flusher_error(self):
+        logger = debug_logger()
+        with self._patch_flusher_state():
+            client = StatsdClient('myhost', 1234, flush_interval=10,
+                                  logger=logger)
+
+            class StopFlusher(BaseException):
+                pass
+
+            now = client._last_flush
+            with mock.patch('swift.common.statsd_client.eventlet.sleep',
+                            side_effect=[None, StopFlusher]), \
+                    mock.patch('swift.common.statsd_client.time.time',
+                               side_effect=[now + 10, now + 20]), \
+                    mock.patch.object(client, 'flush',
+                                      side_effect=[ValueError('boom'), None]):
+                with self.assertRaises(StopFlusher):
+                    statsd_client._run_flusher()
+                self.assertEqual(2, client.flush.call_count)
+        self.assertEqual(['Error flushing StatsD metrics: '],
+                         logger.get_lines_for_level('error'))
+
+    def test_flush_at_exit(self):
+        with self._patch_flusher_state(), \
+                mock.patch('swift.common.statsd_client.atexit') as mock_atexit:
+            StatsdClient('myhost', 1234)
+            self.assertEqual([], mock_atexit.register.mock_calls)
+            client = StatsdClient('myhost', 1234, flush_interval=10)
+            other_client = StatsdClient('myhost', 1234, flush_interval=10)
+            # one hook per process
+            self.assertEqual([mock.call(statsd_client._flush_at_exit)],
+                             mock_atexit.register.mock_calls)
+            with mock.patch.object(client, 'flush') as mock_flush, \
+                    mock.patch.object(other_client, 'flush') as \
+                    mock_other_flush:
+                statsd_client._flush_at_exit()
+            self.assertEqual([mock.call()], mock_flush.mock_calls)
+            self.assertEqual([mock.call()], mock_other_flush.mock_calls)
+
     def test_init_host_is_none(self):
         client = StatsdClient(None, None)
         self.assertIsNone(client._host)
@@ -115,6 +336,23 @@ class TestStatsdLogging(BaseTestStasdClient):
             logger.increment('tunafish')
         self.assertFalse(mock_open.mock_calls)
 
+    def test_get_logger_flushes_replaced_statsd_client(self):
+        conf = {'log_statsd_host': 'some.host.com',
+                'log_statsd_flush_interval': '10'}
+        with mock.patch('swift.common.statsd_client.eventlet'):
+            logger = utils.get_logger(conf, 'some-name',
+                                      log_route='some-route')
+            old_client = logger.logger.statsd_client
+            mock_socket = MockUdpSocket()
+            old_client._open_socket = lambda *_: mock_socket
+            logger.increment('tunafish')
+            self.assertEqual([], mock_socket.sent)
+            utils.get_logger(conf, 'some-name', log_route='some-route')
+        self.assertIsNot(old_client, logger.logger.statsd_client)
+        self.assertEqual(
+            [(b'some-name.tunafish:1|c', ('some.host.com', 8125))],
+            mock_socket.sent)
+
     def test_get_logger_statsd_client_defaults(self):
         logger = utils.get_logger({'log_statsd_host': 'some.host.com'},
                                   'some-name', log_route='some-route')
@@ -69,7 +69,7 @@ from uuid import uuid4
 
 from swift.common.exceptions import Timeout, MessageTimeout, \
     ConnectionTimeout, LockTimeout, ReplicationLockTimeout, \
-    MimeInvalid
+    MimeInvalid, BatchCommitInterrupted
 from swift.common import utils
 from swift.common.utils import set_swift_dir, md5, ShardRangeList, \
     SwiftLogFormatter
@@ -5671,6 +5671,127 @@ class TestGreenAsyncPile(unittest.TestCase):
                       mock_stderr.getvalue())
 
 
+class TestGreenBatcher(unittest.TestCase):
+
+    class Batcher(utils.GreenBatcher):
+        def __init__(self, *args, **kwargs):
+            super(TestGreenBatcher.Batcher, self).__init__(*args, **kwargs)
+            self.commits = []
+            self.unblock = eventlet.event.Event()
+
+        def _commit(self, key, items):
+            self.commits.append((key, list(items)))
+            if 'block' in items:
+                self.unblock.wait()
+            if 'explode' in items:
+                raise ValueError('kaboom')
+            return [item if isinstance(item, Exception) else None
+                    for item in items]
+
+    def _run(self, batcher, submits):
+        pool = eventlet.GreenPool()
+        threads = [pool.spawn(batcher.submit, key, item)
+                   for key, item in submits]
+        results = []
+        for gt in threads:
+            try:
+                results.append(gt.wait())
+            except Exception as err:
+                results.append(err)
+        return results
+
+    def test_concurrent_items_batched_per_key(self):
+        batcher = self.Batcher(0.01, 3)
+        submits = [('a', 1), ('b', 2), ('a', 3), ('a', 4), ('a', 5)]
+        with eventlet.Timeout(5):
+            results = self._run(batcher, submits)
+        self.assertEqual([None] * 5, results)
+        self.assertEqual([('a', [1, 3, 4]), ('b', [2]), ('a', [5])],
+                         sorted(batcher.commits, key=lambda c: c[1]))
+        self.assertFalse(batcher._batches)
+
+    def test_errors(self):
+        batcher = self.Batcher(0.01, 10)
+        err = ValueError('bad item')
+        results = self._run(batcher, [('a', 1), ('a', err), ('a', 3)])
+        self.assertEqual([None, err, None], results)
+        # an error raised by the commit is raised for every item
+        results = self._run(batcher, [('a', 1), ('a', 'explode')])
+        self.assertEqual(2, len(results))
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+            self.assertEqual('kaboom', str(result))
+        self.assertFalse(batcher._batches)
+
+    def test_uncontended_leader_does_not_wait(self):
+        batcher = self.Batcher(10, 10)
+        with eventlet.Timeout(1):
+            self.assertIsNone(batcher.submit('a', 1))
+            self.assertIsNone(batcher.submit('a', 2))
+        self.assertEqual([('a', [1]), ('a', [2])], batcher.commits)
+        self.assertFalse(batcher._batches)
+        self.assertFalse(batcher._committing)
+
+    def test_leader_waits_for_commit_in_progress(self):
+        batcher = self.Batcher(10, 10)
+        first = eventlet.spawn(batcher.submit, 'a', 'block')
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        self.assertEqual([('a', ['block'])], batcher.commits)
+        # while the first batch is committed the next batch collects items
+        waiters = [eventlet.spawn(batcher.submit, 'a', i) for i in range(3)]
+        other = eventlet.spawn(batcher.submit, 'b', 'other')
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        self.assertIsNone(other.wait())
+        self.assertEqual([('a', ['block']), ('b', ['other'])],
+                         batcher.commits)
+        # ...and is committed as soon as the first batch has been committed
+        with eventlet.Timeout(1):
+            batcher.unblock.send()
+            self.assertIsNone(first.wait())
+            for waiter in waiters:
+                self.assertIsNone(waiter.wait())
+        self.assertEqual(
+            [('a', ['block']), ('b', ['other']), ('a', [0, 1, 2])],
+            batcher.commits)
+        self.assertFalse(batcher._batches)
+        self.assertFalse(batcher._committing)
+
+    def test_leader_killed_while_waiting(self):
+        batcher = self.Batcher(10, 10)
+        eventlet.spawn(batcher.submit, 'a', 'block')
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        leader = eventlet.spawn(batcher.submit, 'a', 1)
+        eventlet.sleep(0)
+        follower = eventlet.spawn(batcher.submit, 'a', 2)
+        eventlet.sleep(0)
+        leader.kill()
+        with eventlet.Timeout(5):
+            self.assertIsNone(follower.wait())
+        self.assertEqual([('a', ['block']), ('a', [1, 2])], batcher.commits)
+        self.assertFalse(batcher._batches)
+        batcher.unblock.send()
+
+    def test_leader_killed_while_committing(self):
+        batcher = self.Batcher(10, 10)
+        leader = eventlet.spawn(batcher.submit, 'a', 'block')
+        follower = eventlet.spawn(batcher.submit, 'a', 2)
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        self.assertEqual([('a', ['block', 2])], batcher.commits)
+        leader.kill()
+        with eventlet.Timeout(5):
+            with self.assertRaises(BatchCommitInterrupted):
+                follower.wait()
+            # the next batch is not held up
+            self.assertIsNone(batcher.submit('a', 3))
+        self.assertEqual([('a', ['block', 2]), ('a', [3])], batcher.commits)
+        self.assertFalse(batcher._batches)
+        self.assertFalse(batcher._committing)
+
+
 class TestLRUCache(unittest.TestCase):
 
     def test_maxsize(self):
@@ -53,6 +53,32 @@ class Test_LibcWrapper(unittest.TestCase):
             self.assertEqual(tf.read(100), b"defgh")
 
 
+class TestAdviseSequentialRead(unittest.TestCase):
+    def test_advise_sequential_read(self):
+        with tempfile.TemporaryFile() as tf:
+            with mock.patch.object(libc, '_posix_fadvise',
+                                   return_value=0) as mock_fadvise, \
+                    mock.patch('logging.warning') as mock_warning:
+                libc.advise_sequential_read(tf.fileno())
+            mock_warning.assert_not_called()
+            fd = tf.fileno()
+        self.assertEqual(1, mock_fadvise.call_count)
+        args = mock_fadvise.call_args[0]
+        self.assertEqual(fd, args[0])
+        self.assertEqual([0, 0], [arg.value for arg in args[1:3]])
+        # 2 is POSIX_FADV_SEQUENTIAL
+        self.assertEqual(2, args[3])
+
+    def test_advise_sequential_read_failure(self):
+        with mock.patch.object(libc, '_posix_fadvise',
+                               return_value=22), \
+                mock.patch('logging.warning') as mock_warning:
+            libc.advise_sequential_read(-1, 10, 20)
+        self.assertEqual(1, mock_warning.call_count)
+        self.assertEqual({'fd': -1, 'offset': 10, 'length': 20, 'ret': 22},
+                         mock_warning.call_args[0][1])
+
+
 class TestModifyPriority(unittest.TestCase):
     def test_modify_priority(self):
         pid = os.getpid()
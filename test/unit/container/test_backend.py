@@ -3282,6 +3282,85 @@ class TestContainerBroker(test_db.TestDbBase):
         self.assertEqual([row[0] for row in listing],
                          ['/'])
 
+    def test_list_objects_iter_delim_many_subdirs(self):
+        broker = ContainerBroker(self.get_db_path(), account='a',
+                                 container='c')
+        broker.initialize(Timestamp('1').internal, 0)
+        names = ['d%02d/o%d' % (d, o) for d in range(20) for o in range(5)]
+        names += ['d05', 'd05/', 'd050', 'd10-x', 'top']
+        for name in names:
+            broker.put_object(name, Timestamp.now().internal, 0,
+                              'text/plain', EMPTY_ETAG)
+        expected = ['d%02d/' % d for d in range(20)] + [
+            'd05', 'd050', 'd10-x', 'top']
+        expected.sort()
+
+        def do_listing(skip_scan, **kwargs):
+            with mock.patch('swift.container.backend.SKIP_SCAN_SUPPORTED',
+                            skip_scan):
+                return [row[0] for row in broker.list_objects_iter(**kwargs)]
+
+        for skip_scan in (True, False):
+            self.assertEqual(expected, do_listing(
+                skip_scan, limit=100, marker='', end_marker='', prefix='',
+                delimiter='/'))
+            self.assertEqual(expected[:7], do_listing(
+                skip_scan, limit=7, marker='', end_marker='', prefix='',
+                delimiter='/'))
+            self.assertEqual(expected[7:14], do_listing(
+                skip_scan, limit=7, marker=expected[6], end_marker='',
+                prefix='', delimiter='/'))
+            self.assertEqual(expected[::-1][:7], do_listing(
+                skip_scan, limit=7, marker='', end_marker='', prefix='',
+                delimiter='/', reverse=True))
+            self.assertEqual(['d03/', 'd04/', 'd05', 'd05/'], do_listing(
+                skip_scan, limit=100, marker='d02/o4', end_marker='d050',
+                prefix='', delimiter='/'))
+            self.assertEqual(['d05/', 'd05', 'd04/'], do_listing(
+                skip_scan, limit=3, marker='d050', end_marker='',
+                prefix='d0', delimiter='/', reverse=True))
+            self.assertEqual(['d05/o0', 'd05/o1'], do_listing(
+                skip_scan, limit=100, marker='', end_marker='', prefix='d05/',
+                delimiter='/', storage_policy_index=0)[1:3])
+            # objects sorting directly after a subdir are not skipped
+            self.assertEqual(['d05', 'd05/', 'd050', 'd10-x', 'top'],
+                             do_listing(
+                                 skip_scan, limit=100, marker='',
+                                 end_marker='', prefix=None, delimiter=None,
+                                 path=''))
+            # tombstones do not show up as subdirs
+            broker.delete_object('top', Timestamp.now().internal)
+            self.assertEqual(expected[:-1], do_listing(
+                skip_scan, limit=100, marker='', end_marker='', prefix='',
+                delimiter='/'))
+            broker.put_object('top', Timestamp.now().internal, 0,
+                              'text/plain', EMPTY_ETAG)
+
+    def test_list_objects_iter_delim_skip_scan_queries(self):
+        broker = ContainerBroker(self.get_db_path(), account='a',
+                                 container='c')
+        broker.initialize(Timestamp('1').internal, 0)
+        for d in range(50):
+            for o in range(3):
+                broker.put_object('%02d/%d' % (d, o),
+                                  Timestamp.now().internal, 0,
+                                  'text/plain', EMPTY_ETAG)
+        orig_execute = GreenDBConnection.execute
+
+        def count_queries(skip_scan):
+            with mock.patch('swift.container.backend.SKIP_SCAN_SUPPORTED',
+                            skip_scan), mock.patch.object(
+                    GreenDBConnection, 'execute', autospec=True,
+                    side_effect=orig_execute) as mock_execute:
+                listing = broker.list_objects_iter(100, '', '', '', '/')
+            self.assertEqual(['%02d/' % d for d in range(50)],
+                             [row[0] for row in listing])
+            return len([c for c in mock_execute.call_args_list
+                        if 'FROM object' in c[0][1]])
+
+        self.assertEqual(51, count_queries(False))
+        self.assertEqual(1, count_queries(True))
+
     def test_list_objects_iter_order_and_reverse(self):
         # Test ContainerBroker.list_objects_iter
         broker = ContainerBroker(self.get_db_path(), account='a',
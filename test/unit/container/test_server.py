@@ -28,7 +28,7 @@ from shutil import rmtree
 from tempfile import mkdtemp
 from xml.dom import minidom
 
-from eventlet import spawn, Timeout
+from eventlet import spawn, Timeout, GreenPool
 import json
 import six
 from six import StringIO
@@ -568,6 +568,51 @@ class TestContainerController(unittest.TestCase):
         resp = req.get_response(self.controller)
         self.assertEqual(resp.status_int, 404)
 
+    def test_PUT_DELETE_object_group_commit(self):
+        self.controller = container_server.ContainerController(
+            {'devices': self.testdir, 'mount_check': 'false',
+             'group_commit_window': '0.01'},
+            logger=self.logger)
+        self.assertEqual(0.01, self.controller.group_committer.window)
+        self.assertEqual(500, self.controller.group_committer.max_batch_size)
+        req = Request.blank(
+            '/sda1/p/a/c', method='PUT', headers={
+                'X-Timestamp': next(self.ts).internal})
+        self.assertEqual(201, req.get_response(self.controller).status_int)
+
+        def do_update(method, obj):
+            headers = {'X-Timestamp': next(self.ts).internal,
+                       'X-Backend-Storage-Policy-Index': '0'}
+            if method == 'PUT':
+                headers.update({'X-Size': '0', 'X-Etag': 'x',
+                                'X-Content-Type': 'text/plain'})
+            req = Request.blank('/sda1/p/a/c/%s' % obj, method=method,
+                                headers=headers)
+            return req.get_response(self.controller).status_int
+
+        broker = self.controller._get_container_broker('sda1', 'p', 'a', 'c')
+        with mock.patch.object(broker.__class__, 'put_records',
+                               side_effect=broker.__class__.put_records,
+                               autospec=True) as mock_put_records:
+            pool = GreenPool()
+            puts = [pool.spawn(do_update, 'PUT', 'o%d' % i)
+                    for i in range(5)]
+            self.assertEqual([201] * 5, [gt.wait() for gt in puts])
+            deletes = [pool.spawn(do_update, 'DELETE', 'o%d' % i)
+                       for i in range(2)]
+            self.assertEqual([204] * 2, [gt.wait() for gt in deletes])
+        self.assertEqual([5, 2], [len(call[0][1]) for call in
+                                  mock_put_records.call_args_list])
+        self.assertEqual(
+            ['o2', 'o3', 'o4'],
+            [o[0] for o in broker.list_objects_iter(10, '', None, None, '')])
+        self.assertEqual(
+            {'group_commit.batches': 2, 'group_commit.records': 7},
+            self.logger.statsd_client.get_stats_counts())
+
+    def test_PUT_object_group_commit_disabled(self):
+        self.assertIsNone(self.controller.group_committer)
+
     def test_PUT_good_policy_specified(self):
         policy = random.choice(list(POLICIES))
         # Set metadata header
@@ -1722,6 +1767,161 @@ class TestContainerController(unittest.TestCase):
              'content_type': 'foo/bar', 'last_modified': obj_ts.isoformat},
         ])
 
+    def _make_update_records(self, names, policy_index=None):
+        if policy_index is None:
+            policy_index = POLICIES.default.idx
+        return [{'name': name, 'deleted': 0,
+                 'created_at': next(self.ts).internal,
+                 'etag': 'etag-%s' % name, 'size': len(name),
+                 'storage_policy_index': policy_index,
+                 'content_type': 'text/plain'} for name in names]
+
+    def test_update_merge_batch_size_conf(self):
+        self.assertEqual(1000, self.controller.update_merge_batch_size)
+        controller = container_server.ContainerController(
+            {'devices': self.testdir, 'update_merge_batch_size': '10'},
+            logger=self.logger)
+        self.assertEqual(10, controller.update_merge_batch_size)
+        for bad in ('0', '-1', 'auto'):
+            with self.assertRaises(ValueError):
+                container_server.ContainerController(
+                    {'devices': self.testdir,
+                     'update_merge_batch_size': bad},
+                    logger=self.logger)
+
+    def test_UPDATE_merges_in_batches(self):
+        self.controller.update_merge_batch_size = 3
+        req = Request.blank(
+            '/sda1/p/a/c', method='PUT',
+            headers={'X-Timestamp': next(self.ts).internal})
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 201)
+
+        names = ['obj%02d' % i for i in range(8)]
+        records = self._make_update_records(names)
+        req = Request.blank(
+            '/sda1/p/a/c', method='UPDATE',
+            headers={'X-Timestamp': next(self.ts).internal},
+            body=json.dumps(records))
+        with mock.patch('swift.container.backend.ContainerBroker.merge_items',
+                        autospec=True) as mock_merge:
+            resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 202)
+        self.assertEqual([[r['name'] for r in call[0][1]]
+                          for call in mock_merge.call_args_list],
+                         [names[:3], names[3:6], names[6:]])
+
+        req = Request.blank(
+            '/sda1/p/a/c', method='UPDATE',
+            headers={'X-Timestamp': next(self.ts).internal},
+            body=json.dumps(records))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 202)
+        req = Request.blank('/sda1/p/a/c?format=json', method='GET')
+        resp = req.get_response(self.controller)
+        self.assertEqual(names, [o['name'] for o in json.loads(resp.body)])
+
+    def test_UPDATE_invalid_records(self):
+        req = Request.blank(
+            '/sda1/p/a/c', method='PUT',
+            headers={'X-Timestamp': next(self.ts).internal})
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 201)
+
+        for body in ('{}', '[1]', '[{"deleted": 0}]', '[{"name": 1}]',
+                     json.dumps(self._make_update_records(['a']))[:-1]):
+            req = Request.blank(
+                '/sda1/p/a/c', method='UPDATE',
+                headers={'X-Timestamp': next(self.ts).internal},
+                body=body)
+            resp = req.get_response(self.controller)
+            self.assertEqual(resp.status_int, 400, body)
+
+        # records merged before an invalid record remain merged
+        self.controller.update_merge_batch_size = 1
+        records = self._make_update_records(['a', 'b'])
+        req = Request.blank(
+            '/sda1/p/a/c', method='UPDATE',
+            headers={'X-Timestamp': next(self.ts).internal},
+            body=json.dumps(records + [None]))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 400)
+        self.assertEqual(b'Invalid object record at index 2', resp.body)
+        req = Request.blank('/sda1/p/a/c?format=json', method='GET')
+        resp = req.get_response(self.controller)
+        self.assertEqual(['a', 'b'],
+                         [o['name'] for o in json.loads(resp.body)])
+
+    def test_UPDATE_accept_redirect(self):
+        req = Request.blank(
+            '/sda1/p/a/c', method='PUT',
+            headers={'X-Timestamp': next(self.ts).internal})
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 201)
+        names = ['apple', 'banana', 'cherry', 'kiwi', 'lemon', 'melon', 'xyz']
+
+        def do_update(headers):
+            headers['X-Timestamp'] = next(self.ts).internal
+            req = Request.blank(
+                '/sda1/p/a/c', method='UPDATE', headers=headers,
+                body=json.dumps(self._make_update_records(names)))
+            return req.get_response(self.controller)
+
+        def get_names():
+            req = Request.blank('/sda1/p/a/c?format=json', method='GET',
+                                headers={'X-Backend-Record-Type': 'object'})
+            resp = req.get_response(self.controller)
+            return [o['name'] for o in json.loads(resp.body)]
+
+        # not sharded
+        resp = do_update({'X-Backend-Accept-Redirect': 'true'})
+        self.assertEqual(resp.status_int, 202)
+        self.assertEqual('application/json', resp.headers['Content-Type'])
+        self.assertEqual({'merged': 7, 'redirects': []},
+                         json.loads(resp.body))
+        self.assertEqual(names, get_names())
+
+        shard_ranges = [
+            ShardRange('.shards_a/c_created', next(self.ts), '', 'c',
+                       state=ShardRange.CREATED),
+            ShardRange('.shards_a/c_active', next(self.ts), 'c', 'k',
+                       state=ShardRange.ACTIVE),
+            ShardRange('.shards_a/c_sharding', next(self.ts), 'k', 'm',
+                       state=ShardRange.SHARDING),
+            ShardRange('.shards_a/c_found', next(self.ts), 'm', 'p',
+                       state=ShardRange.FOUND),
+        ]
+        for shard_range in shard_ranges:
+            self._put_shard_range(shard_range)
+        # the FOUND shard range does not take updates, and 'xyz' is in none
+        resp = do_update({'X-Backend-Accept-Redirect': 'true'})
+        self.assertEqual(resp.status_int, 202)
+        self.assertEqual({'merged': 2, 'redirects': [
+            {'path': '.shards_a/c_created',
+             'timestamp': shard_ranges[0].timestamp.internal,
+             'rows': [0, 1]},
+            {'path': '.shards_a/c_active',
+             'timestamp': shard_ranges[1].timestamp.internal,
+             'rows': [2]},
+            {'path': '.shards_a/c_sharding',
+             'timestamp': shard_ranges[2].timestamp.internal,
+             'rows': [3, 4]},
+        ]}, json.loads(resp.body))
+
+        # without the header everything is merged, as before
+        with mock.patch('swift.container.backend.ContainerBroker.merge_items',
+                        autospec=True) as mock_merge:
+            for value in (None, 'false'):
+                headers = {}
+                if value:
+                    headers['X-Backend-Accept-Redirect'] = value
+                resp = do_update(headers)
+                self.assertEqual(resp.status_int, 202)
+                self.assertNotIn('redirects', resp.body.decode('ascii'))
+        self.assertEqual([names, names],
+                         [[r['name'] for r in call[0][1]]
+                          for call in mock_merge.call_args_list])
+
     def _populate_container(self, path):
         req = Request.blank(
             path,
@@ -6167,6 +6367,67 @@ class TestContainerController(unittest.TestCase):
     StoragePolicy(3, 'three'),
     StoragePolicy(4, 'four'),
 ])
+class TestFunctions(unittest.TestCase):
+    def test_iter_json_list(self):
+        def do_test(body, chunk_size):
+            return list(container_server.iter_json_list(
+                BytesIO(body), chunk_size=chunk_size))
+
+        items = [{'name': u'obj\u2603', 'size': -1.5}, [], 'x', 10, None,
+                 True, {}]
+        bodies = [json.dumps(items).encode('ascii'),
+                  json.dumps(items, indent=2).encode('ascii'),
+                  json.dumps(items, ensure_ascii=False).encode('utf-8')]
+        for body in bodies:
+            for chunk_size in (1, 2, 7, 65536):
+                self.assertEqual(items, do_test(body, chunk_size))
+        for body in (b'[]', b' [ ] ', b'\n[\n]\n'):
+            self.assertEqual([], do_test(body, 1))
+        self.assertEqual([-12], do_test(b'[-12]', 1))
+        self.assertEqual([-12], do_test(b'[-12 ]', 1))
+
+        for body in (b'', b'{}', b'1', b'[', b'[1', b'[1,', b'[1,]', b'[,1]',
+                     b'[1 2]', b'[-1.]', b'[tru]', b'["x]', b'\xff'):
+            for chunk_size in (1, 3, 65536):
+                with self.assertRaises(ValueError):
+                    do_test(body, chunk_size)
+
+    def test_iter_json_list_reads_lazily(self):
+        body = BytesIO(json.dumps([{'name': 'a'}, {'name': 'b'}] +
+                                  ['x' * 100] * 10).encode('ascii'))
+        items = container_server.iter_json_list(body, chunk_size=20)
+        self.assertEqual({'name': 'a'}, next(items))
+        self.assertEqual({'name': 'b'}, next(items))
+        self.assertLess(body.tell(), 60)
+
+    def test_iter_json_list_max_item_size(self):
+        body = json.dumps(['x' * 100, 'y']).encode('ascii')
+        items = container_server.iter_json_list(
+            BytesIO(body), chunk_size=10, max_item_size=50)
+        with self.assertRaises(ValueError):
+            next(items)
+        items = container_server.iter_json_list(
+            BytesIO(body), chunk_size=10, max_item_size=200)
+        self.assertEqual(['x' * 100, 'y'], list(items))
+
+    def test_find_shard_range(self):
+        ts = Timestamp.now()
+        shard_ranges = [
+            ShardRange('.shards_a/c_a', ts, '', 'b'),
+            ShardRange('.shards_a/c_b', ts, 'd', 'f'),
+            ShardRange('.shards_a/c_c', ts, 'f', 'h'),
+        ]
+        for name, expected in (('a', 0), ('b', 0), ('c', None), ('d', None),
+                               ('e', 1), ('f', 1), ('g', 2), ('h', 2),
+                               ('i', None)):
+            found = container_server.find_shard_range(name, shard_ranges)
+            if expected is None:
+                self.assertIsNone(found, name)
+            else:
+                self.assertIs(shard_ranges[expected], found, name)
+        self.assertIsNone(container_server.find_shard_range('a', []))
+
+
 class TestNonLegacyDefaultStoragePolicy(TestContainerController):
     """
     Test swift.container.server.ContainerController with a non-legacy default
@@ -22,9 +22,11 @@ import string
 import sys
 import time
 import xattr
+import eventlet
 from shutil import rmtree
 from tempfile import mkdtemp
 import textwrap
+from collections import defaultdict
 from os.path import dirname, basename
 
 from test import BaseTestCase
@@ -38,7 +40,7 @@ from swift.obj.watchers.dark_data import DarkDataWatcher
 from swift.obj.diskfile import (
     DiskFile, write_metadata, invalidate_hash, get_data_dir,
     DiskFileManager, ECDiskFileManager, AuditLocation, clear_auditor_status,
-    get_auditor_status, HASH_FILE, HASH_INVALIDATIONS_FILE)
+    get_auditor_status, HASH_FILE, HASH_INVALIDATIONS_FILE, HASH_INDEX_PREFIX)
 from swift.common.exceptions import ClientException
 from swift.common.utils import (
     mkdirs, normalize_timestamp, Timestamp, readconf, md5, PrefixLoggerAdapter)
@@ -187,9 +189,14 @@ class TestAuditor(TestAuditorBase):
             self.assertEqual(mgr.disk_chunk_size, 65536)
         self.assertEqual(auditor_worker.max_files_per_second, 20)
         self.assertEqual(auditor_worker.zero_byte_only_at_fps, 0)
+        self.assertEqual(auditor_worker.device_concurrency, 0)
+        self.assertEqual(auditor_worker.checksum_batch_size, 1048576)
+        self.assertIsNone(auditor_worker.tpool_size)
 
         # test specified audit value overrides
-        conf.update({'disk_chunk_size': 4096})
+        conf.update({'disk_chunk_size': 4096, 'device_concurrency': '4',
+                     'checksum_batch_size': '65536',
+                     'eventlet_tpool_num_threads': '6'})
         auditor_worker = auditor.AuditorWorker(conf, self.logger,
                                                self.rcache, self.devices,
                                                zero_byte_only_at_fps=50)
@@ -199,6 +206,17 @@ class TestAuditor(TestAuditorBase):
             self.assertEqual(mgr.disk_chunk_size, 4096)
         self.assertEqual(auditor_worker.max_files_per_second, 50)
         self.assertEqual(auditor_worker.zero_byte_only_at_fps, 50)
+        self.assertEqual(auditor_worker.device_concurrency, 4)
+        self.assertEqual(auditor_worker.checksum_batch_size, 65536)
+        self.assertEqual(auditor_worker.tpool_size, 6)
+
+        for bad in ({'device_concurrency': '-1'},
+                    {'checksum_batch_size': '0'},
+                    {'eventlet_tpool_num_threads': 'bad'}):
+            bad_conf = dict(conf, **bad)
+            with self.assertRaises(ValueError):
+                auditor.AuditorWorker(bad_conf, self.logger, self.rcache,
+                                      self.devices)
 
     def test_object_audit_extra_data(self):
         def run_tests(disk_file):
@@ -435,6 +453,71 @@ class TestAuditor(TestAuditorBase):
                       'Invalid EC metadata at offset 0x0',
                       log_lines[0])
 
+    def test_object_audit_in_thread_pool(self):
+        conf = dict(self.conf, device_concurrency='2',
+                    checksum_batch_size='1000', disk_chunk_size='300')
+        data = b'0' * 2500
+
+        def do_test(disk_file, data, etag=None):
+            timestamp = str(normalize_timestamp(time.time()))
+            with disk_file.create() as writer:
+                writer.write(data)
+                metadata = {
+                    'ETag': etag or md5(
+                        data, usedforsecurity=False).hexdigest(),
+                    'X-Timestamp': timestamp,
+                    'Content-Length': len(data),
+                }
+                if disk_file.policy.policy_type == EC_POLICY:
+                    metadata.update({
+                        'X-Object-Sysmeta-Ec-Frag-Index': '1',
+                        'X-Object-Sysmeta-Ec-Etag': 'fake-etag',
+                    })
+                writer.put(metadata)
+                writer.commit(Timestamp(timestamp))
+
+            auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                                   self.rcache, self.devices)
+            with mock.patch('swift.obj.auditor.tpool.execute',
+                            side_effect=lambda f, *a: f(*a)) as mock_execute, \
+                    mock.patch('swift.obj.auditor.advise_sequential_read') \
+                    as mock_advise:
+                auditor_worker.object_audit(
+                    AuditLocation(disk_file._datadir, 'sda', '0',
+                                  policy=disk_file.policy))
+            self.assertEqual(1, mock_advise.call_count)
+            return auditor_worker, mock_execute
+
+        # the data is read and checked a batch at a time
+        auditor_worker, mock_execute = do_test(self.disk_file, data)
+        self.assertEqual(0, auditor_worker.quarantines)
+        # the diskfile is opened, then 2 batches of 4 chunks are read, then
+        # one of the last chunk
+        self.assertEqual(4, mock_execute.call_count)
+        self.assertEqual(auditor_worker._open_diskfile,
+                         mock_execute.call_args_list[0][0][0])
+        self.assertEqual(2500, auditor_worker.bytes_processed)
+        self.assertEqual({'files': 1, 'bytes': 2500},
+                         auditor_worker.device_stats['sda'])
+
+        # a checksum mismatch is found in the thread pool
+        auditor_worker, mock_execute = do_test(
+            self.disk_file, data,
+            etag=md5(b'1' + data[1:], usedforsecurity=False).hexdigest())
+        self.assertEqual(1, auditor_worker.quarantines)
+        self.assertIn("failed audit and was quarantined: ETag",
+                      self.logger.get_lines_for_level('error')[-1])
+
+        # as is a bad EC fragment
+        frag = self.disk_file_ec.policy.pyeclib_driver.encode(
+            b'x' * self.disk_file_ec.policy.ec_segment_size)[0]
+        auditor_worker, mock_execute = do_test(
+            self.disk_file_ec, frag + b'blah' * 16 + frag[64:])
+        self.assertEqual(1, auditor_worker.quarantines)
+        self.assertIn('failed audit and was quarantined: '
+                      'Invalid EC metadata at offset 0x%x' % len(frag),
+                      self.logger.get_lines_for_level('error')[-1])
+
     def test_object_audit_no_meta(self):
         timestamp = str(normalize_timestamp(time.time()))
         path = os.path.join(self.disk_file._datadir, timestamp + '.data')
@@ -816,6 +899,187 @@ class TestAuditor(TestAuditorBase):
                      'bytes_processed': 0}}})
         self.assertEqual(expected, actual_rcache)
 
+    def test_object_run_device_concurrency(self):
+        conf = dict(self.conf, device_concurrency='2')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        auditor_worker.log_time = 0
+        data = b'0' * 1024
+        timestamp = Timestamp(time.time())
+        disk_files = [self.disk_file, self.disk_file_p1]
+        for i in range(4):
+            disk_files.append(self.df_mgr.get_diskfile(
+                'sda', '1', 'a', 'c', 'o%d' % i, policy=POLICIES[0]))
+        disk_files.append(self.df_mgr.get_diskfile(
+            'sdb', '0', 'a', 'c', 'o', policy=POLICIES[0]))
+        for df in disk_files:
+            with df.create() as writer:
+                writer.write(data)
+                writer.put({
+                    'ETag': md5(data, usedforsecurity=False).hexdigest(),
+                    'X-Timestamp': timestamp.internal,
+                    'Content-Length': str(len(data)),
+                })
+                writer.commit(timestamp)
+
+        running = []
+        max_running = [0]
+        real_object_audit = auditor_worker.object_audit
+
+        def fake_object_audit(location):
+            running.append(location.device)
+            max_running[0] = max(max_running[0],
+                                 running.count(location.device))
+            try:
+                # let the other audits run
+                eventlet.sleep(0)
+                real_object_audit(location)
+            finally:
+                running.remove(location.device)
+
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               fake_object_audit), \
+                mock.patch('swift.obj.auditor.dump_recon_cache') \
+                as mock_dump, \
+                mock.patch('swift.obj.auditor.tpool.set_num_threads') \
+                as mock_set_num_threads:
+            auditor_worker.audit_all_objects()
+        self.assertFalse(self.logger.get_lines_for_level('error'))
+        # by default there is a thread for each audit greenthread
+        self.assertEqual([mock.call(2 * len(os.listdir(self.devices)))],
+                         mock_set_num_threads.call_args_list)
+        self.assertEqual(len(disk_files), auditor_worker.total_files_processed)
+        self.assertEqual(len(disk_files) * 1024,
+                         auditor_worker.total_bytes_processed)
+        # no more than device_concurrency audits at once on a device
+        self.assertEqual(2, max_running[0])
+
+        # each device's throughput is reported to recon
+        device_stats = defaultdict(list)
+        for call in mock_dump.call_args_list:
+            stats = call[0][0]['object_auditor_stats_ALL']
+            for device, rates in stats['device_stats'].items():
+                device_stats[device].append(rates)
+        self.assertEqual(['sda', 'sdb'], sorted(device_stats))
+        for rates in device_stats['sda']:
+            self.assertEqual(['bytes_per_second', 'files_per_second'],
+                             sorted(rates))
+            self.assertGreater(rates['bytes_per_second'], 0)
+
+    def test_audit_devices_stopped_early(self):
+        conf = dict(self.conf, device_concurrency='2')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        data = b'0' * 1024
+        timestamp = Timestamp(time.time())
+        for i in range(6):
+            df = self.df_mgr.get_diskfile(
+                'sda', '0', 'a', 'c', 'o%d' % i, policy=POLICIES[0])
+            with df.create() as writer:
+                writer.write(data)
+                writer.put({
+                    'ETag': md5(data, usedforsecurity=False).hexdigest(),
+                    'X-Timestamp': timestamp.internal,
+                    'Content-Length': str(len(data)),
+                })
+                writer.commit(timestamp)
+
+        audited = []
+
+        def fake_object_audit(location):
+            eventlet.sleep(0)
+            audited.append(location)
+
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               fake_object_audit), \
+                mock.patch('swift.obj.auditor.tpool.execute',
+                           side_effect=lambda f, *a: f(*a)) as mock_execute:
+            audit_times = auditor_worker._audit_devices(['sda'])
+            next(audit_times)
+            audit_times.close()
+            num_audited = len(audited)
+            for _ in range(10):
+                eventlet.sleep(0)
+        # the audits stop with the caller
+        self.assertLess(num_audited, 6)
+        self.assertEqual(num_audited, len(audited))
+        # the hash dirs are listed in the thread pool
+        self.assertEqual(
+            [mock.call(next, mock.ANY, None)] * mock_execute.call_count,
+            mock_execute.call_args_list)
+        self.assertGreater(mock_execute.call_count, 0)
+
+    def test_object_audit_device_concurrency_record_stats(self):
+        conf = dict(self.conf, device_concurrency='2',
+                    object_size_stats='10,2048')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        data = b'0' * 1024
+        timestamp = Timestamp(time.time())
+        with self.disk_file.create() as writer:
+            writer.write(data)
+            writer.put({
+                'ETag': md5(data, usedforsecurity=False).hexdigest(),
+                'X-Timestamp': timestamp.internal,
+                'Content-Length': str(len(data)),
+            })
+            writer.commit(timestamp)
+
+        in_thread_pool = []
+        real_execute = auditor.tpool.execute
+
+        def fake_execute(func, *args):
+            in_thread_pool.append(True)
+            try:
+                return real_execute(func, *args)
+            finally:
+                in_thread_pool.pop()
+
+        real_record_stats = auditor_worker.record_stats
+
+        def fake_record_stats(obj_size):
+            # the size buckets are not updated by several threads at once
+            self.assertFalse(in_thread_pool)
+            real_record_stats(obj_size)
+
+        with mock.patch('swift.obj.auditor.tpool.execute', fake_execute), \
+                mock.patch.object(auditor_worker, 'record_stats',
+                                  fake_record_stats):
+            auditor_worker.object_audit(
+                AuditLocation(self.disk_file._datadir, 'sda', '0',
+                              policy=POLICIES.legacy))
+        self.assertEqual({10: 0, 2048: 1, 'OVER': 0},
+                         auditor_worker.stats_buckets)
+
+    def test_audit_devices_tpool_size(self):
+        conf = dict(self.conf, device_concurrency='2',
+                    eventlet_tpool_num_threads='3')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        calls = []
+        with mock.patch('swift.obj.auditor.tpool.killall',
+                        side_effect=lambda: calls.append('killall')), \
+                mock.patch('swift.obj.auditor.tpool.set_num_threads',
+                           side_effect=calls.append):
+            list(auditor_worker._audit_devices(['sda']))
+        # threads left from a previous pass are stopped before resizing
+        self.assertEqual(['killall', 3], calls)
+
+    def test_object_run_device_concurrency_listing_error(self):
+        conf = dict(self.conf, device_concurrency='2')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        with mock.patch('swift.obj.diskfile.get_auditor_status',
+                        side_effect=OSError('boom')), \
+                mock.patch('swift.obj.auditor.tpool.set_num_threads') \
+                as mock_set_num_threads:
+            auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertEqual([mock.call(2)], mock_set_num_threads.call_args_list)
+        self.assertEqual(0, auditor_worker.total_files_processed)
+        self.assertEqual(['ERROR listing objects to audit on sda: '],
+                         [line.split('\n')[0] for line in
+                          self.logger.get_lines_for_level('error')])
+
     def test_object_run_once_no_sda(self):
         auditor_worker = auditor.AuditorWorker(self.conf, self.logger,
                                                self.rcache, self.devices)
@@ -1052,6 +1316,36 @@ class TestAuditor(TestAuditorBase):
                          os.listdir(self.disk_file._datadir))
         return part_dir, suffix
 
+    def test_audit_partition_with_hash_index(self):
+        data = b'0' * 1024
+        timestamp = Timestamp.now()
+        with self.disk_file.create() as writer:
+            writer.write(data)
+            writer.put({
+                'ETag': md5(data, usedforsecurity=False).hexdigest(),
+                'X-Timestamp': timestamp.internal,
+                'Content-Length': str(len(data)),
+            })
+            writer.commit(timestamp)
+        # hash dirs are only indexed once they're not being modified
+        old_time = time.time() - 10
+        os.utime(self.disk_file._datadir, (old_time, old_time))
+        self.disk_file.manager.get_hashes(
+            'sda', '0', [], self.disk_file.policy)
+        suffix = basename(dirname(self.disk_file._datadir))
+        part_dir = dirname(dirname(self.disk_file._datadir))
+        index_file = os.path.join(part_dir, HASH_INDEX_PREFIX + suffix)
+        self.assertTrue(os.path.isfile(index_file))  # sanity
+
+        self.auditor = auditor.ObjectAuditor(self.conf)
+        self.auditor.log_time = 0
+        self.auditor.run_audit(mode='once')
+        # the index is not audited as if it were an object
+        self.assertTrue(os.path.isfile(index_file))
+        self.assertTrue(os.path.exists(self.disk_file._datadir))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.devices, 'sda', 'quarantined')))
+
     def test_non_reclaimable_tombstone(self):
         # audit with a recent tombstone
         ts_tomb = Timestamp(time.time() - 55)
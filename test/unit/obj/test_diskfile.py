@@ -1043,6 +1043,55 @@ class TestObjectAuditLocationGenerator(unittest.TestCase):
                 'Skipping: %s/garbage is not mounted' % tmpdir,
             ], debug_lines)
 
+    def test_inode_order(self):
+        with temptree([]) as tmpdir:
+            part_path = os.path.join(tmpdir, "sdp", "objects", "1519")
+            hsh_paths = [
+                os.path.join(part_path, "aca",
+                             "5c1fdc1ffb12e5eaf84edc30d8b67aca"),
+                os.path.join(part_path, "aca",
+                             "fdfd184d39080020bc8b487f8a7beaca"),
+                os.path.join(part_path, "df2",
+                             "b0fe7af831cc7b1af5bf486b1c841df2"),
+            ]
+            for hsh_path in hsh_paths:
+                os.makedirs(hsh_path)
+            other_path = os.path.join(tmpdir, "sdp", "objects", "9720", "ca5",
+                                      "4a943bc72c2e647c4675923d58cf4ca5")
+            os.makedirs(other_path)
+            # the inodes put the last hash dir first
+            inodes = {hsh_paths[2]: 10, hsh_paths[0]: 20, hsh_paths[1]: 30,
+                      other_path: 1}
+            real_scandir = os.scandir
+
+            def fake_scandir(path):
+                return [mock.MagicMock(path=entry.path,
+                                       inode=lambda p=entry.path: inodes[p])
+                        for entry in real_scandir(path)]
+
+            with mock.patch('swift.obj.diskfile.os.scandir', fake_scandir), \
+                    mock.patch('swift.obj.diskfile.os.stat',
+                               wraps=os.stat) as mock_stat, \
+                    mock.patch('swift.obj.diskfile.os.lstat',
+                               wraps=os.lstat) as mock_lstat:
+                locations = [
+                    (loc.path, loc.partition)
+                    for loc in diskfile.object_audit_location_generator(
+                        devices=tmpdir, datadir="objects", mount_check=False,
+                        inode_order=True)]
+            # the inodes come from the directory listing
+            stat_paths = [call[0][0] for call in
+                          mock_stat.call_args_list + mock_lstat.call_args_list]
+            for path in inodes:
+                self.assertNotIn(path, stat_paths)
+            # each partition is sorted on its own
+            parts = [part for path, part in locations]
+            self.assertEqual(sorted(parts, key=parts.index), parts)
+            self.assertEqual(
+                [hsh_paths[2], hsh_paths[0], hsh_paths[1]],
+                [path for path, part in locations if part == '1519'])
+            self.assertIn((other_path, '9720'), locations)
+
     def test_only_catch_expected_errors(self):
         # Crazy exceptions should still escape object_audit_location_generator
         # so that errors get logged and a human can see what's going wrong;
@@ -8294,6 +8343,143 @@ class TestSuffixHashes(unittest.TestCase):
             self.assertEqual(hashes, {})
             self.assertFalse(os.path.exists(df._datadir))
 
+    def test_hash_suffix_uses_hash_index(self):
+        paths, suffix = find_paths_with_matching_suffixes(2, 1)
+        for policy in self.iter_policies():
+            df_mgr = self.df_router[policy]
+            dfs = []
+            for a, c, o in paths[suffix][:2]:
+                df = df_mgr.get_diskfile(
+                    'sda1', '0', a, c, o, policy=policy)
+                df.delete(self.ts())
+                dfs.append(df)
+            suffix_dir = os.path.dirname(dfs[0]._datadir)
+            # hash dirs are only indexed once they're not being modified
+            old_time = time() - 10
+            for df in dfs:
+                os.utime(df._datadir, (old_time, old_time))
+            hashes = df_mgr.get_hashes('sda1', '0', [], policy)
+            index = diskfile.read_hash_index(suffix_dir)
+            self.assertEqual(
+                sorted(os.path.basename(df._datadir) for df in dfs),
+                sorted(index))
+
+            # a recalculation of the suffix uses the index...
+            with mock.patch.object(
+                    df_mgr, 'cleanup_ondisk_files',
+                    side_effect=df_mgr.cleanup_ondisk_files) as mock_cleanup:
+                self.assertEqual(hashes, df_mgr.get_hashes(
+                    'sda1', '0', [suffix], policy))
+            mock_cleanup.assert_not_called()
+
+            # ... and only cleans up the hash dir that changed
+            dfs[0].delete(self.ts())
+            with mock.patch.object(
+                    df_mgr, 'cleanup_ondisk_files',
+                    side_effect=df_mgr.cleanup_ondisk_files) as mock_cleanup:
+                hashes = df_mgr.get_hashes('sda1', '0', [suffix], policy)
+            self.assertEqual([mock.call(dfs[0]._datadir, policy=policy)],
+                             mock_cleanup.call_args_list)
+
+            # the index is a file alongside hashes.pkl...
+            index_file = os.path.join(os.path.dirname(suffix_dir),
+                                      diskfile.HASH_INDEX_PREFIX + suffix)
+            self.assertTrue(os.path.isfile(index_file))
+            # ... and the suffix gets the same hash as without an index
+            os.unlink(index_file)
+            self.assertEqual(hashes, df_mgr.get_hashes(
+                'sda1', '0', [suffix], policy))
+
+    def test_hash_suffix_hash_index_reclaim_tombstone(self):
+        for policy in self.iter_policies():
+            df_mgr = self.df_router[policy]
+            df = df_mgr.get_diskfile(
+                'sda1', '0', 'a', 'c', 'o', policy=policy)
+            suffix_dir = os.path.dirname(df._datadir)
+            suffix = os.path.basename(suffix_dir)
+            df_mgr.reclaim_age = 1000
+            df.delete(Timestamp(time() - 500))
+            old_time = time() - 10
+            os.utime(df._datadir, (old_time, old_time))
+            hashes = df_mgr.get_hashes('sda1', '0', [], policy)
+            self.assertIn(suffix, hashes)
+            self.assertIn(os.path.basename(df._datadir),
+                          diskfile.read_hash_index(suffix_dir))
+
+            # the indexed tombstone is reclaimable now, so it isn't trusted
+            df_mgr.reclaim_age = 200
+            hashes = df_mgr.get_hashes('sda1', '0', [suffix], policy)
+            self.assertEqual(hashes, {})
+            self.assertFalse(os.path.exists(df._datadir))
+            self.assertEqual({}, diskfile.read_hash_index(suffix_dir))
+
+    def test_get_suffix_trees(self):
+        paths, suffix = find_paths_with_matching_suffixes(2, 1)
+        for policy in self.iter_policies():
+            df_mgr = self.df_router[policy]
+            dfs = []
+            for a, c, o in paths[suffix][:2]:
+                df = df_mgr.get_diskfile(
+                    'sda1', '0', a, c, o, policy=policy)
+                df.delete(self.ts())
+                dfs.append(df)
+            hsh1, hsh2 = [os.path.basename(df._datadir) for df in dfs]
+            trees = df_mgr.get_suffix_trees(
+                'sda1', '0', [suffix, 'abc', 'junk'], policy)
+            self.assertEqual(sorted([suffix, 'abc']), sorted(trees))
+            self.assertEqual({}, trees['abc'])
+            tree = trees[suffix]
+            buckets = set(diskfile.hash_tree_bucket(suffix, hsh)
+                          for hsh in (hsh1, hsh2))
+            self.assertEqual(buckets, set(tree))
+            for bucket in buckets:
+                self.assertEqual(suffix, bucket[:-1])
+            leaves = {}
+            for bucket_leaves in tree.values():
+                leaves.update(bucket_leaves)
+            self.assertEqual(sorted([hsh1, hsh2]), sorted(leaves))
+            # each hash dir has its own digest
+            self.assertNotEqual(leaves[hsh1], leaves[hsh2])
+
+            # an indexed hash dir has the same digest as when it is listed
+            old_time = time() - 10
+            for df in dfs:
+                os.utime(df._datadir, (old_time, old_time))
+            df_mgr.get_hashes('sda1', '0', [suffix], policy)
+            self.assertEqual(2, len(diskfile.read_hash_index(
+                os.path.dirname(dfs[0]._datadir))))
+            with mock.patch.object(
+                    df_mgr, 'cleanup_ondisk_files',
+                    side_effect=df_mgr.cleanup_ondisk_files) as mock_cleanup:
+                self.assertEqual({suffix: tree}, df_mgr.get_suffix_trees(
+                    'sda1', '0', [suffix], policy))
+            mock_cleanup.assert_not_called()
+
+            # only the changed hash dir's digest changes
+            dfs[0].delete(self.ts())
+            trees2 = df_mgr.get_suffix_trees('sda1', '0', [suffix], policy)
+            bucket1 = diskfile.hash_tree_bucket(suffix, hsh1)
+            bucket2 = diskfile.hash_tree_bucket(suffix, hsh2)
+            self.assertNotEqual(tree[bucket1][hsh1],
+                                trees2[suffix][bucket1][hsh1])
+            self.assertEqual(tree[bucket2][hsh2],
+                             trees2[suffix][bucket2][hsh2])
+            digests = diskfile.hash_tree_bucket_digests(tree)
+            digests2 = diskfile.hash_tree_bucket_digests(trees2[suffix])
+            self.assertNotEqual(digests[bucket1], digests2[bucket1])
+            if bucket1 != bucket2:
+                self.assertEqual(digests[bucket2], digests2[bucket2])
+
+    def test_get_suffix_trees_no_partition(self):
+        for policy in self.iter_policies():
+            df_mgr = self.df_router[policy]
+            self.assertEqual({'abc': {}}, df_mgr.get_suffix_trees(
+                'sda1', '9', ['abc'], policy))
+            with mock.patch.object(df_mgr, 'get_dev_path', return_value=None):
+                self.assertRaises(
+                    DiskFileDeviceUnavailable, df_mgr.get_suffix_trees,
+                    'sda1', '0', ['abc'], policy)
+
     def test_hash_suffix_one_reclaim_and_one_valid_tombstone(self):
         paths, suffix = find_paths_with_matching_suffixes(2, 1)
         for policy in self.iter_policies():
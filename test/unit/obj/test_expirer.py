@@ -14,6 +14,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import os
 from time import time
 from unittest import main, TestCase
 from test.debug_logger import debug_logger
@@ -830,6 +832,83 @@ class TestObjectExpirer(TestCase):
                 'Pass completed in 0s; 10 objects expired',
             ])
 
+    def test_task_assignment(self):
+        x = expirer.ObjectExpirer(self.conf, logger=self.logger,
+                                  swift=self.fake_swift)
+        self.assertEqual('object', x.task_assignment)
+        x = expirer.ObjectExpirer(dict(self.conf, task_assignment='Container'),
+                                  logger=self.logger, swift=self.fake_swift)
+        self.assertEqual('container', x.task_assignment)
+        with self.assertRaises(ValueError) as ctx:
+            expirer.ObjectExpirer(dict(self.conf, task_assignment='other'),
+                                  logger=self.logger, swift=self.fake_swift)
+        self.assertEqual('task_assignment must be one of object, container',
+                         str(ctx.exception))
+
+    def _run_once_with_processes(self, task_assignment, processes):
+        listed_containers = []
+        expired_target_paths = []
+        for process in range(processes):
+            x = expirer.ObjectExpirer(
+                dict(self.conf, task_assignment=task_assignment,
+                     processes=processes, process=process),
+                logger=self.logger, swift=self.fake_swift)
+            x.pop_queue = lambda a, c, o: None
+            x.delete_actual_object = \
+                lambda path, ts, is_async: expired_target_paths.append(path)
+            orig_iter_objects = self.fake_swift.iter_objects
+
+            def fake_iter_objects(account, container):
+                listed_containers.append(container)
+                return orig_iter_objects(account, container)
+
+            with mock.patch.object(self.fake_swift, 'iter_objects',
+                                   fake_iter_objects):
+                x.run_once()
+        return listed_containers, expired_target_paths
+
+    def test_run_once_task_assignment_object(self):
+        listed_containers, expired_target_paths = \
+            self._run_once_with_processes('object', 3)
+        # every process lists every task container
+        self.assertEqual(3 * [self.empty_time, self.past_time,
+                              self.just_past_time], listed_containers)
+        self.assertEqual(
+            sorted(self.expired_target_paths[self.past_time] +
+                   self.expired_target_paths[self.just_past_time]),
+            sorted(expired_target_paths))
+
+    def test_run_once_task_assignment_container(self):
+        listed_containers, expired_target_paths = \
+            self._run_once_with_processes('container', 3)
+        # each task container is listed by one process
+        self.assertEqual(sorted([self.empty_time, self.past_time,
+                                 self.just_past_time]),
+                         sorted(listed_containers))
+        self.assertEqual(
+            sorted(self.expired_target_paths[self.past_time] +
+                   self.expired_target_paths[self.just_past_time]),
+            sorted(expired_target_paths))
+
+    def test_run_once_records_backlog(self):
+        x = expirer.ObjectExpirer(dict(self.conf, processes=2, process=1),
+                                  logger=self.logger, swift=self.fake_swift)
+        x.pop_queue = lambda a, c, o: None
+        x.delete_actual_object = lambda path, ts, is_async: None
+        now = time()
+        with mock.patch('swift.obj.expirer.time', return_value=now):
+            x.run_once()
+        with open(os.path.join(self.rcache, 'object.recon')) as fd:
+            recon = json.load(fd)
+        backlog = recon['object_expiration_backlog']
+        self.assertEqual(['1'], list(backlog))
+        self.assertEqual(x.report_backlog, backlog['1']['tasks'])
+        self.assertGreater(backlog['1']['tasks'], 0)
+        self.assertLess(backlog['1']['tasks'], 10)
+        self.assertEqual(now - float(x.report_oldest_task),
+                         backlog['1']['lag'])
+        self.assertGreaterEqual(backlog['1']['lag'], 0)
+
     def test_run_once_rate_limited(self):
         x = expirer.ObjectExpirer(
             dict(self.conf, tasks_per_second=2),
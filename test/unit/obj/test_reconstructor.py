@@ -6024,6 +6024,163 @@ class TestReconstructFragmentArchive(BaseTestObjectReconstructor):
                     object_reconstructor.ObjectReconstructor(
                         {'request_node_count': bad})
 
+    def test_decode_conf(self):
+        reconstructor = object_reconstructor.ObjectReconstructor({})
+        self.assertEqual(4, reconstructor.decode_batch_segments)
+
+        reconstructor = object_reconstructor.ObjectReconstructor(
+            {'decode_batch_segments': '1'})
+        self.assertEqual(1, reconstructor.decode_batch_segments)
+
+        for bad in ('0', '-1', 'auto'):
+            with annotate_failure(bad):
+                with self.assertRaises(ValueError):
+                    object_reconstructor.ObjectReconstructor(
+                        {'decode_batch_segments': bad})
+
+        self.assertIsNone(reconstructor.decode_pool)
+        reconstructor = object_reconstructor.ObjectReconstructor(
+            {'decode_processes': '0'})
+        self.assertIsNone(reconstructor.decode_pool)
+        reconstructor = object_reconstructor.ObjectReconstructor(
+            {'decode_processes': '3'})
+        self.assertEqual(3, reconstructor.decode_pool.num_processes)
+
+        for bad in ('-1', 'auto'):
+            with annotate_failure(bad):
+                with self.assertRaises(ValueError):
+                    object_reconstructor.ObjectReconstructor(
+                        {'decode_processes': bad})
+
+    def test_reconstruct_fa_decode_batches(self):
+        self._configure_reconstructor(decode_batch_segments=2)
+        job = {
+            'partition': 0,
+            'policy': self.policy,
+        }
+        part_nodes = self.policy.object_ring.get_part_nodes(0)
+        node = part_nodes[1]
+        node['backend_index'] = self.policy.get_backend_index(node['index'])
+
+        # five whole segments and a part of a segment
+        test_data = (b'rebuild' * self.policy.ec_segment_size)[
+            :self.policy.ec_segment_size * 5 + 777]
+        etag = md5(test_data, usedforsecurity=False).hexdigest()
+        ec_archive_bodies = encode_frag_archive_bodies(self.policy, test_data)
+        broken_body = ec_archive_bodies.pop(1)
+
+        responses = list()
+        for body in ec_archive_bodies:
+            headers = get_header_frag_index(self, body)
+            headers.update({'X-Object-Sysmeta-Ec-Etag': etag})
+            responses.append((200, body, headers))
+
+        codes, body_iter, headers = zip(*responses)
+        with mocked_http_conn(
+                *codes, body_iter=body_iter, headers=headers), \
+                mock.patch.object(
+                    self.reconstructor, '_reconstruct_segments',
+                    wraps=self.reconstructor._reconstruct_segments) \
+                as mock_reconstruct:
+            df = self.reconstructor.reconstruct_fa(
+                job, node, self._create_fragment(2, body=b''))
+            fixed_body = b''.join(df.reader())
+        self.assertEqual(len(fixed_body), len(broken_body))
+        self.assertEqual(md5(fixed_body, usedforsecurity=False).hexdigest(),
+                         md5(broken_body, usedforsecurity=False).hexdigest())
+        self.assertEqual([2, 2, 2], [
+            len(call[0][1]) for call in mock_reconstruct.call_args_list])
+        self.assertEqual(
+            3, len(self.logger.statsd_client.calls['timing_since']))
+        self.assertEqual({
+            'decode.policy.%d.segments' % int(self.policy): 6,
+            'decode.policy.%d.bytes' % int(self.policy): len(broken_body),
+        }, self.logger.statsd_client.get_stats_counts())
+        self.assertFalse(self.logger.get_lines_for_level('error'))
+
+    def test_reconstruct_fa_decode_processes(self):
+        self._configure_reconstructor(decode_batch_segments=2,
+                                      decode_processes=2)
+        self.addCleanup(self.reconstructor.decode_pool.close)
+        job = {
+            'partition': 0,
+            'policy': self.policy,
+        }
+        part_nodes = self.policy.object_ring.get_part_nodes(0)
+        node = part_nodes[1]
+        node['backend_index'] = self.policy.get_backend_index(node['index'])
+
+        test_data = (b'rebuild' * self.policy.ec_segment_size)[
+            :self.policy.ec_segment_size * 3 + 777]
+        etag = md5(test_data, usedforsecurity=False).hexdigest()
+        ec_archive_bodies = encode_frag_archive_bodies(self.policy, test_data)
+        broken_body = ec_archive_bodies.pop(1)
+
+        responses = list()
+        for body in ec_archive_bodies:
+            headers = get_header_frag_index(self, body)
+            headers.update({'X-Object-Sysmeta-Ec-Etag': etag})
+            responses.append((200, body, headers))
+
+        codes, body_iter, headers = zip(*responses)
+        with mocked_http_conn(
+                *codes, body_iter=body_iter, headers=headers), \
+                mock.patch.object(
+                    self.reconstructor.decode_pool, 'reconstruct',
+                    wraps=self.reconstructor.decode_pool.reconstruct) \
+                as mock_reconstruct, \
+                mock.patch.object(self.reconstructor, '_reconstruct') \
+                as mock_inline:
+            df = self.reconstructor.reconstruct_fa(
+                job, node, self._create_fragment(2, body=b''))
+            fixed_body = b''.join(df.reader())
+        self.assertEqual(md5(fixed_body, usedforsecurity=False).hexdigest(),
+                         md5(broken_body, usedforsecurity=False).hexdigest())
+        self.assertEqual([2, 2], [
+            len(call[0][1]) for call in mock_reconstruct.call_args_list])
+        self.assertFalse(mock_inline.called)
+        self.assertEqual({
+            'decode.policy.%d.segments' % int(self.policy): 4,
+            'decode.policy.%d.bytes' % int(self.policy): len(broken_body),
+        }, self.logger.statsd_client.get_stats_counts())
+        self.assertFalse(self.logger.get_lines_for_level('error'))
+
+    def test_reconstruct_fa_decode_batches_short_response(self):
+        self._configure_reconstructor(decode_batch_segments=2)
+        job = {
+            'partition': 0,
+            'policy': self.policy,
+        }
+        part_nodes = self.policy.object_ring.get_part_nodes(0)
+        node = part_nodes[1]
+        node['backend_index'] = self.policy.get_backend_index(node['index'])
+
+        test_data = (b'rebuild' * self.policy.ec_segment_size)[
+            :self.policy.ec_segment_size * 5]
+        etag = md5(test_data, usedforsecurity=False).hexdigest()
+        ec_archive_bodies = encode_frag_archive_bodies(self.policy, test_data)
+        broken_body = ec_archive_bodies.pop(1)
+        # one response ends after three segments
+        fragment_size = self.policy.fragment_size
+        ec_archive_bodies[3] = ec_archive_bodies[3][:3 * fragment_size]
+
+        responses = list()
+        for body in ec_archive_bodies:
+            headers = get_header_frag_index(self, body)
+            headers.update({'X-Object-Sysmeta-Ec-Etag': etag})
+            responses.append((200, body, headers))
+
+        codes, body_iter, headers = zip(*responses)
+        with mocked_http_conn(
+                *codes, body_iter=body_iter, headers=headers):
+            df = self.reconstructor.reconstruct_fa(
+                job, node, self._create_fragment(2, body=b''))
+            fixed_body = b''.join(df.reader())
+        self.assertEqual(broken_body[:3 * fragment_size], fixed_body)
+        self.assertEqual(
+            3, self.logger.statsd_client.get_stats_counts()[
+                'decode.policy.%d.segments' % int(self.policy)])
+
     def _do_test_reconstruct_insufficient_frags(
             self, extra_conf, num_frags, other_responses,
             local_frag_index=2, frag_index_to_rebuild=1,
@@ -6712,7 +6869,6 @@ class TestReconstructFragmentArchive(BaseTestObjectReconstructor):
             test_invalid_ec_frag_index_header(value)
 
 
-@patch_policies(with_ec_default=True)
 class TestReconstructFragmentArchiveUTF8(TestReconstructFragmentArchive):
     # repeat superclass tests with an object path that contains non-ascii chars
     obj_name = b'o\xc3\xa8'
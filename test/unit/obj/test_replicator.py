@@ -2127,6 +2127,161 @@ class TestObjectReplicator(unittest.TestCase):
         self.assertEqual(stats.suffix_count, 1)
         self.assertEqual(stats.hashmatch, 2)
 
+    @mock.patch('swift.obj.replicator.tpool.execute')
+    @mock.patch('swift.obj.replicator.http_connect', autospec=True)
+    @mock.patch('swift.obj.replicator._do_listdir')
+    def test_update_suffix_tree_sync(
+            self, mock_do_listdir, mock_http, mock_tpool_execute):
+        mock_http.return_value = answer = mock.MagicMock()
+        answer.getresponse.return_value = resp = mock.MagicMock()
+        resp.status = 200
+        resp.read.return_value = pickle.dumps({
+            'a83': 'c130a2c17ed45102aada0f4eee69494ff'})
+        mock_tpool_execute.return_value = (
+            1, {'a83': 'ba47fd314242ec8c7efb91f5d57336e4'})
+
+        self.conf['sync_method'] = 'ssync'
+        self.conf['suffix_tree_sync'] = 'yes'
+        self._create_replicator()
+        self.assertTrue(self.replicator.suffix_tree_sync)
+        self.replicator.sync = fake_sync = \
+            mock.MagicMock(return_value=(True, []))
+        local_job = [
+            job for job in self.replicator.collect_jobs()
+            if not job['delete']
+            and job['partition'] == '0' and int(job['policy']) == 0
+        ][0]
+
+        # the first node differs in one object, the second is only missing
+        # objects that this node doesn't have either
+        with mock.patch.object(self.replicator, '_diff_suffix_trees',
+                               side_effect=[{'abc'}, set()]) as mock_diff:
+            self.replicator.update(local_job)
+        self.assertEqual([
+            mock.call(node, local_job, ['a83'], mock.ANY)
+            for node in local_job['nodes']], mock_diff.call_args_list)
+        self.assertEqual([
+            mock.call(local_job['nodes'][0], local_job, ['a83'],
+                      object_hashes={'abc'})], fake_sync.call_args_list)
+        stats = self.replicator.total_stats
+        self.assertEqual(stats.suffix_sync, 1)
+        self.assertEqual(stats.hashmatch, 1)
+
+        # remote nodes that don't support suffix trees sync whole suffixes
+        fake_sync.reset_mock()
+        self.replicator._zero_stats()
+        with mock.patch.object(self.replicator, '_diff_suffix_trees',
+                               return_value=None):
+            self.replicator.update(local_job)
+        self.assertEqual([
+            mock.call(node, local_job, ['a83'])
+            for node in local_job['nodes']], fake_sync.call_args_list)
+        stats = self.replicator.total_stats
+        self.assertEqual(stats.suffix_sync, 2)
+        self.assertEqual(stats.hashmatch, 0)
+
+        # suffix trees are only used with ssync
+        self.conf['sync_method'] = 'rsync'
+        self._create_replicator()
+        self.replicator.sync = fake_sync = \
+            mock.MagicMock(return_value=(True, []))
+        with mock.patch.object(self.replicator,
+                               '_diff_suffix_trees') as mock_diff:
+            self.replicator.update(local_job)
+        mock_diff.assert_not_called()
+        self.assertEqual(2, fake_sync.call_count)
+
+    def test_diff_suffix_trees(self):
+        self.conf['suffix_tree_batch_size'] = '1'
+        self._create_replicator()
+        self.assertEqual(1, self.replicator.suffix_tree_batch_size)
+        job = [
+            job for job in self.replicator.collect_jobs()
+            if not job['delete']
+            and job['partition'] == '0' and int(job['policy']) == 0
+        ][0]
+        node = job['nodes'][0]
+        object_hashes = []
+        for obj in ('o1', 'o2', 'o3'):
+            df = self.df_mgr.get_diskfile('sda', '0', 'a', 'c', obj,
+                                          policy=POLICIES.legacy)
+            mkdirs(df._datadir)
+            with open(os.path.join(df._datadir,
+                                   next(self.ts).internal + '.data'),
+                      'wb') as f:
+                f.write(b'0')
+            object_hashes.append(os.path.basename(df._datadir))
+        suffixes = sorted(set(hsh[-3:] for hsh in object_hashes))
+        local_trees = self.df_mgr.get_suffix_trees(
+            'sda', '0', suffixes, POLICIES.legacy)
+
+        # the remote has a different o1 and no o2
+        remote_trees = {}
+        for suffix, tree in local_trees.items():
+            remote_trees[suffix] = remote_tree = {}
+            for bucket, leaves in tree.items():
+                remote_tree[bucket] = dict(leaves)
+        hsh1, hsh2, hsh3 = object_hashes
+        remote_trees[hsh1[-3:]][
+            diskfile.hash_tree_bucket(hsh1[-3:], hsh1)][hsh1] = 'other'
+        del remote_trees[hsh2[-3:]][
+            diskfile.hash_tree_bucket(hsh2[-3:], hsh2)][hsh2]
+
+        requests = []
+
+        def fake_replicate_tree(node, job, parts, tree, headers):
+            requests.append((tree, parts))
+            if tree == 'buckets':
+                return dict(
+                    (suffix, diskfile.hash_tree_bucket_digests(
+                        remote_trees[suffix])) for suffix in parts)
+            return dict((bucket, remote_trees[bucket[:-1]].get(bucket, {}))
+                        for bucket in parts)
+
+        with mock.patch.object(self.replicator, '_replicate_tree',
+                               fake_replicate_tree):
+            self.assertEqual({hsh1, hsh2}, self.replicator._diff_suffix_trees(
+                node, job, suffixes, {}))
+        self.assertEqual(('buckets', suffixes), requests[0])
+        # one batch per differing bucket
+        self.assertEqual(
+            sorted(diskfile.hash_tree_bucket(hsh[-3:], hsh)
+                   for hsh in (hsh1, hsh2)),
+            sorted(parts[0] for tree, parts in requests[1:]))
+        self.assertEqual(
+            [2], [call[0][1] for call in
+                  self.logger.statsd_client.calls['update_stats']
+                  if call[0][0] == 'suffix.tree.buckets'])
+
+        # a remote that doesn't support suffix trees
+        with mock.patch.object(self.replicator, '_replicate_tree',
+                               return_value=None):
+            self.assertIsNone(self.replicator._diff_suffix_trees(
+                node, job, suffixes, {}))
+
+    def test_replicate_tree(self):
+        node = {'replication_ip': '127.0.0.1', 'replication_port': 6200,
+                'device': 'sda'}
+        job = {'partition': '0'}
+        body = pickle.dumps({'abc': {}})
+        with mocked_http_conn(
+                200, 200, 400, body=body,
+                headers={'X-Backend-Replicate-Tree': 'buckets'}) as conn:
+            self.assertEqual({'abc': {}}, self.replicator._replicate_tree(
+                node, job, ['abc', 'def'], 'buckets', {'X-Foo': 'bar'}))
+            # the remote didn't understand the tree it was asked for
+            self.assertIsNone(self.replicator._replicate_tree(
+                node, job, ['abc0'], 'hashes', {}))
+            self.assertIsNone(self.replicator._replicate_tree(
+                node, job, ['abc'], 'buckets', {}))
+        self.assertEqual(['/sda/0/abc-def', '/sda/0/abc0', '/sda/0/abc'],
+                         [req['path'] for req in conn.requests])
+        self.assertEqual('buckets', conn.requests[0]['headers'][
+            'X-Backend-Replicate-Tree'])
+        self.assertEqual('bar', conn.requests[0]['headers']['X-Foo'])
+        self.assertEqual('hashes', conn.requests[1]['headers'][
+            'X-Backend-Replicate-Tree'])
+
     def test_rsync_compress_different_region(self):
         self.assertEqual(self.replicator.sync_method, self.replicator.rsync)
         jobs = self.replicator.collect_jobs()
@@ -8007,6 +8007,71 @@ class TestObjectController(BaseTestCase):
                 # hashdir's empty, so it gets cleaned up
                 self.assertFalse(os.path.exists(objfile._datadir))
 
+    def test_REPLICATE_tree(self):
+        for policy in self.iter_policies():
+            ts = next(self.ts)
+            delete_request = Request.blank(
+                '/sda1/0/a/c/o', method='DELETE',
+                headers={
+                    'x-backend-storage-policy-index': int(policy),
+                    'x-timestamp': ts.internal,
+                })
+            resp = delete_request.get_response(self.object_controller)
+            self.assertEqual(resp.status_int, 404)
+            objfile = self.df_mgr.get_diskfile('sda1', '0', 'a', 'c', 'o',
+                                               policy=policy)
+            object_hash = os.path.basename(objfile._datadir)
+            suffix = os.path.basename(os.path.dirname(objfile._datadir))
+            bucket = diskfile.hash_tree_bucket(suffix, object_hash)
+            df_mgr = self.object_controller._diskfile_router[policy]
+            tree = df_mgr.get_suffix_trees(
+                'sda1', '0', [suffix], policy)[suffix]
+
+            req = Request.blank(
+                '/sda1/0/%s-abc' % suffix, method='REPLICATE',
+                headers={
+                    'x-backend-storage-policy-index': int(policy),
+                    'x-backend-replicate-tree': 'buckets',
+                })
+            resp = req.get_response(self.object_controller)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual('buckets',
+                             resp.headers['X-Backend-Replicate-Tree'])
+            self.assertEqual(
+                {suffix: diskfile.hash_tree_bucket_digests(tree), 'abc': {}},
+                pickle.loads(resp.body))
+
+            req = Request.blank(
+                '/sda1/0/%s-abc0' % bucket, method='REPLICATE',
+                headers={
+                    'x-backend-storage-policy-index': int(policy),
+                    'x-backend-replicate-tree': 'hashes',
+                })
+            resp = req.get_response(self.object_controller)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual('hashes',
+                             resp.headers['X-Backend-Replicate-Tree'])
+            self.assertEqual({bucket: tree[bucket], 'abc0': {}},
+                             pickle.loads(resp.body))
+            self.assertEqual([object_hash], list(tree[bucket]))
+
+    def test_REPLICATE_tree_errors(self):
+        req = Request.blank(
+            '/sda1/0/abc', method='REPLICATE',
+            headers={'x-backend-replicate-tree': 'leaves'})
+        resp = req.get_response(self.object_controller)
+        self.assertEqual(resp.status_int, 400)
+        self.assertEqual(b"Invalid X-Backend-Replicate-Tree 'leaves'",
+                         resp.body)
+
+        req = Request.blank(
+            '/sda1/0/abc', method='REPLICATE',
+            headers={'x-backend-replicate-tree': 'buckets'})
+        with mock.patch.object(diskfile.DiskFileManager, 'get_dev_path',
+                               return_value=None):
+            resp = req.get_response(self.object_controller)
+        self.assertEqual(resp.status_int, 507)
+
     def test_SSYNC_can_be_called(self):
         req = Request.blank('/sda1/0',
                             environ={'REQUEST_METHOD': 'SSYNC'},
@@ -8015,6 +8080,17 @@ class TestObjectController(BaseTestCase):
         self.assertEqual(resp.status_int, 200)
         self.assertEqual('True',
                          resp.headers.get('X-Backend-Accept-No-Commit'))
+        self.assertEqual('1', resp.headers.get('X-Backend-Ssync-Version'))
+
+    def test_SSYNC_version(self):
+        for requested, expected in (('1', '1'), ('2', '2'), ('3', '2')):
+            req = Request.blank('/sda1/0',
+                                environ={'REQUEST_METHOD': 'SSYNC'},
+                                headers={'X-Backend-Ssync-Version': requested})
+            resp = req.get_response(self.object_controller)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(expected,
+                             resp.headers.get('X-Backend-Ssync-Version'))
 
     def test_PUT_with_full_drive(self):
 
@@ -27,6 +27,8 @@ from swift.common import swob
 from swift.common import utils
 from swift.common.storage_policy import POLICIES, EC_POLICY
 from swift.obj import ssync_sender, server, diskfile
+from swift.obj.ssync_receiver import MISSING_CHECK_ENTRY, \
+    MISSING_CHECK_FRAME_HEADER, unpack_missing
 from swift.obj.reconstructor import RebuildingECDiskFileStream, \
     ObjectReconstructor
 from swift.obj.replicator import ObjectReplicator
@@ -88,11 +90,27 @@ class TestBaseSsync(BaseTest):
             if msg.strip():
                 trace['messages'].append((type, msg.strip()))
 
+        def add_frame_trace(frame):
+            # record each entry of a version 2 missing check frame as the
+            # equivalent version 1 missing check line
+            entries = frame[MISSING_CHECK_FRAME_HEADER.size:]
+            for i in range(0, len(entries), MISSING_CHECK_ENTRY.size):
+                add_trace('tx', ssync_sender.encode_missing(**unpack_missing(
+                    entries[i:i + MISSING_CHECK_ENTRY.size])))
+            trace['frames'] = trace.get('frames', 0) + 1
+            return bool(entries)
+
         def make_send_wrapper(send):
             def wrapped_send(msg):
                 _msg = msg.split(b'\r\n', 1)[1]
                 _msg = _msg.rsplit(b'\r\n', 1)[0]
-                add_trace('tx', _msg)
+                if trace.get('in_frames'):
+                    trace['in_frames'] = add_frame_trace(_msg)
+                else:
+                    add_trace('tx', _msg)
+                    trace['in_frames'] = (
+                        _msg.strip() == b':MISSING_CHECK: START' and
+                        sender.ssync_version >= 2)
                 send(msg)
             return wrapped_send
 
@@ -1934,5 +1952,70 @@ class TestSsyncReplication(TestBaseSsync):
         self.assertEqual(tx_hashes, rx_hashes)
 
 
+class TestSsyncECVersion2(TestSsyncEC):
+    def setUp(self):
+        super(TestSsyncECVersion2, self).setUp()
+        self.daemon.ssync_version = 2
+
+
+@patch_policies
+class TestSsyncReplicationVersion2(TestSsyncReplication):
+    def setUp(self):
+        super(TestSsyncReplicationVersion2, self).setUp()
+        self.daemon.ssync_version = 2
+
+    def test_meta_file_not_synced_to_legacy_receiver(self):
+        # a legacy receiver does not agree to version 2
+        with mock.patch('swift.obj.ssync_receiver.SSYNC_VERSION', 1):
+            super(TestSsyncReplicationVersion2,
+                  self).test_meta_file_not_synced_to_legacy_receiver()
+
+    def _do_test_missing_check_frames(self, expected_frames):
+        policy = POLICIES.default
+        tx_df_mgr = self.daemon._df_router[policy]
+        rx_df_mgr = self.rx_controller._diskfile_router[policy]
+        tx_objs = {}
+        rx_objs = {}
+        for i in range(5):
+            t = next(self.ts_iter)
+            tx_objs['o%d' % i] = self._create_ondisk_files(
+                tx_df_mgr, 'o%d' % i, policy, t)
+            if i % 2:
+                rx_objs['o%d' % i] = self._create_ondisk_files(
+                    rx_df_mgr, 'o%d' % i, policy, t)
+        suffixes = set(os.path.basename(os.path.dirname(dfs[0]._datadir))
+                       for dfs in tx_objs.values())
+
+        job = {'device': self.device,
+               'partition': self.partition,
+               'policy': policy}
+        sender = ssync_sender.Sender(self.daemon, dict(self.rx_node), job,
+                                     suffixes)
+        sender.connect, trace = self.make_connect_wrapper(sender)
+        success, in_sync_objs = sender()
+
+        self.assertTrue(success)
+        self.assertEqual(5, len(in_sync_objs))
+        self.assertEqual(expected_frames, trace.get('frames'))
+        results = self._analyze_trace(trace)
+        self.assertEqual(5, len(results['tx_missing']))
+        self.assertEqual(3, len(results['rx_missing']))
+        self.assertEqual(['/a/c/o0', '/a/c/o2', '/a/c/o4'], sorted(
+            subreq['path'] for subreq in results['tx_updates']))
+        self._verify_ondisk_files(tx_objs, policy)
+
+    def test_missing_check_frames(self):
+        # all entries fit in one frame, followed by the empty frame
+        self._do_test_missing_check_frames(2)
+
+    def test_missing_check_small_frames(self):
+        self.daemon.network_chunk_size = 2 * MISSING_CHECK_ENTRY.size
+        self._do_test_missing_check_frames(4)
+
+    def test_missing_check_legacy_receiver(self):
+        with mock.patch('swift.obj.ssync_receiver.SSYNC_VERSION', 1):
+            self._do_test_missing_check_frames(None)
+
+
 if __name__ == '__main__':
     unittest.main()
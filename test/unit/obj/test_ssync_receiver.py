@@ -1252,6 +1252,161 @@ class TestReceiver(unittest.TestCase):
         self.assertFalse(self.controller.logger.error.called)
         self.assertFalse(self.controller.logger.exception.called)
 
+    def _missing_check_body(self, offers, ssync_version):
+        # build a request body offering the given missing check entries
+        if ssync_version < 2:
+            missing = b''.join(ssync_sender.encode_missing(**offer) + b'\r\n'
+                               for offer in offers)
+        else:
+            missing = ssync_receiver.MISSING_CHECK_FRAME_HEADER.pack(
+                len(offers)) + b''.join(
+                ssync_sender.pack_missing(**offer) for offer in offers)
+            missing += ssync_receiver.MISSING_CHECK_FRAME_HEADER.pack(0)
+        return (b':MISSING_CHECK: START\r\n' + missing +
+                b':MISSING_CHECK: END\r\n'
+                b':UPDATES: START\r\n:UPDATES: END\r\n')
+
+    def _do_missing_check(self, offers, ssync_version, headers=None):
+        environ = {'REQUEST_METHOD': 'SSYNC',
+                   'HTTP_X_BACKEND_SSYNC_VERSION': str(ssync_version)}
+        environ.update(headers or {})
+        req = swob.Request.blank(
+            '/sda1/1', environ=environ,
+            body=self._missing_check_body(offers, ssync_version))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(str(ssync_version),
+                         resp.headers['X-Backend-Ssync-Version'])
+        self.assertFalse(self.controller.logger.error.called)
+        self.assertFalse(self.controller.logger.exception.called)
+        return self.body_lines(resp.body)
+
+    def test_MISSING_CHECK_version_2(self):
+        self.controller.logger = mock.MagicMock()
+        ts_iter = make_timestamp_iter()
+        t1, t2, t3, t4, t5 = [next(ts_iter) for _ in range(5)]
+        # o1 has data at t2, o2 has data at t2 and meta at t4, o3 has a
+        # tombstone at t2, o4 does not exist
+        dfs = [self.controller.get_diskfile(
+            'sda1', '1', 'a', 'c', 'o%d' % i, POLICIES[0])
+            for i in range(1, 5)]
+        write_diskfile(dfs[0], t2)
+        write_diskfile(dfs[1], t2)
+        dfs[1].write_metadata({'X-Timestamp': t4.internal})
+        write_diskfile(dfs[2], t2)
+        dfs[2].delete(t2)
+        hashes = [os.path.basename(df._datadir) for df in dfs]
+
+        offers = []
+        for object_hash in hashes:
+            for ts_data in (t1, t2, t3):
+                for ts_meta in (None, t3, t4, t5):
+                    if ts_meta and ts_meta <= ts_data:
+                        continue
+                    offers.append({'object_hash': object_hash,
+                                   'ts_data': ts_data, 'ts_meta': ts_meta})
+
+        expected = self._do_missing_check(offers, 1)
+        orig_check_local = ssync_receiver.Receiver._check_local
+        with mock.patch.object(ssync_receiver.Receiver, '_check_local',
+                               autospec=True,
+                               side_effect=orig_check_local) as mock_check:
+            actual = self._do_missing_check(offers, 2)
+        self.assertEqual(expected, actual)
+        # sanity check that some offers were wanted and some were not
+        self.assertLess(len(expected), len(offers) + 4)
+        self.assertGreater(len(expected), 4)
+        # only offers of newer meta than the data file or tombstone listed
+        # for o1 and o3 need to open a diskfile
+        checked = [(call[0][1]['object_hash'], call[0][1]['ts_meta'])
+                   for call in mock_check.call_args_list]
+        self.assertEqual(18, len(checked))
+        for object_hash, ts_meta in checked:
+            self.assertIn(object_hash, (hashes[0], hashes[2]))
+            self.assertGreater(ts_meta, t2)
+
+    def test_MISSING_CHECK_version_2_legacy_sender(self):
+        # a version 1 request is answered with version 1
+        self.controller.logger = mock.MagicMock()
+        req = swob.Request.blank(
+            '/sda1/1',
+            environ={'REQUEST_METHOD': 'SSYNC'},
+            body=':MISSING_CHECK: START\r\n' +
+                 self.hash1 + ' ' + self.ts1 + '\r\n'
+                 ':MISSING_CHECK: END\r\n'
+                 ':UPDATES: START\r\n:UPDATES: END\r\n')
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual('1', resp.headers['X-Backend-Ssync-Version'])
+        self.assertEqual(
+            self.body_lines(resp.body),
+            [b':MISSING_CHECK: START',
+             (self.hash1 + ' dm').encode('ascii'),
+             b':MISSING_CHECK: END',
+             b':UPDATES: START', b':UPDATES: END'])
+
+    def test_MISSING_CHECK_version_2_bad_frame(self):
+        self.controller.logger = mock.MagicMock()
+        offers = [{'object_hash': self.hash1,
+                   'ts_data': utils.Timestamp(self.ts1)}]
+        # the frame claims more entries than are sent
+        body = self._missing_check_body(offers, 2).replace(
+            ssync_receiver.MISSING_CHECK_FRAME_HEADER.pack(1),
+            ssync_receiver.MISSING_CHECK_FRAME_HEADER.pack(1000))
+        req = swob.Request.blank(
+            '/sda1/1',
+            environ={'REQUEST_METHOD': 'SSYNC',
+                     'HTTP_X_BACKEND_SSYNC_VERSION': '2'},
+            body=body)
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual([], self.body_lines(resp.body))
+        self.controller.logger.error.assert_called_once_with(
+            'ssync client disconnected')
+
+    @patch_policies(with_ec_default=True)
+    def test_MISSING_CHECK_version_2_local_non_durable(self):
+        # the listing cannot tell if a non-durable local frag should be made
+        # durable, so the diskfile is opened
+        self.controller.logger = mock.MagicMock()
+        self.controller._diskfile_router = diskfile.DiskFileRouter(
+            self.conf, self.controller.logger)
+        ts_iter = make_timestamp_iter()
+        t1, t2, t3 = [next(ts_iter) for _ in range(3)]
+        df = self.controller.get_diskfile(
+            'sda1', '1', 'a', 'c', 'o1', POLICIES[0], frag_index=2)
+        write_diskfile(df, t2, frag_index=2, commit=False)
+        object_hash = os.path.basename(df._datadir)
+        headers = {'HTTP_X_BACKEND_STORAGE_POLICY_INDEX': '0',
+                   'HTTP_X_BACKEND_SSYNC_FRAG_INDEX': '2'}
+
+        def do_check(ts_data, durable, expected):
+            offer = {'object_hash': object_hash, 'ts_data': ts_data,
+                     'durable': durable}
+            self.assertEqual(
+                [b':MISSING_CHECK: START'] + expected +
+                [b':MISSING_CHECK: END', b':UPDATES: START',
+                 b':UPDATES: END'],
+                self._do_missing_check([offer], 2, headers))
+
+        wanted = [(object_hash + ' dm').encode('ascii')]
+        do_check(t1, True, wanted)
+        do_check(t3, False, wanted)
+        do_check(t2, False, [])
+        self.assertEqual([t2.internal + '#2.data'],
+                         os.listdir(df._datadir))
+        # durable remote frag at t2 will make the local durable
+        do_check(t2, True, [])
+        self.assertEqual([t2.internal + '#2#d.data'],
+                         os.listdir(df._datadir))
+        # in sync offers are now compared with the listing alone
+        with mock.patch.object(ssync_receiver.Receiver,
+                               '_check_local') as mock_check:
+            do_check(t1, True, [])
+            do_check(t2, True, [])
+        self.assertFalse(mock_check.called)
+        do_check(t3, True, wanted)
+
     def test_UPDATES_no_start(self):
         # verify behavior when the sender disconnects and does not send
         # ':UPDATES: START' e.g. if a sender timeout pops while waiting for
@@ -2462,6 +2617,23 @@ class TestSsyncRxServer(unittest.TestCase):
         # sanity check that the receiver did not proceed to missing_check
         self.assertFalse(mock_missing_check.called)
 
+    def test_bad_request_invalid_ssync_version(self):
+        with mock.patch('swift.obj.ssync_receiver.Receiver.missing_check')\
+                as mock_missing_check:
+            self.connection = bufferedhttp.BufferedHTTPConnection(
+                '127.0.0.1:%s' % self.rx_port)
+            self.connection.putrequest('SSYNC', '/sda1/0')
+            self.connection.putheader('Transfer-Encoding', 'chunked')
+            self.connection.putheader('X-Backend-Ssync-Version', 'two')
+            self.connection.endheaders()
+            resp = self.connection.getresponse()
+        self.assertEqual(400, resp.status)
+        error_msg = resp.read()
+        self.assertIn(b"Invalid X-Backend-Ssync-Version 'two'", error_msg)
+        resp.close()
+        # sanity check that the receiver did not proceed to missing_check
+        self.assertFalse(mock_missing_check.called)
+
     def test_bad_request_invalid_frag_index(self):
         with mock.patch('swift.obj.ssync_receiver.Receiver.missing_check')\
                 as mock_missing_check:
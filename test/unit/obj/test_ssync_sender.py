@@ -12,6 +12,7 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import binascii
 import io
 import os
 import time
@@ -440,6 +441,48 @@ class TestSender(BaseTest):
         warnings = self.daemon_logger.get_lines_for_level('warning')
         self.assertEqual([], warnings)
 
+    def _do_test_connect_ssync_version(self, ssync_version, resp_headers):
+        self.daemon.ssync_version = ssync_version
+        node = dict(replication_ip='1.2.3.4', replication_port=5678,
+                    device='sda1')
+        job = dict(partition='9', policy=POLICIES.legacy)
+        sender = ssync_sender.Sender(self.daemon, node, job, None)
+        with mock.patch(
+                'swift.obj.ssync_sender.SsyncBufferedHTTPConnection'
+        ) as mock_conn_class:
+            mock_conn = mock_conn_class.return_value
+            mock_conn.getresponse.return_value = FakeResponse('', resp_headers)
+            sender.connect()
+        return sender, mock_conn.putheader.mock_calls
+
+    def test_connect_ssync_version(self):
+        sender, calls = self._do_test_connect_ssync_version(1, {})
+        self.assertEqual(1, sender.ssync_version)
+        self.assertNotIn(mock.call('X-Backend-Ssync-Version', 1), calls)
+
+        resp_hdrs = {'x-backend-ssync-version': '2'}
+        sender, calls = self._do_test_connect_ssync_version(1, resp_hdrs)
+        self.assertEqual(1, sender.ssync_version)
+
+        sender, calls = self._do_test_connect_ssync_version(2, resp_hdrs)
+        self.assertEqual(2, sender.ssync_version)
+        self.assertIn(mock.call('X-Backend-Ssync-Version', 2), calls)
+
+        # sender never asks for more than it understands
+        sender, calls = self._do_test_connect_ssync_version(3, resp_hdrs)
+        self.assertEqual(2, sender.ssync_version)
+        self.assertIn(mock.call('X-Backend-Ssync-Version', 2), calls)
+
+    def test_connect_ssync_version_legacy_receiver(self):
+        # no 'x-backend-ssync-version' in response, fall back to version 1
+        sender, calls = self._do_test_connect_ssync_version(2, {})
+        self.assertEqual(1, sender.ssync_version)
+        self.assertIn(mock.call('X-Backend-Ssync-Version', 2), calls)
+
+        resp_hdrs = {'x-backend-ssync-version': '1'}
+        sender, calls = self._do_test_connect_ssync_version(2, resp_hdrs)
+        self.assertEqual(1, sender.ssync_version)
+
     def test_call(self):
         def patch_sender(sender, available_map, send_map):
             connection = FakeConnection()
@@ -926,6 +969,41 @@ class TestSender(BaseTest):
         self.assertEqual([], self.daemon_logger.get_lines_for_level('info'))
         self.assertFalse(self.sender.limited_by_max_objects)
 
+    def test_missing_check_object_hashes(self):
+        def yield_hashes(device, partition, policy, suffixes=None, **kwargs):
+            yield (
+                '9d41d8cd98f00b204e9800998ecf0abc',
+                {'ts_data': Timestamp(1380144470.00000)})
+            yield (
+                '9d41d8cd98f00b204e9800998ecf0def',
+                {'ts_data': Timestamp(1380144472.22222)})
+            yield (
+                '9d41d8cd98f00b204e9800998ecf1def',
+                {'ts_data': Timestamp(1380144474.44444)})
+
+        self.sender = ssync_sender.Sender(
+            self.daemon, None, self.job, ['abc', 'def'],
+            object_hashes={'9d41d8cd98f00b204e9800998ecf0def',
+                           '9d41d8cd98f00b204e9800998ecf2def'})
+        connection = FakeConnection()
+        response = FakeResponse(
+            chunk_body=(
+                ':MISSING_CHECK: START\r\n'
+                ':MISSING_CHECK: END\r\n'))
+        self.sender.df_mgr.yield_hashes = yield_hashes
+        available_map, send_map = self.sender.missing_check(connection,
+                                                            response)
+        # only the given object hashes are offered
+        self.assertEqual(
+            b''.join(connection.sent),
+            b'17\r\n:MISSING_CHECK: START\r\n\r\n'
+            b'33\r\n9d41d8cd98f00b204e9800998ecf0def 1380144472.22222\r\n\r\n'
+            b'15\r\n:MISSING_CHECK: END\r\n\r\n')
+        self.assertEqual(send_map, {})
+        self.assertEqual(available_map, {
+            '9d41d8cd98f00b204e9800998ecf0def':
+            {'ts_data': Timestamp(1380144472.22222)}})
+
     def test_missing_check_max_objects_less_than_actual_objects(self):
         def yield_hashes(device, partition, policy, suffixes=None, **kwargs):
             # verify missing_check stops after 2 objects even though more
@@ -990,6 +1068,93 @@ class TestSender(BaseTest):
             self.daemon_logger.get_lines_for_level('info'))
         self.assertTrue(self.sender.limited_by_max_objects)
 
+    def _do_test_missing_check_frames(self, max_objects, frame_entries):
+        hashes = [
+            ('9d41d8cd98f00b204e9800998ecf0abc',
+             {'ts_data': Timestamp(1380144470.00000)}),
+            ('9d41d8cd98f00b204e9800998ecf0def',
+             {'ts_data': Timestamp(1380144472.22222),
+              'ts_meta': Timestamp(1380144473.22222)}),
+            ('9d41d8cd98f00b204e9800998ecf1def',
+             {'ts_data': Timestamp(1380144474.44444),
+              'ts_ctype': Timestamp(1380144474.44448),
+              'ts_meta': Timestamp(1380144475.44444),
+              'durable': False})]
+
+        def yield_hashes(device, partition, policy, suffixes=None, **kwargs):
+            for item in hashes:
+                yield item
+
+        self.daemon.ssync_version = 2
+        self.daemon.network_chunk_size = (
+            frame_entries * ssync_receiver.MISSING_CHECK_ENTRY.size)
+        self.sender = ssync_sender.Sender(self.daemon, None, self.job, None,
+                                          max_objects=max_objects)
+        connection = FakeConnection()
+        self.sender.job = {
+            'device': 'dev',
+            'partition': '9',
+            'policy': POLICIES.legacy,
+        }
+        self.sender.suffixes = ['abc', 'def']
+        response = FakeResponse(
+            chunk_body=(
+                ':MISSING_CHECK: START\r\n'
+                '9d41d8cd98f00b204e9800998ecf0def d\r\n'
+                ':MISSING_CHECK: END\r\n'))
+        self.sender.df_mgr.yield_hashes = yield_hashes
+        available_map, send_map = self.sender.missing_check(connection,
+                                                            response)
+        self.assertEqual(
+            {'9d41d8cd98f00b204e9800998ecf0def': {'data': True}}, send_map)
+        self.assertEqual(b'17\r\n:MISSING_CHECK: START\r\n\r\n',
+                         connection.sent[0])
+        self.assertEqual(b'15\r\n:MISSING_CHECK: END\r\n\r\n',
+                         connection.sent[-1])
+        frames = []
+        for msg in connection.sent[1:-1]:
+            size, msg = msg.split(b'\r\n', 1)
+            self.assertEqual(int(size, 16) + 2, len(msg))
+            frames.append(msg[:-2])
+        # the last frame is empty
+        self.assertEqual(b'\x00\x00\x00\x00', frames.pop())
+        entries = []
+        for frame in frames:
+            count, = ssync_receiver.MISSING_CHECK_FRAME_HEADER.unpack(
+                frame[:4])
+            self.assertEqual(
+                count * ssync_receiver.MISSING_CHECK_ENTRY.size,
+                len(frame) - 4)
+            self.assertLessEqual(count, frame_entries)
+            entries.append(frame[4:])
+        expected_hashes = hashes[:max_objects or None]
+        self.assertEqual(
+            b''.join(ssync_sender.pack_missing(object_hash, **timestamps)
+                     for object_hash, timestamps in expected_hashes),
+            b''.join(entries))
+        self.assertEqual(dict(expected_hashes), available_map)
+        return frames
+
+    def test_missing_check_frames(self):
+        frames = self._do_test_missing_check_frames(0, 1000)
+        self.assertEqual(1, len(frames))
+        self.assertFalse(self.sender.limited_by_max_objects)
+
+    def test_missing_check_small_frames(self):
+        frames = self._do_test_missing_check_frames(0, 2)
+        self.assertEqual(2, len(frames))
+        self.assertFalse(self.sender.limited_by_max_objects)
+
+    def test_missing_check_frames_max_objects(self):
+        frames = self._do_test_missing_check_frames(2, 1)
+        self.assertEqual(2, len(frames))
+        self.assertTrue(self.sender.limited_by_max_objects)
+        self.assertEqual(
+            ['ssync missing_check truncated after 2 objects: device: dev, '
+             'part: 9, policy: 0, last object hash: '
+             '9d41d8cd98f00b204e9800998ecf0def'],
+            self.daemon_logger.get_lines_for_level('info'))
+
     def test_missing_check_max_objects_exactly_actual_objects(self):
         def yield_hashes(device, partition, policy, suffixes=None, **kwargs):
             if (device == 'dev' and partition == '9' and
@@ -1983,6 +2148,53 @@ class TestSenderEC(BaseTest):
 
 
 class TestModuleMethods(unittest.TestCase):
+    def test_pack_missing(self):
+        object_hash = '9d41d8cd98f00b204e9800998ecf0abc'
+        ts_iter = make_timestamp_iter()
+        t_data = next(ts_iter)
+        t_type = next(ts_iter)
+        t_meta = next(ts_iter)
+
+        # entries are fixed width
+        entry = ssync_sender.pack_missing(object_hash, t_data)
+        self.assertEqual(ssync_receiver.MISSING_CHECK_ENTRY.size, len(entry))
+        self.assertEqual(65, len(entry))
+        self.assertEqual(binascii.unhexlify(object_hash), entry[:16])
+        self.assertEqual(entry, ssync_sender.pack_missing(
+            object_hash, t_data, ts_meta=t_data, ts_ctype=t_data,
+            durable=True))
+        self.assertEqual(len(entry), len(ssync_sender.pack_missing(
+            object_hash, t_data, t_meta, t_type, durable=False)))
+
+        # missing meta and content type timestamps default to data timestamp
+        expected = {'object_hash': object_hash, 'ts_meta': t_data,
+                    'ts_data': t_data, 'ts_ctype': t_data, 'durable': True}
+        self.assertEqual(expected, ssync_receiver.unpack_missing(entry))
+
+        # test pack and unpack functions invert
+        for durable in (True, False):
+            expected = {'object_hash': object_hash, 'ts_meta': t_meta,
+                        'ts_data': t_data, 'ts_ctype': t_type,
+                        'durable': durable}
+            entry = ssync_sender.pack_missing(**expected)
+            self.assertEqual(expected, ssync_receiver.unpack_missing(entry))
+
+        # durable None is not False
+        entry = ssync_sender.pack_missing(object_hash, t_data, durable=None)
+        self.assertTrue(ssync_receiver.unpack_missing(entry)['durable'])
+
+        # timestamps have offsets
+        expected = {'object_hash': object_hash,
+                    'ts_meta': utils.Timestamp(t_meta, offset=1),
+                    'ts_data': utils.Timestamp(t_data, offset=99),
+                    'ts_ctype': utils.Timestamp(t_type, offset=2),
+                    'durable': True}
+        entry = ssync_sender.pack_missing(**expected)
+        actual = ssync_receiver.unpack_missing(entry)
+        self.assertEqual(expected, actual)
+        for key in ('ts_data', 'ts_meta', 'ts_ctype'):
+            self.assertEqual(expected[key].internal, actual[key].internal)
+
     def test_encode_missing(self):
         object_hash = '9d41d8cd98f00b204e9800998ecf0abc'
         ts_iter = make_timestamp_iter()
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import eventlet
+import json
 import six.moves.cPickle as pickle
 from six.moves.queue import PriorityQueue
 import mock
@@ -140,6 +141,8 @@ class TestObjectUpdater(unittest.TestCase):
         self.assertEqual(daemon.max_objects_per_container_per_second, 0.0)
         self.assertEqual(daemon.per_container_ratelimit_buckets, 1000)
         self.assertEqual(daemon.max_deferred_updates, 10000)
+        self.assertEqual(daemon.update_batch_size, 1)
+        self.assertEqual(daemon.max_batched_updates, 10000)
 
         # non-defaults
         conf = {
@@ -153,6 +156,8 @@ class TestObjectUpdater(unittest.TestCase):
             'max_objects_per_container_per_second': '1.2',
             'per_container_ratelimit_buckets': '100',
             'max_deferred_updates': '0',
+            'update_batch_size': '100',
+            'max_batched_updates': '1000',
         }
         daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
         self.assertEqual(daemon.devices, '/some/where/else')
@@ -165,6 +170,8 @@ class TestObjectUpdater(unittest.TestCase):
         self.assertEqual(daemon.max_objects_per_container_per_second, 1.2)
         self.assertEqual(daemon.per_container_ratelimit_buckets, 100)
         self.assertEqual(daemon.max_deferred_updates, 0)
+        self.assertEqual(daemon.update_batch_size, 100)
+        self.assertEqual(daemon.max_batched_updates, 1000)
 
         # check deprecated option
         daemon = object_updater.ObjectUpdater({'slowdown': '0.04'},
@@ -189,6 +196,9 @@ class TestObjectUpdater(unittest.TestCase):
         check_bad({'max_deferred_updates': '-1'})
         check_bad({'max_deferred_updates': '1.1'})
         check_bad({'max_deferred_updates': 'auto'})
+        check_bad({'update_batch_size': '0'})
+        check_bad({'update_batch_size': '1.5'})
+        check_bad({'max_batched_updates': '0'})
 
     @mock.patch('os.listdir')
     def test_listdir_with_exception(self, mock_listdir):
@@ -851,6 +861,245 @@ class TestObjectUpdater(unittest.TestCase):
             'X-Backend-Storage-Policy-Index')
         do_test(headers_out, expected)
 
+    def _write_batchable_async_update(self, dfmanager, policy, account,
+                                      container, obj, op='PUT'):
+        timestamp = next(self.ts_iter)
+        headers_out = {
+            'x-size': 3,
+            'x-content-type': 'text/plain',
+            'x-etag': 'd41d8cd98f00b204e9800998ecf8427e',
+            'x-timestamp': timestamp.internal,
+            'X-Backend-Storage-Policy-Index': int(policy),
+            'User-Agent': 'object-server %s' % os.getpid()
+        }
+        data = {'op': op, 'account': account, 'container': container,
+                'obj': obj, 'headers': headers_out}
+        dfmanager.pickle_async_update(self.sda1, account, container, obj,
+                                      data, timestamp, policy)
+        return timestamp
+
+    @mock.patch('swift.obj.updater.dump_recon_cache')
+    def test_obj_put_async_updates_batched(self, mock_recon):
+        policy = POLICIES[0]
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_batch_size': '3',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        async_dir = os.path.join(self.sda1, get_async_dir(policy))
+        os.mkdir(async_dir)
+        dfmanager = DiskFileManager(conf, daemon.logger)
+        c1_timestamps = [
+            self._write_batchable_async_update(
+                dfmanager, policy, 'a', 'c1', 'o%d' % i)
+            for i in range(3)]
+        c2_timestamps = [
+            self._write_batchable_async_update(
+                dfmanager, policy, 'a', 'c2', 'o0'),
+            self._write_batchable_async_update(
+                dfmanager, policy, 'a', 'c2', 'o1', op='DELETE')]
+        # an update without the headers needed for a batch is sent by itself
+        self._write_async_update(dfmanager, next(self.ts_iter), policy,
+                                 headers={'X-Container-Timestamp': '0'})
+
+        bodies = {}
+
+        def capture_body(conn, data):
+            bodies[conn.connection_id] = data
+
+        with mocked_http_conn(*([200] * 9),
+                              give_send=capture_body) as fake_conn:
+            daemon.run_once()
+        self.assertFalse(os.listdir(async_dir))
+        self.assertEqual(
+            {'successes': 6, 'unlinks': 6, 'async_pendings': 6},
+            daemon.logger.statsd_client.get_increment_counts())
+
+        requests = {}
+        for i, req in enumerate(fake_conn.requests):
+            requests.setdefault((req['method'], req['path']), []).append(
+                (req['headers'], bodies.get(i)))
+        c1_part, _ = daemon.get_container_ring().get_nodes('a', 'c1')
+        c2_part, _ = daemon.get_container_ring().get_nodes('a', 'c2')
+        c_part, _ = daemon.get_container_ring().get_nodes('a', 'c')
+        self.assertEqual(
+            {('UPDATE', '/sda1/%s/a/c1' % c1_part),
+             ('UPDATE', '/sda1/%s/a/c2' % c2_part),
+             ('PUT', '/sda1/%s/a/c/o' % c_part)},
+            set(requests))
+
+        def check_batch(path, expected):
+            self.assertEqual(3, len(requests[path]))
+            for headers, body in requests[path]:
+                self.assertEqual(min(r['created_at'] for r in expected),
+                                 headers['X-Timestamp'])
+                self.assertEqual(str(int(policy)),
+                                 headers['X-Backend-Storage-Policy-Index'])
+                self.assertEqual(str(len(body)), headers['Content-Length'])
+                self.assertEqual(expected, sorted(
+                    json.loads(body), key=lambda r: r['name']))
+
+        check_batch(('UPDATE', '/sda1/%s/a/c1' % c1_part), [
+            {'name': 'o%d' % i, 'created_at': ts.internal, 'size': 3,
+             'content_type': 'text/plain',
+             'etag': 'd41d8cd98f00b204e9800998ecf8427e', 'deleted': 0,
+             'storage_policy_index': int(policy), 'ctype_timestamp': None,
+             'meta_timestamp': None}
+            for i, ts in enumerate(c1_timestamps)])
+        check_batch(('UPDATE', '/sda1/%s/a/c2' % c2_part), [
+            {'name': 'o0', 'created_at': c2_timestamps[0].internal,
+             'size': 3, 'content_type': 'text/plain',
+             'etag': 'd41d8cd98f00b204e9800998ecf8427e', 'deleted': 0,
+             'storage_policy_index': int(policy), 'ctype_timestamp': None,
+             'meta_timestamp': None},
+            {'name': 'o1', 'created_at': c2_timestamps[1].internal,
+             'size': 0, 'content_type': 'application/deleted',
+             'etag': 'noetag', 'deleted': 1,
+             'storage_policy_index': int(policy), 'ctype_timestamp': None,
+             'meta_timestamp': None}])
+
+    @mock.patch('swift.obj.updater.dump_recon_cache')
+    def test_obj_put_async_updates_batched_partial_failure(self, mock_recon):
+        policy = POLICIES[0]
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_batch_size': '10',
+            'concurrency': '1',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        async_dir = os.path.join(self.sda1, get_async_dir(policy))
+        os.mkdir(async_dir)
+        dfmanager = DiskFileManager(conf, daemon.logger)
+        for i in range(4):
+            self._write_batchable_async_update(
+                dfmanager, policy, 'a', 'c', 'o%d' % i)
+        part, nodes = daemon.get_container_ring().get_nodes('a', 'c')
+
+        # one node fails, so all updates are kept for the next sweep
+        with mocked_http_conn(200, 507, 200) as fake_conn:
+            daemon.run_once()
+        self.assertEqual(['UPDATE'] * 3,
+                         [req['method'] for req in fake_conn.requests])
+        self.assertEqual(
+            {'failures': 4, 'async_pendings': 4},
+            daemon.logger.statsd_client.get_increment_counts())
+        async_files = [os.path.join(async_dir, suffix, f)
+                       for suffix in os.listdir(async_dir)
+                       for f in os.listdir(os.path.join(async_dir, suffix))]
+        self.assertEqual(4, len(async_files))
+        for async_file in async_files:
+            with open(async_file, 'rb') as fd:
+                update = pickle.load(fd)
+            self.assertEqual([nodes[0]['id'], nodes[2]['id']],
+                             update['successes'])
+
+        # only the failed node is sent the updates again
+        daemon.logger.clear()
+        with mocked_http_conn(200) as fake_conn:
+            daemon.run_once()
+        self.assertEqual(
+            [nodes[1]['replication_ip']],
+            [req['ip'] for req in fake_conn.requests])
+        self.assertEqual(
+            {'successes': 4, 'unlinks': 4},
+            daemon.logger.statsd_client.get_increment_counts())
+        self.assertFalse(os.listdir(async_dir))
+
+    @mock.patch('swift.obj.updater.dump_recon_cache')
+    def test_obj_put_async_updates_batched_redirects(self, mock_recon):
+        policy = POLICIES[0]
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_batch_size': '10',
+            'concurrency': '1',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        async_dir = os.path.join(self.sda1, get_async_dir(policy))
+        os.mkdir(async_dir)
+        dfmanager = DiskFileManager(conf, daemon.logger)
+        for i in range(3):
+            self._write_batchable_async_update(
+                dfmanager, policy, 'a', 'c', 'o%d' % i)
+        ts_a, ts_b = next(self.ts_iter), next(self.ts_iter)
+
+        def redirect_body(redirects):
+            return json.dumps({'merged': 0, 'redirects': [
+                {'path': path, 'timestamp': ts.internal, 'rows': rows}
+                for path, ts, rows in redirects]}).encode('ascii')
+
+        # the first node redirects every row to one shard; the second
+        # redirects the first row to a newer shard; the third doesn't know
+        # about redirects
+        body_iter = [
+            redirect_body([('.shards_a/c_a', ts_a, [0, 1, 2])]),
+            redirect_body([('.shards_a/c_b', ts_b, [0])]),
+            b'',
+        ] + [b''] * 6
+        bodies = {}
+
+        def capture_body(conn, data):
+            bodies[conn.connection_id] = data
+
+        with mocked_http_conn(*([200] * 9), body_iter=body_iter,
+                              give_send=capture_body) as fake_conn:
+            daemon.run_once()
+        self.assertFalse(os.listdir(async_dir))
+        self.assertEqual(
+            {'redirects': 3, 'successes': 3, 'unlinks': 3,
+             'async_pendings': 3},
+            daemon.logger.statsd_client.get_increment_counts())
+
+        part, _ = daemon.get_container_ring().get_nodes('a', 'c')
+        part_a, _ = daemon.get_container_ring().get_nodes(
+            '.shards_a', 'c_a')
+        part_b, _ = daemon.get_container_ring().get_nodes(
+            '.shards_a', 'c_b')
+        first_obj = json.loads(bodies[0])[0]['name']
+        other_objs = sorted(r['name'] for r in json.loads(bodies[0])[1:])
+        # updates are retried to the newest shard each was redirected to
+        self.assertEqual(
+            [('UPDATE', '/sda1/%s/a/c' % part)] * 3 +
+            [('PUT', '/sda1/%s/.shards_a/c_b/%s' % (part_b, first_obj))] * 3 +
+            [('UPDATE', '/sda1/%s/.shards_a/c_a' % part_a)] * 3,
+            [(req['method'], req['path']) for req in fake_conn.requests])
+        for i in range(6, 9):
+            self.assertEqual(other_objs, sorted(
+                r['name'] for r in json.loads(bodies[i])))
+        for req in fake_conn.requests:
+            self.assertEqual('true',
+                             req['headers']['X-Backend-Accept-Redirect'])
+
+    def test_batch_updates(self):
+        conf = {'update_batch_size': '3', 'max_batched_updates': '4'}
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+
+        def make_ctx(container, obj, op='PUT'):
+            return {'policy': POLICIES[0], 'update_path': obj, 'update': {
+                'op': op, 'account': 'a', 'container': container, 'obj': obj,
+                'headers': {'x-size': '0', 'x-content-type': 'text/plain',
+                            'x-etag': 'etag',
+                            'x-timestamp': next(self.ts_iter).internal}}}
+
+        ctxs = [make_ctx('c1', 'a'), make_ctx('c2', 'b'), make_ctx('c1', 'c'),
+                make_ctx('c3', 'd', op='POST'), make_ctx('c2', 'e'),
+                make_ctx('c1', 'f'), make_ctx('c4', 'g'),
+                make_ctx('c5', 'h'), make_ctx('c4', 'i')]
+        batches = [[ctx['update_path'] for ctx in batch]
+                   for batch in daemon._batch_updates(iter(ctxs))]
+        self.assertEqual([
+            ['d'],  # not batchable
+            ['a', 'c', 'f'],  # full
+            ['b', 'e'],  # oldest when too many are waiting
+            ['g', 'i'],
+            ['h'],
+        ], batches)
+
     def _check_update_requests(self, requests, timestamp, policy):
         # do some sanity checks on update request
         expected_headers = {
@@ -1905,6 +2154,50 @@ class TestObjectUpdaterFunctions(unittest.TestCase):
         actual = object_updater.split_update_path(update)
         self.assertEqual(('.shards_a', 'c_shard_n'), actual)
 
+    def test_make_update_record(self):
+        update = {
+            'op': 'PUT',
+            'account': 'a',
+            'container': 'c',
+            'obj': 'o',
+            'headers': {
+                'X-Size': '12',
+                'X-Content-Type': 'text/plain',
+                'X-Etag': 'etag',
+                'X-Timestamp': normalize_timestamp(1),
+                'X-Content-Type-Timestamp': normalize_timestamp(2),
+                'X-Meta-Timestamp': normalize_timestamp(3),
+                'X-Backend-Storage-Policy-Index': '1',
+            }
+        }
+        self.assertEqual({
+            'name': 'o', 'created_at': normalize_timestamp(1), 'size': 12,
+            'content_type': 'text/plain', 'etag': 'etag', 'deleted': 0,
+            'storage_policy_index': 1,
+            'ctype_timestamp': normalize_timestamp(2),
+            'meta_timestamp': normalize_timestamp(3),
+        }, object_updater.make_update_record(update, 0))
+
+        update['op'] = 'DELETE'
+        del update['headers']['X-Backend-Storage-Policy-Index']
+        self.assertEqual({
+            'name': 'o', 'created_at': normalize_timestamp(1), 'size': 0,
+            'content_type': 'application/deleted', 'etag': 'noetag',
+            'deleted': 1, 'storage_policy_index': 1,
+            'ctype_timestamp': None, 'meta_timestamp': None,
+        }, object_updater.make_update_record(update, 1))
+
+        update['op'] = 'POST'
+        self.assertIsNone(
+            object_updater.make_update_record(update, 1))
+
+        update['op'] = 'PUT'
+        del update['headers']['X-Size']
+        self.assertIsNone(object_updater.make_update_record(update, 1))
+        update['headers']['X-Size'] = 'big'
+        with self.assertRaises(ValueError):
+            object_updater.make_update_record(update, 1)
+
 
 class TestBucketizedUpdateSkippingLimiter(unittest.TestCase):
 
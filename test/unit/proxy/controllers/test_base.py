@@ -18,6 +18,7 @@ from argparse import Namespace
 import itertools
 import json
 from collections import defaultdict
+import time
 import unittest
 import mock
 
@@ -30,9 +31,9 @@ from swift.proxy.controllers.base import headers_to_container_info, \
     Controller, GetOrHeadHandler, bytes_to_skip, clear_info_cache, \
     set_info_cache, NodeIter, headers_from_container_info, \
     record_cache_op_metrics, GetterSource, get_namespaces_from_cache, \
-    set_namespaces_in_cache
-from swift.common.swob import Request, HTTPException, RESPONSE_REASONS, \
-    bytes_to_wsgi
+    set_namespaces_in_cache, WorkerInfoCache, ShardedContainers
+from swift.common.swob import Request, Response, HTTPException, \
+    RESPONSE_REASONS, bytes_to_wsgi
 from swift.common import exceptions
 from swift.common.utils import split_path, Timestamp, \
     GreenthreadSafeIterator, GreenAsyncPile, NamespaceBoundList
@@ -199,6 +200,110 @@ class BaseTest(unittest.TestCase):
                                             container_ring=self.container_ring)
 
 
+class TestShardedContainers(unittest.TestCase):
+
+    def test_update(self):
+        sharded = ShardedContainers(2)
+        self.assertNotIn('container/a/c', sharded)
+        sharded.update('container/a/c', {'sharding_state': 'unsharded'})
+        self.assertNotIn('container/a/c', sharded)
+        sharded.update('container/a/c', {'sharding_state': 'sharding'})
+        self.assertIn('container/a/c', sharded)
+        sharded.update('container/a/c', {'sharding_state': 'sharded'})
+        self.assertIn('container/a/c', sharded)
+        self.assertEqual(1, len(sharded))
+        sharded.update('container/a/c', {'sharding_state': 'collapsed'})
+        self.assertNotIn('container/a/c', sharded)
+        self.assertEqual(0, len(sharded))
+
+    def test_maxsize(self):
+        sharded = ShardedContainers(2)
+        for c in ('c1', 'c2', 'c1', 'c3'):
+            sharded.update('container/a/%s' % c, {'sharding_state': 'sharded'})
+        # the least recently seen container is forgotten
+        self.assertEqual(2, len(sharded))
+        self.assertNotIn('container/a/c2', sharded)
+        self.assertIn('container/a/c1', sharded)
+        self.assertIn('container/a/c3', sharded)
+
+
+class TestWorkerInfoCache(unittest.TestCase):
+
+    def test_get_set_delete(self):
+        cache = WorkerInfoCache(10, 5)
+        self.assertIsNone(cache.get('container/a/c'))
+        info = {'status': 200, 'meta': {'x': 'y'}}
+        cache.set('container/a/c', info)
+        # entries are not copied
+        self.assertIs(info, cache.get('container/a/c'))
+        cache.delete('container/a/c')
+        self.assertIsNone(cache.get('container/a/c'))
+        cache.delete('container/a/c')
+        self.assertEqual(0, len(cache))
+
+    def test_lru_eviction(self):
+        cache = WorkerInfoCache(3, 5)
+        for i in range(3):
+            cache.set('account/a%d' % i, {'status': 200, 'i': i})
+        # a0 becomes the most recently used
+        self.assertEqual(0, cache.get('account/a0')['i'])
+        cache.set('account/a3', {'status': 200, 'i': 3})
+        self.assertEqual(3, len(cache))
+        self.assertIsNone(cache.get('account/a1'))
+        for i in (0, 2, 3):
+            self.assertEqual(i, cache.get('account/a%d' % i)['i'])
+
+    def test_expiry(self):
+        cache = WorkerInfoCache(10, 100)
+        now = time.time()
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now), \
+                mock.patch('swift.proxy.controllers.base.random.uniform',
+                           return_value=0.1) as mock_uniform:
+            cache.set('container/a/found', {'status': 200})
+            cache.set('container/a/missing', {'status': 404})
+            cache.set('container/a/gone', {'status': 410})
+        self.assertEqual([mock.call(-0.1, 0.1)] * 3,
+                         mock_uniform.call_args_list)
+        # negative entries expire after a tenth of the ttl, with jitter
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 10.9):
+            self.assertEqual({'status': 404},
+                             cache.get('container/a/missing'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 11):
+            self.assertIsNone(cache.get('container/a/missing'))
+            self.assertIsNone(cache.get('container/a/gone'))
+            self.assertEqual({'status': 200}, cache.get('container/a/found'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 110):
+            self.assertIsNone(cache.get('container/a/found'))
+        self.assertEqual(0, len(cache))
+
+    def test_max_ttl(self):
+        cache = WorkerInfoCache(10, 100)
+        now = time.time()
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now), \
+                mock.patch('swift.proxy.controllers.base.random.uniform',
+                           return_value=0.1):
+            cache.set('container/a/short', {'status': 200}, 30)
+            cache.set('container/a/long', {'status': 200}, 300)
+            cache.set('container/a/missing', {'status': 404}, 3)
+        # entries don't outlive memcache's copy
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 29.9):
+            self.assertEqual({'status': 200}, cache.get('container/a/short'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 30):
+            self.assertIsNone(cache.get('container/a/short'))
+            self.assertIsNone(cache.get('container/a/missing'))
+            self.assertEqual({'status': 200}, cache.get('container/a/long'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=now + 110):
+            self.assertIsNone(cache.get('container/a/long'))
+
+
 @patch_policies([StoragePolicy(0, 'zero', True, object_ring=FakeRing())])
 class TestFuncs(BaseTest):
 
@@ -274,6 +379,28 @@ class TestFuncs(BaseTest):
         actual = get_namespaces_from_cache(req, cache_key, 0.0)
         self.assertEqual((None, 'error'), actual)
 
+    def test_get_namespaces_from_cache_prefetched(self):
+        cache_key = 'shard-updating-v2/a/c/'
+        ns_bound_list = NamespaceBoundList([['', 'sr1'], ['k', 'sr2']])
+        req = Request.blank('a/c')
+        req.environ['swift.cache'] = self.cache
+        req.environ['swift.memcache_prefetch'] = {
+            cache_key: ns_bound_list.bounds}
+        actual = get_namespaces_from_cache(req, cache_key, 0.0)
+        self.assertEqual((ns_bound_list, 'hit'), actual)
+        self.assertEqual([], self.cache.calls)
+        self.assertEqual({}, req.environ['swift.memcache_prefetch'])
+
+        # a prefetched miss is not looked up again
+        self.cache.set(cache_key, ns_bound_list.bounds)
+        self.cache.clear_calls()
+        req = Request.blank('a/c')
+        req.environ['swift.cache'] = self.cache
+        req.environ['swift.memcache_prefetch'] = {cache_key: None}
+        actual = get_namespaces_from_cache(req, cache_key, 0.0)
+        self.assertEqual((None, 'miss'), actual)
+        self.assertEqual([], self.cache.calls)
+
     def test_set_namespaces_in_cache_disabled(self):
         cache_key = 'shard-updating-v2/a/c/'
         ns_bound_list = NamespaceBoundList([['', 'sr1'], ['k', 'sr2']])
@@ -589,6 +716,72 @@ class TestFuncs(BaseTest):
             expected = expected.encode('utf8')
         self.assertEqual(resp['versions'], expected)
 
+    def test_get_container_info_prefetch_keys(self):
+        cache = FakeCache({})
+        info_key = get_cache_key('AUTH_account', 'cont')
+        shard_key = get_cache_key('AUTH_account', 'cont', shard='updating')
+        cache.set(info_key, {'status': 200, 'sharding_state': 'sharded'})
+        cache.set(shard_key, [['', 'sr1']])
+        cache.clear_calls()
+        app = FakeApp()
+        app.sharded_containers = ShardedContainers(10)
+
+        def do_get_info():
+            req = Request.blank("/v1/AUTH_account/cont",
+                                environ={'swift.cache': cache})
+            info = get_container_info(req.environ, app,
+                                      prefetch_keys=[shard_key])
+            self.assertEqual('sharded', info['sharding_state'])
+            return req
+
+        # the worker has not seen the container sharded yet
+        req = do_get_info()
+        self.assertEqual([mock.call.get(info_key, False)], cache.calls)
+        self.assertNotIn('swift.memcache_prefetch', req.environ)
+        self.assertIn(info_key, app.sharded_containers)
+
+        # ...but now it has
+        cache.clear_calls()
+        req = do_get_info()
+        self.assertEqual(
+            [mock.call.get_many([info_key, shard_key], raise_on_error=True)],
+            cache.calls)
+        self.assertEqual({shard_key: [['', 'sr1']]},
+                         req.environ['swift.memcache_prefetch'])
+
+        # on error, only the info is looked up again
+        cache.clear_calls()
+        cache.error_on_get = [True, False]
+        req = do_get_info()
+        self.assertEqual(
+            [mock.call.get_many([info_key, shard_key], raise_on_error=True),
+             mock.call.get(info_key, False)],
+            cache.calls)
+        self.assertNotIn('swift.memcache_prefetch', req.environ)
+
+        # once the container is seen unsharded, nothing is prefetched
+        cache.set(info_key, {'status': 200, 'sharding_state': 'unsharded'})
+        cache.clear_calls()
+        req = Request.blank("/v1/AUTH_account/cont",
+                            environ={'swift.cache': cache})
+        get_container_info(req.environ, app, prefetch_keys=[shard_key])
+        self.assertNotIn(info_key, app.sharded_containers)
+        cache.clear_calls()
+        req = Request.blank("/v1/AUTH_account/cont",
+                            environ={'swift.cache': cache})
+        get_container_info(req.environ, app, prefetch_keys=[shard_key])
+        self.assertEqual([mock.call.get(info_key, False)], cache.calls)
+
+        # apps without a record of sharded containers never prefetch
+        cache.set(info_key, {'status': 200, 'sharding_state': 'sharded'})
+        cache.clear_calls()
+        for _ in range(2):
+            req = Request.blank("/v1/AUTH_account/cont",
+                                environ={'swift.cache': cache})
+            get_container_info(req.environ, FakeApp(),
+                               prefetch_keys=[shard_key])
+        self.assertEqual([mock.call.get(info_key, False)] * 2, cache.calls)
+
     def test_get_container_info_no_account(self):
         app = FakeApp(statuses=[404, 200])
         req = Request.blank("/v1/AUTH_does_not_exist/cont")
@@ -794,7 +987,130 @@ class TestFuncs(BaseTest):
                          shard='listing')
         check_not_in_cache(req, shard_cache_key)
 
+    def test_get_container_info_worker_info_cache(self):
+        worker_infocache = WorkerInfoCache(10, 5)
+        self.app.worker_info_cache = worker_infocache
+        self.app.recheck_container_existence = 30
+        app = FakeApp(statuses=[200, 200, 200])
+        app._pipeline_final_app = self.app
+        app._pipeline_request_logging_app = app
+        cache_key = get_cache_key('account', 'cont')
+        memcache = FakeCache()
+        memcache.set(cache_key, {'status': 200, 'bytes': 3333,
+                                 'object_count': 10, 'meta': {}})
+
+        def do_get_info():
+            self.logger.clear()
+            req = Request.blank('/v1/account/cont',
+                                environ={'swift.cache': memcache})
+            info = get_container_info(req.environ, app)
+            return info, self.logger.statsd_client.get_increment_counts()
+
+        # memcache hit populates the worker's cache
+        info, metrics = do_get_info()
+        self.assertEqual(3333, info['bytes'])
+        self.assertEqual({'container.info.worker_cache.miss': 1,
+                          'container.info.cache.hit': 1}, metrics)
+        self.assertEqual(1, len(worker_infocache))
+
+        # subsequent requests don't need memcache
+        memcache.store.clear()
+        info, metrics = do_get_info()
+        self.assertEqual(3333, info['bytes'])
+        self.assertEqual({'container.info.worker_cache.hit': 1}, metrics)
+        # ...and get their own copy
+        info['meta']['foo'] = 'bar'
+        info, metrics = do_get_info()
+        self.assertEqual({}, info['meta'])
+
+        # clearing the info invalidates the worker's cache
+        req = Request.blank('/v1/account/cont', environ={
+            'swift.cache': memcache,
+            'swift.worker_infocache': worker_infocache})
+        clear_info_cache(req.environ, 'account', 'cont')
+        self.assertEqual(0, len(worker_infocache))
+
+        # a backend response populates the worker's cache
+        info, metrics = do_get_info()
+        self.assertEqual(6666, info['bytes'])
+        self.assertEqual(2, len(worker_infocache))
+        self.assertEqual('6666', worker_infocache.get(cache_key)['bytes'])
+        self.assertEqual(
+            200, worker_infocache.get(get_cache_key('account'))['status'])
+
+        # the worker's cache is skipped along with memcache
+        self.app.container_existence_skip_cache = 0.1
+        with mock.patch('random.random', return_value=0.05):
+            info, metrics = do_get_info()
+        self.assertEqual(6666, info['bytes'])
+        self.assertEqual({'account.info.worker_cache.hit': 1,
+                          'container.info.cache.skip.200': 1}, metrics)
+
+        # account info callers get their own copy too
+        req = Request.blank('/v1/account', environ={'swift.cache': memcache})
+        info = get_account_info(req.environ, app)
+        info['meta']['foo'] = 'bar'
+        self.assertEqual(
+            {}, worker_infocache.get(get_cache_key('account'))['meta'])
+
+    def test_worker_info_cache_ttl_capped_by_memcache(self):
+        worker_infocache = WorkerInfoCache(10, 100)
+        self.app.worker_info_cache = worker_infocache
+        self.app.recheck_container_existence = 30
+        app = FakeApp(statuses=[200, 200])
+        app._pipeline_final_app = self.app
+        app._pipeline_request_logging_app = app
+        cache_key = get_cache_key('account', 'cont')
+        memcache = FakeCache()
+        memcache.set(cache_key, {'status': 200, 'bytes': 3333,
+                                 'object_count': 10, 'meta': {}})
+        with mock.patch.object(worker_infocache, 'set',
+                               wraps=worker_infocache.set) as mock_set:
+            req = Request.blank('/v1/account/cont',
+                                environ={'swift.cache': memcache})
+            get_container_info(req.environ, app)
+        # info from memcache is cached for no longer than recheck time
+        self.assertEqual([mock.call(cache_key, mock.ANY, 30)],
+                         mock_set.call_args_list)
+
+        # info from a backend response for no longer than it is in memcache
+        resp = Response(headers={
+            'X-Backend-Recheck-Container-Existence': '7'})
+        req = Request.blank('/v1/account/cont', environ={
+            'swift.cache': memcache,
+            'swift.worker_infocache': worker_infocache})
+        with mock.patch.object(worker_infocache, 'set') as mock_set:
+            set_info_cache(req.environ, 'account', 'cont', resp)
+        self.assertEqual([mock.call(cache_key, mock.ANY, 7)],
+                         mock_set.call_args_list)
+        resp.status = 404
+        with mock.patch.object(worker_infocache, 'set') as mock_set:
+            set_info_cache(req.environ, 'account', 'cont', resp)
+        self.assertEqual(1, mock_set.call_count)
+        self.assertAlmostEqual(0.7, mock_set.call_args[0][2])
+
+    def test_get_container_info_ignores_other_worker_info_cache(self):
+        # e.g. a mocked proxy-server app
+        self.app.worker_info_cache = mock.MagicMock()
+        self.app.recheck_container_existence = 30
+        app = FakeApp(statuses=[200, 200])
+        app._pipeline_final_app = self.app
+        app._pipeline_request_logging_app = app
+        req = Request.blank('/v1/account/cont',
+                            environ={'swift.cache': FakeCache()})
+        info = get_container_info(req.environ, app)
+        self.assertEqual(6666, info['bytes'])
+        self.assertNotIn('swift.worker_infocache', req.environ)
+
     def test_record_cache_op_metrics(self):
+        record_cache_op_metrics(
+            self.logger, 'container', 'info', 'worker_cache_hit')
+        record_cache_op_metrics(
+            self.logger, 'account', 'info', 'worker_cache_miss')
+        self.assertEqual({'container.info.worker_cache.hit': 1,
+                          'account.info.worker_cache.miss': 1},
+                         self.logger.statsd_client.get_increment_counts())
+        self.logger.clear()
         record_cache_op_metrics(
             self.logger, 'container', 'shard_listing', 'infocache_hit')
         self.assertEqual(
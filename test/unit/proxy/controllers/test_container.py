@@ -32,7 +32,7 @@ from swift.common.utils import ShardRange, Timestamp, Namespace, \
     NamespaceBoundList
 from swift.proxy import server as proxy_server
 from swift.proxy.controllers.base import headers_to_container_info, \
-    Controller, get_container_info, get_cache_key
+    Controller, get_container_info, get_cache_key, ShardedContainers
 from test import annotate_failure
 from test.unit import fake_http_connect, FakeRing, FakeMemcache, \
     make_timestamp_iter
@@ -3149,6 +3149,10 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
                 side_effect=self._fake_get_from_shards):
             return req.get_response(self.app)
 
+    def _forget_sharded_containers(self):
+        self.app.sharded_containers = ShardedContainers(
+            self.app.sharded_containers.maxsize)
+
     def _setup_namespace_stubs(self):
         self._stub_namespaces = self.ns_dicts
         self._stub_namespaces_dump = json.dumps(
@@ -3172,6 +3176,7 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
             'X-Backend-Cached-Results': 'true',
             'X-Backend-Sharding-State': sharding_state}
         self.memcache.delete_all()
+        self._forget_sharded_containers()
         # container is sharded but proxy does not have that state cached;
         # expect a backend request and expect namespaces to be cached
         self.memcache.clear_calls()
@@ -3241,7 +3246,8 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
              'container.shard_listing.cache.miss.200'])
 
         # container is sharded and proxy does have that state cached and
-        # also has namespaces cached; expect a read from cache
+        # also has namespaces cached; expect a read from cache, along with
+        # the container info now that the worker has seen it sharded
         self.memcache.clear_calls()
         self.logger.clear()
         req = self._build_request({'X-Backend-Record-Type': record_type},
@@ -3249,8 +3255,8 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
         resp = self._call_app(req)
         self._check_response(resp, self.bogus_listing, exp_cache_resp_hdrs)
         self.assertEqual(
-            [mock.call.get('container/a/c'),
-             mock.call.get(cache_key, raise_on_error=True)],
+            [mock.call.get_many(['container/a/c', cache_key],
+                                raise_on_error=True)],
             self.memcache.calls)
         self.assertIn('swift.infocache', req.environ)
         self.assertIn(cache_key, req.environ['swift.infocache'])
@@ -3275,7 +3281,8 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
             req, backend_req, extra_hdrs=exp_backend_req_hdrs)
         self._check_response(resp, self.bogus_listing, exp_noncache_resp_hdrs)
         self.assertEqual(
-            [mock.call.get('container/a/c'),
+            [mock.call.get_many(['container/a/c', cache_key],
+                                raise_on_error=True),
              mock.call.set(cache_key, self.ns_bound_list.bounds,
                            time=exp_recheck_listing, raise_on_error=True),
              # Since there was a backend request, we go ahead and cache
@@ -3301,8 +3308,8 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
             resp = self._call_app(req)
             self._check_response(resp, self.bogus_listing, exp_cache_resp_hdrs)
         self.assertEqual(
-            [mock.call.get('container/a/c'),
-             mock.call.get(cache_key, raise_on_error=True)],
+            [mock.call.get_many(['container/a/c', cache_key],
+                                raise_on_error=True)],
             self.memcache.calls)
         self.assertIn('swift.infocache', req.environ)
         self.assertIn(cache_key, req.environ['swift.infocache'])
@@ -3549,6 +3556,7 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
         # pre-warm cache with container metadata and shard ranges and verify
         # that shard range listing are read from cache when appropriate
         self.memcache.delete_all()
+        self._forget_sharded_containers()
         self.logger.clear()
         info = headers_to_container_info(self.root_resp_hdrs)
         info['status'] = 200
@@ -3779,6 +3787,7 @@ class TestGetPathNamespaceCaching(BaseTestContainerControllerGetPath):
         # Note: backend response has state unsharded so no shard ranges cached
 
         def do_test(info):
+            self._forget_sharded_containers()
             self.memcache.set('container/a/c', info)
             # expect the same outcomes as if there was no cached container info
             resp_headers = {'X-Backend-Record-Type': 'shard',
@@ -40,6 +40,7 @@ else:
 
 import swift
 from swift.common import utils, swob, exceptions
+from swift.common.ec_pool import ECProcessPool
 from swift.common.exceptions import ChunkWriteTimeout, ShortReadError, \
     ChunkReadTimeout, RangeAlreadyComplete
 from swift.common.utils import Timestamp, list_from_csv, md5, FileLikeIter, \
@@ -104,7 +105,8 @@ class PatchedObjControllerApp(proxy_server.Application):
 
     def __call__(self, *args, **kwargs):
 
-        def _fake_get_container_info(env, app, swift_source=None):
+        def _fake_get_container_info(env, app, swift_source=None,
+                                     **kwargs):
             _vrs, account, container, _junk = utils.split_path(
                 swob.wsgi_to_str(env['PATH_INFO']), 3, 4)
 
@@ -123,7 +125,8 @@ class PatchedObjControllerApp(proxy_server.Application):
             else:
                 ic[cache_key] = self.container_info.copy()
 
-            real_info = _real_get_container_info(env, app, swift_source)
+            real_info = _real_get_container_info(env, app, swift_source,
+                                                 **kwargs)
 
             if old_value is None:
                 del ic[cache_key]
@@ -6330,6 +6333,66 @@ class TestECFunctions(unittest.TestCase):
         do_test(1)
         do_test(2)
 
+    def test_chunk_segmenter(self):
+        segmenter = obj.chunk_segmenter(4)
+        segmenter.send(None)
+        self.assertEqual([], segmenter.send(b'ab'))
+        self.assertEqual([b'abcd'], segmenter.send(b'cdef'))
+        self.assertEqual([b'efgh', b'ijkl'], segmenter.send(b'ghijklm'))
+        self.assertEqual([b'mnop'], segmenter.send(b'nop'))
+        self.assertEqual([], segmenter.send(b''))
+
+        segmenter = obj.chunk_segmenter(4)
+        segmenter.send(None)
+        self.assertEqual([b'abcd'], segmenter.send(b'abcdef'))
+        self.assertEqual([b'ef'], segmenter.send(b''))
+
+    def _make_encode_policy(self):
+        return ECStoragePolicy(0, 'ec8-2', ec_type=DEFAULT_TEST_EC_TYPE,
+                               ec_ndata=8, ec_nparity=2,
+                               object_ring=FakeRing(replicas=10),
+                               ec_segment_size=1024)
+
+    def test_encode_segments(self):
+        policy = self._make_encode_policy()
+        segments = [b'a' * 1024, b'b' * 1024, b'c' * 10]
+        frag_sets = [policy.pyeclib_driver.encode(segment)
+                     for segment in segments]
+        self.assertEqual([b''.join(frags) for frags in zip(*frag_sets)],
+                         obj.encode_segments(policy, segments))
+
+    def test_encode_segments_encode_pool(self):
+        policy = self._make_encode_policy()
+        segments = [b'a' * 1024, b'c' * 10]
+        frag_sets = [policy.pyeclib_driver.encode(segment)
+                     for segment in segments]
+        encode_pool = mock.MagicMock()
+        encode_pool.encode.return_value = frag_sets
+        with mock.patch.object(policy.pyeclib_driver, 'encode') as mock_encode:
+            self.assertEqual(
+                [b''.join(frags) for frags in zip(*frag_sets)],
+                obj.encode_segments(policy, segments, encode_pool))
+        self.assertEqual([mock.call(policy, segments)],
+                         encode_pool.encode.call_args_list)
+        self.assertFalse(mock_encode.called)
+
+    def test_chunk_transformer_metrics(self):
+        policy = self._make_encode_policy()
+        logger = debug_logger('proxy-server')
+        transform = obj.chunk_transformer(policy, logger)
+        transform.send(None)
+        self.assertIsNone(transform.send(b'a' * 1000))
+        self.assertEqual(
+            obj.encode_segments(policy, [b'a' * 1024]),
+            transform.send(b'a' * 34))
+        self.assertEqual(
+            obj.encode_segments(policy, [b'a' * 10]), transform.send(b''))
+        self.assertEqual(
+            {'object.policy.0.encode.bytes': 1034},
+            logger.statsd_client.get_stats_counts())
+        self.assertEqual(
+            2, len(logger.statsd_client.calls['timing_since']))
+
     def test_client_range_to_segment_range(self):
         actual = obj.client_range_to_segment_range(100, 700, 512)
         self.assertEqual(actual, (0, 1023))
@@ -6983,6 +7046,23 @@ class ECCommonPutterMixin(object):
 
         self.assertEqual(resp.status_int, 500)
 
+    def test_PUT_ec_send_errors(self):
+        segment_size = self.policy.ec_segment_size
+        req = swob.Request.blank('/v1/a/c/o', method='PUT',
+                                 body=b'x' * segment_size * 3)
+
+        def fail_send(conn, data):
+            raise Exception('kaboom')
+
+        codes = [201] * self.replicas()
+        with set_http_connect(*codes, expect_headers=self.expect_headers,
+                              give_send=fail_send):
+            resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 503)
+        self.assertIn(
+            'Object PUT exceptions during send',
+            self.logger.get_lines_for_level('error')[-1])
+
 
 # This is how CommonObjectControllerMixin is supposed to be used:
 # @patch_policies(with_ec_default=True)
@@ -7153,6 +7233,17 @@ class TestECObjControllerMimePutter(BaseObjectControllerMixin,
     def test_PUT_with_both_body(self):
         self._test_PUT_with_body(chunked=True, content_length=True)
 
+    def test_PUT_with_body_encode_processes(self):
+        self.app.ec_encode_pool = ECProcessPool(2)
+        self.addCleanup(self.app.ec_encode_pool.close)
+        with mock.patch.object(
+                self.app.ec_encode_pool, 'encode',
+                wraps=self.app.ec_encode_pool.encode) as mock_encode:
+            self._test_PUT_with_body()
+        self.assertTrue(mock_encode.call_args_list)
+        for call in mock_encode.call_args_list:
+            self.assertIs(self.policy, call[0][0])
+
     def _test_PUT_with_body(self, chunked=False, content_length=True):
         segment_size = self.policy.ec_segment_size
         test_body = (b'asdf' * segment_size)[:-10]
@@ -7291,6 +7382,10 @@ class TestECObjControllerMimePutter(BaseObjectControllerMixin,
         self.assertEqual(len(test_body), len(expected_body))
         self.assertEqual(test_body, expected_body)
 
+        self.assertEqual(
+            len(test_body), self.logger.statsd_client.get_stats_counts()[
+                'object.policy.%d.encode.bytes' % int(self.policy)])
+
     def test_PUT_with_footers(self):
         # verify footers supplied by a footers callback being added to
         # trailing metadata
@@ -60,7 +60,7 @@ from test.unit import (
     DEFAULT_TEST_EC_TYPE, make_timestamp_iter, skip_if_no_xattrs,
     FakeHTTPResponse, node_error_count, node_last_error, set_node_errors)
 from test.unit.helpers import setup_servers, teardown_servers
-from swift.common.statsd_client import StatsdClient
+from swift.common.statsd_client import StatsdClient, DEFAULT_MAX_PACKET_SIZE
 from swift.proxy import server as proxy_server
 from swift.proxy.controllers.obj import ReplicatedObjectController
 from swift.obj import server as object_server
@@ -75,6 +75,8 @@ from swift.common.utils import hash_path, storage_directory, \
     parse_content_type, parse_mime_headers, iter_multipart_mime_documents, \
     public, mkdirs, NullLogger, md5, node_to_string, NamespaceBoundList
 from swift.common.wsgi import loadapp, ConfigString
+from swift.common.ec_pool import ECProcessPool
+from swift.common.error_limiter import ErrorLimiter, SharedErrorLimiter
 from swift.common.http_protocol import SwiftHttpProtocol
 from swift.proxy.controllers import base as proxy_base
 from swift.proxy.controllers.base import get_cache_key, cors_validation, \
@@ -628,6 +630,23 @@ class TestProxyServerConfiguration(unittest.TestCase):
         self.assertEqual(app.container_listing_shard_ranges_skip_cache, 0.0001)
         self.assertEqual(app.container_updating_shard_ranges_skip_cache, 0.001)
 
+    def test_worker_info_cache_options(self):
+        # disabled by default
+        app = self._make_app({})
+        self.assertIsNone(app.worker_info_cache)
+        app = self._make_app({'worker_info_cache_size': '100',
+                              'worker_info_cache_ttl': '2.5'})
+        self.assertEqual(100, app.worker_info_cache.maxsize)
+        self.assertEqual(2.5, app.worker_info_cache.ttl)
+        app = self._make_app({'worker_info_cache_size': '100'})
+        self.assertEqual(5, app.worker_info_cache.ttl)
+        # the cache is made available to requests
+        env = {}
+        with mock.patch.object(app, 'handle_request') as mock_handle:
+            app(env, lambda *args: None)
+        self.assertIs(app.worker_info_cache, env['swift.worker_infocache'])
+        mock_handle.assert_called_once()
+
 
 @patch_policies([StoragePolicy(0, 'zero', True, object_ring=FakeRing())])
 class TestProxyServer(unittest.TestCase):
@@ -864,6 +883,82 @@ class TestProxyServer(unittest.TestCase):
                        {'ip': '127.0.0.1'}]
         self.assertEqual(res, exp_sorting)
 
+    def test_ec_encode_processes(self):
+        app = proxy_server.Application({}, container_ring=FakeRing(),
+                                       account_ring=FakeRing())
+        self.assertIsNone(app.ec_encode_pool)
+        app = proxy_server.Application({'ec_encode_processes': '0'},
+                                       container_ring=FakeRing(),
+                                       account_ring=FakeRing())
+        self.assertIsNone(app.ec_encode_pool)
+        app = proxy_server.Application({'ec_encode_processes': '4'},
+                                       container_ring=FakeRing(),
+                                       account_ring=FakeRing())
+        self.assertIsInstance(app.ec_encode_pool, ECProcessPool)
+        self.assertEqual(4, app.ec_encode_pool.num_processes)
+        for bad in ('-1', 'auto'):
+            with self.assertRaises(ValueError):
+                proxy_server.Application({'ec_encode_processes': bad},
+                                         container_ring=FakeRing(),
+                                         account_ring=FakeRing())
+
+    def test_shared_node_stats(self):
+        baseapp = proxy_server.Application({},
+                                           container_ring=FakeRing(),
+                                           account_ring=FakeRing())
+        self.assertFalse(baseapp.shared_node_stats)
+        self.assertIsInstance(baseapp.error_limiter, ErrorLimiter)
+        self.assertNotIsInstance(baseapp.error_limiter, SharedErrorLimiter)
+        self.assertEqual(baseapp.node_timings, {})
+
+        global_conf = {}
+        preloaded_app_conf = {'shared_node_stats': 'yes',
+                              'shared_node_stats_size': '100'}
+        proxy_server.global_conf_callback(preloaded_app_conf, global_conf)
+        self.assertEqual(['shared_node_stats_tables'], list(global_conf))
+        error_table, timing_table = global_conf['shared_node_stats_tables']
+        self.assertEqual(100, error_table.size)
+        self.assertEqual(100, timing_table.size)
+
+        conf = dict(global_conf, sorting_method='timing',
+                    shared_node_stats='yes')
+        apps = [proxy_server.Application(conf,
+                                         container_ring=FakeRing(),
+                                         account_ring=FakeRing())
+                for _ in range(2)]
+        for app in apps:
+            self.assertTrue(app.shared_node_stats)
+            self.assertIsInstance(app.error_limiter, SharedErrorLimiter)
+            self.assertIs(error_table, app.error_limiter.stats)
+            self.assertIs(timing_table, app.node_timings)
+
+        node = {'ip': '127.0.0.1', 'port': 6200, 'device': 'sda'}
+        apps[0].error_limit(node, 'test')
+        self.assertTrue(apps[1].error_limited(node))
+
+        now = time.time()
+        with mock.patch('swift.proxy.server.time', return_value=now):
+            apps[0].set_node_timing(node, 0.1)
+        self.assertEqual((0.1, now + apps[1].timing_expiry),
+                         apps[1].node_timings.get('127.0.0.1'))
+        nodes = [dict(node), {'ip': '127.0.0.2'}]
+        with mock.patch('swift.proxy.server.shuffle', lambda l: l):
+            self.assertEqual(['127.0.0.2', '127.0.0.1'],
+                             [n['ip'] for n in apps[1].sort_nodes(nodes)])
+
+        # without tables made before forking, the app makes its own
+        app = proxy_server.Application({'shared_node_stats': 'yes'},
+                                       container_ring=FakeRing(),
+                                       account_ring=FakeRing())
+        self.assertIsInstance(app.error_limiter, SharedErrorLimiter)
+        self.assertEqual(8192, app.error_limiter.stats.size)
+        self.assertFalse(app.error_limited(node))
+
+    def test_global_conf_callback_does_nothing(self):
+        global_conf = {}
+        proxy_server.global_conf_callback({}, global_conf)
+        self.assertEqual({}, global_conf)
+
     def _do_sort_nodes(self, conf, policy_conf, nodes, policy,
                        node_timings=None):
         # Note with shuffling mocked out, sort_nodes will by default return
@@ -1013,6 +1108,90 @@ class TestProxyServer(unittest.TestCase):
                                           node_timings=node_timings)
         self.assertEqual([nodes[1], nodes[2], nodes[0]], actual)
 
+    def test_sort_nodes_by_latency(self):
+        nodes = [{'ip': '127.0.0.%d' % i, 'port': 6010, 'device': 'sda'}
+                 for i in range(1, 4)]
+        conf = {'sorting_method': 'latency'}
+        baseapp = proxy_server.Application(conf,
+                                           logger=debug_logger(),
+                                           container_ring=FakeRing(),
+                                           account_ring=FakeRing())
+        self.assertTrue(baseapp.tracks_latency)
+        for node, latency in zip(nodes, (0.3, 0.1, 0.2)):
+            baseapp.start_node_request(node)
+            baseapp.end_node_request(node, latency)
+        # always pick the first two of the remaining nodes to compare
+        with mock.patch('swift.proxy.server.shuffle', lambda x: x), \
+                mock.patch('swift.common.latency_tracker.random.sample',
+                           lambda population, k: list(population)[:k]):
+            actual = baseapp.sort_nodes(list(nodes))
+        self.assertEqual([nodes[1], nodes[2], nodes[0]], actual)
+
+        # requests in flight make a node less attractive
+        for _ in range(3):
+            baseapp.start_node_request(nodes[1])
+        with mock.patch('swift.proxy.server.shuffle', lambda x: x), \
+                mock.patch('swift.common.latency_tracker.random.sample',
+                           lambda population, k: list(population)[:k]):
+            actual = baseapp.sort_nodes(list(nodes))
+        self.assertEqual([nodes[0], nodes[2], nodes[1]], actual)
+
+    def test_latency_not_tracked_by_default(self):
+        baseapp = proxy_server.Application({},
+                                           container_ring=FakeRing(),
+                                           account_ring=FakeRing())
+        self.assertFalse(baseapp.tracks_latency)
+        node = {'ip': '127.0.0.1', 'port': 6010, 'device': 'sda'}
+        baseapp.start_node_request(node)
+        baseapp.end_node_request(node, 0.1, 'Object')
+        self.assertFalse(baseapp.latency_tracker.stats)
+        self.assertFalse(baseapp.latency_tracker.samples)
+
+    @patch_policies([StoragePolicy(0, 'zero', True, object_ring=FakeRing()),
+                     StoragePolicy(1, 'one', object_ring=FakeRing())])
+    def test_get_concurrency_timeout(self):
+        conf = {'concurrency_timeout': '0.5'}
+        baseapp = proxy_server.Application(conf,
+                                           container_ring=FakeRing(),
+                                           account_ring=FakeRing())
+        self.assertEqual(0.5, baseapp.get_concurrency_timeout('Object'))
+
+        conf['concurrency_timeout_percentile'] = '90'
+        baseapp = proxy_server.Application(conf,
+                                           container_ring=FakeRing(),
+                                           account_ring=FakeRing())
+        self.assertTrue(baseapp.tracks_latency)
+        node = {'ip': '127.0.0.1', 'port': 6010, 'device': 'sda'}
+        # too few samples to trust a percentile
+        baseapp.end_node_request(node, 0.01, 'Object')
+        self.assertEqual(0.5, baseapp.get_concurrency_timeout('Object'))
+        for i in range(99):
+            baseapp.end_node_request(node, i / 1000.0, 'Object')
+        self.assertEqual(0.088, baseapp.get_concurrency_timeout('Object'))
+        # failed requests are not sampled
+        for i in range(100):
+            baseapp.end_node_request(node, 0.2)
+        self.assertEqual(0.088, baseapp.get_concurrency_timeout('Object'))
+        # latencies are sampled per server type and policy
+        self.assertEqual(0.5, baseapp.get_concurrency_timeout('Container'))
+        self.assertEqual(
+            0.5, baseapp.get_concurrency_timeout('Object', POLICIES[1]))
+        for i in range(100):
+            baseapp.end_node_request(node, 0.2, 'Object', POLICIES[1])
+        self.assertEqual(
+            0.2, baseapp.get_concurrency_timeout('Object', POLICIES[1]))
+        self.assertEqual(0.088, baseapp.get_concurrency_timeout('Object'))
+        # concurrency_timeout is still an upper bound
+        for i in range(100):
+            baseapp.end_node_request(node, 10, 'Object')
+        self.assertEqual(0.5, baseapp.get_concurrency_timeout('Object'))
+
+        conf['concurrency_timeout_percentile'] = '101'
+        with self.assertRaises(ValueError):
+            proxy_server.Application(conf,
+                                     container_ring=FakeRing(),
+                                     account_ring=FakeRing())
+
     def test_node_concurrency(self):
         nodes = [{'region': 1, 'zone': 1, 'ip': '127.0.0.1', 'port': 6010,
                   'device': 'sda'},
@@ -1774,6 +1953,7 @@ class TestProxyServerConfigLoading(unittest.TestCase):
             "'write_affinity_handoff_delete_count': None, "
             "'rebalance_missing_suppression_count': 1, "
             "'concurrent_gets': False, 'concurrency_timeout': 0.5, "
+            "'concurrency_timeout_percentile': 0.0, "
             "'concurrent_ec_extra_requests': 0"
             "}, app)",
             repr(default_options))
@@ -1788,6 +1968,7 @@ class TestProxyServerConfigLoading(unittest.TestCase):
             "'write_affinity_handoff_delete_count': 4, "
             "'rebalance_missing_suppression_count': 2, "
             "'concurrent_gets': False, 'concurrency_timeout': 0.5, "
+            "'concurrency_timeout_percentile': 0.0, "
             "'concurrent_ec_extra_requests': 0"
             "}, app)",
             repr(policy_0_options))
@@ -2111,7 +2292,7 @@ class TestProxyServerConfigLoading(unittest.TestCase):
                 self._write_conf_and_load_app(conf_sections)
             self.assertEqual(
                 'Invalid sorting_method value; must be one of shuffle, '
-                "timing, affinity, not 'broken' for %s" % scope,
+                "timing, affinity, latency, not 'broken' for %s" % scope,
                 cm.exception.args[0])
 
         conf_sections = """
@@ -2301,7 +2482,8 @@ class TestProxyServerConfigLoading(unittest.TestCase):
         self.assertEqual('swift', app.logger.server)
         mock_statsd.assert_called_once_with(
             'example.com', 8125, '', 'proxy-server', 1.0, 1.0,
-            logger=app.logger.logger)
+            logger=app.logger.logger, flush_interval=0.0,
+            max_packet_size=DEFAULT_MAX_PACKET_SIZE)
 
         conf_sections = """
         [DEFAULT]
@@ -2327,7 +2509,8 @@ class TestProxyServerConfigLoading(unittest.TestCase):
         # statsd tail prefix is hard-wired 'proxy-server'
         mock_statsd.assert_called_once_with(
             'example.com', 8125, '', 'proxy-server', 1.0, 1.0,
-            logger=app.logger.logger)
+            logger=app.logger.logger, flush_interval=0.0,
+            max_packet_size=DEFAULT_MAX_PACKET_SIZE)
 
 
 class TestProxyServerConfigStringLoading(TestProxyServerConfigLoading):
@@ -4492,7 +4675,7 @@ class TestReplicatedObjectController(
         self.app.sort_nodes = lambda nodes, *args, **kwargs: nodes
         self.app.recheck_updating_shard_ranges = 3600
 
-        def do_test(method, sharding_state):
+        def do_test(method, sharding_state, seen_sharded):
             self.app.logger.clear()  # clean capture state
             shard_ranges = [
                 utils.ShardRange(
@@ -4533,6 +4716,19 @@ class TestReplicatedObjectController(
                               'object.shard_updating.cache.hit': 1}, stats)
             # verify statsd prefix is not mutated
             self.assertEqual([], self.app.logger.log_dict['set_statsd_prefix'])
+            get_many_call = mock.call.get_many(
+                ['container/a/c', 'shard-updating-v2/a/c'],
+                raise_on_error=True)
+            get_namespaces_call = mock.call.get(
+                'shard-updating-v2/a/c', raise_on_error=True)
+            if seen_sharded:
+                # namespaces were read from memcache along with container
+                # info, because this worker has seen the container sharded
+                self.assertIn(get_many_call, cache.calls)
+                self.assertNotIn(get_namespaces_call, cache.calls)
+            else:
+                self.assertNotIn(get_many_call, cache.calls)
+                self.assertIn(get_namespaces_call, cache.calls)
 
             backend_requests = fake_conn.requests
             account_request = backend_requests[0]
@@ -4574,12 +4770,12 @@ class TestReplicatedObjectController(
                 expected[device] = '10.0.0.%d:100%d' % (i, i)
             self.assertEqual(container_headers, expected)
 
-        do_test('POST', 'sharding')
-        do_test('POST', 'sharded')
-        do_test('DELETE', 'sharding')
-        do_test('DELETE', 'sharded')
-        do_test('PUT', 'sharding')
-        do_test('PUT', 'sharded')
+        do_test('POST', 'sharding', False)
+        do_test('POST', 'sharded', True)
+        do_test('DELETE', 'sharding', True)
+        do_test('DELETE', 'sharded', True)
+        do_test('PUT', 'sharding', True)
+        do_test('PUT', 'sharded', True)
 
     @patch_policies([
         StoragePolicy(0, 'zero', is_default=True, object_ring=FakeRing()),
@@ -4834,7 +5030,9 @@ class TestReplicatedObjectController(
             req = Request.blank(
                 '/v1/a/c/o', {'swift.cache': cache},
                 method=method, body='', headers={'Content-Type': 'text/plain'})
-            cache.error_on_get = [False, True]
+            # ...both when read along with the container info and when read
+            # again on its own
+            cache.error_on_get = [True, False, True]
             with mock.patch('random.random', return_value=1.0), \
                     mocked_http_conn(*status_codes, headers=resp_headers,
                                      body=body):